@@ -1,7 +1,15 @@
-import boto3
 import time
 import sys
 
+import trazas
+from clientes import cliente_perezoso
+from estado import EstadoDespliegue
+from etiquetas import especificacion
+from flota import Flota, esperar_running
+from nacls import EntradaNacl, asociar, compilar, programar
+from plan import Recurso, ReglaSg, aplicar_plan, calcular_plan, imprimir_plan
+from waiters import esperar_todos, estados_nat
+
 # --- CONFIGURACIÓN ---
 REGION = "us-east-1"
 PROJECT_NAME = "miguel-python"  # Prefijo para diferenciar nombres
@@ -18,189 +26,219 @@ PRIV_CIDR_2 = "10.10.4.0/24"
 AZ_1 = f"{REGION}a"
 AZ_2 = f"{REGION}b"
 
-# Inicializar cliente EC2
-ec2 = boto3.client('ec2', region_name=REGION)
+# Reglas de los NACLs: EntradaNacl(egress, número, protocolo, desde, hasta, cidr)
+NACL_PUB_ENTRADAS = [
+    EntradaNacl(False, 100, '6', 22, 22),           # Entrada SSH
+    EntradaNacl(False, 110, '6', 80, 80),           # Entrada HTTP
+    EntradaNacl(False, 120, '6', 1024, 65535),      # Entrada puertos efímeros
+    EntradaNacl(True, 100, '-1'),                   # Salida (All)
+]
+NACL_PRIV_ENTRADAS = [
+    EntradaNacl(False, 100, '-1', cidr='cidr:vpc'), # Entrada solo desde la VPC
+    EntradaNacl(True, 100, '-1'),                   # Salida (All)
+]
+
+# Reglas de entrada de los SGs: ReglaSg(protocolo, desde, hasta, origen)
+# ('cidr:<nombre>' y 'sg:<nombre>' se refieren a recursos de topologia())
+SG_PUB_REGLAS = [
+    ReglaSg('tcp', 22, 22, '0.0.0.0/0'),
+    ReglaSg('tcp', 80, 80, '0.0.0.0/0'),
+    ReglaSg('icmp', -1, -1, '0.0.0.0/0'),
+]
+SG_PRIV_REGLAS = [
+    # Todo desde el SG público (encadenamiento)
+    ReglaSg('tcp', 0, 65535, "sg:sg-public"),
+    ReglaSg('icmp', -1, -1, "sg:sg-public"),
+]
+
+# Estado persistente: un re-run tras un fallo reanuda desde el paso que falló
+ESTADO = EstadoDespliegue(f"examen-{PROJECT_NAME}")
 
-def create_tag(resource_id, value):
-    ec2.create_tags(Resources=[resource_id], Tags=[{'Key': 'Name', 'Value': value}])
+# Cliente EC2 (se crea en la primera llamada, no al importar)
+ec2 = cliente_perezoso('ec2', REGION)
+
+def tag_spec(resource_type, value):
+    """Tag Name dentro de la propia llamada de creación (sin create_tags aparte)"""
     print(f"   -> Etiquetado: {value}")
+    return especificacion(resource_type, value)
 
 def main():
     print(f"--- INICIANDO DESPLIEGUE BOTO3 ({PROJECT_NAME}) ---")
+    # Las reglas de los NACLs se validan antes de crear nada
+    tabla_pub = compilar(NACL_PUB_ENTRADAS, nombre='nacl-public')
+    tabla_priv = compilar(NACL_PRIV_ENTRADAS, {'vpc': VPC_CIDR}, 'nacl-private')
+    if ESTADO.registros():
+        print(f"   -> Reanudando desde {ESTADO.ruta}")
+
+    def paso(nombre, entradas, funcion):
+        # Los pasos ya hechos con las mismas entradas se saltan y devuelven su ID guardado
+        return ESTADO.paso(nombre, entradas, funcion, region=REGION, tipo=nombre,
+                           log=lambda m: print(f"   -> {m}"))
 
     # 1. CREAR VPC
     print("\n1. Creando VPC...")
-    vpc = ec2.create_vpc(CidrBlock=VPC_CIDR)
-    vpc_id = vpc['Vpc']['VpcId']
-    ec2.modify_vpc_attribute(VpcId=vpc_id, EnableDnsHostnames={'Value': True})
-    create_tag(vpc_id, f"{PROJECT_NAME}-vpc")
+    def crear_vpc():
+        vpc = ec2.create_vpc(CidrBlock=VPC_CIDR, TagSpecifications=tag_spec('vpc', f"{PROJECT_NAME}-vpc"))
+        vpc_id = vpc['Vpc']['VpcId']
+        ec2.modify_vpc_attribute(VpcId=vpc_id, EnableDnsHostnames={'Value': True})
+        return vpc_id
+    vpc_id = paso('vpc', {'cidr': VPC_CIDR}, crear_vpc)
 
     # 2. CREAR INTERNET GATEWAY
     print("\n2. Creando IGW...")
-    igw = ec2.create_internet_gateway()
-    igw_id = igw['InternetGateway']['InternetGatewayId']
-    ec2.attach_internet_gateway(InternetGatewayId=igw_id, VpcId=vpc_id)
-    create_tag(igw_id, f"{PROJECT_NAME}-igw")
+    def crear_igw():
+        igw = ec2.create_internet_gateway(TagSpecifications=tag_spec('internet-gateway', f"{PROJECT_NAME}-igw"))
+        igw_id = igw['InternetGateway']['InternetGatewayId']
+        ec2.attach_internet_gateway(InternetGatewayId=igw_id, VpcId=vpc_id)
+        return igw_id
+    igw_id = paso('igw', {'vpc': vpc_id}, crear_igw)
 
     # 3. CREAR SUBREDES (2 AZs)
     print("\n3. Creando Subredes...")
-    
-    # Public 1 (AZ A)
-    sub_pub_1 = ec2.create_subnet(VpcId=vpc_id, CidrBlock=PUB_CIDR_1, AvailabilityZone=AZ_1)
-    sub_pub_1_id = sub_pub_1['Subnet']['SubnetId']
-    ec2.modify_subnet_attribute(SubnetId=sub_pub_1_id, MapPublicIpOnLaunch={'Value': True})
-    create_tag(sub_pub_1_id, f"{PROJECT_NAME}-sub-pub-1a")
-
-    # Public 2 (AZ B)
-    sub_pub_2 = ec2.create_subnet(VpcId=vpc_id, CidrBlock=PUB_CIDR_2, AvailabilityZone=AZ_2)
-    sub_pub_2_id = sub_pub_2['Subnet']['SubnetId']
-    ec2.modify_subnet_attribute(SubnetId=sub_pub_2_id, MapPublicIpOnLaunch={'Value': True})
-    create_tag(sub_pub_2_id, f"{PROJECT_NAME}-sub-pub-2b")
-
-    # Private 1 (AZ A)
-    sub_priv_1 = ec2.create_subnet(VpcId=vpc_id, CidrBlock=PRIV_CIDR_1, AvailabilityZone=AZ_1)
-    sub_priv_1_id = sub_priv_1['Subnet']['SubnetId']
-    create_tag(sub_priv_1_id, f"{PROJECT_NAME}-sub-priv-1a")
-
-    # Private 2 (AZ B)
-    sub_priv_2 = ec2.create_subnet(VpcId=vpc_id, CidrBlock=PRIV_CIDR_2, AvailabilityZone=AZ_2)
-    sub_priv_2_id = sub_priv_2['Subnet']['SubnetId']
-    create_tag(sub_priv_2_id, f"{PROJECT_NAME}-sub-priv-2b")
+    def crear_subred(cidr, az, nombre, publica):
+        sub = ec2.create_subnet(VpcId=vpc_id, CidrBlock=cidr, AvailabilityZone=az,
+                                TagSpecifications=tag_spec('subnet', nombre))
+        sub_id = sub['Subnet']['SubnetId']
+        if publica:
+            ec2.modify_subnet_attribute(SubnetId=sub_id, MapPublicIpOnLaunch={'Value': True})
+        return sub_id
+
+    def subred(nombre, cidr, az, publica):
+        return paso(nombre, {'vpc': vpc_id, 'cidr': cidr, 'az': az},
+                    lambda: crear_subred(cidr, az, f"{PROJECT_NAME}-{nombre}", publica))
+
+    # Public 1 (AZ A) / Public 2 (AZ B)
+    sub_pub_1_id = subred('sub-pub-1a', PUB_CIDR_1, AZ_1, True)
+    sub_pub_2_id = subred('sub-pub-2b', PUB_CIDR_2, AZ_2, True)
+    # Private 1 (AZ A) / Private 2 (AZ B)
+    sub_priv_1_id = subred('sub-priv-1a', PRIV_CIDR_1, AZ_1, False)
+    sub_priv_2_id = subred('sub-priv-2b', PRIV_CIDR_2, AZ_2, False)
 
     # 4. SECURITY GROUPS
     print("\n4. Configurando Security Groups...")
     
     # SG Publico
-    sg_pub = ec2.create_security_group(GroupName=f"{PROJECT_NAME}-sg-public", Description="Acceso Publico", VpcId=vpc_id)
-    sg_pub_id = sg_pub['GroupId']
-    create_tag(sg_pub_id, f"{PROJECT_NAME}-sg-public")
-    
-    # Reglas SG Publico (SSH, HTTP, ICMP)
-    ec2.authorize_security_group_ingress(GroupId=sg_pub_id, IpProtocol='tcp', FromPort=22, ToPort=22, CidrIp='0.0.0.0/0')
-    ec2.authorize_security_group_ingress(GroupId=sg_pub_id, IpProtocol='tcp', FromPort=80, ToPort=80, CidrIp='0.0.0.0/0')
-    ec2.authorize_security_group_ingress(GroupId=sg_pub_id, IpProtocol='icmp', FromPort=-1, ToPort=-1, CidrIp='0.0.0.0/0')
+    def crear_sg_pub():
+        sg_pub = ec2.create_security_group(GroupName=f"{PROJECT_NAME}-sg-public", Description="Acceso Publico", VpcId=vpc_id,
+                                           TagSpecifications=tag_spec('security-group', f"{PROJECT_NAME}-sg-public"))
+        sg_pub_id = sg_pub['GroupId']
+        
+        # Reglas SG Publico (SSH, HTTP, ICMP)
+        ec2.authorize_security_group_ingress(GroupId=sg_pub_id, IpProtocol='tcp', FromPort=22, ToPort=22, CidrIp='0.0.0.0/0')
+        ec2.authorize_security_group_ingress(GroupId=sg_pub_id, IpProtocol='tcp', FromPort=80, ToPort=80, CidrIp='0.0.0.0/0')
+        ec2.authorize_security_group_ingress(GroupId=sg_pub_id, IpProtocol='icmp', FromPort=-1, ToPort=-1, CidrIp='0.0.0.0/0')
+        return sg_pub_id
+    sg_pub_id = paso('sg-public', {'vpc': vpc_id}, crear_sg_pub)
 
     # SG Privado
-    sg_priv = ec2.create_security_group(GroupName=f"{PROJECT_NAME}-sg-private", Description="Acceso Privado", VpcId=vpc_id)
-    sg_priv_id = sg_priv['GroupId']
-    create_tag(sg_priv_id, f"{PROJECT_NAME}-sg-private")
-    
-    # Regla SG Privado: Permitir TODO desde SG Publico (Encadenamiento)
-    ec2.authorize_security_group_ingress(
-        GroupId=sg_priv_id, 
-        IpPermissions=[{
-            'IpProtocol': 'tcp', 'FromPort': 0, 'ToPort': 65535,
-            'UserIdGroupPairs': [{'GroupId': sg_pub_id}]
-        },
-        {
-            'IpProtocol': 'icmp', 'FromPort': -1, 'ToPort': -1,
-            'UserIdGroupPairs': [{'GroupId': sg_pub_id}]
-        }]
-    )
+    def crear_sg_priv():
+        sg_priv = ec2.create_security_group(GroupName=f"{PROJECT_NAME}-sg-private", Description="Acceso Privado", VpcId=vpc_id,
+                                            TagSpecifications=tag_spec('security-group', f"{PROJECT_NAME}-sg-private"))
+        sg_priv_id = sg_priv['GroupId']
+        
+        # Regla SG Privado: Permitir TODO desde SG Publico (Encadenamiento)
+        ec2.authorize_security_group_ingress(
+            GroupId=sg_priv_id, 
+            IpPermissions=[{
+                'IpProtocol': 'tcp', 'FromPort': 0, 'ToPort': 65535,
+                'UserIdGroupPairs': [{'GroupId': sg_pub_id}]
+            },
+            {
+                'IpProtocol': 'icmp', 'FromPort': -1, 'ToPort': -1,
+                'UserIdGroupPairs': [{'GroupId': sg_pub_id}]
+            }]
+        )
+        return sg_priv_id
+    sg_priv_id = paso('sg-private', {'vpc': vpc_id, 'sg_pub': sg_pub_id}, crear_sg_priv)
 
     # 5. NETWORK ACLs
     print("\n5. Configurando NACLs...")
     
     # NACL Publica
-    nacl_pub = ec2.create_network_acl(VpcId=vpc_id)
-    nacl_pub_id = nacl_pub['NetworkAcl']['NetworkAclId']
-    create_tag(nacl_pub_id, f"{PROJECT_NAME}-nacl-public")
-    
-    # Reglas NACL Publica
-    # Entrada (SSH, HTTP, Ephemeral)
-    ec2.create_network_acl_entry(NetworkAclId=nacl_pub_id, RuleNumber=100, Protocol='6', RuleAction='allow', Egress=False, CidrBlock='0.0.0.0/0', PortRange={'From': 22, 'To': 22})
-    ec2.create_network_acl_entry(NetworkAclId=nacl_pub_id, RuleNumber=110, Protocol='6', RuleAction='allow', Egress=False, CidrBlock='0.0.0.0/0', PortRange={'From': 80, 'To': 80})
-    ec2.create_network_acl_entry(NetworkAclId=nacl_pub_id, RuleNumber=120, Protocol='6', RuleAction='allow', Egress=False, CidrBlock='0.0.0.0/0', PortRange={'From': 1024, 'To': 65535})
-    # Salida (All)
-    ec2.create_network_acl_entry(NetworkAclId=nacl_pub_id, RuleNumber=100, Protocol='-1', RuleAction='allow', Egress=True, CidrBlock='0.0.0.0/0')
+    def crear_nacl_pub():
+        nacl_pub = ec2.create_network_acl(VpcId=vpc_id, TagSpecifications=tag_spec('network-acl', f"{PROJECT_NAME}-nacl-public"))
+        nacl_pub_id = nacl_pub['NetworkAcl']['NetworkAclId']
+        # Reglas NACL Publica: entrada SSH, HTTP y efímeros; salida todo (en paralelo)
+        programar(ec2, nacl_pub_id, tabla_pub)
+        return nacl_pub_id
+    nacl_pub_id = paso('nacl-public', {'vpc': vpc_id}, crear_nacl_pub)
 
     # NACL Privada
-    nacl_priv = ec2.create_network_acl(VpcId=vpc_id)
-    nacl_priv_id = nacl_priv['NetworkAcl']['NetworkAclId']
-    create_tag(nacl_priv_id, f"{PROJECT_NAME}-nacl-private")
-    
-    # Reglas NACL Privada
-    # Entrada (VPC CIDR allow)
-    ec2.create_network_acl_entry(NetworkAclId=nacl_priv_id, RuleNumber=100, Protocol='-1', RuleAction='allow', Egress=False, CidrBlock=VPC_CIDR)
-    # Salida (All)
-    ec2.create_network_acl_entry(NetworkAclId=nacl_priv_id, RuleNumber=100, Protocol='-1', RuleAction='allow', Egress=True, CidrBlock='0.0.0.0/0')
-
-    # ASOCIAR NACLS (Paso delicado en script)
-    # Helper para reemplazar asociación
-    def replace_nacl_assoc(subnet_id, new_nacl_id):
-        # Buscar la asociación actual de la subred
-        filters = [{'Name': 'association.subnet-id', 'Values': [subnet_id]}]
-        acls = ec2.describe_network_acls(Filters=filters)
-        for acl in acls['NetworkAcls']:
-            for assoc in acl['Associations']:
-                if assoc['SubnetId'] == subnet_id:
-                    assoc_id = assoc['NetworkAclAssociationId']
-                    ec2.replace_network_acl_association(AssociationId=assoc_id, NetworkAclId=new_nacl_id)
-    
-    replace_nacl_assoc(sub_pub_1_id, nacl_pub_id)
-    replace_nacl_assoc(sub_pub_2_id, nacl_pub_id)
-    replace_nacl_assoc(sub_priv_1_id, nacl_priv_id)
-    replace_nacl_assoc(sub_priv_2_id, nacl_priv_id)
+    def crear_nacl_priv():
+        nacl_priv = ec2.create_network_acl(VpcId=vpc_id, TagSpecifications=tag_spec('network-acl', f"{PROJECT_NAME}-nacl-private"))
+        nacl_priv_id = nacl_priv['NetworkAcl']['NetworkAclId']
+        # Reglas NACL Privada: entrada solo desde la VPC; salida todo
+        programar(ec2, nacl_priv_id, tabla_priv)
+        return nacl_priv_id
+    nacl_priv_id = paso('nacl-private', {'vpc': vpc_id, 'vpc_cidr': VPC_CIDR}, crear_nacl_priv)
+
+    # ASOCIAR NACLS: las asociaciones actuales de todas las subredes salen de un solo describe de la VPC
+    asociar(ec2, vpc_id, {sub_pub_1_id: nacl_pub_id, sub_pub_2_id: nacl_pub_id,
+                          sub_priv_1_id: nacl_priv_id, sub_priv_2_id: nacl_priv_id})
 
     # 6. TABLAS DE RUTAS
     print("\n6. Tablas de Rutas...")
     
     # RT Publica
-    rt_pub = ec2.create_route_table(VpcId=vpc_id)
-    rt_pub_id = rt_pub['RouteTable']['RouteTableId']
-    create_tag(rt_pub_id, f"{PROJECT_NAME}-rt-publica")
-    ec2.create_route(RouteTableId=rt_pub_id, DestinationCidrBlock='0.0.0.0/0', GatewayId=igw_id)
-    ec2.associate_route_table(RouteTableId=rt_pub_id, SubnetId=sub_pub_1_id)
-    ec2.associate_route_table(RouteTableId=rt_pub_id, SubnetId=sub_pub_2_id)
+    def crear_rt_pub():
+        rt_pub = ec2.create_route_table(VpcId=vpc_id, TagSpecifications=tag_spec('route-table', f"{PROJECT_NAME}-rt-publica"))
+        rt_pub_id = rt_pub['RouteTable']['RouteTableId']
+        ec2.create_route(RouteTableId=rt_pub_id, DestinationCidrBlock='0.0.0.0/0', GatewayId=igw_id)
+        ec2.associate_route_table(RouteTableId=rt_pub_id, SubnetId=sub_pub_1_id)
+        ec2.associate_route_table(RouteTableId=rt_pub_id, SubnetId=sub_pub_2_id)
+        return rt_pub_id
+    paso('rt-publica', {'vpc': vpc_id, 'igw': igw_id, 'subredes': [sub_pub_1_id, sub_pub_2_id]}, crear_rt_pub)
 
     # RT Privada
-    rt_priv = ec2.create_route_table(VpcId=vpc_id)
-    rt_priv_id = rt_priv['RouteTable']['RouteTableId']
-    create_tag(rt_priv_id, f"{PROJECT_NAME}-rt-privada")
-    ec2.associate_route_table(RouteTableId=rt_priv_id, SubnetId=sub_priv_1_id)
-    ec2.associate_route_table(RouteTableId=rt_priv_id, SubnetId=sub_priv_2_id)
+    def crear_rt_priv():
+        rt_priv = ec2.create_route_table(VpcId=vpc_id, TagSpecifications=tag_spec('route-table', f"{PROJECT_NAME}-rt-privada"))
+        rt_priv_id = rt_priv['RouteTable']['RouteTableId']
+        ec2.associate_route_table(RouteTableId=rt_priv_id, SubnetId=sub_priv_1_id)
+        ec2.associate_route_table(RouteTableId=rt_priv_id, SubnetId=sub_priv_2_id)
+        return rt_priv_id
+    rt_priv_id = paso('rt-privada', {'vpc': vpc_id, 'subredes': [sub_priv_1_id, sub_priv_2_id]}, crear_rt_priv)
 
     # 7. LANZAR INSTANCIAS EC2
     print("\n7. Lanzando EC2s...")
     
-    # Instancia Publica (Jump)
-    inst_pub = ec2.run_instances(
-        ImageId=AMI_ID, InstanceType='t3.micro', KeyName=KEY_NAME, MinCount=1, MaxCount=1,
-        SubnetId=sub_pub_1_id, SecurityGroupIds=[sg_pub_id],
-        IamInstanceProfile={'Name': IAM_PROFILE},
-        TagSpecifications=[{'ResourceType': 'instance', 'Tags': [{'Key': 'Name', 'Value': f"{PROJECT_NAME}-ec2-jump"}]}]
-    )
-    inst_pub_id = inst_pub['Instances'][0]['InstanceId']
-
-    # Instancia Privada (Internal)
-    inst_priv = ec2.run_instances(
-        ImageId=AMI_ID, InstanceType='t3.micro', KeyName=KEY_NAME, MinCount=1, MaxCount=1,
-        SubnetId=sub_priv_1_id, SecurityGroupIds=[sg_priv_id],
-        IamInstanceProfile={'Name': IAM_PROFILE},
-        TagSpecifications=[{'ResourceType': 'instance', 'Tags': [{'Key': 'Name', 'Value': f"{PROJECT_NAME}-ec2-internal"}]}]
-    )
-    inst_priv_id = inst_priv['Instances'][0]['InstanceId']
+    # Jump (pública) e Internal (privada) se lanzan a la vez y se esperan con un solo sondeo
+    def crear_instancias():
+        flota = Flota(ec2, ImageId=AMI_ID, InstanceType='t3.micro', KeyName=KEY_NAME,
+                      IamInstanceProfile={'Name': IAM_PROFILE})
+        flota.anadir(f"{PROJECT_NAME}-ec2-jump", sub_pub_1_id, [sg_pub_id])
+        flota.anadir(f"{PROJECT_NAME}-ec2-internal", sub_priv_1_id, [sg_priv_id])
+        ids = flota.lanzar()
+        return {'jump': ids[f"{PROJECT_NAME}-ec2-jump"][0], 'internal': ids[f"{PROJECT_NAME}-ec2-internal"][0]}
+    instancias = paso('ec2', {'ami': AMI_ID, 'subredes': [sub_pub_1_id, sub_priv_1_id],
+                              'sgs': [sg_pub_id, sg_priv_id]}, crear_instancias)
+    inst_pub_id, inst_priv_id = instancias['jump'], instancias['internal']
 
     print(f"   -> Esperando a que estén Running (IDs: {inst_pub_id}, {inst_priv_id})...")
-    waiter = ec2.get_waiter('instance_running')
-    waiter.wait(InstanceIds=[inst_pub_id, inst_priv_id])
+    esperar_running(ec2, [inst_pub_id, inst_priv_id])
 
     # 8. NAT GATEWAY
     print("\n8. Creando NAT Gateway (esto tarda un poco)...")
-    eip = ec2.allocate_address(Domain='vpc')
-    eip_id = eip['AllocationId']
-    create_tag(eip_id, f"{PROJECT_NAME}-nat-eip")
+    def crear_eip():
+        eip = ec2.allocate_address(Domain='vpc', TagSpecifications=tag_spec('elastic-ip', f"{PROJECT_NAME}-nat-eip"))
+        eip_id = eip['AllocationId']
+        return eip_id
+    eip_id = paso('nat-eip', {}, crear_eip)
 
-    nat_gw = ec2.create_nat_gateway(SubnetId=sub_pub_1_id, AllocationId=eip_id)
-    nat_gw_id = nat_gw['NatGateway']['NatGatewayId']
-    create_tag(nat_gw_id, f"{PROJECT_NAME}-nat")
+    def crear_nat():
+        nat_gw = ec2.create_nat_gateway(SubnetId=sub_pub_1_id, AllocationId=eip_id,
+                                        TagSpecifications=tag_spec('natgateway', f"{PROJECT_NAME}-nat"))
+        nat_gw_id = nat_gw['NatGateway']['NatGatewayId']
+        return nat_gw_id
+    nat_gw_id = paso('nat', {'subnet': sub_pub_1_id, 'eip': eip_id}, crear_nat)
     
     print(f"   -> NAT Gateway creado ({nat_gw_id}). Esperando disponibilidad (aprox 2 min)...")
-    nat_waiter = ec2.get_waiter('nat_gateway_available')
-    nat_waiter.wait(NatGatewayIds=[nat_gw_id])
+    esperar_todos(estados_nat(ec2), [nat_gw_id], listo={'available'}, fallido={'failed', 'deleted'},
+                  timeout=600, descripcion='NAT Gateway')
     
     # Añadir ruta NAT a la tabla privada
-    ec2.create_route(RouteTableId=rt_priv_id, DestinationCidrBlock='0.0.0.0/0', NatGatewayId=nat_gw_id)
+    def crear_ruta_nat():
+        ec2.create_route(RouteTableId=rt_priv_id, DestinationCidrBlock='0.0.0.0/0', NatGatewayId=nat_gw_id)
+    paso('ruta-nat', {'rt': rt_priv_id, 'nat': nat_gw_id}, crear_ruta_nat)
 
     print("\n==========================================")
     print(" DESPLIEGUE PYTHON FINALIZADO CON ÉXITO")
@@ -209,6 +247,54 @@ def main():
     print(f"Jump Server: {inst_pub_id}")
     print(f"Internal Server: {inst_priv_id}")
     print(f"NAT Gateway: {nat_gw_id}")
+    print(f"Estado guardado en: {ESTADO.ruta}")
+
+def prefijo():
+    """Prefijo del tag Name de los recursos de topologia()"""
+    return f"{PROJECT_NAME}-"
+
+def topologia():
+    """Estado deseado del examen a partir de las constantes de configuración (nombres sin prefijo)"""
+    instancia = dict(ami=AMI_ID, tipo_instancia='t3.micro', key=KEY_NAME, perfil=IAM_PROFILE)
+    return [
+        Recurso('vpc', 'vpc', cidr=VPC_CIDR, dns_hostnames=True),
+        Recurso('igw', 'igw', vpc='vpc'),
+        Recurso('subnet', 'sub-pub-1a', vpc='vpc', cidr=PUB_CIDR_1, az=AZ_1, publica=True),
+        Recurso('subnet', 'sub-pub-2b', vpc='vpc', cidr=PUB_CIDR_2, az=AZ_2, publica=True),
+        Recurso('subnet', 'sub-priv-1a', vpc='vpc', cidr=PRIV_CIDR_1, az=AZ_1),
+        Recurso('subnet', 'sub-priv-2b', vpc='vpc', cidr=PRIV_CIDR_2, az=AZ_2),
+        Recurso('sg', 'sg-public', vpc='vpc', descripcion="Acceso Publico", reglas=SG_PUB_REGLAS),
+        Recurso('sg', 'sg-private', vpc='vpc', descripcion="Acceso Privado", reglas=SG_PRIV_REGLAS),
+        Recurso('nacl', 'nacl-public', vpc='vpc', entradas=NACL_PUB_ENTRADAS,
+                subredes=['sub-pub-1a', 'sub-pub-2b']),
+        Recurso('nacl', 'nacl-private', vpc='vpc', entradas=NACL_PRIV_ENTRADAS,
+                subredes=['sub-priv-1a', 'sub-priv-2b']),
+        Recurso('rt', 'rt-publica', vpc='vpc', rutas={'0.0.0.0/0': 'igw'},
+                subredes=['sub-pub-1a', 'sub-pub-2b']),
+        # Las instancias se lanzan antes del NAT; la espera a 'running' se hace al final, en lote
+        Recurso('instance', 'ec2-jump', subred='sub-pub-1a', sgs=['sg-public'], **instancia),
+        Recurso('instance', 'ec2-internal', subred='sub-priv-1a', sgs=['sg-private'], **instancia),
+        Recurso('nat', 'nat', subred='sub-pub-1a'),
+        Recurso('rt', 'rt-privada', vpc='vpc', rutas={'0.0.0.0/0': 'nat'},
+                subredes=['sub-priv-1a', 'sub-priv-2b']),
+    ]
+
+def sincronizar(aplicar=True):
+    """Modo plan: compara la configuración con lo desplegado y aplica solo las diferencias"""
+    print(f"--- PLAN BOTO3 ({PROJECT_NAME}) ---")
+    cambios, ids = calcular_plan(topologia(), ec2, REGION, prefijo())
+    imprimir_plan(cambios, lambda m: print(f"   -> {m}"))
+    if aplicar and cambios:
+        aplicar_plan(cambios, ec2, ids, lambda m: print(f"   -> {m}"))
+        print(f"VPC: {ids['vpc']}")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    # python3 Examen.py          -> despliegue completo (reanudable con el fichero de estado)
+    # python3 Examen.py plan     -> muestra las diferencias con lo desplegado
+    # python3 Examen.py aplicar  -> aplica solo esas diferencias
+    orden = sys.argv[1] if len(sys.argv) > 1 else None
+    if orden in ('plan', 'aplicar'):
+        sincronizar(aplicar=orden == 'aplicar')
+    else:
+        with trazas.ejecucion('examen'):
+            main()
\ No newline at end of file
@@ -1,12 +1,97 @@
 #!/usr/bin/env python3
-import boto3
-import time
+from concurrent.futures import ThreadPoolExecutor
 
-def cleanup_transit_gateway_infrastructure():
+import trazas
+from cleanup_lote import limpiar_lote
+from clientes import cliente
+from metricas import con_contexto, en_paso
+from MRtransit_gateway_multiregion import REGIONS_CONFIG
+from waiters import esperar_todos, estados_vpc_attachments
+
+def delete_region_attachments(region):
+    """Elimina los VPC attachments de los TGWs de una región (conexiones intra-regionales)"""
+    ec2_client = cliente('ec2', region)
+    print(f"\n--- Limpiando attachments en {region} ---")
+    
+    # Obtener TGW ID
+    try:
+        tgws = ec2_client.describe_transit_gateways()
+        for tgw in tgws['TransitGateways']:
+            if tgw['State'] in ['available', 'pending']:
+                tgw_id = tgw['TransitGatewayId']
+                
+                # Eliminar VPC attachments
+                attachments = ec2_client.describe_transit_gateway_vpc_attachments(
+                    Filters=[{'Name': 'transit-gateway-id', 'Values': [tgw_id]}]
+                )
+                
+                attachment_ids = []
+                for attachment in attachments['TransitGatewayVpcAttachments']:
+                    if attachment['State'] in ['available', 'pending']:
+                        attachment_id = attachment['TransitGatewayAttachmentId']
+                        attachment_ids.append(attachment_id)
+                        print(f"Eliminando attachment: {attachment_id}")
+                        ec2_client.delete_transit_gateway_vpc_attachment(TransitGatewayAttachmentId=attachment_id)
+                
+                # Esperar eliminación de attachments
+                if attachment_ids:
+                    print("Esperando eliminación de attachments...")
+                    esperar_todos(estados_vpc_attachments(ec2_client), attachment_ids, listo={'deleted', 'deleting'},
+                                  ausente='deleted', timeout=600, descripcion='attachments', log=print)
+    except Exception as e:
+        print(f"Error eliminando attachments en {region}: {e}")
+
+async def delete_region_attachments_async(region):
+    """delete_region_attachments para el backend asyncio: borrados a la vez y espera sin hilo"""
+    import asyncio
+
+    import asincrono
+    ctl = asincrono.actual()
+    ec2 = ctl.cliente('ec2', region)
+    print(f"\n--- Limpiando attachments en {region} ---")
+    try:
+        tgws = await ec2.describe_transit_gateways(Filters=[{'Name': 'state', 'Values': ['available', 'pending']}])
+        tgw_ids = [tgw['TransitGatewayId'] for tgw in tgws['TransitGateways']]
+        if not tgw_ids:
+            return
+        attachments = await ec2.describe_transit_gateway_vpc_attachments(
+            Filters=[{'Name': 'transit-gateway-id', 'Values': tgw_ids}]
+        )
+        attachment_ids = [a['TransitGatewayAttachmentId'] for a in attachments['TransitGatewayVpcAttachments']
+                          if a['State'] in ['available', 'pending']]
+        for attachment_id in attachment_ids:
+            print(f"Eliminando attachment: {attachment_id}")
+        await asyncio.gather(*(ec2.delete_transit_gateway_vpc_attachment(TransitGatewayAttachmentId=a)
+                               for a in attachment_ids))
+        if attachment_ids:
+            print("Esperando eliminación de attachments...")
+            await ctl.esperar('vpc-attachment', region, attachment_ids, listo={'deleted', 'deleting'},
+                              ausente='deleted', descripcion='attachments')
+    except Exception as e:
+        print(f"Error eliminando attachments en {region}: {e}")
+
+async def delete_attachments_async(regions):
+    import asyncio
+
+    async def en_region(region):
+        with en_paso(f"attachments:{region}"):
+            await delete_region_attachments_async(region)
+    await asyncio.gather(*(en_region(region) for region in regions))
+
+def delete_region_attachments_paso(region):
+    with en_paso(f"attachments:{region}"):
+        delete_region_attachments(region)
+
+def cleanup_transit_gateway_infrastructure(regions=None, vpc_names=None, backend='hilos'):
     """Elimina las conexiones intra-regionales Transit Gateway (VPC attachments) y VPCs asociadas.
-    Mantiene los Transit Gateways y el peering inter-regional."""
-    ec2_east = boto3.client('ec2', region_name='us-east-1')
-    ec2_west = boto3.client('ec2', region_name='us-west-2')
+    Mantiene los Transit Gateways y el peering inter-regional.
+
+    Por defecto usa las regiones y VPCs de MRtransit_gateway_multiregion.REGIONS_CONFIG.
+    backend='asyncio' borra y espera los attachments de todas las regiones en un bucle de eventos."""
+    if regions is None:
+        regions = [r['region'] for r in REGIONS_CONFIG]
+    if vpc_names is None:
+        vpc_names = [v['name'] for r in REGIONS_CONFIG for v in r['vpcs']]
     
     print("=== Limpiando conexiones intra-regionales Transit Gateway ===")
     
@@ -14,105 +99,19 @@ def cleanup_transit_gateway_infrastructure():
         # Nota: Este script ahora solo elimina conexiones intra-regionales (VPC attachments)
         # Las conexiones inter-regionales (TGW peering) se mantienen
         
-        # 1. Eliminar TGW Attachments y VPCs por región (conexiones intra-regionales)
-        regions = [
-            ('us-east-1', ec2_east, ['VPC-East-1', 'VPC-East-2']),
-            ('us-west-2', ec2_west, ['VPC-West-1', 'VPC-West-2'])
-        ]
+        # 1. Eliminar TGW Attachments de todas las regiones a la vez
+        if backend == 'asyncio':
+            # asincrono (y asyncio) solo se cargan con este backend: cuestan ~50 ms de arranque
+            import asincrono
+            asincrono.ejecutar(delete_attachments_async(regions))
+        else:
+            with ThreadPoolExecutor(max_workers=len(regions)) as pool:
+                list(pool.map(con_contexto(delete_region_attachments_paso), regions))
         
-        for region, ec2_client, vpc_names in regions:
-            print(f"\n--- Limpiando recursos en {region} ---")
-            
-            # Obtener TGW ID
-            try:
-                tgws = ec2_client.describe_transit_gateways()
-                for tgw in tgws['TransitGateways']:
-                    if tgw['State'] in ['available', 'pending']:
-                        tgw_id = tgw['TransitGatewayId']
-                        
-                        # Eliminar VPC attachments
-                        attachments = ec2_client.describe_transit_gateway_vpc_attachments(
-                            Filters=[{'Name': 'transit-gateway-id', 'Values': [tgw_id]}]
-                        )
-                        
-                        attachment_ids = []
-                        for attachment in attachments['TransitGatewayVpcAttachments']:
-                            if attachment['State'] in ['available', 'pending']:
-                                attachment_id = attachment['TransitGatewayAttachmentId']
-                                attachment_ids.append(attachment_id)
-                                print(f"Eliminando attachment: {attachment_id}")
-                                ec2_client.delete_transit_gateway_vpc_attachment(TransitGatewayAttachmentId=attachment_id)
-                        
-                        # Esperar eliminación de attachments
-                        if attachment_ids:
-                            print("Esperando eliminación de attachments...")
-                            for att_id in attachment_ids:
-                                while True:
-                                    try:
-                                        response = ec2_client.describe_transit_gateway_vpc_attachments(TransitGatewayAttachmentIds=[att_id])
-                                        state = response['TransitGatewayVpcAttachments'][0]['State']
-                                        if state in ['deleted', 'deleting']:
-                                            break
-                                    except:
-                                        break  # Attachment no existe
-                                    time.sleep(15)
-            except Exception as e:
-                print(f"Error eliminando attachments en {region}: {e}")
-            
-            # Eliminar VPCs específicas
-            for vpc_name in vpc_names:
-                try:
-                    vpcs = ec2_client.describe_vpcs(Filters=[{'Name': 'tag:Name', 'Values': [vpc_name]}])
-                    
-                    for vpc in vpcs['Vpcs']:
-                        vpc_id = vpc['VpcId']
-                        print(f"Limpiando {vpc_name}: {vpc_id}")
-                        
-                        # Terminar instancias
-                        instances = ec2_client.describe_instances(Filters=[{'Name': 'vpc-id', 'Values': [vpc_id]}])
-                        instance_ids = []
-                        for reservation in instances['Reservations']:
-                            for instance in reservation['Instances']:
-                                if instance['State']['Name'] not in ['terminated', 'terminating']:
-                                    instance_ids.append(instance['InstanceId'])
-                                    print(f"Terminando instancia: {instance['InstanceId']}")
-                                    ec2_client.terminate_instances(InstanceIds=[instance['InstanceId']])
-                        
-                        # Esperar terminación
-                        if instance_ids:
-                            print("Esperando terminación de instancias...")
-                            ec2_client.get_waiter('instance_terminated').wait(InstanceIds=instance_ids)
-                        
-                        # Eliminar Security Groups
-                        sgs = ec2_client.describe_security_groups(Filters=[{'Name': 'vpc-id', 'Values': [vpc_id]}])
-                        for sg in sgs['SecurityGroups']:
-                            if sg['GroupName'] != 'default':
-                                print(f"Eliminando SG: {sg['GroupId']}")
-                                ec2_client.delete_security_group(GroupId=sg['GroupId'])
-                        
-                        # Eliminar subredes
-                        subnets = ec2_client.describe_subnets(Filters=[{'Name': 'vpc-id', 'Values': [vpc_id]}])
-                        for subnet in subnets['Subnets']:
-                            print(f"Eliminando subred: {subnet['SubnetId']}")
-                            ec2_client.delete_subnet(SubnetId=subnet['SubnetId'])
-                        
-                        # Desconectar y eliminar IGW
-                        igws = ec2_client.describe_internet_gateways(Filters=[{'Name': 'attachment.vpc-id', 'Values': [vpc_id]}])
-                        for igw in igws['InternetGateways']:
-                            igw_id = igw['InternetGatewayId']
-                            print(f"Desconectando IGW: {igw_id}")
-                            ec2_client.detach_internet_gateway(InternetGatewayId=igw_id, VpcId=vpc_id)
-                            print(f"Eliminando IGW: {igw_id}")
-                            ec2_client.delete_internet_gateway(InternetGatewayId=igw_id)
-                        
-                        # Eliminar VPC
-                        print(f"Eliminando VPC: {vpc_id}")
-                        ec2_client.delete_vpc(VpcId=vpc_id)
-                        
-                except Exception as e:
-                    print(f"Error eliminando {vpc_name}: {e}")
+        # 2. Eliminar las VPCs de todas las regiones en una sola pasada
+        limpiar_lote([{'Name': 'tag:Name', 'Values': vpc_names}], regions)
         
-        # 2. Eliminar Transit Gateways (opcional, comentado para mantener TGWs con peering inter-regional)
+        # 3. Eliminar Transit Gateways (opcional, comentado para mantener TGWs con peering inter-regional)
         # print("\n--- Eliminando Transit Gateways ---")
         # # Pausa adicional para asegurar que todos los attachments estén eliminados
         # time.sleep(60)
@@ -146,4 +145,5 @@ def main():
     cleanup_transit_gateway_infrastructure()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with trazas.ejecucion('mrcleanup'):
+        main()
\ No newline at end of file
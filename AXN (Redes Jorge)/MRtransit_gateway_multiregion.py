@@ -1,6 +1,26 @@
 #!/usr/bin/env python3
-import boto3
-import time
+import json
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import combinations
+
+import metricas
+import trazas
+from clientes import cliente, cuenta
+from coalescer import COALESCEDOR
+from dag_executor import Paso, ejecutar_dag
+from direcciones import comprobar_sin_solapes, resumir
+from estado import EstadoDespliegue
+from etiquetas import especificacion
+from flota import Flota
+from inventario import inventario
+from waiters import TiempoAgotado, esperar_todos, estados_tgw, estados_vpc_attachments, estados_peering, estados_instancias
+
+# Estado persistente: un re-run tras un fallo reutiliza VPCs, TGWs y peerings ya creados
+ESTADO = EstadoDespliegue('mrtransit')
+# Estados de los que una instancia ya no va a pasar a running
+BAD_INSTANCE_STATES = {'shutting-down', 'terminated', 'stopping', 'stopped'}
 
 def get_ubuntu_ami(ec2_client):
     """Obtiene la AMI más reciente de Ubuntu 22.04 LTS"""
@@ -14,248 +34,207 @@ def get_ubuntu_ami(ec2_client):
     images = sorted(response['Images'], key=lambda x: x['CreationDate'], reverse=True)
     return images[0]['ImageId']
 
-def wait_for_instances_running(ec2_client, instance_ids):
-    """Espera a que las instancias estén en estado running, manejando instancias que no existen"""
-    max_attempts = 60
-    valid_instances = instance_ids.copy()
+def wait_for_instances_running(ec2_client, instance_ids, region=None):
+    """Espera a que las instancias estén en estado running, descartando las que fallan o no existen.
+
+    El sondeo pasa por el coalescedor: las esperas de todas las regiones y hilos
+    comparten un único describe_instances agrupado por región y tick.
+    Devuelve la lista de instancias que quedaron en running.
+    """
+    if not instance_ids:
+        print("⚠️ No hay instancias válidas para verificar")
+        return []
     
-    for attempt in range(max_attempts):
-        if not valid_instances:
-            print("⚠️ No hay instancias válidas para verificar")
-            return
-            
-        try:
-            response = ec2_client.describe_instances(InstanceIds=valid_instances)
-        except Exception as e:
-            if "InvalidInstanceID.NotFound" in str(e):
-                print(f"⚠️ Algunas instancias no existen, verificando individualmente...")
-                # Verificar cada instancia individualmente
-                still_valid = []
-                for instance_id in valid_instances:
-                    try:
-                        ec2_client.describe_instances(InstanceIds=[instance_id])
-                        still_valid.append(instance_id)
-                    except:
-                        print(f"⚠️ Instancia {instance_id} no existe, removiendo de la lista")
-                valid_instances = still_valid
-                continue
-            else:
-                raise e
-        
-        running_count = 0
-        instances_to_remove = []
-        
-        for reservation in response['Reservations']:
-            for instance in reservation['Instances']:
-                instance_id = instance['InstanceId']
-                state = instance['State']['Name']
-                
-                if state == 'running':
-                    running_count += 1
-                elif state in ['shutting-down', 'terminated', 'stopping', 'stopped']:
-                    print(f"⚠️ Instancia {instance_id} está en estado {state}, removiendo...")
-                    instances_to_remove.append(instance_id)
-        
-        # Remover instancias que no están en estados válidos
-        for instance_id in instances_to_remove:
-            if instance_id in valid_instances:
-                valid_instances.remove(instance_id)
-        
-        if not valid_instances:
-            print("⚠️ No quedan instancias válidas")
-            return
-            
-        if running_count == len(valid_instances):
-            print(f"✅ Todas las instancias válidas ({running_count}) están ejecutándose")
-            return
-        
-        print(f"Esperando... {running_count}/{len(valid_instances)} instancias ejecutándose")
-        time.sleep(10)
+    region = region or ec2_client.meta.region_name
+    try:
+        # 'running' o un estado del que ya no va a salir: ambos terminan la espera de esa instancia
+        states = COALESCEDOR.esperar(('instance', region), instance_ids, listo={'running'} | BAD_INSTANCE_STATES,
+                                     timeout=600, consultar=estados_instancias(ec2_client))
+    except TiempoAgotado as e:
+        states = {}
+        print(f"⚠️ Timeout esperando instancias: {e.pendientes}")
+    return report_instances(instance_ids, states)
+
+def report_instances(instance_ids, states):
+    """Avisa de las instancias que no arrancaron y devuelve las que están running"""
+    valid_instances = []
+    for instance_id in instance_ids:
+        state = states.get(instance_id)
+        if state == 'running':
+            valid_instances.append(instance_id)
+        elif state in BAD_INSTANCE_STATES:
+            print(f"⚠️ Instancia {instance_id} está en estado {state}, removiendo...")
     
-    print(f"⚠️ Timeout esperando instancias, continuando con {len(valid_instances)} instancias válidas")
+    if not valid_instances:
+        print("⚠️ No quedan instancias válidas")
+    else:
+        print(f"✅ Todas las instancias válidas ({len(valid_instances)}) están ejecutándose")
+    return valid_instances
+
+def create_single_vpc(ec2, inv, config):
+    """Crea una VPC con su IGW, subred y SG y devuelve sus IDs (la instancia va en la flota de la región)"""
+    vpc_name = config['name']
+    vpc_cidr = config['vpc_cidr']
+    subnet_cidr = config['subnet_cidr']
+
+    print(f"\n--- Creando {vpc_name} ---")
+
+    # Crear VPC
+    vpc_response = ec2.create_vpc(CidrBlock=vpc_cidr, TagSpecifications=especificacion('vpc', vpc_name))
+    vpc_id = vpc_response['Vpc']['VpcId']
+
+    # Habilitar DNS
+    ec2.modify_vpc_attribute(VpcId=vpc_id, EnableDnsHostnames={'Value': True})
+    ec2.modify_vpc_attribute(VpcId=vpc_id, EnableDnsSupport={'Value': True})
+
+    # Crear Internet Gateway
+    igw_response = ec2.create_internet_gateway(TagSpecifications=especificacion('internet-gateway', f'IGW-{vpc_name}'))
+    igw_id = igw_response['InternetGateway']['InternetGatewayId']
+    ec2.attach_internet_gateway(InternetGatewayId=igw_id, VpcId=vpc_id)
 
-def create_vpc_infrastructure(region, vpc_configs):
-    """Crea VPCs, subredes, IGW e instancias EC2 en una región"""
-    ec2 = boto3.client('ec2', region_name=region)
+    # Crear subred pública
+    az = inv.zonas_disponibles()[0]
+
+    subnet_response = ec2.create_subnet(VpcId=vpc_id, CidrBlock=subnet_cidr, AvailabilityZone=az,
+                                        TagSpecifications=especificacion('subnet', f'Subnet-{vpc_name}'))
+    subnet_id = subnet_response['Subnet']['SubnetId']
+    ec2.modify_subnet_attribute(SubnetId=subnet_id, MapPublicIpOnLaunch={'Value': True})
+
+    # Configurar tabla de rutas
+    inv.refrescar(['route_tables'], vpc_ids=[vpc_id])
+    main_rt_id = inv.tabla_principal(vpc_id)
+    ec2.create_route(RouteTableId=main_rt_id, DestinationCidrBlock='0.0.0.0/0', GatewayId=igw_id)
+
+    # Crear Security Group
+    sg_response = ec2.create_security_group(
+        GroupName=f'SG-{vpc_name}',
+        Description=f'Security group for {vpc_name}',
+        VpcId=vpc_id,
+        TagSpecifications=especificacion('security-group', f'SG-{vpc_name}')
+    )
+    sg_id = sg_response['GroupId']
+
+    # Reglas de seguridad
+    ec2.authorize_security_group_ingress(
+        GroupId=sg_id,
+        IpPermissions=[
+            {'IpProtocol': 'tcp', 'FromPort': 22, 'ToPort': 22, 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]},
+            {'IpProtocol': 'icmp', 'FromPort': -1, 'ToPort': -1, 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]}
+        ]
+    )
+
+    print(f"VPC: {vpc_id}, Subnet: {subnet_id}")
+
+    return {
+        'vpc_id': vpc_id,
+        'subnet_id': subnet_id,
+        'igw_id': igw_id,
+        'sg_id': sg_id,
+        'route_table_id': main_rt_id
+    }
+
+def create_vpc_infrastructure(region, vpc_configs, max_workers=None):
+    """Crea las VPCs de una región en paralelo y devuelve sus IDs en el orden de vpc_configs.
+
+    Las instancias van aparte (launch_instances y check_instances), fuera del camino crítico.
+    max_workers: VPCs creadas a la vez (por defecto MAX_WORKERS).
+    """
+    ec2 = cliente('ec2', region)
     
     print(f"\n=== Creando VPCs en {region} ===")
     
-    ubuntu_ami = get_ubuntu_ami(ec2)
-    created_resources = []
+    # Índice compartido de la región: AZs y tablas de rutas sin describes repetidos
+    inv = inventario(region, ec2, cargar=False)
     
-    for config in vpc_configs:
-        vpc_name = config['name']
-        vpc_cidr = config['vpc_cidr']
-        subnet_cidr = config['subnet_cidr']
-        
-        print(f"\n--- Creando {vpc_name} ---")
-        
-        # Crear VPC
-        vpc_response = ec2.create_vpc(CidrBlock=vpc_cidr)
-        vpc_id = vpc_response['Vpc']['VpcId']
-        ec2.create_tags(Resources=[vpc_id], Tags=[{'Key': 'Name', 'Value': vpc_name}])
-        
-        # Habilitar DNS
-        ec2.modify_vpc_attribute(VpcId=vpc_id, EnableDnsHostnames={'Value': True})
-        ec2.modify_vpc_attribute(VpcId=vpc_id, EnableDnsSupport={'Value': True})
-        
-        # Crear Internet Gateway
-        igw_response = ec2.create_internet_gateway()
-        igw_id = igw_response['InternetGateway']['InternetGatewayId']
-        ec2.attach_internet_gateway(InternetGatewayId=igw_id, VpcId=vpc_id)
-        ec2.create_tags(Resources=[igw_id], Tags=[{'Key': 'Name', 'Value': f'IGW-{vpc_name}'}])
-        
-        # Crear subred pública
-        azs = ec2.describe_availability_zones(Filters=[{'Name': 'state', 'Values': ['available']}])
-        az = azs['AvailabilityZones'][0]['ZoneName']
-        
-        subnet_response = ec2.create_subnet(VpcId=vpc_id, CidrBlock=subnet_cidr, AvailabilityZone=az)
-        subnet_id = subnet_response['Subnet']['SubnetId']
-        ec2.create_tags(Resources=[subnet_id], Tags=[{'Key': 'Name', 'Value': f'Subnet-{vpc_name}'}])
-        ec2.modify_subnet_attribute(SubnetId=subnet_id, MapPublicIpOnLaunch={'Value': True})
-        
-        # Configurar tabla de rutas
-        route_tables = ec2.describe_route_tables(Filters=[{'Name': 'vpc-id', 'Values': [vpc_id]}])
-        main_rt_id = route_tables['RouteTables'][0]['RouteTableId']
-        ec2.create_route(RouteTableId=main_rt_id, DestinationCidrBlock='0.0.0.0/0', GatewayId=igw_id)
-        
-        # Crear Security Group
-        sg_response = ec2.create_security_group(
-            GroupName=f'SG-{vpc_name}',
-            Description=f'Security group for {vpc_name}',
-            VpcId=vpc_id
-        )
-        sg_id = sg_response['GroupId']
-        ec2.create_tags(Resources=[sg_id], Tags=[{'Key': 'Name', 'Value': f'SG-{vpc_name}'}])
-        
-        # Reglas de seguridad
-        ec2.authorize_security_group_ingress(
-            GroupId=sg_id,
-            IpPermissions=[
-                {'IpProtocol': 'tcp', 'FromPort': 22, 'ToPort': 22, 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]},
-                {'IpProtocol': 'icmp', 'FromPort': -1, 'ToPort': -1, 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]}
-            ]
-        )
-        
-        # Crear instancia EC2
-        print(f"Creando instancia en {vpc_name}...")
-        instance_response = ec2.run_instances(
-            ImageId=ubuntu_ami,
-            MinCount=1,
-            MaxCount=1,
-            InstanceType='t3.micro',
-            SubnetId=subnet_id,
-            SecurityGroupIds=[sg_id],
-            TagSpecifications=[{
-                'ResourceType': 'instance',
-                'Tags': [{'Key': 'Name', 'Value': f'Instance-{vpc_name}'}]
-            }]
-        )
-        instance_id = instance_response['Instances'][0]['InstanceId']
-        
-        # Verificar inmediatamente el estado de la instancia
-        time.sleep(5)
-        try:
-            check_response = ec2.describe_instances(InstanceIds=[instance_id])
-            current_state = check_response['Reservations'][0]['Instances'][0]['State']['Name']
-            print(f"Estado inicial de {instance_id}: {current_state}")
-            
-            if current_state in ['shutting-down', 'terminated']:
-                print(f"⚠️ Instancia {instance_id} falló al iniciar, verificando razón...")
-                # Intentar obtener información de estado
-                state_reason = check_response['Reservations'][0]['Instances'][0].get('StateReason', {})
-                print(f"Razón del estado: {state_reason.get('Message', 'No disponible')}")
-        except Exception as e:
-            print(f"⚠️ Error verificando estado de instancia: {e}")
-        
-        print(f"VPC: {vpc_id}, Subnet: {subnet_id}, Instance: {instance_id}")
-        
-        created_resources.append({
-            'vpc_id': vpc_id,
-            'subnet_id': subnet_id,
-            'instance_id': instance_id,
-            'igw_id': igw_id,
-            'sg_id': sg_id,
-            'route_table_id': main_rt_id
-        })
-        
-        # Pausa entre creaciones para evitar problemas de límites
-        time.sleep(10)
-    
-    # Esperar a que todas las instancias estén ejecutándose
-    all_instance_ids = [res['instance_id'] for res in created_resources]
-    if all_instance_ids:
-        print(f"\nEsperando que todas las instancias en {region} estén ejecutándose...")
-        print(f"Instancias a verificar: {all_instance_ids}")
-        try:
-            wait_for_instances_running(ec2, all_instance_ids)
-        except Exception as e:
-            print(f"⚠️ Problema verificando instancias: {e}")
-            print("Continuando con la creación de infraestructura...")
-            # Filtrar instancias que realmente existen
-            valid_resources = []
-            for res in created_resources:
-                try:
-                    check = ec2.describe_instances(InstanceIds=[res['instance_id']])
-                    state = check['Reservations'][0]['Instances'][0]['State']['Name']
-                    if state not in ['shutting-down', 'terminated']:
-                        valid_resources.append(res)
-                    else:
-                        print(f"⚠️ Removiendo recurso con instancia fallida: {res['instance_id']}")
-                except:
-                    print(f"⚠️ Removiendo recurso con instancia inexistente: {res['instance_id']}")
-            created_resources[:] = valid_resources
+    def crear(config):
+        # Las VPCs ya creadas en una ejecución anterior (mismo config) se reutilizan
+        return ESTADO.paso(f"vpc:{region}:{config['name']}", config,
+                           lambda: create_single_vpc(ec2, inv, config),
+                           region=region, tipo='vpc', log=print)
     
-    return created_resources
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers or MAX_WORKERS, len(vpc_configs)))) as pool:
+        return list(pool.map(metricas.con_contexto(crear), vpc_configs))
+
+def launch_instances(region, vpc_configs, resources):
+    """Una instancia por VPC: todas las de la región se lanzan a la vez con Flota.
+
+    Cada VPC tiene su subred y su SG, así que son run_instances distintos,
+    pero no se esperan entre sí ni hay describe por instancia: la espera a
+    'running' es una sola, en check_instances. Devuelve {VPC: instance_id}.
+    """
+    ec2 = cliente('ec2', region)
+    flota = Flota(ec2, ImageId=get_ubuntu_ami(ec2), InstanceType='t3.micro')
+    for config, res in zip(vpc_configs, resources):
+        flota.anadir(f"Instance-{config['name']}", res['subnet_id'], [res['sg_id']])
+    ids = flota.lanzar(log=print)
+    return {config['name']: ids[f"Instance-{config['name']}"][0] for config in vpc_configs}
+
+def check_instances(region, instance_ids):
+    """Espera a que las instancias de la región estén running y avisa de las que fallan"""
+    print(f"\nEsperando que todas las instancias en {region} estén ejecutándose...")
+    print(f"Instancias a verificar: {instance_ids}")
+    try:
+        return wait_for_instances_running(cliente('ec2', region), instance_ids, region)
+    except Exception as e:
+        print(f"⚠️ Problema verificando instancias en {region}: {e}")
+        return []
+
+def deploy_instances(region, vpc_configs, resources):
+    """Lanza (o reutiliza del estado) las instancias de la región y espera a que arranquen"""
+    instance_ids = ESTADO.paso(f"instancias:{region}", [res['vpc_id'] for res in resources],
+                               lambda: launch_instances(region, vpc_configs, resources),
+                               region=region, tipo='instancias', log=print)
+    return check_instances(region, list(instance_ids.values()))
+
+def tgw_args(region, asn, name):
+    return {
+        'Description': f'Transit Gateway for {region}',
+        'Options': {'AmazonSideAsn': asn},
+        'TagSpecifications': [{
+            'ResourceType': 'transit-gateway',
+            'Tags': [{'Key': 'Name', 'Value': name}]
+        }]
+    }
 
 def create_transit_gateway(region, asn, name):
     """Crea Transit Gateway en una región"""
-    ec2 = boto3.client('ec2', region_name=region)
+    ec2 = cliente('ec2', region)
     
     print(f"\n--- Creando Transit Gateway en {region} ---")
     
-    tgw_response = ec2.create_transit_gateway(
-        Description=f'Transit Gateway for {region}',
-        Options={'AmazonSideAsn': asn},
-        TagSpecifications=[{
-            'ResourceType': 'transit-gateway',
-            'Tags': [{'Key': 'Name', 'Value': name}]
-        }]
-    )
+    tgw_response = ec2.create_transit_gateway(**tgw_args(region, asn, name))
     tgw_id = tgw_response['TransitGateway']['TransitGatewayId']
     
     # Esperar a que esté disponible
     print(f"Esperando que TGW {tgw_id} esté disponible...")
-    while True:
-        response = ec2.describe_transit_gateways(TransitGatewayIds=[tgw_id])
-        state = response['TransitGateways'][0]['State']
-        if state == 'available':
-            break
-        time.sleep(10)
+    esperar_todos(estados_tgw(ec2), [tgw_id], listo={'available'}, fallido={'deleting', 'deleted'},
+                  timeout=900, descripcion=f"TGW {tgw_id}", log=print)
     
     print(f"Transit Gateway creado: {tgw_id}")
     return tgw_id
 
+def attachment_args(tgw_id, resource):
+    return {
+        'TransitGatewayId': tgw_id,
+        'VpcId': resource['vpc_id'],
+        'SubnetIds': [resource['subnet_id']],
+        'TagSpecifications': [{
+            'ResourceType': 'transit-gateway-attachment',
+            'Tags': [{'Key': 'Name', 'Value': f"TGW-Attachment-{resource['vpc_id']}"}]
+        }]
+    }
+
 def attach_vpcs_to_tgw(region, tgw_id, vpc_resources):
     """Conecta VPCs al Transit Gateway"""
-    ec2 = boto3.client('ec2', region_name=region)
+    ec2 = cliente('ec2', region)
     
     print(f"\n--- Conectando VPCs al TGW en {region} ---")
     
     attachments = []
     for resource in vpc_resources:
         vpc_id = resource['vpc_id']
-        subnet_id = resource['subnet_id']
         
-        attachment_response = ec2.create_transit_gateway_vpc_attachment(
-            TransitGatewayId=tgw_id,
-            VpcId=vpc_id,
-            SubnetIds=[subnet_id],
-            TagSpecifications=[{
-                'ResourceType': 'transit-gateway-attachment',
-                'Tags': [{'Key': 'Name', 'Value': f'TGW-Attachment-{vpc_id}'}]
-            }]
-        )
+        attachment_response = ec2.create_transit_gateway_vpc_attachment(**attachment_args(tgw_id, resource))
         attachment_id = attachment_response['TransitGatewayVpcAttachment']['TransitGatewayAttachmentId']
         attachments.append(attachment_id)
         
@@ -263,213 +242,444 @@ def attach_vpcs_to_tgw(region, tgw_id, vpc_resources):
     
     # Esperar a que los attachments estén disponibles
     print("Esperando que los attachments estén disponibles...")
-    for attachment_id in attachments:
-        while True:
-            response = ec2.describe_transit_gateway_vpc_attachments(TransitGatewayAttachmentIds=[attachment_id])
-            state = response['TransitGatewayVpcAttachments'][0]['State']
-            if state == 'available':
-                break
-            time.sleep(10)
+    # Un único describe por tick para todos los attachments de la región
+    COALESCEDOR.esperar(('vpc-attachment', region), attachments, listo={'available'},
+                        fallido={'failed', 'rejected', 'deleted'}, timeout=900,
+                        consultar=estados_vpc_attachments(ec2))
     
     return attachments
 
-def create_tgw_peering(tgw_east_id, tgw_west_id):
-    """Crea peering entre Transit Gateways"""
-    ec2_east = boto3.client('ec2', region_name='us-east-1')
-    sts = boto3.client('sts')
+def peering_args(tgw_a_id, tgw_b_id, account_id, region_a, region_b):
+    return {
+        'TransitGatewayId': tgw_a_id,
+        'PeerTransitGatewayId': tgw_b_id,
+        'PeerAccountId': account_id,
+        'PeerRegion': region_b,
+        'TagSpecifications': [{
+            'ResourceType': 'transit-gateway-attachment',
+            'Tags': [{'Key': 'Name', 'Value': f'TGW-Peering-{region_a}-{region_b}'}]
+        }]
+    }
+
+def create_tgw_peering(tgw_a_id, tgw_b_id, region_a='us-east-1', region_b='us-west-2'):
+    """Crea peering entre dos Transit Gateways (lo solicita region_a y lo acepta region_b)"""
+    ec2_a = cliente('ec2', region_a)
     
-    print("\n--- Creando TGW Peering ---")
+    print(f"\n--- Creando TGW Peering {region_a} <-> {region_b} ---")
     
-    # Obtener Account ID
-    account_id = sts.get_caller_identity()['Account']
+    # Obtener Account ID (una sola llamada a STS para todos los peerings)
+    account_id = cuenta()
     
-    peering_response = ec2_east.create_transit_gateway_peering_attachment(
-        TransitGatewayId=tgw_east_id,
-        PeerTransitGatewayId=tgw_west_id,
-        PeerAccountId=account_id,
-        PeerRegion='us-west-2',
-        TagSpecifications=[{
-            'ResourceType': 'transit-gateway-attachment',
-            'Tags': [{'Key': 'Name', 'Value': 'TGW-Peering-East-West'}]
-        }]
-    )
+    peering_response = ec2_a.create_transit_gateway_peering_attachment(
+        **peering_args(tgw_a_id, tgw_b_id, account_id, region_a, region_b))
     peering_id = peering_response['TransitGatewayPeeringAttachment']['TransitGatewayAttachmentId']
     print(f"TGW Peering creado: {peering_id}")
     
     # Esperar a que el peering esté en estado pendingAcceptance
     print("Esperando que el peering esté listo para aceptar...")
-    while True:
-        response = ec2_east.describe_transit_gateway_peering_attachments(TransitGatewayAttachmentIds=[peering_id])
-        state = response['TransitGatewayPeeringAttachments'][0]['State']
-        if state == 'pendingAcceptance':
-            break
-        time.sleep(5)
+    ec2_b = cliente('ec2', region_b)
+    # La solicitud tiene que ser visible en la región que acepta, no solo en la que la crea
+    esperar_todos(estados_peering(ec2_b), [peering_id], listo={'pendingAcceptance'},
+                  fallido={'failed', 'rejected', 'deleted'}, timeout=600,
+                  descripcion=f"peering {peering_id} en {region_b}", log=print)
     
-    # Aceptar peering desde us-west-2
-    ec2_west = boto3.client('ec2', region_name='us-west-2')
-    print("Aceptando peering desde us-west-2...")
-    ec2_west.accept_transit_gateway_peering_attachment(TransitGatewayAttachmentId=peering_id)
+    # Aceptar peering desde la región destino
+    print(f"Aceptando peering desde {region_b}...")
+    ec2_b.accept_transit_gateway_peering_attachment(TransitGatewayAttachmentId=peering_id)
     
     # Esperar a que esté disponible
     print("Esperando que el peering esté disponible...")
-    while True:
-        response = ec2_east.describe_transit_gateway_peering_attachments(TransitGatewayAttachmentIds=[peering_id])
-        state = response['TransitGatewayPeeringAttachments'][0]['State']
-        if state == 'available':
-            break
-        time.sleep(10)
+    esperar_todos(estados_peering(ec2_a), [peering_id], listo={'available'},
+                  fallido={'failed', 'rejected', 'deleted'}, timeout=900,
+                  descripcion=f"peering {peering_id}", log=print)
     
     return peering_id
 
-def configure_tgw_routes(tgw_east_id, tgw_west_id, peering_id):
-    """Configura rutas en los Transit Gateways"""
-    ec2_east = boto3.client('ec2', region_name='us-east-1')
-    ec2_west = boto3.client('ec2', region_name='us-west-2')
-    
-    print("\n--- Configurando rutas TGW ---")
+def configure_tgw_routes(region, tgw_id, destinos):
+    """Configura rutas estáticas en el TGW de una región hacia los peerings.
+
+    destinos: lista de (cidr, peering_id) con las redes de las otras regiones.
+    """
+    ec2 = cliente('ec2', region)
     
-    # Esperar un poco más para asegurar propagación del peering
-    time.sleep(30)
+    print(f"\n--- Configurando rutas TGW en {region} ---")
     
+    # Esperar a que los peerings estén 'available' vistos desde esta región
+    peering_ids = list(dict.fromkeys(p for _, p in destinos))
+    if peering_ids:
+        esperar_todos(estados_peering(ec2), peering_ids, listo={'available'},
+                      fallido={'failed', 'rejected', 'deleted'}, timeout=600,
+                      descripcion=f"peerings en {region}", log=print)
+    crear_rutas_tgw(region, tgw_id, destinos)
+
+def crear_rutas_tgw(region, tgw_id, destinos):
+    """Crea las rutas de configure_tgw_routes, con los peerings ya 'available'"""
+    ec2 = cliente('ec2', region)
     try:
-        # Obtener tablas de rutas por defecto
-        east_rt = ec2_east.describe_transit_gateway_route_tables(
-            Filters=[{'Name': 'transit-gateway-id', 'Values': [tgw_east_id]}]
-        )['TransitGatewayRouteTables'][0]['TransitGatewayRouteTableId']
-        
-        west_rt = ec2_west.describe_transit_gateway_route_tables(
-            Filters=[{'Name': 'transit-gateway-id', 'Values': [tgw_west_id]}]
+        # Obtener tabla de rutas por defecto
+        rt_id = ec2.describe_transit_gateway_route_tables(
+            Filters=[{'Name': 'transit-gateway-id', 'Values': [tgw_id]}]
         )['TransitGatewayRouteTables'][0]['TransitGatewayRouteTableId']
         
-        # Ruta en TGW-East hacia redes de West (192.x.x.x)
-        ec2_east.create_transit_gateway_route(
-            DestinationCidrBlock='192.0.0.0/8',
-            TransitGatewayRouteTableId=east_rt,
-            TransitGatewayAttachmentId=peering_id
-        )
-        
-        # Ruta en TGW-West hacia redes de East (10.x.x.x)
-        ec2_west.create_transit_gateway_route(
-            DestinationCidrBlock='10.0.0.0/8',
-            TransitGatewayRouteTableId=west_rt,
-            TransitGatewayAttachmentId=peering_id
-        )
+        for cidr, peering_id in destinos:
+            ec2.create_transit_gateway_route(
+                DestinationCidrBlock=cidr,
+                TransitGatewayRouteTableId=rt_id,
+                TransitGatewayAttachmentId=peering_id
+            )
+            print(f"  Ruta TGW {cidr} -> {peering_id}")
         
-        print("Rutas TGW configuradas")
+        print(f"Rutas TGW configuradas en {region}")
         
     except Exception as e:
-        print(f"⚠️ Error configurando rutas TGW: {e}")
+        print(f"⚠️ Error configurando rutas TGW en {region}: {e}")
         print("Continuando sin rutas TGW (las VPCs locales seguirán funcionando)")
 
-def configure_vpc_routes(region, vpc_resources, tgw_id, vpc_configs):
-    """Configura rutas en las VPCs hacia el Transit Gateway"""
-    ec2 = boto3.client('ec2', region_name=region)
+def configure_vpc_routes(region, vpc_resources, tgw_id, vpc_configs, all_cidrs, attachments=()):
+    """Configura rutas en las VPCs hacia el Transit Gateway.
+
+    all_cidrs: prefijos (resumidos) de todo el despliegue; cada VPC los enruta
+    hacia el TGW de su región salvo el suyo exacto (la ruta local es más
+    específica que cualquier resumen que la contenga).
+    attachments: IDs de los VPC attachments de la región, que deben estar
+    'available' antes de crear rutas hacia el TGW.
+    """
+    ec2 = cliente('ec2', region)
     
     print(f"\n--- Configurando rutas VPC en {region} ---")
     
-    # Pausa para asegurar que los attachments estén completamente propagados
-    print("Esperando propagación de attachments...")
-    time.sleep(30)
+    # Las rutas hacia el TGW solo son válidas con los attachments disponibles
+    if attachments:
+        COALESCEDOR.esperar(('vpc-attachment', region), list(attachments), listo={'available'},
+                            fallido={'failed', 'rejected', 'deleted'}, timeout=600,
+                            consultar=estados_vpc_attachments(ec2))
     
     for i, resource in enumerate(vpc_resources):
         rt_id = resource['route_table_id']
         vpc_name = vpc_configs[i]['name']
-        
-        # Ruta para tráfico cross-region
-        if region == 'us-east-1':
-            cross_region_cidr = '192.0.0.0/8'  # Hacia redes de West
-            # Ruta intra-regional: hacia la otra VPC en East
-            local_cidr = '10.2.0.0/16' if 'East-1' in vpc_name else '10.1.0.0/16'
-        else:
-            cross_region_cidr = '10.0.0.0/8'   # Hacia redes de East  
-            # Ruta intra-regional: hacia la otra VPC en West
-            local_cidr = '192.224.0.0/16' if 'West-1' in vpc_name else '192.168.0.0/16'
+        own_cidr = vpc_configs[i]['vpc_cidr']
         
         print(f"Configurando rutas para {vpc_name}...")
         
-        # Agregar ruta cross-region
-        try:
-            ec2.create_route(
-                RouteTableId=rt_id,
-                DestinationCidrBlock=cross_region_cidr,
-                TransitGatewayId=tgw_id
-            )
-            print(f"  Ruta {cross_region_cidr} -> TGW configurada")
-        except Exception as e:
-            if "RouteAlreadyExists" not in str(e):
-                print(f"  ⚠️ Error configurando ruta cross-region: {e}")
-        
-        # Pausa entre configuración de rutas
-        time.sleep(5)
-        
-        # Agregar ruta intra-regional
-        try:
-            ec2.create_route(
-                RouteTableId=rt_id,
-                DestinationCidrBlock=local_cidr,
-                TransitGatewayId=tgw_id
-            )
-            print(f"  Ruta {local_cidr} -> TGW configurada")
-        except Exception as e:
-            if "RouteAlreadyExists" not in str(e):
-                print(f"  ⚠️ Error configurando ruta intra-regional: {e}")
-        
-        # Pausa entre VPCs
-        time.sleep(10)
+        for dest_cidr in all_cidrs:
+            if dest_cidr == own_cidr:
+                continue
+            try:
+                ec2.create_route(
+                    RouteTableId=rt_id,
+                    DestinationCidrBlock=dest_cidr,
+                    TransitGatewayId=tgw_id
+                )
+                print(f"  Ruta {dest_cidr} -> TGW configurada")
+            except Exception as e:
+                if "RouteAlreadyExists" not in str(e):
+                    print(f"  ⚠️ Error configurando ruta hacia {dest_cidr}: {e}")
+
+# --- CONFIGURACIÓN DE REGIONES ---
+# Cada entrada es un pipeline independiente (VPCs -> TGW -> attachments).
+# Se pueden añadir tantas regiones como se quiera; el peering es full-mesh.
+REGIONS_CONFIG = [
+    {
+        'region': 'us-east-1', 'asn': 64512, 'tgw_name': 'TGW-East',
+        'vpcs': [
+            {'name': 'VPC-East-1', 'vpc_cidr': '10.1.0.0/16', 'subnet_cidr': '10.1.0.0/24'},
+            {'name': 'VPC-East-2', 'vpc_cidr': '10.2.0.0/16', 'subnet_cidr': '10.2.0.0/24'}
+        ]
+    },
+    {
+        'region': 'us-west-2', 'asn': 64513, 'tgw_name': 'TGW-West',
+        'vpcs': [
+            {'name': 'VPC-West-1', 'vpc_cidr': '192.168.0.0/16', 'subnet_cidr': '192.168.1.0/24'},
+            {'name': 'VPC-West-2', 'vpc_cidr': '192.224.0.0/16', 'subnet_cidr': '192.224.0.0/24'}
+        ]
+    }
+]
+
+MAX_WORKERS = 8 # Hilos del DAG de despliegue y de la creación de VPCs de cada región
+
+def load_regions_config(path):
+    """Carga (regiones, peerings) de un JSON: una lista con el formato de REGIONS_CONFIG
+    o {'regions': [...], 'peerings': [[a, b], ...]} (el que genera malla.py)"""
+    with open(path) as f:
+        datos = json.load(f)
+    if isinstance(datos, list):
+        return datos, None
+    return datos['regions'], [tuple(p) for p in datos.get('peerings', [])] or None
+
+def region_prefixes(region_config):
+    """Prefijos con los que se anuncia una región: su resumen, o sus VPCs colapsadas"""
+    if region_config.get('summary'):
+        return [region_config['summary']]
+    return resumir(v['vpc_cidr'] for v in region_config['vpcs'])
+
+def compute_routes(regions_config, peerings):
+    """Rutas de la malla: ({región: [(prefijo, peering)]} para cada TGW, prefijos para las VPCs).
+
+    Cada TGW envía cada región remota por el primer peering del camino más
+    corto hacia ella: en full-mesh es el peering directo y en hub-and-spoke
+    los spokes pasan por el hub.
+    """
+    vecinos = {r['region']: [] for r in regions_config}
+    for a, b in peerings:
+        vecinos[a].append((b, (a, b)))
+        vecinos[b].append((a, (a, b)))
+    tgw_routes = {}
+    for r in regions_config:
+        origen = r['region']
+        primer_salto = {}
+        cola = deque()
+        for vecino, peering in vecinos[origen]:
+            if vecino not in primer_salto:
+                primer_salto[vecino] = peering
+                cola.append(vecino)
+        while cola:
+            actual = cola.popleft()
+            for vecino, _ in vecinos[actual]:
+                if vecino != origen and vecino not in primer_salto:
+                    primer_salto[vecino] = primer_salto[actual]
+                    cola.append(vecino)
+        tgw_routes[origen] = [(c, primer_salto[d['region']]) for d in regions_config
+                              if d['region'] in primer_salto for c in region_prefixes(d)]
+    vpc_routes = [c for r in regions_config for c in region_prefixes(r)]
+    return tgw_routes, vpc_routes
+
+def modelo_rutas(regions_config=None, peerings=None):
+    """Modelo offline (rutas.Red) de las rutas que instala main(), para comprobarlas sin AWS"""
+    from rutas import Red
+    if regions_config is None:
+        regions_config = REGIONS_CONFIG
+    if peerings is None:
+        peerings = list(combinations([r['region'] for r in regions_config], 2))
+    tgw_routes, vpc_routes = compute_routes(regions_config, peerings)
+    tgw_de = {r['region']: r['tgw_name'] for r in regions_config}
+    red = Red()
+    for r in regions_config:
+        red.anadir_tgw(r['tgw_name'])
+        for v in r['vpcs']:
+            # configure_vpc_routes: los prefijos de la malla hacia el TGW de la región
+            red.anadir_vpc(v['name'], v['vpc_cidr'], {c: r['tgw_name'] for c in vpc_routes if c != v['vpc_cidr']})
+            attachment = f"attachment-{v['name']}"
+            red.adjuntar_vpc(attachment, r['tgw_name'], v['name'])
+            # Ruta propagada por el attachment en la tabla por defecto del TGW
+            red.anadir_ruta_tgw(r['tgw_name'], v['vpc_cidr'], attachment)
+    for a, b in peerings:
+        red.peering(f"peering-{a}-{b}", tgw_de[a], tgw_de[b])
+    # configure_tgw_routes: las regiones remotas por su peering
+    for region, rutas in tgw_routes.items():
+        for cidr, (a, b) in rutas:
+            red.anadir_ruta_tgw(tgw_de[region], cidr, f"peering-{a}-{b}")
+    return red
+
+def construir_pasos(regions_config, peerings, max_workers=None):
+    """DAG del despliegue: cada paso arranca en cuanto terminan sus dependencias.
+
+    Los TGWs no esperan a las VPCs, los peerings solo a sus dos TGWs y la
+    espera de instancias no bloquea nada, así que el tiempo total lo marca
+    el camino crítico (TGW -> peering -> rutas) y no el número de VPCs.
+    """
+    tgw_routes, vpc_routes = compute_routes(regions_config, peerings)
+    pasos = []
+    for r in regions_config:
+        region = r['region']
+        pasos += [
+            Paso(f"vpcs:{region}", lambda ctx, r=r: create_vpc_infrastructure(r['region'], r['vpcs'], max_workers)),
+            Paso(f"instancias:{region}", lambda ctx, r=r: deploy_instances(r['region'], r['vpcs'], ctx[f"vpcs:{r['region']}"]),
+                 depende=[f"vpcs:{region}"]),
+            Paso(f"tgw:{region}", lambda ctx, r=r: ESTADO.paso(
+                f"tgw:{r['region']}", {'asn': r['asn'], 'name': r['tgw_name']},
+                lambda: create_transit_gateway(r['region'], r['asn'], r['tgw_name']),
+                region=r['region'], tipo='tgw', log=print)),
+            Paso(f"attachments:{region}", lambda ctx, region=region: ESTADO.paso(
+                f"attachments:{region}",
+                {'tgw': ctx[f"tgw:{region}"], 'vpcs': [res['vpc_id'] for res in ctx[f"vpcs:{region}"]]},
+                lambda: attach_vpcs_to_tgw(region, ctx[f"tgw:{region}"], ctx[f"vpcs:{region}"]),
+                region=region, tipo='tgw-attachments', log=print),
+                 depende=[f"vpcs:{region}", f"tgw:{region}"]),
+            Paso(f"rutas-vpc:{region}", lambda ctx, r=r: configure_vpc_routes(
+                r['region'], ctx[f"vpcs:{r['region']}"], ctx[f"tgw:{r['region']}"], r['vpcs'], vpc_routes,
+                ctx[f"attachments:{r['region']}"]),
+                 depende=[f"attachments:{region}"]),
+        ]
+    for a, b in peerings:
+        pasos.append(Paso(f"peering:{a}:{b}", lambda ctx, a=a, b=b: ESTADO.paso(
+            f"peering:{a}:{b}", {'tgw_a': ctx[f"tgw:{a}"], 'tgw_b': ctx[f"tgw:{b}"]},
+            lambda: create_tgw_peering(ctx[f"tgw:{a}"], ctx[f"tgw:{b}"], a, b),
+            region=a, tipo='tgw-peering', log=print),
+            depende=[f"tgw:{a}", f"tgw:{b}"]))
+    for r in regions_config:
+        region = r['region']
+        rutas = tgw_routes[region]
+        pasos.append(Paso(f"rutas-tgw:{region}", lambda ctx, region=region, rutas=rutas: configure_tgw_routes(
+            region, ctx[f"tgw:{region}"], [(c, ctx[f"peering:{a}:{b}"]) for c, (a, b) in rutas]),
+            depende=[f"tgw:{region}"] + sorted({f"peering:{a}:{b}" for _, (a, b) in rutas})))
+    return pasos
+
+# --- BACKEND ASYNCIO ---
+# Los pasos que pasan minutos esperando (TGW, attachments, peerings, instancias)
+# tienen versión async: con backend='asyncio' esperan en el bucle de eventos sin
+# ocupar un hilo. El resto de pasos del DAG son los mismos y van al pool de hilos.
+# asincrono y asyncio se importan dentro: con backend='hilos' no se cargan (~50 ms de arranque).
 
-def main():
+async def create_transit_gateway_async(region, asn, name):
+    import asincrono
+    ctl = asincrono.actual()
+    print(f"\n--- Creando Transit Gateway en {region} ---")
+    tgw_response = await ctl.cliente('ec2', region).create_transit_gateway(**tgw_args(region, asn, name))
+    tgw_id = tgw_response['TransitGateway']['TransitGatewayId']
+    await ctl.esperar('tgw', region, [tgw_id], listo={'available'}, fallido={'deleting', 'deleted'},
+                      timeout=900, descripcion=f"TGW {tgw_id}")
+    print(f"Transit Gateway creado: {tgw_id}")
+    return tgw_id
+
+async def attach_vpcs_to_tgw_async(region, tgw_id, vpc_resources):
+    import asyncio
+
+    import asincrono
+    ctl = asincrono.actual()
+    ec2 = ctl.cliente('ec2', region)
+    print(f"\n--- Conectando VPCs al TGW en {region} ---")
+    respuestas = await asyncio.gather(*(ec2.create_transit_gateway_vpc_attachment(**attachment_args(tgw_id, res))
+                                        for res in vpc_resources))
+    attachments = [r['TransitGatewayVpcAttachment']['TransitGatewayAttachmentId'] for r in respuestas]
+    await ctl.esperar('vpc-attachment', region, attachments, listo={'available'},
+                      fallido={'failed', 'rejected', 'deleted'}, timeout=900)
+    return attachments
+
+async def create_tgw_peering_async(tgw_a_id, tgw_b_id, region_a, region_b):
+    import asincrono
+    ctl = asincrono.actual()
+    print(f"\n--- Creando TGW Peering {region_a} <-> {region_b} ---")
+    account_id = await ctl.en_hilo(cuenta)
+    peering_response = await ctl.cliente('ec2', region_a).create_transit_gateway_peering_attachment(
+        **peering_args(tgw_a_id, tgw_b_id, account_id, region_a, region_b))
+    peering_id = peering_response['TransitGatewayPeeringAttachment']['TransitGatewayAttachmentId']
+    print(f"TGW Peering creado: {peering_id}")
+    fallido = {'failed', 'rejected', 'deleted'}
+    await ctl.esperar('peering', region_b, [peering_id], listo={'pendingAcceptance'}, fallido=fallido,
+                      descripcion=f"peering {peering_id} en {region_b}")
+    await ctl.cliente('ec2', region_b).accept_transit_gateway_peering_attachment(TransitGatewayAttachmentId=peering_id)
+    await ctl.esperar('peering', region_a, [peering_id], listo={'available'}, fallido=fallido,
+                      timeout=900, descripcion=f"peering {peering_id}")
+    return peering_id
+
+async def deploy_instances_async(region, vpc_configs, resources):
+    import asincrono
+    ctl = asincrono.actual()
+    instance_ids = await ctl.en_hilo(
+        ESTADO.paso, f"instancias:{region}", [res['vpc_id'] for res in resources],
+        lambda: launch_instances(region, vpc_configs, resources), region=region, tipo='instancias', log=print)
+    instance_ids = list(instance_ids.values())
+    try:
+        states = await ctl.esperar('instance', region, instance_ids, listo={'running'} | BAD_INSTANCE_STATES, timeout=600)
+    except TiempoAgotado as e:
+        states = {}
+        print(f"⚠️ Timeout esperando instancias: {e.pendientes}")
+    return report_instances(instance_ids, states)
+
+def construir_pasos_async(regions_config, peerings, max_workers=None):
+    """El DAG de construir_pasos con los pasos que esperan en versión asyncio"""
+    import asincrono
+    por_region = {r['region']: r for r in regions_config}
+    tgw_routes, _ = compute_routes(regions_config, peerings)
+
+    def tgw(r):
+        return lambda ctx: asincrono.paso_persistente(
+            ESTADO, f"tgw:{r['region']}", {'asn': r['asn'], 'name': r['tgw_name']},
+            lambda: create_transit_gateway_async(r['region'], r['asn'], r['tgw_name']),
+            region=r['region'], tipo='tgw', log=print)
+
+    def attachments(region):
+        return lambda ctx: asincrono.paso_persistente(
+            ESTADO, f"attachments:{region}",
+            {'tgw': ctx[f"tgw:{region}"], 'vpcs': [res['vpc_id'] for res in ctx[f"vpcs:{region}"]]},
+            lambda: attach_vpcs_to_tgw_async(region, ctx[f"tgw:{region}"], ctx[f"vpcs:{region}"]),
+            region=region, tipo='tgw-attachments', log=print)
+
+    def peering(a, b):
+        return lambda ctx: asincrono.paso_persistente(
+            ESTADO, f"peering:{a}:{b}", {'tgw_a': ctx[f"tgw:{a}"], 'tgw_b': ctx[f"tgw:{b}"]},
+            lambda: create_tgw_peering_async(ctx[f"tgw:{a}"], ctx[f"tgw:{b}"], a, b),
+            region=a, tipo='tgw-peering', log=print)
+
+    def rutas_tgw(region):
+        # La espera a que los peerings se vean 'available' desde esta región va en el bucle
+        # y en el hilo solo se crean las rutas (crear_rutas_tgw, sin la espera de configure_tgw_routes)
+        async def funcion(ctx):
+            ctl = asincrono.actual()
+            destinos = [(c, ctx[f"peering:{a}:{b}"]) for c, (a, b) in tgw_routes[region]]
+            print(f"\n--- Configurando rutas TGW en {region} ---")
+            await ctl.esperar('peering', region, list(dict.fromkeys(p for _, p in destinos)), listo={'available'},
+                              fallido={'failed', 'rejected', 'deleted'}, timeout=600, descripcion=f"peerings en {region}")
+            return await ctl.en_hilo(crear_rutas_tgw, region, ctx[f"tgw:{region}"], destinos)
+        return funcion
+
+    pasos = []
+    for paso in construir_pasos(regions_config, peerings, max_workers):
+        tipo, _, resto = paso.nombre.partition(':')
+        if tipo == 'tgw':
+            funcion = tgw(por_region[resto])
+        elif tipo == 'attachments':
+            funcion = attachments(resto)
+        elif tipo == 'peering':
+            funcion = peering(*resto.split(':'))
+        elif tipo == 'instancias':
+            funcion = lambda ctx, r=por_region[resto]: deploy_instances_async(r['region'], r['vpcs'],
+                                                                              ctx[f"vpcs:{r['region']}"])
+        elif tipo == 'rutas-tgw':
+            funcion = rutas_tgw(resto)
+        else:
+            pasos.append(paso)
+            continue
+        pasos.append(asincrono.PasoAsync(paso.nombre, funcion, paso.depende))
+    return pasos
+
+def main(regions_config=None, max_workers=MAX_WORKERS, peerings=None, backend='hilos'):
+    """Despliega la malla. peerings: parejas de regiones a unir (por defecto full-mesh).
+
+    backend: 'hilos' (dag_executor) o 'asyncio' (asincrono.py: las esperas no ocupan hilo).
+    """
     print("=== Iniciando despliegue de infraestructura Transit Gateway ===")
     
-    # Configuraciones de VPCs
-    east_configs = [
-        {'name': 'VPC-East-1', 'vpc_cidr': '10.1.0.0/16', 'subnet_cidr': '10.1.0.0/24'},
-        {'name': 'VPC-East-2', 'vpc_cidr': '10.2.0.0/16', 'subnet_cidr': '10.2.0.0/24'}
-    ]
-    
-    west_configs = [
-        {'name': 'VPC-West-1', 'vpc_cidr': '192.168.0.0/16', 'subnet_cidr': '192.168.1.0/24'},
-        {'name': 'VPC-West-2', 'vpc_cidr': '192.224.0.0/16', 'subnet_cidr': '192.224.0.0/24'}
-    ]
+    if regions_config is None:
+        regions_config = REGIONS_CONFIG
+    if peerings is None:
+        peerings = list(combinations([r['region'] for r in regions_config], 2))
+    # Con el TGW en malla, dos VPCs solapadas romperían el enrutado: se comprueba antes de crear nada
+    comprobar_sin_solapes([v['vpc_cidr'] for r in regions_config for v in r['vpcs']], 'CIDRs de VPC')
     
     try:
-        # 1. Crear VPCs en ambas regiones
-        east_resources = create_vpc_infrastructure('us-east-1', east_configs)
-        west_resources = create_vpc_infrastructure('us-west-2', west_configs)
-        
-        # 2. Crear Transit Gateways
-        tgw_east_id = create_transit_gateway('us-east-1', 64512, 'TGW-East')
-        tgw_west_id = create_transit_gateway('us-west-2', 64513, 'TGW-West')
-        
-        # 3. Conectar VPCs a TGWs
-        attach_vpcs_to_tgw('us-east-1', tgw_east_id, east_resources)
-        attach_vpcs_to_tgw('us-west-2', tgw_west_id, west_resources)
-        
-        # 4. Crear peering entre TGWs
-        peering_id = create_tgw_peering(tgw_east_id, tgw_west_id)
-        
-        # 5. Configurar rutas
-        configure_tgw_routes(tgw_east_id, tgw_west_id, peering_id)
-        configure_vpc_routes('us-east-1', east_resources, tgw_east_id, east_configs)
-        configure_vpc_routes('us-west-2', west_resources, tgw_west_id, west_configs)
+        if backend == 'asyncio':
+            import asincrono
+            ctx = asincrono.ejecutar(asincrono.ejecutar_dag(construir_pasos_async(regions_config, peerings, max_workers), log=print),
+                                     hilos=max(max_workers, asincrono.HILOS))
+        else:
+            ctx = ejecutar_dag(construir_pasos(regions_config, peerings, max_workers), max_workers=max_workers, log=print)
         
         print("\n=== RESUMEN DE RECURSOS CREADOS ===")
-        print(f"TGW East: {tgw_east_id}")
-        print(f"TGW West: {tgw_west_id}")
-        print(f"TGW Peering: {peering_id}")
-        
-        print("\nVPCs US-EAST-1:")
-        for i, resource in enumerate(east_resources):
-            print(f"  {east_configs[i]['name']}: {resource['vpc_id']}")
+        for r in regions_config:
+            print(f"TGW {r['region']}: {ctx[f'tgw:' + r['region']]}")
+        for a, b in peerings:
+            print(f"TGW Peering {a} <-> {b}: {ctx[f'peering:{a}:{b}']}")
         
-        print("\nVPCs US-WEST-2:")
-        for i, resource in enumerate(west_resources):
-            print(f"  {west_configs[i]['name']}: {resource['vpc_id']}")
+        for r in regions_config:
+            print(f"\nVPCs {r['region'].upper()}:")
+            for config, resource in zip(r['vpcs'], ctx[f"vpcs:{r['region']}"]):
+                print(f"  {config['name']}: {resource['vpc_id']}")
         
         print("\n✅ Infraestructura Transit Gateway creada exitosamente!")
-        print("🔗 Conectividad full-mesh entre todas las VPCs habilitada")
+        print(f"🔗 Conectividad entre todas las VPCs habilitada ({len(peerings)} peerings)")
         
     except Exception as e:
         print(f"❌ Error: {e}")
+        print(f"Recursos ya creados guardados en {ESTADO.ruta}; vuelve a ejecutar para reanudar.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Uso: python3 MRtransit_gateway_multiregion.py [regiones.json]   (p. ej. generado con malla.py)
+    with trazas.ejecucion('mrtransit'):
+        if len(sys.argv) > 1:
+            regions_config, peerings = load_regions_config(sys.argv[1])
+            main(regions_config, peerings=peerings)
+        else:
+            main()
+    metricas.resumen()
+    print("Métricas en %s y %s" % metricas.exportar('mrtransit'))
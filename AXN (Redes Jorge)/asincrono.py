@@ -0,0 +1,351 @@
+"""Backend asyncio para despliegues y limpiezas con mucho fan-out.
+
+Con el backend de hilos cada espera larga (TGW, peering, NAT, instancias)
+ocupa un hilo durante minutos. Aquí todo corre en un único bucle de
+eventos: las esperas son asyncio.sleep y se agrupan como en coalescer.py
+(un describe por tipo de recurso, región y tick para todos los que
+esperan), así que un proceso puede tener cientos de creaciones y esperas
+en vuelo a la vez.
+
+Las llamadas a AWS pasan por un semáforo por región. Con aiobotocore
+instalado son corrutinas nativas; si no, cada llamada va a un pool de
+hilos sobre los clientes compartidos de clientes.py, que solo se ocupa lo
+que dura la petición HTTP y no la espera. El limitador (limitador.py) solo
+actúa en ese segundo modo: sus pausas son time.sleep y bloquearían el
+bucle, así que con aiobotocore el ritmo lo marcan el semáforo y los
+reintentos 'adaptive' de botocore.
+
+    async def desplegar():
+        async with Controlador() as ctl:
+            ec2 = ctl.cliente('ec2', 'us-east-1')
+            tgw = (await ec2.create_transit_gateway(...))['TransitGateway']['TransitGatewayId']
+            await ctl.esperar('tgw', 'us-east-1', [tgw], listo={'available'})
+
+    ejecutar(desplegar())
+
+ejecutar_dag() es la versión async de dag_executor.ejecutar_dag: los
+PasoAsync se esperan en el bucle y los Paso normales van a un hilo, así
+que un DAG existente puede pasar a asyncio cambiando solo los pasos que
+esperan.
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import clientes
+import metricas
+from dag_executor import Paso, validar_grafo
+from waiters import EstadoFallido, TiempoAgotado
+
+# --- CONFIGURACIÓN ---
+LLAMADAS_POR_REGION = 32   # Peticiones a AWS en vuelo a la vez por región
+HILOS = 64                 # Pool para el modo sin aiobotocore y para los Paso síncronos
+INTERVALO = 5.0            # Segundos entre sondeos de cada tipo de recurso
+VALORES_POR_FILTRO = 200   # Máximo de IDs por filtro en un describe
+
+# tipo -> (operación describe, clave de la lista, filtro por ID, campo del ID)
+CONSULTAS = {
+    'tgw': ('describe_transit_gateways', 'TransitGateways', 'transit-gateway-id', 'TransitGatewayId'),
+    'vpc-attachment': ('describe_transit_gateway_vpc_attachments', 'TransitGatewayVpcAttachments',
+                       'transit-gateway-attachment-id', 'TransitGatewayAttachmentId'),
+    'peering': ('describe_transit_gateway_peering_attachments', 'TransitGatewayPeeringAttachments',
+                'transit-gateway-attachment-id', 'TransitGatewayAttachmentId'),
+    'attachment': ('describe_transit_gateway_attachments', 'TransitGatewayAttachments',
+                   'transit-gateway-attachment-id', 'TransitGatewayAttachmentId'),
+    'nat': ('describe_nat_gateways', 'NatGateways', 'nat-gateway-id', 'NatGatewayId'),
+    'instance': ('describe_instances', 'Reservations', 'instance-id', 'InstanceId'),
+}
+
+_actual = contextvars.ContextVar('controlador', default=None)
+
+
+class PasoAsync(Paso):
+    """Paso del DAG cuya función devuelve una corrutina (se espera en el bucle, sin hilo)."""
+
+
+class ClienteAsync:
+    """Cliente de un servicio en una región: cada operación es una corrutina."""
+
+    def __init__(self, controlador, servicio, region):
+        self._controlador = controlador
+        self.servicio = servicio
+        self.region = region
+
+    def __getattr__(self, operacion):
+        if operacion.startswith('_'):
+            raise AttributeError(operacion)
+
+        async def llamar(**kwargs):
+            return await self._controlador.llamar(self.servicio, self.region, operacion, kwargs)
+        return llamar
+
+
+class _Sondeo:
+    """Un tipo de recurso en una región: una tarea consulta en lote todos los IDs esperados.
+
+    Como en coalescer.py, cada consulta lleva un número de ronda y una espera
+    solo acepta estados de rondas lanzadas después de registrarse: un describe
+    que ya estaba en vuelo puede traer un estado anterior a la acción que se espera.
+    """
+
+    def __init__(self, consultar, intervalo, log=None):
+        self.consultar = consultar
+        self.intervalo = intervalo
+        self.log = log
+        self.interes = {}     # id -> nº de esperas activas
+        self.estados = {}     # id -> (ronda, último estado visto; None = no aparece)
+        self.ronda = 0        # Consultas lanzadas
+        self.tick = asyncio.Condition()
+        self.tarea = None
+
+    async def _bucle(self):
+        while self.interes:
+            self.ronda += 1
+            ronda, ids = self.ronda, list(self.interes)
+            try:
+                estados = await self.consultar(ids)
+            except Exception as e:
+                estados = None
+                if self.log:
+                    self.log(f"Error consultando {ids[:3]}... (se reintenta en el siguiente tick): {e}")
+            async with self.tick:
+                if estados is not None:
+                    # Los que ya nadie espera no se guardan: estados no crece con cada espera terminada
+                    for rid in ids:
+                        if rid in self.interes:
+                            self.estados[rid] = (ronda, estados.get(rid))
+                self.tick.notify_all()
+            await asyncio.sleep(self.intervalo)
+        self.tarea = None
+
+    async def esperar(self, ids, listo, fallido, ausente, descripcion, vistos=None):
+        """vistos: dict que se va rellenando con los estados válidos (para informar de un timeout)"""
+        vistos = {} if vistos is None else vistos
+        desde = self.ronda + 1
+        for rid in ids:
+            self.interes[rid] = self.interes.get(rid, 0) + 1
+        if self.tarea is None:
+            self.tarea = asyncio.create_task(self._bucle())
+        try:
+            async with self.tick:
+                while True:
+                    for rid in ids:
+                        ronda, estado = self.estados.get(rid, (0, None))
+                        if ronda >= desde:
+                            vistos[rid] = ausente if estado is None else estado
+                    malos = {i: e for i, e in vistos.items() if e in fallido}
+                    if malos:
+                        raise EstadoFallido(f"{descripcion} en estado fallido: {malos}", malos)
+                    if all(vistos.get(rid) in listo for rid in ids):
+                        return dict(vistos)
+                    await self.tick.wait()
+        finally:
+            for rid in ids:
+                self.interes[rid] -= 1
+                if self.interes[rid] == 0:
+                    del self.interes[rid]
+                    self.estados.pop(rid, None)
+
+
+class Controlador:
+    """Clientes, semáforos por región y sondeos agrupados de un bucle de eventos.
+
+    backend: 'auto' (aiobotocore si está instalado), 'aiobotocore' o 'hilos'.
+    """
+
+    def __init__(self, backend='auto', llamadas_por_region=LLAMADAS_POR_REGION, hilos=HILOS,
+                 intervalo=INTERVALO, log=None):
+        self.backend = backend
+        self.llamadas_por_region = llamadas_por_region
+        self.intervalo = intervalo
+        self.log = log
+        self._num_hilos = hilos
+        self._semaforos = {}   # región -> asyncio.Semaphore
+        self._sondeos = {}     # (tipo, región) -> _Sondeo
+        self._aio = {}         # (servicio, región) -> cliente de aiobotocore
+        self._lock_aio = None
+        self._pila = None
+        self._sesion_aio = None
+        self._token = None
+        self.llamadas = 0
+
+    async def __aenter__(self):
+        if self.backend in ('auto', 'aiobotocore'):
+            try:
+                from aiobotocore.session import get_session
+            except ImportError:
+                if self.backend == 'aiobotocore':
+                    raise
+                get_session = None
+            if get_session is not None:
+                from contextlib import AsyncExitStack
+                self._sesion_aio = get_session()
+                self._pila = AsyncExitStack()
+                self._lock_aio = asyncio.Lock()
+                self.backend = 'aiobotocore'
+            else:
+                self.backend = 'hilos'
+        self.hilos = ThreadPoolExecutor(max_workers=self._num_hilos, thread_name_prefix='asincrono')
+        self._token = _actual.set(self)
+        return self
+
+    async def __aexit__(self, *exc):
+        _actual.reset(self._token)
+        for sondeo in self._sondeos.values():
+            if sondeo.tarea is not None:
+                sondeo.tarea.cancel()
+        if self._pila is not None:
+            await self._pila.aclose()
+        self.hilos.shutdown(wait=False)
+        return False
+
+    def cliente(self, servicio, region=None):
+        return ClienteAsync(self, servicio, region)
+
+    def semaforo(self, region):
+        if region not in self._semaforos:
+            self._semaforos[region] = asyncio.Semaphore(self.llamadas_por_region)
+        return self._semaforos[region]
+
+    async def _cliente_aio(self, servicio, region):
+        clave = (servicio, region)
+        if clave not in self._aio:
+            async with self._lock_aio:
+                if clave not in self._aio:
+                    from aiobotocore.config import AioConfig
+                    self._aio[clave] = metricas.instalar(await self._pila.enter_async_context(
+                        self._sesion_aio.create_client(servicio, region_name=region,
+                                                       config=AioConfig(**clientes.opciones()))))
+        return self._aio[clave]
+
+    async def llamar(self, servicio, region, operacion, kwargs):
+        async with self.semaforo(region):
+            self.llamadas += 1
+            if self.backend == 'aiobotocore':
+                aio = await self._cliente_aio(servicio, region)
+                return await getattr(aio, operacion)(**kwargs)
+            return await self.en_hilo(lambda: getattr(clientes.cliente(servicio, region), operacion)(**kwargs))
+
+    async def en_hilo(self, funcion, *args, **kwargs):
+        """Ejecuta código boto3 bloqueante en el pool sin parar el bucle (con el paso en curso de metricas.py)"""
+        contexto = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            self.hilos, functools.partial(contexto.run, funcion, *args, **kwargs))
+
+    async def describir(self, tipo, region, ids):
+        """{id: estado} de los recursos de un tipo de CONSULTAS (describe paginado, por bloques de IDs)"""
+        operacion, clave, filtro, campo = CONSULTAS[tipo]
+        client = self.cliente('ec2', region)
+        estados = {}
+        for i in range(0, len(ids), VALORES_POR_FILTRO):
+            kwargs = {'Filters': [{'Name': filtro, 'Values': list(ids[i:i + VALORES_POR_FILTRO])}]}
+            while True:
+                pagina = await getattr(client, operacion)(**kwargs)
+                for r in pagina[clave]:
+                    if tipo == 'instance':
+                        estados.update({x['InstanceId']: x['State']['Name'] for x in r['Instances']})
+                    else:
+                        estados[r[campo]] = r['State']
+                if not pagina.get('NextToken'):
+                    break
+                kwargs['NextToken'] = pagina['NextToken']
+        return estados
+
+    async def esperar(self, tipo, region, ids, listo, fallido=(), ausente=None, timeout=600, descripcion=None):
+        """Espera sin hilo a que todos los IDs estén en 'listo'. Devuelve {id: estado}.
+
+        Todas las esperas del mismo tipo y región comparten un describe por tick.
+        """
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return {}
+        clave = (tipo, region)
+        if clave not in self._sondeos:
+            self._sondeos[clave] = _Sondeo(functools.partial(self.describir, tipo, region), self.intervalo, self.log)
+        descripcion = descripcion or f"{tipo} en {region}"
+        vistos = {}
+        with metricas.espera(tipo, region, ids):
+            try:
+                return await asyncio.wait_for(
+                    self._sondeos[clave].esperar(ids, set(listo), set(fallido), ausente, descripcion, vistos), timeout)
+            except asyncio.TimeoutError:
+                pendientes = [i for i in ids if vistos.get(i) not in set(listo)]
+                raise TiempoAgotado(f"Tiempo agotado esperando {descripcion}: {pendientes}", pendientes) from None
+
+
+def actual():
+    """Controlador del contexto actual (dentro de 'async with Controlador()')"""
+    controlador = _actual.get()
+    if controlador is None:
+        raise RuntimeError("No hay un Controlador activo: usa 'async with Controlador()' o ejecutar()")
+    return controlador
+
+
+async def paso_persistente(estado, paso, entradas, corrutina, region=None, tipo=None, log=None):
+    """EstadoDespliegue.paso para corrutinas: solo se espera corrutina() si el paso no está hecho.
+
+    Igual que allí, los IDs guardados se comprueban (en el pool: son describes
+    bloqueantes) y el paso es un tramo/métrica de metricas.en_paso.
+    """
+    valor = await actual().en_hilo(estado.reutilizable, paso, entradas, region, log)
+    if valor is not None:
+        return valor
+    with metricas.en_paso(paso) as tramo:
+        valor = await corrutina()
+        tramo.anotar(valor)
+        tramo.region = region or tramo.region
+    estado.guardar(paso, True if valor is None else valor, entradas, region=region, tipo=tipo)
+    return valor
+
+
+async def ejecutar_dag(pasos, log=None):
+    """dag_executor.ejecutar_dag en el bucle de eventos; devuelve {nombre: resultado}.
+
+    Los PasoAsync se esperan en el bucle; los Paso normales se ejecutan en
+    el pool de hilos del controlador. Si un paso falla no se arrancan más
+    pasos, se espera a los que ya están en marcha y se relanza el error.
+    """
+    orden = validar_grafo(pasos)
+    por_nombre = {p.nombre: p for p in pasos}
+    controlador = actual()
+    ctx, tareas = {}, {}
+    errores = []
+
+    async def correr(paso):
+        for dep in paso.depende:
+            await tareas[dep]
+        if errores or any(d not in ctx for d in paso.depende):
+            return
+        if log:
+            log(f"Iniciando paso '{paso.nombre}'...")
+        try:
+            with metricas.en_paso(paso.nombre, paso.depende) as tramo:
+                if isinstance(paso, PasoAsync):
+                    ctx[paso.nombre] = await paso.funcion(ctx)
+                else:
+                    ctx[paso.nombre] = await controlador.en_hilo(paso.funcion, ctx)
+                tramo.anotar(ctx[paso.nombre])
+            if log:
+                log(f"Paso '{paso.nombre}' completado.")
+        except Exception as e:
+            errores.append(e)
+            if log:
+                log(f"Paso '{paso.nombre}' falló: {e}")
+
+    # validar_grafo devuelve un orden topológico: las dependencias ya tienen su tarea
+    for nombre in orden:
+        tareas[nombre] = asyncio.create_task(correr(por_nombre[nombre]))
+    await asyncio.gather(*tareas.values())
+
+    if errores:
+        raise errores[0]
+    return ctx
+
+
+def ejecutar(corrutina, **opciones):
+    """asyncio.run(corrutina) dentro de un Controlador (opciones: backend, llamadas_por_region...)"""
+    async def principal():
+        async with Controlador(**opciones):
+            return await corrutina
+    return asyncio.run(principal())
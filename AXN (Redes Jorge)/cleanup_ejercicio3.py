@@ -1,7 +1,13 @@
-import boto3
-import time
+from concurrent.futures import ThreadPoolExecutor
+
 from botocore.exceptions import ClientError
 
+import trazas
+from cleanup_lote import limpiar_lote
+from clientes import cliente
+from metricas import con_contexto, en_paso
+from waiters import esperar_todos, estados_attachments, estados_tgw, reintentar
+
 # --- CONFIGURACIÓN ---
 REGIONS = ['us-east-1', 'us-west-2']
 # Nombres de las VPCs que queremos borrar (para no borrar las de otros proyectos)
@@ -10,18 +16,20 @@ TAG_NAMES = ['VPC-R1-A', 'VPC-R1-B', 'VPC-R2-C']
 def log(msg):
     print(f"[CLEANUP-MASTER] {msg}")
 
-def cleanup_region_logic(region):
+def cleanup_tgw_region(region):
+    """Attachments (VPC y peering) y Transit Gateways de una región"""
     log(f"--- CONECTANDO A {region} ---")
-    ec2 = boto3.resource('ec2', region_name=region)
-    client = boto3.client('ec2', region_name=region)
+    client = cliente('ec2', region)
 
     # ---------------------------------------------------------
     # 1. ELIMINAR ATTACHMENTS (VPC y PEERING)
     # ---------------------------------------------------------
-    # Buscamos attachments que NO estén ya borrados
-    atts = client.describe_transit_gateway_attachments(
-        Filters=[{'Name': 'state', 'Values': ['available', 'pending', 'pendingAcceptance', 'modifying', 'initiating']}]
+    # Buscamos attachments que NO estén ya borrados (incluidos los que se están borrando,
+    # porque también hay que esperarlos antes de tocar el TGW)
+    todos = client.describe_transit_gateway_attachments(
+        Filters=[{'Name': 'state', 'Values': ['available', 'pending', 'pendingAcceptance', 'modifying', 'initiating', 'deleting']}]
     )['TransitGatewayAttachments']
+    atts = [a for a in todos if a['State'] != 'deleting']
 
     if atts:
         log(f"Encontrados {len(atts)} attachments activos. Enviando orden de borrado...")
@@ -53,26 +61,13 @@ def cleanup_region_logic(region):
     # 2. ESPERA ACTIVA (BLOQUEANTE)
     # ---------------------------------------------------------
     # No avanzamos al TGW hasta que no queden attachments. Punto.
-    log("Verificando limpieza de attachments (Loop de espera)...")
-    while True:
-        try:
-            current_atts = client.describe_transit_gateway_attachments(
-                Filters=[{'Name': 'state', 'Values': ['available', 'pending', 'deleting', 'modifying', 'pendingAcceptance']}]
-            )['TransitGatewayAttachments']
-            
-            if not current_atts:
-                log("¡Todos los attachments han desaparecido!")
-                break
-            
-            # Feedback visual para no desesperar
-            count = len(current_atts)
-            types = [a['ResourceType'] for a in current_atts]
-            log(f"Esperando a AWS... Quedan {count} attachments borrándose ({types})...")
-            time.sleep(15)
-            
-        except Exception as e:
-            log(f"Error consultando estado (reintentando): {e}")
-            time.sleep(10)
+    log("Verificando limpieza de attachments...")
+    att_ids = [a['TransitGatewayAttachmentId'] for a in todos]
+    if att_ids:
+        # Un solo describe por sondeo para todos; los que ya no aparecen cuentan como borrados
+        esperar_todos(estados_attachments(client), att_ids, listo={'deleted'}, ausente='deleted',
+                      timeout=1200, descripcion='attachments borrándose', log=log)
+    log("¡Todos los attachments han desaparecido!")
 
     # ---------------------------------------------------------
     # 3. ELIMINAR TRANSIT GATEWAYS
@@ -81,85 +76,48 @@ def cleanup_region_logic(region):
         Filters=[{'Name': 'state', 'Values': ['available', 'pending', 'deleting']}]
     )['TransitGateways']
 
+    tgw_ids = []
     for tgw in tgws:
         tgw_id = tgw['TransitGatewayId']
         log(f"Gestionando TGW {tgw_id}...")
-        
-        # Intentar borrar hasta que nos deje (por si hay latencia en la desaparición de attachments)
-        while True:
-            try:
-                # Verificar estado actual
-                res = client.describe_transit_gateways(TransitGatewayIds=[tgw_id])
-                if not res['TransitGateways']:
-                    break # Ya no existe
-                
-                state = res['TransitGateways'][0]['State']
-                if state == 'deleted':
-                    log(f"TGW {tgw_id} ya está eliminado.")
-                    break
-                
-                if state != 'deleting':
-                    client.delete_transit_gateway(TransitGatewayId=tgw_id)
-                    log(f"Orden de borrado enviada para TGW {tgw_id}.")
-                else:
-                    log(f"TGW {tgw_id} está en estado 'deleting'. Esperando...")
-                
-                time.sleep(10)
-                
-            except ClientError as e:
-                if "IncorrectState" in str(e):
-                    log("AWS aún detecta dependencias. Reintentando en 10s...")
-                    time.sleep(10)
-                elif "NotFound" in str(e):
-                    break
-                else:
-                    log(f"Error: {e}. Reintentando...")
-                    time.sleep(10)
-
-    # ---------------------------------------------------------
-    # 4. ELIMINAR VPCs (Estándar)
-    # ---------------------------------------------------------
-    log("Limpiando VPCs y dependencias de red...")
-    filters = [{'Name': 'tag:Name', 'Values': TAG_NAMES}]
-    vpcs = list(ec2.vpcs.filter(Filters=filters))
-    
-    if not vpcs:
-        log("No se encontraron VPCs con los tags del ejercicio.")
-    
-    for vpc in vpcs:
-        log(f"Borrando VPC {vpc.id}...")
-        # Borrar Subnets
-        for subnet in vpc.subnets.all():
-            # Borrar Interfaces de red residuales
-            for eni in subnet.network_interfaces.all():
-                try: eni.delete()
-                except: pass
-            try: client.delete_subnet(SubnetId=subnet.id)
-            except: pass
-            
-        # Borrar IGWs
-        for igw in vpc.internet_gateways.all():
-            try:
-                vpc.detach_internet_gateway(InternetGatewayId=igw.id)
-                igw.delete()
-            except: pass
-            
-        # Borrar VPC
+        if tgw['State'] == 'deleting':
+            log(f"TGW {tgw_id} está en estado 'deleting'.")
+            tgw_ids.append(tgw_id)
+            continue
         try:
-            client.delete_vpc(VpcId=vpc.id)
-            log("-> VPC Eliminada.")
-        except Exception as e:
-            log(f"-> Error borrando VPC: {e}")
+            # IncorrectState: el TGW sigue 'pending' o AWS aún ve attachments; se reintenta hasta que deje
+            reintentar(lambda: client.delete_transit_gateway(TransitGatewayId=tgw_id),
+                       lambda e: 'IncorrectState' in str(e), timeout=1200, log=log)
+            log(f"Orden de borrado enviada para TGW {tgw_id}.")
+            tgw_ids.append(tgw_id)
+        except ClientError as e:
+            if "NotFound" not in str(e):
+                log(f"Error: {e}")
+
+    # Esperar a los TGWs que se están borrando con un único describe por sondeo
+    if tgw_ids:
+        esperar_todos(estados_tgw(client), tgw_ids, listo={'deleted'}, ausente='deleted',
+                      timeout=1200, descripcion='TGWs borrándose', log=log)
 
 def main():
     log("INICIANDO PROTOCOLO DE LIMPIEZA UNIVERSAL")
-    for r in REGIONS:
+
+    # 1-3. TGWs de todas las regiones a la vez
+    def tgw_seguro(r):
         try:
-            cleanup_region_logic(r)
+            with en_paso(f"tgw:{r}"):
+                cleanup_tgw_region(r)
         except Exception as e:
             log(f"Error crítico en región {r}: {e}")
+
+    with ThreadPoolExecutor(max_workers=len(REGIONS)) as pool:
+        list(pool.map(con_contexto(tgw_seguro), REGIONS))
+
+    # 4. VPCs de todas las regiones en una sola pasada
+    limpiar_lote([{'Name': 'tag:Name', 'Values': TAG_NAMES}], REGIONS)
     
     log("PROTOCOLO FINALIZADO. INFRAESTRUCTURA LIMPIA.")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    with trazas.ejecucion('cleanup-ejercicio3'):
+        main()
\ No newline at end of file
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Limpieza en lote de VPCs de laboratorio en varias regiones a la vez.
+
+Recibe selectores de tags ('Name=VPC-R1-*', 'Proyecto=lab') y una lista de
+regiones. Todas las regiones se limpian en paralelo; dentro de cada región
+las VPCs se reparten en lotes que usan teardown.destruir_vpcs, con un
+límite de operaciones simultáneas por región para no disparar el
+throttling de la API de EC2. Al final se imprime un resumen conjunto.
+
+Uso:
+    python3 cleanup_lote.py --tag Name=VPC-R1-A --tag Name=VPC-R2-* \\
+        --regions us-east-1 us-west-2 --max-concurrencia 16
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import trazas
+from clientes import cliente
+from metricas import con_contexto, en_paso
+from teardown import destruir_vpcs
+
+MAX_CONCURRENCIA_REGION = 16  # Llamadas simultáneas a EC2 por región
+VPCS_POR_LOTE = 50            # Límite de valores por filtro en los describe
+MAX_LOTES_REGION = 2          # Lotes de VPCs en marcha a la vez por región
+
+_print_lock = threading.Lock()
+
+
+def log(msg):
+    with _print_lock:
+        print(f"[CLEANUP-LOTE] {msg}")
+
+
+def parsear_selector(texto):
+    """'Clave=Valor1,Valor2' -> filtro EC2 {'Name': 'tag:Clave', 'Values': [...]}"""
+    if '=' not in texto:
+        raise ValueError(f"Selector inválido (se esperaba Clave=Valor): {texto}")
+    clave, valores = texto.split('=', 1)
+    return {'Name': f'tag:{clave}', 'Values': valores.split(',')}
+
+
+def buscar_vpcs(client, selectores):
+    """VPCs que cumplen ALGUNO de los selectores (un describe paginado por selector)"""
+    encontradas = {}
+    paginator = client.get_paginator('describe_vpcs')
+    for selector in selectores:
+        for pagina in paginator.paginate(Filters=[selector]):
+            for vpc in pagina['Vpcs']:
+                encontradas[vpc['VpcId']] = vpc
+    return list(encontradas)
+
+
+def limpiar_region(region, selectores, max_concurrencia=MAX_CONCURRENCIA_REGION,
+                   vpcs_por_lote=VPCS_POR_LOTE, max_lotes=MAX_LOTES_REGION):
+    """Borra todas las VPCs de la región que casan con los selectores"""
+    inicio = time.monotonic()
+    client = cliente('ec2', region)
+    resultado = {'region': region, 'vpcs': [], 'borrados': 0, 'errores': [], 'segundos': 0.0}
+
+    def log_region(msg):
+        log(f"[{region}] {msg}")
+
+    try:
+        with en_paso(f"limpiar:{region}") as tramo:
+            vpc_ids = buscar_vpcs(client, selectores)
+            resultado['vpcs'] = vpc_ids
+            tramo.anotar(vpc_ids)
+            log_region(f"{len(vpc_ids)} VPCs encontradas.")
+
+            lotes = [vpc_ids[i:i + vpcs_por_lote] for i in range(0, len(vpc_ids), vpcs_por_lote)]
+            # El presupuesto de concurrencia de la región se reparte entre los lotes activos
+            hilos_por_lote = max(1, max_concurrencia // max(1, min(max_lotes, len(lotes))))
+            destruir = con_contexto(lambda lote: destruir_vpcs(client, lote, max_workers=hilos_por_lote, log=log_region))
+            with ThreadPoolExecutor(max_workers=max_lotes) as pool:
+                for resumen in pool.map(destruir, lotes):
+                    resultado['borrados'] += resumen['borrados']
+                    resultado['errores'] += resumen['errores']
+    except Exception as e:
+        resultado['errores'].append(f"Error crítico: {e}")
+        log_region(f"Error crítico: {e}")
+
+    resultado['segundos'] = time.monotonic() - inicio
+    return resultado
+
+
+def limpiar_lote(selectores, regiones, max_concurrencia=MAX_CONCURRENCIA_REGION, max_lotes=MAX_LOTES_REGION):
+    """Limpia todas las regiones a la vez y devuelve la lista de resultados por región"""
+    selectores = [parsear_selector(s) if isinstance(s, str) else s for s in selectores]
+    log(f"Limpiando {len(regiones)} regiones con selectores {selectores}...")
+    with ThreadPoolExecutor(max_workers=max(1, len(regiones))) as pool:
+        resultados = list(pool.map(
+            con_contexto(lambda r: limpiar_region(r, selectores, max_concurrencia=max_concurrencia, max_lotes=max_lotes)),
+            regiones
+        ))
+    imprimir_resumen(resultados)
+    return resultados
+
+
+def imprimir_resumen(resultados):
+    print("\n" + "=" * 60)
+    print("RESUMEN DE LIMPIEZA")
+    print("=" * 60)
+    for r in resultados:
+        estado = "OK" if not r['errores'] else f"{len(r['errores'])} ERRORES"
+        print(f"{r['region']:<16} VPCs: {len(r['vpcs']):>4}  operaciones: {r['borrados']:>5}  "
+              f"tiempo: {r['segundos']:>7.1f}s  {estado}")
+    total_vpcs = sum(len(r['vpcs']) for r in resultados)
+    total_errores = sum(len(r['errores']) for r in resultados)
+    print("-" * 60)
+    print(f"TOTAL: {total_vpcs} VPCs en {len(resultados)} regiones, {total_errores} errores")
+    for r in resultados:
+        for error in r['errores']:
+            print(f"  [{r['region']}] {error}")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Limpieza en lote de VPCs por tags y regiones")
+    parser.add_argument('--tag', action='append', required=True, help="Selector Clave=Valor[,Valor] (admite *)")
+    parser.add_argument('--regions', nargs='+', default=['us-east-1', 'us-west-2'])
+    parser.add_argument('--max-concurrencia', type=int, default=MAX_CONCURRENCIA_REGION,
+                        help="Llamadas simultáneas a EC2 por región")
+    parser.add_argument('--max-lotes', type=int, default=MAX_LOTES_REGION)
+    args = parser.parse_args()
+    with trazas.ejecucion('cleanup-lote'):
+        limpiar_lote(args.tag, args.regions, max_concurrencia=args.max_concurrencia, max_lotes=args.max_lotes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""Punto de entrada único para desplegar y limpiar las topologías del lab.
+
+Subcomandos:
+    deploy  <topologia>   despliega (DAG en paralelo, plan/diff o pipelines por región)
+    destroy <topologia>   borra por capas en paralelo con limpiar_lote / destruir_vpcs
+    plan    <topologia>   muestra lo que haría deploy sin tocar nada
+    status  <topologia>   VPCs vivas de la topología y pasos guardados en su estado
+
+Topologías: ejercicio1, ejercicio2, ejercicio3, examen, mrtransit.
+
+Opciones comunes:
+    --regions R [R...]    regiones (sustituye la región de los scripts de una región)
+    --max-workers N       hilos del despliegue y concurrencia de la limpieza
+    --config fichero      YAML (requiere PyYAML) o JSON con constantes a sobrescribir
+    --dry-run             deploy/destroy solo enseñan lo que harían
+    --backend B           'hilos' (por defecto) o 'asyncio': las esperas largas de
+                          ejercicio1 y mrtransit van en un bucle de eventos (asincrono.py)
+
+Ejemplo de --config:
+    max_workers: 16
+    regions: [us-east-1, us-west-2]
+    limites:                  # tokens/s y ráfaga del limitador (familia o acción)
+      mutaciones: [10, 100]
+      CreateRoute: [2, 10]
+    examen:
+      PROJECT_NAME: lab2
+      VPC_CIDR: 10.20.0.0/16
+
+Los módulos de cada topología se importan solo al usarlos, así que
+'python3 cli.py --help' no carga boto3.
+"""
+import abc
+import argparse
+import importlib
+import json
+import sys
+
+import clientes
+import limitador
+import metricas
+import trazas
+
+MAX_WORKERS = 8
+
+
+def log(msg):
+    print(f"[CLI] {msg}")
+
+
+# --- CONFIGURACIÓN DE LOS MÓDULOS ---
+
+def cargar_config(ruta):
+    """Lee --config: YAML si PyYAML está instalado, si no solo JSON"""
+    if ruta is None:
+        return {}
+    with open(ruta) as f:
+        texto = f.read()
+    if ruta.endswith('.json'):
+        return json.loads(texto)
+    try:
+        import yaml
+    except ImportError:
+        try:
+            return json.loads(texto)
+        except ValueError:
+            raise SystemExit(f"{ruta}: para ficheros YAML hace falta PyYAML (pip install pyyaml), o usa JSON")
+    return yaml.safe_load(texto) or {}
+
+
+def sobrescribir(mod, valores):
+    """Sustituye constantes del módulo (solo MAYÚSCULAS que ya existan)"""
+    for clave, valor in (valores or {}).items():
+        if not clave.isupper() or not hasattr(mod, clave):
+            raise SystemExit(f"{mod.__name__} no tiene la constante {clave}")
+        setattr(mod, clave, valor)
+
+
+def cambiar_regiones(mod, mapa, fijas=()):
+    """Traslada un módulo a otras regiones: {región vieja: región nueva}.
+
+    Cambia las constantes que empiezan por la región ('us-east-1', AZs como
+    'us-east-1a') y los clientes perezosos del módulo. Los IDs de AMI son
+    de cada región: las constantes 'ami-...' pasan a la AMI del mismo
+    nombre y dueño en la región nueva (ver ami_en_region). Las constantes de
+    fijas (las que ya vienen de --config) no se tocan.
+    """
+    mapa = {vieja: nueva for vieja, nueva in mapa.items() if vieja != nueva}
+    if not mapa:
+        return
+    for nombre, valor in list(vars(mod).items()):
+        if nombre in fijas:
+            continue
+        if isinstance(valor, clientes.Perezoso) and valor.region in mapa:
+            setattr(mod, nombre, valor.en_region(mapa[valor.region]))
+        elif nombre.isupper() and isinstance(valor, str) and valor.startswith('ami-'):
+            if len(mapa) != 1:
+                raise SystemExit(f"{mod.__name__}.{nombre}: no se sabe de cuál de {sorted(mapa)} es la AMI {valor}")
+            (vieja, nueva), = mapa.items()
+            setattr(mod, nombre, ami_en_region(valor, vieja, nueva))
+        elif nombre.isupper() and isinstance(valor, str):
+            for vieja, nueva in mapa.items():
+                if valor.startswith(vieja):
+                    setattr(mod, nombre, nueva + valor[len(vieja):])
+                    break
+
+
+def ami_en_region(ami, origen, destino):
+    """ID en destino de la AMI ami de origen: la imagen con el mismo nombre y dueño.
+
+    Canonical, Amazon y compañía publican cada imagen con el mismo nombre en
+    todas las regiones. Si no está en destino no se puede seguir.
+    """
+    from botocore.exceptions import ClientError
+    try:
+        imagenes = clientes.cliente('ec2', origen).describe_images(ImageIds=[ami])['Images']
+        if not imagenes:
+            raise SystemExit(f"La AMI {ami} no existe en {origen}")
+        imagen = imagenes[0]
+        candidatas = clientes.cliente('ec2', destino).describe_images(
+            Owners=[imagen['OwnerId']], Filters=[{'Name': 'name', 'Values': [imagen['Name']]}])['Images']
+    except ClientError as e:
+        raise SystemExit(f"No se pudo trasladar la AMI {ami} de {origen} a {destino}: {e}")
+    if not candidatas:
+        raise SystemExit(f"La AMI {ami} ({imagen['Name']}) no está publicada en {destino}; "
+                         "pon una de esa región en --config")
+    log(f"AMI {ami} de {origen} -> {candidatas[0]['ImageId']} en {destino} ({imagen['Name']})")
+    return candidatas[0]['ImageId']
+
+
+# --- TOPOLOGÍAS ---
+
+class Topologia(abc.ABC):
+    """Une el script de despliegue, el de limpieza y cómo encontrar sus VPCs."""
+
+    def __init__(self, nombre, despliegue, limpieza=None, estado=None):
+        self.nombre = nombre
+        self.despliegue = despliegue
+        self.limpieza = limpieza
+        self.estado = estado
+        self.args = None
+        self.config = {}
+
+    def modulo(self, nombre):
+        mod = importlib.import_module(nombre)
+        sobrescribir(mod, self.config.get(self.nombre))
+        if self.args.regions:
+            self.ajustar_regiones(mod, self.args.regions)
+        if hasattr(mod, 'MAX_WORKERS'):
+            mod.MAX_WORKERS = self.args.max_workers
+        return mod
+
+    def ajustar_regiones(self, mod, regiones):
+        if hasattr(mod, 'REGION'):
+            if len(regiones) != 1:
+                raise SystemExit(f"{self.nombre} es de una sola región; pasa una en --regions")
+            cambiar_regiones(mod, {mod.REGION: regiones[0]}, fijas=self.config.get(self.nombre) or {})
+
+    @abc.abstractmethod
+    def vpcs(self):
+        """{región: [nombres de VPC]} que forman la topología"""
+
+    @abc.abstractmethod
+    def deploy(self):
+        """Crea la topología (o lo que le falte)"""
+
+    def plan(self):
+        """Por defecto: pasos del fichero de estado ya hechos frente a los pendientes"""
+        self.status()
+
+    @abc.abstractmethod
+    def destroy(self):
+        """Borra todo lo de la topología"""
+
+    def status(self):
+        for region, nombres in self.vpcs().items():
+            inv = _inventario_vpcs(region)
+            for nombre in nombres:
+                vivas = inv.vpcs_por_nombre(nombre)
+                log(f"[{region}] {nombre}: {', '.join(vivas) if vivas else 'no desplegada'}")
+        if self.estado:
+            from estado import EstadoDespliegue
+            registros = EstadoDespliegue(self.estado).registros()
+            log(f"Estado '{self.estado}': {len(registros)} pasos guardados")
+            for r in registros:
+                log(f"  {r['paso']}: {r['valor']}")
+
+    def destroy_en_seco(self):
+        """--dry-run de destroy: inventario de lo que se borraría, sin borrar"""
+        from teardown import descubrir
+        for region, nombres in self.vpcs().items():
+            inv = _inventario_vpcs(region)
+            vpc_ids = inv.vpcs_por_nombre(*nombres)
+            if not vpc_ids:
+                log(f"[{region}] nada que borrar")
+                continue
+            d = descubrir(clientes.cliente('ec2', region), vpc_ids)
+            log(f"[{region}] se borrarían {vpc_ids}: " + ", ".join(
+                f"{len(v)} {k}" for k, v in d.items() if k != 'vpcs'))
+
+
+def _inventario_vpcs(region):
+    """Inventario de la región con las VPCs recién leídas"""
+    from inventario import inventario
+    return inventario(region, clientes.cliente('ec2', region), cargar=False).refrescar(['vpcs'])
+
+
+class Ejercicio1(Topologia):
+    def vpcs(self):
+        mod = self.modulo('cleanup_ejercicio1')
+        return {mod.REGION: [mod.VPC_TAG_NAME]}
+
+    def deploy(self):
+        self.modulo('ejercicio1_arquitectura').main(backend=self.args.backend)
+
+    def plan(self):
+        mod = self.modulo('ejercicio1_arquitectura')
+        for paso in mod.construir_pasos():
+            hecho = mod.ESTADO.get(paso.nombre)
+            log(f"  {'=' if hecho is not None else '+'} {paso.nombre:<18} "
+                f"{'hecho: ' + str(hecho) if hecho is not None else 'pendiente'}"
+                f"{'  (tras ' + ', '.join(paso.depende) + ')' if paso.depende else ''}")
+
+    def destroy(self):
+        self.modulo('cleanup_ejercicio1').cleanup()
+
+
+class ConPlan(Topologia):
+    """Topologías con modo plan/diff (plan.py): deploy aplica solo las diferencias"""
+
+    def __init__(self, nombre, despliegue, nombre_vpc, **kwargs):
+        super().__init__(nombre, despliegue, **kwargs)
+        self.nombre_vpc = nombre_vpc
+
+    def vpcs(self):
+        mod = self.modulo(self.despliegue)
+        return {mod.REGION: [self.nombre_vpc(mod)]}
+
+    def _plan(self, aplicar):
+        from plan import aplicar_plan, calcular_plan, imprimir_plan
+        mod = self.modulo(self.despliegue)
+        client = clientes.cliente('ec2', mod.REGION)
+        prefijo = mod.prefijo() if hasattr(mod, 'prefijo') else ''
+        cambios, ids = calcular_plan(mod.topologia(), client, mod.REGION, prefijo)
+        imprimir_plan(cambios, log)
+        if aplicar and cambios:
+            aplicar_plan(cambios, client, ids, log)
+
+    def deploy(self):
+        self._plan(aplicar=True)
+
+    def plan(self):
+        self._plan(aplicar=False)
+
+    def destroy(self):
+        from cleanup_lote import limpiar_lote
+        for region, nombres in self.vpcs().items():
+            limpiar_lote([{'Name': 'tag:Name', 'Values': nombres}], [region],
+                         max_concurrencia=self.args.max_workers)
+
+
+class Ejercicio3(Topologia):
+    def ajustar_regiones(self, mod, regiones):
+        if hasattr(mod, 'REGION_1'):
+            if len(regiones) != 2:
+                raise SystemExit("ejercicio3 usa dos regiones; pasa dos en --regions")
+            cambiar_regiones(mod, {mod.REGION_1: regiones[0], mod.REGION_2: regiones[1]},
+                             fijas=self.config.get(self.nombre) or {})
+        elif hasattr(mod, 'REGIONS'):
+            mod.REGIONS = list(regiones)
+
+    def vpcs(self):
+        despliegue = self.modulo(self.despliegue)
+        limpieza = self.modulo(self.limpieza)
+        # main() crea VPC-R1-* en la primera región y VPC-R2-* en la segunda
+        return {despliegue.REGION_1: [n for n in limpieza.TAG_NAMES if n.startswith('VPC-R1')],
+                despliegue.REGION_2: [n for n in limpieza.TAG_NAMES if n.startswith('VPC-R2')]}
+
+    def deploy(self):
+        self.modulo(self.despliegue).main()
+
+    def plan(self):
+        log("ejercicio3 no guarda estado: deploy crea todo de nuevo. VPCs que ya existen:")
+        self.status()
+
+    def destroy(self):
+        self.modulo(self.limpieza).main()
+
+
+class MRTransit(Topologia):
+    def regiones(self):
+        mod = self.modulo(self.despliegue)
+        config = mod.REGIONS_CONFIG
+        if self.args.regions:
+            desconocidas = set(self.args.regions) - {c['region'] for c in config}
+            if desconocidas:
+                raise SystemExit(f"Regiones sin configuración en REGIONS_CONFIG: {sorted(desconocidas)}")
+            config = [c for c in config if c['region'] in self.args.regions]
+        return mod, config
+
+    def ajustar_regiones(self, mod, regiones):
+        pass  # Las regiones se filtran sobre REGIONS_CONFIG
+
+    def vpcs(self):
+        _, config = self.regiones()
+        return {c['region']: [v['name'] for v in c['vpcs']] for c in config}
+
+    def deploy(self):
+        mod, config = self.regiones()
+        mod.main(config, max_workers=self.args.max_workers, backend=self.args.backend)
+
+    def plan(self):
+        mod, config = self.regiones()
+        pasos = [f"vpc:{c['region']}:{v['name']}" for c in config for v in c['vpcs']]
+        pasos += [p for c in config for p in (f"tgw:{c['region']}", f"attachments:{c['region']}")]
+        regiones = [c['region'] for c in config]
+        pasos += [f"peering:{a}:{b}" for i, a in enumerate(regiones) for b in regiones[i + 1:]]
+        for paso in pasos:
+            hecho = mod.ESTADO.get(paso)
+            log(f"  {'=' if hecho is not None else '+'} {paso:<40} {'hecho' if hecho is not None else 'pendiente'}")
+
+    def destroy(self):
+        _, config = self.regiones()
+        limpieza = self.modulo(self.limpieza)
+        limpieza.cleanup_transit_gateway_infrastructure(
+            regions=[c['region'] for c in config], vpc_names=[v['name'] for c in config for v in c['vpcs']],
+            backend=self.args.backend)
+
+
+TOPOLOGIAS = {
+    'ejercicio1': Ejercicio1('ejercicio1', 'ejercicio1_arquitectura', 'cleanup_ejercicio1', estado='ejercicio1'),
+    'ejercicio2': ConPlan('ejercicio2', 'ejercicio2_nacls', lambda mod: mod.VPC_NAME),
+    'ejercicio3': Ejercicio3('ejercicio3', 'ejercicio3_tgw_multiregion', 'cleanup_ejercicio3'),
+    'examen': ConPlan('examen', 'Examen', lambda mod: f"{mod.PROJECT_NAME}-vpc"),
+    'mrtransit': MRTransit('mrtransit', 'MRtransit_gateway_multiregion', 'MRcleanup_transit_gateway', estado='mrtransit'),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Despliegue y limpieza de las topologías del lab")
+    parser.add_argument('orden', choices=['deploy', 'destroy', 'plan', 'status'])
+    parser.add_argument('topologia', choices=sorted(TOPOLOGIAS))
+    parser.add_argument('--regions', nargs='+')
+    parser.add_argument('--max-workers', type=int)
+    parser.add_argument('--config', help="YAML/JSON con constantes por topología")
+    parser.add_argument('--dry-run', action='store_true', help="deploy/destroy sin cambios: solo plan")
+    parser.add_argument('--backend', choices=['hilos', 'asyncio'], help="ejecución de ejercicio1 y mrtransit")
+    args = parser.parse_args(argv)
+
+    config = cargar_config(args.config)
+    args.regions = args.regions or config.get('regions')
+    args.max_workers = args.max_workers or config.get('max_workers') or MAX_WORKERS
+    args.backend = args.backend or config.get('backend') or 'hilos'
+    # Suficientes conexiones HTTP para todos los hilos que van a compartir cada cliente
+    clientes.configurar(max_pool_connections=max(clientes.OPCIONES_POR_DEFECTO['max_pool_connections'],
+                                                 args.max_workers * 2))
+    for nombre, (tasa, rafaga) in config.get('limites', {}).items():
+        limitador.configurar(nombre, tasa, rafaga)
+
+    topologia = TOPOLOGIAS[args.topologia]
+    topologia.args = args
+    topologia.config = config
+
+    orden = args.orden
+    if args.dry_run and orden == 'deploy':
+        orden = 'plan'
+    if args.dry_run and orden == 'destroy':
+        log(f"--dry-run: no se borra nada en {args.topologia}")
+        topologia.destroy_en_seco()
+        return
+    log(f"{orden} {args.topologia}")
+    metricas.limpiar()
+    try:
+        if orden in ('deploy', 'destroy'):
+            with trazas.ejecucion(f"{args.topologia}-{orden}", log=log):
+                getattr(topologia, orden)()
+        else:
+            getattr(topologia, orden)()
+    finally:
+        # También si falla a medias: es cuando más interesa saber dónde se fue el tiempo
+        for (region, familia), datos in sorted(limitador.resumen().items()):
+            if datos['esperado'] or datos['limitaciones']:
+                log(f"[{region}] {familia}: {datos['esperado']} s de espera en el limitador, "
+                    f"{datos['limitaciones']} throttlings, tasa final {datos['tasa']}/s")
+        if orden in ('deploy', 'destroy'):
+            metricas.resumen(log)
+            json_, prom = metricas.exportar(f"{args.topologia}-{orden}")
+            log(f"Métricas en {json_} y {prom}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,154 @@
+"""Clientes boto3 compartidos por todo el proceso.
+
+Crear un cliente resuelve credenciales y endpoints y abre su propio pool
+HTTP, así que en vez de un boto3.client(...) por función se guarda uno
+por (servicio, región, perfil) y lo reutilizan todos los hilos. Los
+clientes de boto3 son thread-safe; las sesiones no, por eso su creación
+va con lock. Los 'resource' no son thread-safe: se cachean igual, pero
+cada hilo debería usar el cliente para llamadas concurrentes.
+
+La configuración de botocore es común: pool de conexiones grande para los
+modos en paralelo, reintentos 'adaptive' (backoff + limitación en cliente
+ante throttling), timeouts de conexión/lectura ajustados y TCP keep-alive.
+
+Los clientes de los servicios de limitador.SERVICIOS (EC2) llevan además
+un token bucket por (región, familia de acciones) que frena antes de que
+AWS devuelva RequestLimitExceeded; ver limitador.py. Todos registran sus
+llamadas en metricas.py.
+
+Nada se construye al importar: boto3 se importa con la primera sesión, los
+scripts declaran sus clientes de módulo con cliente_perezoso() (se crean
+en la primera llamada) y el ID de cuenta se pide a STS una sola vez.
+Importar un script para reutilizar sus funciones no toca la red.
+"""
+import threading
+
+import limitador
+import metricas
+
+# --- CONFIGURACIÓN ---
+OPCIONES_POR_DEFECTO = {
+    'max_pool_connections': 50,   # Conexiones HTTP simultáneas por cliente
+    'retries': {'mode': 'adaptive', 'max_attempts': 10},
+    'connect_timeout': 5,
+    'read_timeout': 60,
+    'tcp_keepalive': True,
+}
+
+_opciones = dict(OPCIONES_POR_DEFECTO)
+_sesiones = {}   # perfil -> boto3.Session
+_clientes = {}   # (servicio, región, perfil) -> cliente
+_recursos = {}   # (servicio, región, perfil) -> resource
+_cuentas = {}    # perfil -> ID de cuenta
+_lock = threading.RLock()
+
+
+def opciones():
+    """Copia de las opciones actuales de botocore (p. ej. para AioConfig en asincrono.py)"""
+    return dict(_opciones)
+
+
+def configuracion():
+    """Config de botocore con las opciones actuales"""
+    from botocore.config import Config
+    return Config(**opciones())
+
+
+def configurar(**opciones):
+    """Cambia opciones de botocore (max_pool_connections, retries...) y vacía la caché"""
+    with _lock:
+        _opciones.update(opciones)
+        limpiar()
+
+
+def sesion(perfil=None):
+    with _lock:
+        if perfil not in _sesiones:
+            import boto3
+            _sesiones[perfil] = boto3.session.Session(profile_name=perfil)
+        return _sesiones[perfil]
+
+
+def _region(region, perfil):
+    return region or sesion(perfil).region_name
+
+
+def cliente(servicio, region=None, perfil=None):
+    """Cliente compartido para (servicio, región, perfil)"""
+    clave = (servicio, _region(region, perfil), perfil)
+    existente = _clientes.get(clave)
+    if existente is not None:
+        return existente
+    with _lock:
+        if clave not in _clientes:
+            nuevo = sesion(perfil).client(servicio, region_name=clave[1], config=configuracion())
+            if servicio in limitador.SERVICIOS:
+                limitador.instalar(nuevo)
+            metricas.instalar(nuevo)
+            _clientes[clave] = nuevo
+        return _clientes[clave]
+
+
+def recurso(servicio, region=None, perfil=None):
+    """boto3 resource compartido para (servicio, región, perfil)"""
+    clave = (servicio, _region(region, perfil), perfil)
+    existente = _recursos.get(clave)
+    if existente is not None:
+        return existente
+    with _lock:
+        if clave not in _recursos:
+            nuevo = sesion(perfil).resource(servicio, region_name=clave[1], config=configuracion())
+            if servicio in limitador.SERVICIOS:
+                limitador.instalar(nuevo.meta.client)
+            metricas.instalar(nuevo.meta.client)
+            _recursos[clave] = nuevo
+        return _recursos[clave]
+
+
+def cuenta(perfil=None):
+    """ID de la cuenta AWS (una sola llamada a STS por perfil)"""
+    with _lock:
+        if perfil not in _cuentas:
+            _cuentas[perfil] = cliente('sts', perfil=perfil).get_caller_identity()['Account']
+        return _cuentas[perfil]
+
+
+class Perezoso:
+    """Se usa como el cliente/resource, pero no lo construye hasta el primer atributo."""
+
+    def __init__(self, fabrica, servicio, region=None, perfil=None):
+        self._fabrica = fabrica
+        self._clave = (servicio, region, perfil)
+
+    def __getattr__(self, nombre):
+        # La caché devuelve siempre el mismo objeto: tras el primer uso es un acceso a diccionario
+        return getattr(self._fabrica(*self._clave), nombre)
+
+    @property
+    def region(self):
+        return self._clave[1]
+
+    def en_region(self, region):
+        """Mismo servicio y perfil en otra región (también perezoso)"""
+        servicio, _, perfil = self._clave
+        return Perezoso(self._fabrica, servicio, region, perfil)
+
+    def __repr__(self):
+        return f"Perezoso{self._clave}"
+
+
+def cliente_perezoso(servicio, region=None, perfil=None):
+    return Perezoso(cliente, servicio, region, perfil)
+
+
+def recurso_perezoso(servicio, region=None, perfil=None):
+    return Perezoso(recurso, servicio, region, perfil)
+
+
+def limpiar():
+    """Olvida todos los clientes (p. ej. tras cambiar credenciales)"""
+    with _lock:
+        _sesiones.clear()
+        _clientes.clear()
+        _recursos.clear()
+        _cuentas.clear()
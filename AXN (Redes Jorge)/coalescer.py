@@ -0,0 +1,131 @@
+"""Agrupador de sondeos (request coalescing) para esperas concurrentes.
+
+Varios hilos pueden esperar recursos del mismo tipo a la vez (attachments
+de varias VPCs, instancias de varias regiones...). En lugar de que cada uno
+haga su propio describe, registran su interés aquí y un único hilo de
+sondeo lanza, en cada tick, UNA llamada describe por tipo de recurso con
+todos los IDs pendientes y reparte los estados a quien los espera.
+Así las llamadas por tick son O(tipos de recurso) y no O(recursos).
+
+Cada tick lleva un número de ronda: una espera solo acepta estados de
+rondas lanzadas después de registrarse, nunca los de un describe que
+ya estaba en vuelo (o que leyó otra espera antes). Los estados de un ID
+se olvidan cuando ya nadie lo espera.
+"""
+import threading
+import time
+
+import metricas
+from waiters import TiempoAgotado, EstadoFallido
+
+
+class Coalescedor:
+    """Sondea en lote los IDs registrados y despierta a los que esperan."""
+
+    def __init__(self, intervalo=5.0, log=None):
+        self.intervalo = intervalo
+        self.log = log
+        self._consultas = {}   # tipo -> consultar(ids) -> {id: estado}
+        self._interes = {}     # tipo -> {id: nº de esperas activas}
+        self._estados = {}     # (tipo, id) -> (ronda, último estado visto; None = no aparece)
+        self._ronda = 0        # Ticks de sondeo lanzados
+        self._cond = threading.Condition()
+        self._hilo = None
+
+    def registrar_tipo(self, tipo, consultar):
+        """Asocia un tipo (p.ej. ('instance', 'us-east-1')) con su describe agrupado"""
+        with self._cond:
+            self._consultas.setdefault(tipo, consultar)
+
+    def esperar(self, tipo, ids, listo, fallido=(), ausente=None, timeout=600, consultar=None):
+        """Bloquea hasta que todos los IDs estén en 'listo'. Devuelve {id: estado}."""
+        # tipo suele ser (recurso, región): así se anota en metricas.py
+        nombre, region = tipo if isinstance(tipo, tuple) and len(tipo) == 2 else (str(tipo), None)
+        with metricas.espera(nombre, region, ids):
+            return self._esperar(tipo, ids, listo, fallido, ausente, timeout, consultar)
+
+    def _esperar(self, tipo, ids, listo, fallido, ausente, timeout, consultar):
+        if consultar is not None:
+            self.registrar_tipo(tipo, consultar)
+        listo = set(listo)
+        fallido = set(fallido)
+        ids = list(dict.fromkeys(ids))
+        limite = time.monotonic() + timeout
+
+        with self._cond:
+            if tipo not in self._consultas:
+                raise ValueError(f"Tipo de recurso sin consulta registrada: {tipo}")
+            interes = self._interes.setdefault(tipo, {})
+            for rid in ids:
+                interes[rid] = interes.get(rid, 0) + 1
+            # Solo valen lecturas nuevas: ni las de otra espera ni la de un tick ya en vuelo
+            desde = self._ronda + 1
+            self._arrancar()
+
+            try:
+                while True:
+                    estados = {}
+                    for rid in ids:
+                        ronda, estado = self._estados.get((tipo, rid), (0, None))
+                        if ronda >= desde:
+                            estados[rid] = ausente if estado is None else estado
+
+                    malos = {i: e for i, e in estados.items() if e in fallido}
+                    if malos:
+                        raise EstadoFallido(f"Recursos {tipo} en estado fallido: {malos}", malos)
+
+                    pendientes = [i for i in ids if estados.get(i) not in listo]
+                    if not pendientes:
+                        return estados
+
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        raise TiempoAgotado(f"Tiempo agotado esperando {tipo}: {pendientes}", pendientes)
+                    self._cond.wait(restante)
+            finally:
+                for rid in ids:
+                    interes[rid] -= 1
+                    if interes[rid] == 0:
+                        del interes[rid]
+                        self._estados.pop((tipo, rid), None)
+                if not interes:
+                    del self._interes[tipo]
+
+    def _arrancar(self):
+        # Llamar con el lock tomado
+        if self._hilo is None or not self._hilo.is_alive():
+            self._hilo = threading.Thread(target=self._bucle, name='coalescedor', daemon=True)
+            self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            with self._cond:
+                lote = {tipo: list(ids) for tipo, ids in self._interes.items() if ids}
+                if not lote:
+                    self._hilo = None
+                    return
+                self._ronda += 1
+                ronda = self._ronda
+
+            # Las llamadas a AWS se hacen fuera del lock: una por tipo y tick
+            resultados = {}
+            for tipo, ids in lote.items():
+                try:
+                    resultados[tipo] = (ids, self._consultas[tipo](ids))
+                except Exception as e:
+                    if self.log:
+                        self.log(f"Error consultando {tipo} (se reintenta en el siguiente tick): {e}")
+
+            with self._cond:
+                for tipo, (ids, estados) in resultados.items():
+                    interes = self._interes.get(tipo, {})
+                    for rid in ids:
+                        if rid in interes:   # Si ya nadie lo espera no se guarda: se quedaría para siempre
+                            self._estados[(tipo, rid)] = (ronda, estados.get(rid))
+                self._cond.notify_all()
+
+            time.sleep(self.intervalo)
+
+
+# Instancia compartida por todo el proceso
+COALESCEDOR = Coalescedor()
@@ -0,0 +1,121 @@
+"""Ejecutor de grafos de dependencias para los despliegues.
+
+Cada paso declara de qué pasos depende. Un pool de hilos lanza a la vez
+todos los pasos cuyas dependencias ya han terminado, así que el tiempo
+total lo marca el camino crítico y no la suma de todos los pasos.
+"""
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import metricas
+
+
+class Paso:
+    """Nodo del grafo: nombre, función a ejecutar y dependencias."""
+
+    def __init__(self, nombre, funcion, depende=()):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.depende = tuple(depende)
+
+    def __repr__(self):
+        return f"Paso({self.nombre!r}, depende={list(self.depende)})"
+
+
+def validar_grafo(pasos):
+    """Comprueba que no haya nombres repetidos, dependencias desconocidas ni ciclos"""
+    nombres = {}
+    for paso in pasos:
+        if paso.nombre in nombres:
+            raise ValueError(f"Paso duplicado: {paso.nombre}")
+        nombres[paso.nombre] = paso
+
+    for paso in pasos:
+        for dep in paso.depende:
+            if dep not in nombres:
+                raise ValueError(f"El paso '{paso.nombre}' depende de '{dep}', que no existe")
+
+    # Orden topológico (Kahn): si no se visitan todos los nodos hay un ciclo
+    pendientes = {p.nombre: len(p.depende) for p in pasos}
+    hijos = {p.nombre: [] for p in pasos}
+    for paso in pasos:
+        for dep in paso.depende:
+            hijos[dep].append(paso.nombre)
+
+    listos = [n for n, c in pendientes.items() if c == 0]
+    orden = []
+    while listos:
+        nombre = listos.pop()
+        orden.append(nombre)
+        for hijo in hijos[nombre]:
+            pendientes[hijo] -= 1
+            if pendientes[hijo] == 0:
+                listos.append(hijo)
+
+    if len(orden) != len(pasos):
+        en_ciclo = sorted(n for n, c in pendientes.items() if c > 0)
+        raise ValueError(f"Ciclo de dependencias entre: {en_ciclo}")
+    return orden
+
+
+def _ejecutar(paso, ctx):
+    # Las llamadas y esperas del paso se atribuyen a su nombre en metricas.py
+    with metricas.en_paso(paso.nombre, paso.depende) as tramo:
+        resultado = paso.funcion(ctx)
+        tramo.anotar(resultado)
+        return resultado
+
+
+def ejecutar_dag(pasos, max_workers=8, log=None):
+    """Ejecuta los pasos respetando dependencias y devuelve {nombre: resultado}.
+
+    Cada función recibe el diccionario de resultados (ctx) y puede leer de
+    él los valores de sus dependencias. Si un paso falla no se lanzan más
+    pasos, se espera a los que ya están en marcha y se relanza el error.
+    """
+    validar_grafo(pasos)
+    por_nombre = {p.nombre: p for p in pasos}
+    ctx = {}
+    hechos = set()
+    lanzados = {}
+    error = None
+
+    def listos():
+        return [
+            p for p in pasos
+            if p.nombre not in hechos
+            and p.nombre not in lanzados.values()
+            and all(d in hechos for d in p.depende)
+        ]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while True:
+            if error is None:
+                for paso in listos():
+                    if log:
+                        log(f"Iniciando paso '{paso.nombre}'...")
+                    lanzados[pool.submit(metricas.con_contexto(_ejecutar), paso, ctx)] = paso.nombre
+
+            if not lanzados:
+                break
+
+            terminados, _ = wait(list(lanzados), return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                nombre = lanzados.pop(futuro)
+                try:
+                    ctx[nombre] = futuro.result()
+                    hechos.add(nombre)
+                    if log:
+                        log(f"Paso '{nombre}' completado.")
+                except Exception as e:
+                    if error is None:
+                        error = e
+                        if log:
+                            log(f"Paso '{nombre}' falló: {e}")
+
+    if error is not None:
+        raise error
+
+    faltan = [n for n in por_nombre if n not in hechos]
+    if faltan:
+        raise RuntimeError(f"Pasos sin ejecutar: {faltan}")
+    return ctx
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""Planificación de direcciones: reparte un superbloque en regiones, VPCs y subredes.
+
+El espacio libre se lleva con un asignador buddy: un montículo de bloques
+libres por longitud de prefijo. Pedir un /N toma el bloque libre más
+pequeño (y de dirección más baja) que lo contiene y lo parte por la mitad
+hasta el tamaño pedido; liberar vuelve a juntar cada bloque con su
+"compañero" si también está libre. Cada operación cuesta como mucho 32
+divisiones o fusiones más O(log n) en el montículo, así que planificar
+cientos de VPCs es instantáneo, y por construcción dos bloques asignados
+nunca se solapan.
+
+plan_direcciones() asigna primero un bloque por región y dentro de él las
+VPCs de esa región, y dentro de cada VPC una subred por AZ. Así cada
+región se resume en un único prefijo, que es lo que se enruta por los
+peerings entre TGWs. El precio es que el bloque de una región es una
+potencia de dos de VPCs: 20 VPCs ocupan lo que 32. Con /16 por VPC un /8
+solo da para 8 regiones de 17-32 VPCs; con el PREFIJO_VPC por defecto
+(/20, 4096 VPCs en un /8) caben 10 regiones x 20 VPCs con holgura. Si no
+cabe, SinEspacio dice qué prefijo de VPC haría falta.
+
+Uso:
+    python3 direcciones.py 10.0.0.0/8 3 4    # 3 regiones x 4 VPCs
+"""
+import heapq
+import ipaddress
+import math
+import sys
+from collections import namedtuple
+
+# --- CONFIGURACIÓN ---
+SUPERBLOQUE = '10.0.0.0/8'
+PREFIJO_VPC = 20       # 4096 VPCs en un /8: 10 regiones x 20 VPCs caben aunque cada región se redondee a 32
+PREFIJO_SUBRED = 24
+
+
+class SinEspacio(ValueError):
+    """No queda un bloque libre del tamaño pedido."""
+
+
+class Solapamiento(ValueError):
+    """Un bloque pedido o reservado pisa otro ya asignado."""
+
+
+def red(cidr):
+    """ip_network estricta: '192.168.5.0/16' es un error, no se corrige en silencio"""
+    try:
+        return ipaddress.IPv4Network(cidr)
+    except ValueError as e:
+        raise ValueError(f"CIDR inválido {cidr!r}: {e}") from None
+
+
+def subred(cidr, prefijo, indice=0):
+    """La subred número 'indice' de tamaño /prefijo dentro de cidr"""
+    padre = red(cidr)
+    tamano = 2 ** (32 - prefijo)
+    if prefijo < padre.prefixlen or (indice + 1) * tamano > padre.num_addresses:
+        raise SinEspacio(f"{cidr} no tiene una subred /{prefijo} número {indice}")
+    return str(ipaddress.IPv4Network((int(padre.network_address) + indice * tamano, prefijo)))
+
+
+def resumir(cidrs):
+    """Mínimo conjunto de prefijos que cubre exactamente los CIDRs dados"""
+    return [str(n) for n in ipaddress.collapse_addresses(red(c) for c in cidrs)]
+
+
+def solapes(cidrs):
+    """Parejas de CIDRs que se solapan (ordenando por inicio: O(n log n))"""
+    redes = sorted((red(c) for c in cidrs), key=lambda n: (int(n.network_address), -n.num_addresses))
+    encontrados, abierta = [], None
+    for n in redes:
+        if abierta is not None and int(n.network_address) <= int(abierta.broadcast_address):
+            encontrados.append((str(abierta), str(n)))
+            if n.broadcast_address <= abierta.broadcast_address:
+                continue
+        abierta = n
+    return encontrados
+
+
+def comprobar_sin_solapes(cidrs, que='CIDRs'):
+    repetidos = solapes(cidrs)
+    if repetidos:
+        raise Solapamiento(f"{que} solapados: " + ", ".join(f"{a} / {b}" for a, b in repetidos))
+
+
+class EspacioLibre:
+    """Asignador buddy de bloques dentro de un superbloque."""
+
+    def __init__(self, superbloque):
+        self.superbloque = red(superbloque)
+        self._libres = {p: set() for p in range(33)}  # prefijo -> {inicio de bloque libre}
+        # prefijo -> montículo de inicios; los que ya no están en _libres se descartan al llegar arriba
+        self._monticulos = {p: [] for p in range(33)}
+        self._anadir(int(self.superbloque.network_address), self.superbloque.prefixlen)
+        self.asignados = {}  # inicio -> prefijo
+
+    def _anadir(self, inicio, prefijo):
+        self._libres[prefijo].add(inicio)
+        heapq.heappush(self._monticulos[prefijo], inicio)
+
+    def _menor(self, prefijo):
+        """Inicio más bajo de los /prefijo libres, o None"""
+        monticulo, libres = self._monticulos[prefijo], self._libres[prefijo]
+        while monticulo and monticulo[0] not in libres:
+            heapq.heappop(monticulo)
+        return monticulo[0] if monticulo else None
+
+    def _partir(self, inicio, prefijo):
+        """Parte el bloque libre (inicio, prefijo) en dos mitades libres"""
+        self._libres[prefijo].remove(inicio)
+        self._anadir(inicio, prefijo + 1)
+        self._anadir(inicio + 2 ** (31 - prefijo), prefijo + 1)
+
+    def asignar(self, prefijo):
+        """Reserva el primer /prefijo libre (el de dirección más baja) y lo devuelve como CIDR"""
+        if prefijo < self.superbloque.prefixlen or prefijo > 32:
+            raise SinEspacio(f"/{prefijo} no cabe en {self.superbloque}")
+        origen = next((p for p in range(prefijo, self.superbloque.prefixlen - 1, -1) if self._libres[p]), None)
+        if origen is None:
+            raise SinEspacio(f"No queda ningún /{prefijo} libre en {self.superbloque}")
+        inicio = self._menor(origen)
+        for p in range(origen, prefijo):
+            self._partir(inicio, p)
+        self._libres[prefijo].remove(inicio)
+        self.asignados[inicio] = prefijo
+        return str(ipaddress.IPv4Network((inicio, prefijo)))
+
+    def reservar(self, cidr):
+        """Marca como asignado un bloque concreto (p. ej. una VPC que ya existe)"""
+        n = red(cidr)
+        if not n.subnet_of(self.superbloque):
+            raise Solapamiento(f"{cidr} está fuera de {self.superbloque}")
+        inicio, prefijo = int(n.network_address), n.prefixlen
+        # Bloque libre que lo contiene: se busca de más grande a más pequeño
+        for p in range(self.superbloque.prefixlen, prefijo + 1):
+            base = inicio & ~(2 ** (32 - p) - 1) & 0xFFFFFFFF
+            if base in self._libres[p]:
+                for q in range(p, prefijo):
+                    self._partir(inicio & ~(2 ** (32 - q) - 1) & 0xFFFFFFFF, q)
+                self._libres[prefijo].remove(inicio)
+                self.asignados[inicio] = prefijo
+                return str(n)
+        raise Solapamiento(f"{cidr} pisa un bloque ya asignado")
+
+    def liberar(self, cidr):
+        n = red(cidr)
+        inicio, prefijo = int(n.network_address), n.prefixlen
+        if self.asignados.get(inicio) != prefijo:
+            raise ValueError(f"{cidr} no está asignado")
+        del self.asignados[inicio]
+        # Fusión con el compañero mientras también esté libre
+        while prefijo > self.superbloque.prefixlen:
+            companero = inicio ^ 2 ** (32 - prefijo)
+            if companero not in self._libres[prefijo]:
+                break
+            self._libres[prefijo].remove(companero)
+            inicio, prefijo = min(inicio, companero), prefijo - 1
+        self._anadir(inicio, prefijo)
+
+    def libre(self):
+        """Direcciones libres que quedan"""
+        return sum(len(b) * 2 ** (32 - p) for p, b in self._libres.items())
+
+
+PlanDirecciones = namedtuple('PlanDirecciones', 'regiones vpcs subredes')
+
+
+def _prefijo_para(n, prefijo_hijo):
+    """Prefijo del bloque más pequeño que contiene n bloques /prefijo_hijo"""
+    return prefijo_hijo - math.ceil(math.log2(max(n, 1)))
+
+
+def _comprobar_cabe(regiones, espacio, prefijo_vpc, prefijo_subred):
+    """SinEspacio (con el prefijo de VPC que sí cabría) si los bloques de región no caben ni sin fragmentar"""
+    def necesarias(prefijo):
+        return sum(2 ** (32 - _prefijo_para(len(vpcs), prefijo)) for vpcs in regiones.values())
+
+    libres = espacio.libre()
+    if necesarias(prefijo_vpc) <= libres:
+        return
+    cabria = next((p for p in range(prefijo_vpc + 1, prefijo_subred + 1) if necesarias(p) <= libres), None)
+    mayor = max((len(v) for v in regiones.values()), default=0)
+    raise SinEspacio(
+        f"{len(regiones)} regiones (hasta {mayor} VPCs, redondeadas a {2 ** math.ceil(math.log2(max(mayor, 1)))} "
+        f"para resumir cada región en un prefijo) necesitan {necesarias(prefijo_vpc)} direcciones con VPCs "
+        f"/{prefijo_vpc} y en {espacio.superbloque} quedan {libres}"
+        + (f"; con VPCs /{cabria} sí caben" if cabria else ""))
+
+
+def plan_direcciones(regiones, superbloque=SUPERBLOQUE, prefijo_vpc=PREFIJO_VPC,
+                     prefijo_subred=PREFIJO_SUBRED, ocupados=()):
+    """Reparte el superbloque sin solapes.
+
+    regiones: {region: {vpc: [subredes/AZs]}} (o {vpc: nº de subredes}).
+    ocupados: CIDRs que ya existen y no se pueden reutilizar.
+    Devuelve PlanDirecciones(regiones={region: resumen}, vpcs={vpc: cidr},
+    subredes={(vpc, subred): cidr}).
+    """
+    espacio = EspacioLibre(superbloque)
+    for cidr in ocupados:
+        espacio.reservar(cidr)
+    _comprobar_cabe(regiones, espacio, prefijo_vpc, prefijo_subred)
+
+    plan = PlanDirecciones({}, {}, {})
+    # Las regiones más grandes primero: los bloques grandes se alinean antes de fragmentar
+    for region, vpcs in sorted(regiones.items(), key=lambda kv: -len(kv[1])):
+        bloque = espacio.asignar(_prefijo_para(len(vpcs), prefijo_vpc))
+        plan.regiones[region] = bloque
+        en_region = EspacioLibre(bloque)
+        for vpc, subredes in vpcs.items():
+            if isinstance(subredes, int):
+                subredes = [f"subred-{i}" for i in range(subredes)]
+            cidr_vpc = plan.vpcs[vpc] = en_region.asignar(prefijo_vpc)
+            for i, nombre in enumerate(subredes):
+                plan.subredes[(vpc, nombre)] = subred(cidr_vpc, prefijo_subred, i)
+    return plan
+
+
+if __name__ == '__main__':
+    # python3 direcciones.py [superbloque] [regiones] [vpcs por región]
+    superbloque = sys.argv[1] if len(sys.argv) > 1 else SUPERBLOQUE
+    n_regiones = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    n_vpcs = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    plan = plan_direcciones({f"region-{r}": {f"VPC-{r}-{v}": 2 for v in range(n_vpcs)} for r in range(n_regiones)},
+                            superbloque)
+    for region, resumen in plan.regiones.items():
+        print(f"{region}: {resumen}")
+        for vpc, cidr in plan.vpcs.items():
+            if red(cidr).subnet_of(red(resumen)):
+                print(f"  {vpc}: {cidr}")
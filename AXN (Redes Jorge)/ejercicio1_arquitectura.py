@@ -1,7 +1,14 @@
-import boto3
 import time
 import sys
 
+import trazas
+from clientes import cliente_perezoso
+from dag_executor import Paso, ejecutar_dag
+from estado import EstadoDespliegue
+from etiquetas import especificacion
+from flota import ESTADOS_FALLIDOS, Flota, esperar_running
+from waiters import esperar_todos, estados_nat
+
 # --- CONFIGURACIÓN ---
 REGION = 'us-east-1' 
 VPC_CIDR = '15.0.0.0/20'
@@ -10,154 +17,234 @@ SUBNET_PRIV_BACK_CIDR = '15.0.2.0/24'
 SUBNET_PRIV_DB_CIDR = '15.0.3.0/24'
 AMI_ID = 'ami-04b70fa74e45c3917' # Ubuntu 24.04 us-east-1
 KEY_NAME = 'vockey' 
+MAX_WORKERS = 8 # Pasos del despliegue en paralelo
+
+# Estado persistente: al relanzar tras un fallo se reanuda desde el paso que falló
+ESTADO = EstadoDespliegue('ejercicio1')
 
-# Recursos Boto3
-ec2 = boto3.resource('ec2', region_name=REGION)
-client = boto3.client('ec2', region_name=REGION)
+# Cliente Boto3 (se crea en el primer uso, no al importar). Los pasos corren en hilos a la vez:
+# todos usan el cliente, que es thread-safe; un ec2.resource compartido no lo es
+client = cliente_perezoso('ec2', REGION)
 
 def log(mensaje):
     print(f"[PROGRESO] {mensaje}")
 
-def main():
+# --- PASOS DEL DESPLIEGUE ---
+# Cada paso recibe ctx (IDs creados por los pasos anteriores) y devuelve el ID de su recurso.
+
+def paso_vpc(ctx):
+    log(f"Creando VPC con CIDR {VPC_CIDR}...")
+    vpc_id = client.create_vpc(CidrBlock=VPC_CIDR,
+                               TagSpecifications=especificacion('vpc', "VPC-Examen-3Capas"))['Vpc']['VpcId']
+    client.get_waiter('vpc_available').wait(VpcIds=[vpc_id])
+
+    # Habilitar DNS (Importante para que apt-get resuelva dominios)
+    client.modify_vpc_attribute(VpcId=vpc_id, EnableDnsSupport={'Value': True})
+    client.modify_vpc_attribute(VpcId=vpc_id, EnableDnsHostnames={'Value': True})
+    log(f"VPC creada: {vpc_id}")
+    return vpc_id
+
+def paso_igw(ctx):
+    igw_id = client.create_internet_gateway(
+        TagSpecifications=especificacion('internet-gateway', "IGW-Examen"))['InternetGateway']['InternetGatewayId']
+    client.attach_internet_gateway(InternetGatewayId=igw_id, VpcId=ctx['vpc'])
+    log("IGW creado.")
+    return igw_id
+
+def crear_subred(cidr, az, nombre):
+    def paso(ctx):
+        subnet_id = client.create_subnet(VpcId=ctx['vpc'], CidrBlock=cidr, AvailabilityZone=az,
+                                         TagSpecifications=especificacion('subnet', nombre))['Subnet']['SubnetId']
+        log(f"Subred {nombre} creada: {subnet_id}")
+        return subnet_id
+    return paso
+
+def paso_eip(ctx):
+    log("Asignando Elastic IP...")
+    eip = client.allocate_address(Domain='vpc', TagSpecifications=especificacion('elastic-ip', "EIP-NAT-Examen"))
+    return eip['AllocationId']
+
+def paso_nat_gw(ctx):
+    log("Creando NAT Gateway...")
+    nat_gw = client.create_nat_gateway(
+        SubnetId=ctx['subnet_pub'],
+        AllocationId=ctx['eip'],
+        TagSpecifications=especificacion('natgateway', 'NAT-GW-Examen')
+    )
+    return nat_gw['NatGateway']['NatGatewayId']
+
+def paso_nat_disponible(ctx):
+    # Separado de la creación: al reanudar se vuelve a esperar, pero no se crea otro NAT
+    log("Esperando NAT Gateway (puede tardar 3-5 minutos, no cierres)...")
+    esperar_todos(estados_nat(client), [ctx['nat_gw_id']], listo={'available'}, fallido={'failed', 'deleted'},
+                  timeout=600, descripcion='NAT Gateway')
+    log("NAT Gateway ACTIVO.")
+
+async def paso_nat_disponible_async(ctx):
+    # Backend asyncio: la espera es un sondeo en el bucle de eventos, sin hilo bloqueado
+    import asincrono
+    log("Esperando NAT Gateway (puede tardar 3-5 minutos, no cierres)...")
+    await asincrono.actual().esperar('nat', REGION, [ctx['nat_gw_id']], listo={'available'},
+                                     fallido={'failed', 'deleted'}, timeout=600)
+    log("NAT Gateway ACTIVO.")
+
+def crear_tabla(vpc_id, nombre):
+    return client.create_route_table(VpcId=vpc_id, TagSpecifications=especificacion('route-table', nombre)
+                                     )['RouteTable']['RouteTableId']
+
+def paso_rt_pub(ctx):
+    # Pública (hacia IGW)
+    rt_pub = crear_tabla(ctx['vpc'], "RT-Publica")
+    client.create_route(RouteTableId=rt_pub, DestinationCidrBlock='0.0.0.0/0', GatewayId=ctx['igw'])
+    client.associate_route_table(RouteTableId=rt_pub, SubnetId=ctx['subnet_pub'])
+    log("Tabla de rutas pública configurada.")
+    return rt_pub
+
+def paso_rt_priv(ctx):
+    # Privada: la tabla y sus asociaciones no necesitan esperar al NAT
+    rt_priv = crear_tabla(ctx['vpc'], "RT-Privada")
+    client.associate_route_table(RouteTableId=rt_priv, SubnetId=ctx['subnet_priv_back'])
+    client.associate_route_table(RouteTableId=rt_priv, SubnetId=ctx['subnet_priv_db'])
+    return rt_priv
+
+def paso_ruta_nat(ctx):
+    # Ruta por defecto hacia el NAT GW (solo cuando está activo)
+    client.create_route(RouteTableId=ctx['rt_priv'], DestinationCidrBlock='0.0.0.0/0', NatGatewayId=ctx['nat_gw_id'])
+    log("Tabla de rutas privada configurada.")
+
+def crear_sg(vpc_id, nombre, descripcion):
+    return client.create_security_group(GroupName=nombre, Description=descripcion, VpcId=vpc_id,
+                                        TagSpecifications=especificacion('security-group', nombre))['GroupId']
+
+def paso_sg_front(ctx):
+    sg_front = crear_sg(ctx['vpc'], 'SG-Frontend', 'Acceso Web y SSH')
+    client.authorize_security_group_ingress(
+        GroupId=sg_front,
+        IpPermissions=[
+            {'IpProtocol': 'tcp', 'FromPort': 22, 'ToPort': 22, 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]},
+            {'IpProtocol': 'tcp', 'FromPort': 80, 'ToPort': 80, 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]}
+        ]
+    )
+    log(f"SG Frontend creado: {sg_front}")
+    return sg_front
+
+def paso_sg_back(ctx):
+    sg_back = crear_sg(ctx['vpc'], 'SG-Backend', 'Acceso interno')
+
+    # Regla: Permitir todo el tráfico que venga del SG Frontend
+    client.authorize_security_group_ingress(
+        GroupId=sg_back,
+        IpPermissions=[
+            {
+                'IpProtocol': '-1',
+                'UserIdGroupPairs': [{'GroupId': ctx['sg_front']}]
+            }
+        ]
+    )
+    log(f"SG Backend creado: {sg_back}")
+    return sg_back
+
+def paso_instancias(ctx):
+    """Bastion y backend a la vez, cada uno con su run_instances (distinta subred y SG)"""
+    flota = Flota(client, ImageId=AMI_ID, InstanceType='t2.micro', KeyName=KEY_NAME)
+    flota.anadir('SRV-Frontend-Bastion', ctx['subnet_pub'], [ctx['sg_front']], publica=True)
+    flota.anadir('SRV-Backend-Private', ctx['subnet_priv_back'], [ctx['sg_back']], publica=False)
+    ids = flota.lanzar(log=log)
+    return {'instance_pub': ids['SRV-Frontend-Bastion'][0], 'instance_priv': ids['SRV-Backend-Private'][0]}
+
+def describir_instancias(instancias):
+    """{clave: datos de describe_instances} de {clave: ID}, en una sola llamada"""
+    reservas = client.describe_instances(InstanceIds=list(instancias.values()))['Reservations']
+    por_id = {i['InstanceId']: i for r in reservas for i in r['Instances']}
+    return {clave: por_id[instance_id] for clave, instance_id in instancias.items()}
+
+def paso_instancias_running(ctx):
+    log("Esperando estado Running...")
+    esperar_running(client, list(ctx['instancias'].values()), log=log)
+    return describir_instancias(ctx['instancias'])
+
+async def paso_instancias_running_async(ctx):
+    import asincrono
+    log("Esperando estado Running...")
+    await asincrono.actual().esperar('instance', REGION, list(ctx['instancias'].values()), listo={'running'},
+                                     fallido=ESTADOS_FALLIDOS)
+    return describir_instancias(ctx['instancias'])
+
+def persistente(nombre, funcion, depende=(), entradas=None):
+    """Paso del DAG que guarda el ID creado en ESTADO y se salta al reanudar.
+
+    El hash de entradas incluye la configuración del paso y los IDs de sus
+    dependencias: si cambia un CIDR o se recrea la VPC, el paso se repite.
+    """
+    def ejecutar(ctx):
+        claves = dict(entradas or {}, **{d: ctx[d] for d in depende})
+        return ESTADO.paso(nombre, claves, lambda: funcion(ctx), region=REGION, tipo=nombre, log=log)
+    return Paso(nombre, ejecutar, depende=depende)
+
+def construir_pasos(backend='hilos'):
+    """Grafo del despliegue: cada paso lista solo lo que realmente necesita.
+
+    Con backend='asyncio' las dos esperas largas (NAT e instancias) son PasoAsync.
+    """
+    if backend == 'asyncio':
+        # asincrono (y con él asyncio) solo se carga con este backend: cuesta ~50 ms de arranque
+        from asincrono import PasoAsync
+        esperas = [PasoAsync('nat_disponible', paso_nat_disponible_async, depende=['nat_gw_id']),
+                   PasoAsync('running', paso_instancias_running_async, depende=['instancias'])]
+    else:
+        esperas = [Paso('nat_disponible', paso_nat_disponible, depende=['nat_gw_id']),
+                   Paso('running', paso_instancias_running, depende=['instancias'])]
+    return [
+        persistente('vpc', paso_vpc, entradas={'cidr': VPC_CIDR}),
+        persistente('igw', paso_igw, depende=['vpc']),
+        persistente('subnet_pub', crear_subred(SUBNET_PUB_CIDR, f'{REGION}a', "Subnet-Publica-Frontend"), depende=['vpc'],
+                    entradas={'cidr': SUBNET_PUB_CIDR}),
+        persistente('subnet_priv_back', crear_subred(SUBNET_PRIV_BACK_CIDR, f'{REGION}a', "Subnet-Privada-Backend"), depende=['vpc'],
+                    entradas={'cidr': SUBNET_PRIV_BACK_CIDR}),
+        persistente('subnet_priv_db', crear_subred(SUBNET_PRIV_DB_CIDR, f'{REGION}b', "Subnet-Privada-DB"), depende=['vpc'],
+                    entradas={'cidr': SUBNET_PRIV_DB_CIDR}),
+        persistente('eip', paso_eip),
+        persistente('nat_gw_id', paso_nat_gw, depende=['subnet_pub', 'eip']),
+        persistente('rt_pub', paso_rt_pub, depende=['igw', 'subnet_pub']),
+        persistente('rt_priv', paso_rt_priv, depende=['subnet_priv_back', 'subnet_priv_db']),
+        persistente('ruta_nat', paso_ruta_nat, depende=['rt_priv', 'nat_gw_id', 'nat_disponible']),
+        persistente('sg_front', paso_sg_front, depende=['vpc']),
+        persistente('sg_back', paso_sg_back, depende=['sg_front']),
+        persistente('instancias', paso_instancias,
+                    depende=['subnet_pub', 'sg_front', 'rt_pub', 'subnet_priv_back', 'sg_back', 'rt_priv'],
+                    entradas={'ami': AMI_ID}),
+    ] + esperas
+
+def main(backend='hilos'):
     try:
         log("--- INICIANDO DESPLIEGUE ARQUITECTURA 3 CAPAS (VERSIÓN FINAL) ---")
 
-        # 1. Crear VPC
-        log(f"Creando VPC con CIDR {VPC_CIDR}...")
-        vpc = ec2.create_vpc(CidrBlock=VPC_CIDR)
-        vpc.create_tags(Tags=[{"Key": "Name", "Value": "VPC-Examen-3Capas"}])
-        vpc.wait_until_available()
-        
-        # Habilitar DNS (Importante para que apt-get resuelva dominios)
-        client.modify_vpc_attribute(VpcId=vpc.id, EnableDnsSupport={'Value': True})
-        client.modify_vpc_attribute(VpcId=vpc.id, EnableDnsHostnames={'Value': True})
-        log(f"VPC creada: {vpc.id}")
-
-        # 2. Crear Internet Gateway
-        igw = ec2.create_internet_gateway()
-        vpc.attach_internet_gateway(InternetGatewayId=igw.id)
-        igw.create_tags(Tags=[{"Key": "Name", "Value": "IGW-Examen"}])
-        log("IGW creado.")
-
-        # 3. Crear Subredes
-        log("Creando Subredes...")
-        subnet_pub = vpc.create_subnet(CidrBlock=SUBNET_PUB_CIDR, AvailabilityZone=f'{REGION}a')
-        subnet_pub.create_tags(Tags=[{"Key": "Name", "Value": "Subnet-Publica-Frontend"}])
-        
-        subnet_priv_back = vpc.create_subnet(CidrBlock=SUBNET_PRIV_BACK_CIDR, AvailabilityZone=f'{REGION}a')
-        subnet_priv_back.create_tags(Tags=[{"Key": "Name", "Value": "Subnet-Privada-Backend"}])
-
-        subnet_priv_db = vpc.create_subnet(CidrBlock=SUBNET_PRIV_DB_CIDR, AvailabilityZone=f'{REGION}b')
-        subnet_priv_db.create_tags(Tags=[{"Key": "Name", "Value": "Subnet-Privada-DB"}])
-
-        # 4. NAT Gateway
-        log("Asignando Elastic IP y creando NAT Gateway...")
-        eip = client.allocate_address(Domain='vpc')
-        eip_alloc_id = eip['AllocationId']
-
-        nat_gw = client.create_nat_gateway(
-            SubnetId=subnet_pub.id, 
-            AllocationId=eip_alloc_id,
-            TagSpecifications=[{'ResourceType': 'natgateway', 'Tags': [{'Key': 'Name', 'Value': 'NAT-GW-Examen'}]}]
-        )
-        nat_gw_id = nat_gw['NatGateway']['NatGatewayId']
-
-        log("Esperando NAT Gateway (puede tardar 3-5 minutos, no cierres)...")
-        waiter_nat = client.get_waiter('nat_gateway_available')
-        waiter_nat.wait(NatGatewayIds=[nat_gw_id])
-        log("NAT Gateway ACTIVO.")
-
-        # 5. Tablas de Rutas
-        log("Configurando Rutas...")
-        # 5.1 Pública (hacia IGW)
-        rt_pub = vpc.create_route_table()
-        rt_pub.create_tags(Tags=[{"Key": "Name", "Value": "RT-Publica"}])
-        rt_pub.create_route(DestinationCidrBlock='0.0.0.0/0', GatewayId=igw.id)
-        rt_pub.associate_with_subnet(SubnetId=subnet_pub.id)
-
-        # 5.2 Privada (hacia NAT GW)
-        rt_priv = vpc.create_route_table()
-        rt_priv.create_tags(Tags=[{"Key": "Name", "Value": "RT-Privada"}])
-        rt_priv.create_route(DestinationCidrBlock='0.0.0.0/0', NatGatewayId=nat_gw_id)
-        rt_priv.associate_with_subnet(SubnetId=subnet_priv_back.id)
-        rt_priv.associate_with_subnet(SubnetId=subnet_priv_db.id)
-
-        # 6. Security Groups
-        log("Creando Security Groups...")
-        
-        # SG Frontend
-        sg_front = vpc.create_security_group(GroupName='SG-Frontend', Description='Acceso Web y SSH')
-        sg_front.create_tags(Tags=[{"Key": "Name", "Value": "SG-Frontend"}])
-        sg_front.authorize_ingress(
-            IpPermissions=[
-                {'IpProtocol': 'tcp', 'FromPort': 22, 'ToPort': 22, 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]},
-                {'IpProtocol': 'tcp', 'FromPort': 80, 'ToPort': 80, 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]}
-            ]
-        )
-        
-        # SG Backend
-        sg_back = vpc.create_security_group(GroupName='SG-Backend', Description='Acceso interno')
-        sg_back.create_tags(Tags=[{"Key": "Name", "Value": "SG-Backend"}])
-        
-        # Regla: Permitir todo el tráfico que venga del SG Frontend
-        sg_back.authorize_ingress(
-            IpPermissions=[
-                {
-                    'IpProtocol': '-1',
-                    'UserIdGroupPairs': [{'GroupId': sg_front.id}]
-                }
-            ]
-        )
-
-        # 7. Instancias (CORREGIDO: Usamos ec2.create_instances en vez de vpc.create_instances)
-        log("Lanzando Instancias...")
-        
-        # Instancia Pública (Bastion)
-        instance_pub = ec2.create_instances(
-            ImageId=AMI_ID, InstanceType='t2.micro', KeyName=KEY_NAME, MinCount=1, MaxCount=1,
-            NetworkInterfaces=[{
-                'SubnetId': subnet_pub.id, 
-                'DeviceIndex': 0, 
-                'AssociatePublicIpAddress': True, 
-                'Groups': [sg_front.id]
-            }],
-            TagSpecifications=[{'ResourceType': 'instance', 'Tags': [{'Key': 'Name', 'Value': 'SRV-Frontend-Bastion'}]}]
-        )[0]
-
-        # Instancia Privada (Backend)
-        instance_priv = ec2.create_instances(
-            ImageId=AMI_ID, InstanceType='t2.micro', KeyName=KEY_NAME, MinCount=1, MaxCount=1,
-            NetworkInterfaces=[{
-                'SubnetId': subnet_priv_back.id, 
-                'DeviceIndex': 0, 
-                'AssociatePublicIpAddress': False, 
-                'Groups': [sg_back.id]
-            }],
-            TagSpecifications=[{'ResourceType': 'instance', 'Tags': [{'Key': 'Name', 'Value': 'SRV-Backend-Private'}]}]
-        )[0]
-
-        log("Esperando estado Running...")
-        instance_pub.wait_until_running()
-        instance_priv.wait_until_running()
-
-        instance_pub.reload()
-        instance_priv.reload()
+        # Los pasos independientes (subredes, SGs, instancias...) se solapan con la espera del NAT
+        if backend == 'asyncio':
+            import asincrono
+            ctx = asincrono.ejecutar(asincrono.ejecutar_dag(construir_pasos(backend), log=log))
+        else:
+            ctx = ejecutar_dag(construir_pasos(), max_workers=MAX_WORKERS, log=log)
+        ip_publica = ctx['running']['instance_pub'].get('PublicIpAddress')
+        ip_privada = ctx['running']['instance_priv']['PrivateIpAddress']
 
         print("\n" + "="*50)
         print("DESPLIEGUE FINALIZADO CON ÉXITO")
         print("="*50)
-        print(f"Bastion Public IP: {instance_pub.public_ip_address}")
-        print(f"Backend Private IP: {instance_priv.private_ip_address}")
+        print(f"Bastion Public IP: {ip_publica}")
+        print(f"Backend Private IP: {ip_privada}")
         print("="*50)
         print("PASOS PARA OBTENER CAPTURA DE APT-GET UPDATE:")
-        print(f"1. ssh -i {KEY_NAME}.pem ubuntu@{instance_pub.public_ip_address}")
+        print(f"1. ssh -i {KEY_NAME}.pem ubuntu@{ip_publica}")
         print(f"2. nano key.pem (pega tu clave) -> chmod 400 key.pem")
-        print(f"3. ssh -i key.pem ubuntu@{instance_priv.private_ip_address}")
+        print(f"3. ssh -i key.pem ubuntu@{ip_privada}")
         print("4. sudo apt-get update")
         print("="*50)
 
     except Exception as e:
         print(f"[ERROR CRÍTICO] {e}")
+        print(f"Los recursos ya creados están en {ESTADO.ruta}; vuelve a ejecutar para reanudar.")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    with trazas.ejecucion('ejercicio1'):
+        main()
\ No newline at end of file
@@ -1,82 +1,71 @@
-import boto3
+import sys
 import time
 
+from clientes import cliente_perezoso
+from nacls import EntradaNacl
+from plan import Recurso, aplicar_plan, calcular_plan, imprimir_plan
+
 # --- CONFIGURACIÓN ---
 REGION = 'us-east-1'
 VPC_CIDR = '10.0.0.0/16'
 SUBNET_PUB_CIDR = '10.0.1.0/24'
 SUBNET_PRIV_CIDR = '10.0.2.0/24'
 
-ec2 = boto3.resource('ec2', region_name=REGION)
-client = boto3.client('ec2', region_name=REGION)
-
-def log(msg):
-    print(f"[NACLs] {msg}")
-
-def main():
-    try:
-        log("--- INICIANDO ESCENARIO NACLs (EJERCICIO 2) ---")
-
-        # 1. Crear VPC Base
-        vpc = ec2.create_vpc(CidrBlock=VPC_CIDR)
-        vpc.create_tags(Tags=[{"Key": "Name", "Value": "VPC-Ejercicio2-NACLs"}])
-        vpc.wait_until_available()
-        log(f"VPC creada: {vpc.id}")
+VPC_NAME = 'VPC-Ejercicio2-NACLs'
 
-        # 2. Subredes
-        sn_pub = vpc.create_subnet(CidrBlock=SUBNET_PUB_CIDR, AvailabilityZone=f'{REGION}a')
-        sn_pub.create_tags(Tags=[{"Key": "Name", "Value": "Subnet-Publica-NACL"}])
-        
-        sn_priv = vpc.create_subnet(CidrBlock=SUBNET_PRIV_CIDR, AvailabilityZone=f'{REGION}a')
-        sn_priv.create_tags(Tags=[{"Key": "Name", "Value": "Subnet-Privada-NACL"}])
-        log("Subredes creadas.")
+# Reglas de los NACLs: EntradaNacl(egress, número, protocolo, desde, hasta, cidr, acción)
+# ('cidr:<nombre>' toma el CIDR de esa subred de topologia())
+NACL_PUB_ENTRADAS = [
+    # ENTRADA: HTTP y HTTPS desde Internet
+    EntradaNacl(False, 100, '6', 80, 80, '0.0.0.0/0'),
+    EntradaNacl(False, 110, '6', 443, 443, '0.0.0.0/0'),
+    # Tráfico de retorno desde la Privada (para que puedan hablar)
+    EntradaNacl(False, 120, '-1', cidr='cidr:Subnet-Privada-NACL'),
+    # IMPORTANTE: puertos efímeros de retorno desde Internet (si el servidor inicia la conexión)
+    EntradaNacl(False, 140, '6', 1024, 65535, '0.0.0.0/0'),
+    # SALIDA: responder a Internet (puertos efímeros) y hablar hacia la Privada
+    EntradaNacl(True, 100, '6', 1024, 65535, '0.0.0.0/0'),
+    EntradaNacl(True, 110, '-1', cidr='cidr:Subnet-Privada-NACL'),
+]
+NACL_PRIV_ENTRADAS = [
+    # Solo desde y hacia la Pública
+    EntradaNacl(False, 100, '-1', cidr='cidr:Subnet-Publica-NACL'),
+    EntradaNacl(True, 100, '-1', cidr='cidr:Subnet-Publica-NACL'),
+]
 
-        # 3. Internet Gateway (necesario para definir 'Internet' en la pública)
-        igw = ec2.create_internet_gateway()
-        vpc.attach_internet_gateway(InternetGatewayId=igw.id)
-        
-        # 4. CREACIÓN DE NACL PÚBLICO (La parte clave)
-        log("Configurando NACL Público...")
-        nacl_pub = vpc.create_network_acl()
-        nacl_pub.create_tags(Tags=[{"Key": "Name", "Value": "NACL-Publico-Estricto"}])
+client = cliente_perezoso('ec2', REGION)
 
-        # REGLAS DE ENTRADA (Inbound)
-        # 100: Permitir HTTP (80) desde Internet
-        nacl_pub.create_entry(RuleNumber=100, Protocol='6', PortRange={'From': 80, 'To': 80}, Egress=False, RuleAction='allow', CidrBlock='0.0.0.0/0')
-        # 110: Permitir HTTPS (443) desde Internet
-        nacl_pub.create_entry(RuleNumber=110, Protocol='6', PortRange={'From': 443, 'To': 443}, Egress=False, RuleAction='allow', CidrBlock='0.0.0.0/0')
-        # 120: Permitir Tráfico de retorno desde la Privada (Para que puedan hablar)
-        nacl_pub.create_entry(RuleNumber=120, Protocol='-1', Egress=False, RuleAction='allow', CidrBlock=SUBNET_PRIV_CIDR)
-        # IMPORTANTE: Permitir puertos efímeros de retorno desde internet (si el servidor inicia la conexión)
-        nacl_pub.create_entry(RuleNumber=140, Protocol='6', PortRange={'From': 1024, 'To': 65535}, Egress=False, RuleAction='allow', CidrBlock='0.0.0.0/0')
+def log(msg):
+    print(f"[NACLs] {msg}")
 
-        # REGLAS DE SALIDA (Outbound)
-        # 100: Permitir responder a Internet (Puertos efímeros)
-        nacl_pub.create_entry(RuleNumber=100, Protocol='6', PortRange={'From': 1024, 'To': 65535}, Egress=True, RuleAction='allow', CidrBlock='0.0.0.0/0')
-        # 110: Permitir hablar hacia la Privada
-        nacl_pub.create_entry(RuleNumber=110, Protocol='-1', Egress=True, RuleAction='allow', CidrBlock=SUBNET_PRIV_CIDR)
-        
-        # ASOCIAR NACL a Subred Pública
-        # Hay que reemplazar la asociación por defecto
-        assoc_pub = client.describe_network_acls(Filters=[{'Name': 'association.subnet-id', 'Values': [sn_pub.id]}])['NetworkAcls'][0]['Associations'][0]['NetworkAclAssociationId']
-        client.replace_network_acl_association(AssociationId=assoc_pub, NetworkAclId=nacl_pub.id)
-        log("NACL Público configurado y asociado.")
+def topologia():
+    """Estado deseado del escenario a partir de las constantes de configuración"""
+    return [
+        Recurso('vpc', VPC_NAME, cidr=VPC_CIDR),
+        Recurso('subnet', 'Subnet-Publica-NACL', vpc=VPC_NAME, cidr=SUBNET_PUB_CIDR, az=f'{REGION}a'),
+        Recurso('subnet', 'Subnet-Privada-NACL', vpc=VPC_NAME, cidr=SUBNET_PRIV_CIDR, az=f'{REGION}a'),
+        # Internet Gateway (necesario para definir 'Internet' en la pública)
+        Recurso('igw', 'IGW-Ejercicio2', vpc=VPC_NAME),
+        Recurso('nacl', 'NACL-Publico-Estricto', vpc=VPC_NAME, entradas=NACL_PUB_ENTRADAS,
+                subredes=['Subnet-Publica-NACL']),
+        Recurso('nacl', 'NACL-Privado-Aislado', vpc=VPC_NAME, entradas=NACL_PRIV_ENTRADAS,
+                subredes=['Subnet-Privada-NACL']),
+    ]
 
-        # 5. CREACIÓN DE NACL PRIVADO
-        log("Configurando NACL Privado...")
-        nacl_priv = vpc.create_network_acl()
-        nacl_priv.create_tags(Tags=[{"Key": "Name", "Value": "NACL-Privado-Aislado"}])
+def main(aplicar=True):
+    """Compara la configuración con lo desplegado y aplica solo las diferencias.
 
-        # REGLAS ENTRADA: Solo desde la Pública
-        nacl_priv.create_entry(RuleNumber=100, Protocol='-1', Egress=False, RuleAction='allow', CidrBlock=SUBNET_PUB_CIDR)
-        
-        # REGLAS SALIDA: Solo hacia la Pública
-        nacl_priv.create_entry(RuleNumber=100, Protocol='-1', Egress=True, RuleAction='allow', CidrBlock=SUBNET_PUB_CIDR)
+    Con aplicar=False (python3 ejercicio2_nacls.py plan) solo se muestra el plan.
+    """
+    try:
+        log("--- INICIANDO ESCENARIO NACLs (EJERCICIO 2) ---")
+        cambios, ids = calcular_plan(topologia(), client, REGION)
+        imprimir_plan(cambios, log)
+        if not aplicar or not cambios:
+            return
 
-        # ASOCIAR NACL a Subred Privada
-        assoc_priv = client.describe_network_acls(Filters=[{'Name': 'association.subnet-id', 'Values': [sn_priv.id]}])['NetworkAcls'][0]['Associations'][0]['NetworkAclAssociationId']
-        client.replace_network_acl_association(AssociationId=assoc_priv, NetworkAclId=nacl_priv.id)
-        log("NACL Privado configurado y asociado.")
+        aplicar_plan(cambios, client, ids, log)
+        log(f"VPC: {ids[VPC_NAME]}")
 
         print("\n" + "="*50)
         print("ESCENARIO COMPLETADO")
@@ -89,4 +78,4 @@ def main():
         print(f"[ERROR] {e}")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main(aplicar='plan' not in sys.argv[1:])
\ No newline at end of file
@@ -1,8 +1,13 @@
-import boto3
-import time
 import sys
 from botocore.exceptions import ClientError
 
+import trazas
+from clientes import cliente_perezoso, cuenta, recurso_perezoso
+from direcciones import subred
+from etiquetas import especificacion
+from metricas import en_paso
+from waiters import esperar_todos, reintentar, estados_tgw, estados_vpc_attachments, estados_peering
+
 # --- CONFIGURACIÓN ---
 REGION_1 = 'us-east-1' 
 REGION_2 = 'us-west-2' 
@@ -10,47 +15,50 @@ REGION_2 = 'us-west-2'
 ASN_EAST = 64512
 ASN_WEST = 64513
 
-ec2_east = boto3.resource('ec2', region_name=REGION_1)
-client_east = boto3.client('ec2', region_name=REGION_1)
-ec2_west = boto3.resource('ec2', region_name=REGION_2)
-client_west = boto3.client('ec2', region_name=REGION_2)
+CIDR_R1_A = '10.1.0.0/16'
+CIDR_R1_B = '10.2.0.0/16'
+CIDR_R2_C = '10.3.0.0/16'
+
+# Rutas de las VPCs hacia el TGW de su región y de cada TGW hacia el peering
+RUTAS_VPC_R1 = [CIDR_R2_C]
+RUTAS_VPC_R2 = [CIDR_R1_A, CIDR_R1_B]
+RUTA_TGW_R1 = CIDR_R2_C
+RUTA_TGW_R2 = '10.0.0.0/8'  # Resumen: todo el Este (la /16 propagada de VPC-R2-C gana por ser más específica)
 
-sts = boto3.client('sts')
-MY_ACCOUNT_ID = sts.get_caller_identity()['Account']
+# Clientes perezosos: importar el módulo no resuelve credenciales ni llama a STS
+ec2_east = recurso_perezoso('ec2', REGION_1)
+client_east = cliente_perezoso('ec2', REGION_1)
+ec2_west = recurso_perezoso('ec2', REGION_2)
+client_west = cliente_perezoso('ec2', REGION_2)
 
 def log(msg):
     print(f"[TGW-MULTI] {msg}")
 
 # --- FUNCIÓN DE SEGURIDAD PARA RUTAS ---
 def create_route_with_retry(client, destination, tgw_rt_id, attach_id):
-    """Intenta crear la ruta y reintenta si el attachment no está listo (IncorrectState)"""
-    max_retries = 10
-    for i in range(max_retries):
-        try:
-            client.create_transit_gateway_route(
-                DestinationCidrBlock=destination,
-                TransitGatewayRouteTableId=tgw_rt_id,
-                TransitGatewayAttachmentId=attach_id
-            )
-            log(f"Ruta creada hacia {destination}.")
-            return
-        except ClientError as e:
-            code = e.response['Error']['Code']
-            if code == 'IncorrectState' or code == 'InvalidTransitGatewayAttachmentID.NotFound':
-                log(f"El Attachment aún no está listo para enrutar ({code}). Reintentando en 15s... ({i+1}/{max_retries})")
-                time.sleep(15)
-            else:
-                raise e # Si es otro error, fallar de verdad
-    raise Exception("No se pudo crear la ruta tras múltiples intentos.")
+    """Intenta crear la ruta y reintenta con backoff si el attachment no está listo (IncorrectState)"""
+    def attachment_no_listo(e):
+        # Si es otro error, fallar de verdad
+        return isinstance(e, ClientError) and e.response['Error']['Code'] in ('IncorrectState', 'InvalidTransitGatewayAttachmentID.NotFound')
+
+    reintentar(
+        lambda: client.create_transit_gateway_route(
+            DestinationCidrBlock=destination,
+            TransitGatewayRouteTableId=tgw_rt_id,
+            TransitGatewayAttachmentId=attach_id
+        ),
+        attachment_no_listo, timeout=150, log=log
+    )
+    log(f"Ruta creada hacia {destination}.")
 
 def create_vpc_stack(ec2_res, client, cidr, name):
     log(f"Creando VPC {name} ({cidr})...")
-    vpc = ec2_res.create_vpc(CidrBlock=cidr)
-    vpc.create_tags(Tags=[{"Key": "Name", "Value": name}])
+    vpc = ec2_res.create_vpc(CidrBlock=cidr, TagSpecifications=especificacion('vpc', name))
     vpc.wait_until_available()
     az = client.describe_availability_zones()['AvailabilityZones'][0]['ZoneName']
-    subnet = vpc.create_subnet(CidrBlock=cidr.replace("0.0/16", "1.0/24"), AvailabilityZone=az)
-    subnet.create_tags(Tags=[{"Key": "Name", "Value": f"Subnet-{name}"}])
+    # Segunda /24 de la VPC (10.1.0.0/16 -> 10.1.1.0/24), válida para cualquier CIDR
+    subnet = vpc.create_subnet(CidrBlock=subred(cidr, 24, 1), AvailabilityZone=az,
+                               TagSpecifications=especificacion('subnet', f"Subnet-{name}"))
     return vpc, subnet
 
 def main():
@@ -58,90 +66,89 @@ def main():
         log("--- INICIANDO DESPLIEGUE TGW MULTI-REGION (FIXED) ---")
 
         # 1. CREAR VPCs
-        vpc_east_1, sub_east_1 = create_vpc_stack(ec2_east, client_east, '10.1.0.0/16', 'VPC-R1-A')
-        vpc_east_2, sub_east_2 = create_vpc_stack(ec2_east, client_east, '10.2.0.0/16', 'VPC-R1-B')
-        vpc_west_1, sub_west_1 = create_vpc_stack(ec2_west, client_west, '10.3.0.0/16', 'VPC-R2-C')
+        with en_paso('vpcs'):
+            vpc_east_1, sub_east_1 = create_vpc_stack(ec2_east, client_east, CIDR_R1_A, 'VPC-R1-A')
+            vpc_east_2, sub_east_2 = create_vpc_stack(ec2_east, client_east, CIDR_R1_B, 'VPC-R1-B')
+            vpc_west_1, sub_west_1 = create_vpc_stack(ec2_west, client_west, CIDR_R2_C, 'VPC-R2-C')
 
         # 2. CREAR TGWs
-        log(f"Creando TGW en {REGION_1}...")
-        tgw_east = client_east.create_transit_gateway(
-            Options={'AmazonSideAsn': ASN_EAST, 'AutoAcceptSharedAttachments': 'enable'},
-            TagSpecifications=[{'ResourceType': 'transit-gateway', 'Tags': [{'Key': 'Name', 'Value': 'TGW-East'}]}]
-        )['TransitGateway']
+        with en_paso('tgws'):
+            log(f"Creando TGW en {REGION_1}...")
+            tgw_east = client_east.create_transit_gateway(
+                Options={'AmazonSideAsn': ASN_EAST, 'AutoAcceptSharedAttachments': 'enable'},
+                TagSpecifications=[{'ResourceType': 'transit-gateway', 'Tags': [{'Key': 'Name', 'Value': 'TGW-East'}]}]
+            )['TransitGateway']
         
-        log(f"Creando TGW en {REGION_2}...")
-        tgw_west = client_west.create_transit_gateway(
-            Options={'AmazonSideAsn': ASN_WEST, 'AutoAcceptSharedAttachments': 'enable'},
-            TagSpecifications=[{'ResourceType': 'transit-gateway', 'Tags': [{'Key': 'Name', 'Value': 'TGW-West'}]}]
-        )['TransitGateway']
-
-        log("Esperando TGWs available (~2 min)...")
-        while True:
-            te = client_east.describe_transit_gateways(TransitGatewayIds=[tgw_east['TransitGatewayId']])['TransitGateways'][0]
-            tw = client_west.describe_transit_gateways(TransitGatewayIds=[tgw_west['TransitGatewayId']])['TransitGateways'][0]
-            if te['State'] == 'available' and tw['State'] == 'available':
-                break
-            time.sleep(15)
+            log(f"Creando TGW en {REGION_2}...")
+            tgw_west = client_west.create_transit_gateway(
+                Options={'AmazonSideAsn': ASN_WEST, 'AutoAcceptSharedAttachments': 'enable'},
+                TagSpecifications=[{'ResourceType': 'transit-gateway', 'Tags': [{'Key': 'Name', 'Value': 'TGW-West'}]}]
+            )['TransitGateway']
 
-        # 3. ATTACHMENTS
-        log("Adjuntando VPCs...")
-        client_east.create_transit_gateway_vpc_attachment(TransitGatewayId=tgw_east['TransitGatewayId'], VpcId=vpc_east_1.id, SubnetIds=[sub_east_1.id])
-        client_east.create_transit_gateway_vpc_attachment(TransitGatewayId=tgw_east['TransitGatewayId'], VpcId=vpc_east_2.id, SubnetIds=[sub_east_2.id])
-        client_west.create_transit_gateway_vpc_attachment(TransitGatewayId=tgw_west['TransitGatewayId'], VpcId=vpc_west_1.id, SubnetIds=[sub_west_1.id])
+            log("Esperando TGWs available (~2 min)...")
+            # Ambos se crean a la vez; mientras esperamos el Este, el Oeste sigue avanzando
+            esperar_todos(estados_tgw(client_east), [tgw_east['TransitGatewayId']], listo={'available'}, timeout=900, descripcion='TGW Este', log=log)
+            esperar_todos(estados_tgw(client_west), [tgw_west['TransitGatewayId']], listo={'available'}, timeout=900, descripcion='TGW Oeste', log=log)
 
-        log("Esperando estabilización de attachments (40s)...")
-        time.sleep(40) 
+        # 3. ATTACHMENTS
+        with en_paso('attachments'):
+            log("Adjuntando VPCs...")
+            att_east = [
+                client_east.create_transit_gateway_vpc_attachment(TransitGatewayId=tgw_east['TransitGatewayId'], VpcId=vpc.id, SubnetIds=[sub.id])['TransitGatewayVpcAttachment']['TransitGatewayAttachmentId']
+                for vpc, sub in [(vpc_east_1, sub_east_1), (vpc_east_2, sub_east_2)]
+            ]
+            att_west = [
+                client_west.create_transit_gateway_vpc_attachment(TransitGatewayId=tgw_west['TransitGatewayId'], VpcId=vpc_west_1.id, SubnetIds=[sub_west_1.id])['TransitGatewayVpcAttachment']['TransitGatewayAttachmentId']
+            ]
+
+            log("Esperando attachments available...")
+            esperar_todos(estados_vpc_attachments(client_east), att_east, listo={'available'}, fallido={'failed', 'deleted'}, timeout=600, descripcion='attachments Este', log=log)
+            esperar_todos(estados_vpc_attachments(client_west), att_west, listo={'available'}, fallido={'failed', 'deleted'}, timeout=600, descripcion='attachments Oeste', log=log)
 
         # 4. PEERING
-        log("Creando Peering Cross-Region...")
-        peer_att = client_east.create_transit_gateway_peering_attachment(
-            TransitGatewayId=tgw_east['TransitGatewayId'],
-            PeerTransitGatewayId=tgw_west['TransitGatewayId'],
-            PeerAccountId=MY_ACCOUNT_ID,
-            PeerRegion=REGION_2,
-            TagSpecifications=[{'ResourceType': 'transit-gateway-attachment', 'Tags': [{'Key': 'Name', 'Value': 'Peering-East-West'}]}]
-        )['TransitGatewayPeeringAttachment']
+        with en_paso('peering'):
+            log("Creando Peering Cross-Region...")
+            peer_att = client_east.create_transit_gateway_peering_attachment(
+                TransitGatewayId=tgw_east['TransitGatewayId'],
+                PeerTransitGatewayId=tgw_west['TransitGatewayId'],
+                PeerAccountId=cuenta(),
+                PeerRegion=REGION_2,
+                TagSpecifications=[{'ResourceType': 'transit-gateway-attachment', 'Tags': [{'Key': 'Name', 'Value': 'Peering-East-West'}]}]
+            )['TransitGatewayPeeringAttachment']
         
-        peer_id = peer_att['TransitGatewayAttachmentId']
-        log(f"Peering ID: {peer_id}. Esperando propagación para aceptar...")
+            peer_id = peer_att['TransitGatewayAttachmentId']
+            log(f"Peering ID: {peer_id}. Esperando propagación para aceptar...")
         
-        time.sleep(15) # Espera inicial
-        accepted = False
-        while not accepted:
-            try:
-                client_west.accept_transit_gateway_peering_attachment(TransitGatewayAttachmentId=peer_id)
-                accepted = True
-                log("Peering Aceptado!")
-            except Exception:
-                log("Aún no llegó la solicitud al Oeste... reintentando en 10s")
-                time.sleep(10)
+            # Esperar a que la solicitud llegue al Oeste en vez de reintentar el accept a ciegas
+            esperar_todos(estados_peering(client_west), [peer_id], listo={'pendingAcceptance'}, fallido={'failed', 'rejected'}, timeout=600, descripcion='solicitud de peering en el Oeste', log=log)
+            client_west.accept_transit_gateway_peering_attachment(TransitGatewayAttachmentId=peer_id)
+            log("Peering Aceptado!")
         
-        log("Esperando estado 'available' del peering...")
-        while True:
-            p_state = client_east.describe_transit_gateway_peering_attachments(TransitGatewayAttachmentIds=[peer_id])['TransitGatewayPeeringAttachments'][0]['State']
-            if p_state == 'available':
-                break
-            time.sleep(10)
+            log("Esperando estado 'available' del peering...")
+            esperar_todos(estados_peering(client_east), [peer_id], listo={'available'}, fallido={'failed', 'rejected', 'deleted'}, timeout=900, descripcion='peering', log=log)
 
         # 5. RUTAS (SECCIÓN FIXEADA CON REINTENTOS)
-        log("Configurando Rutas de VPC...")
-        for vpc in [vpc_east_1, vpc_east_2]:
-            rt = list(vpc.route_tables.all())[0]
-            rt.create_route(DestinationCidrBlock='10.3.0.0/16', TransitGatewayId=tgw_east['TransitGatewayId'])
+        with en_paso('rutas-vpc'):
+            log("Configurando Rutas de VPC...")
+            for vpc in [vpc_east_1, vpc_east_2]:
+                rt = list(vpc.route_tables.all())[0]
+                for destino in RUTAS_VPC_R1:
+                    rt.create_route(DestinationCidrBlock=destino, TransitGatewayId=tgw_east['TransitGatewayId'])
             
-        rt_west = list(vpc_west_1.route_tables.all())[0]
-        rt_west.create_route(DestinationCidrBlock='10.1.0.0/16', TransitGatewayId=tgw_west['TransitGatewayId'])
-        rt_west.create_route(DestinationCidrBlock='10.2.0.0/16', TransitGatewayId=tgw_west['TransitGatewayId'])
+            rt_west = list(vpc_west_1.route_tables.all())[0]
+            for destino in RUTAS_VPC_R2:
+                rt_west.create_route(DestinationCidrBlock=destino, TransitGatewayId=tgw_west['TransitGatewayId'])
 
-        log("Configurando Rutas Internas TGW (Con lógica de reintento)...")
+        with en_paso('rutas-tgw'):
+            log("Configurando Rutas Internas TGW (Con lógica de reintento)...")
         
-        # Ruta en TGW Este
-        te_rt_id = client_east.describe_transit_gateways(TransitGatewayIds=[tgw_east['TransitGatewayId']])['TransitGateways'][0]['Options']['AssociationDefaultRouteTableId']
-        create_route_with_retry(client_east, '10.3.0.0/16', te_rt_id, peer_id)
+            # Ruta en TGW Este
+            te_rt_id = client_east.describe_transit_gateways(TransitGatewayIds=[tgw_east['TransitGatewayId']])['TransitGateways'][0]['Options']['AssociationDefaultRouteTableId']
+            create_route_with_retry(client_east, RUTA_TGW_R1, te_rt_id, peer_id)
 
-        # Ruta en TGW Oeste
-        tw_rt_id = client_west.describe_transit_gateways(TransitGatewayIds=[tgw_west['TransitGatewayId']])['TransitGateways'][0]['Options']['AssociationDefaultRouteTableId']
-        create_route_with_retry(client_west, '10.0.0.0/8', tw_rt_id, peer_id)
+            # Ruta en TGW Oeste
+            tw_rt_id = client_west.describe_transit_gateways(TransitGatewayIds=[tgw_west['TransitGatewayId']])['TransitGateways'][0]['Options']['AssociationDefaultRouteTableId']
+            create_route_with_retry(client_west, RUTA_TGW_R2, tw_rt_id, peer_id)
 
         print("\n" + "="*50)
         print("DESPLIEGUE EXITOSO")
@@ -152,5 +159,22 @@ def main():
     except Exception as e:
         print(f"[ERROR FATAL] {e}")
 
+def modelo_rutas():
+    """Modelo offline (rutas.Red) de las rutas que instala main(), para comprobarlas sin AWS"""
+    from rutas import Red
+    red = Red().anadir_tgw('TGW-East').anadir_tgw('TGW-West')
+    vpcs = [('VPC-R1-A', CIDR_R1_A, 'TGW-East', RUTAS_VPC_R1), ('VPC-R1-B', CIDR_R1_B, 'TGW-East', RUTAS_VPC_R1),
+            ('VPC-R2-C', CIDR_R2_C, 'TGW-West', RUTAS_VPC_R2)]
+    for nombre, cidr, tgw, rutas in vpcs:
+        red.anadir_vpc(nombre, cidr, {destino: tgw for destino in rutas})
+        red.adjuntar_vpc(f"attachment-{nombre}", tgw, nombre)
+        # Propagación en la tabla por defecto del TGW
+        red.anadir_ruta_tgw(tgw, cidr, f"attachment-{nombre}")
+    red.peering('Peering-East-West', 'TGW-East', 'TGW-West')
+    red.anadir_ruta_tgw('TGW-East', RUTA_TGW_R1, 'Peering-East-West')
+    red.anadir_ruta_tgw('TGW-West', RUTA_TGW_R2, 'Peering-East-West')
+    return red
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    with trazas.ejecucion('ejercicio3'):
+        main()
\ No newline at end of file
@@ -0,0 +1,194 @@
+"""Fichero de estado persistente para los despliegues.
+
+Cada paso que crea algo en AWS deja un registro (JSON-lines) con el ID
+creado y un hash de sus entradas (CIDR, nombre, IDs de los que depende...).
+Si el script falla a mitad y se vuelve a lanzar, los pasos con el mismo
+hash se saltan y se reutiliza el ID guardado, en vez de crear VPCs y EIPs
+duplicadas. Antes de saltarlo se comprueba con un describe que los IDs
+guardados siguen existiendo: si alguien borró uno a mano (NotFound, o ya
+'deleted'/'terminated'), el paso se repite. Los scripts de limpieza pueden leer los IDs registrados y
+borrar directamente, sin describes de descubrimiento.
+
+El fichero se reescribe entero a un temporal y se renombra (os.replace),
+así que nunca queda a medio escribir aunque el proceso muera.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import metricas
+from trazas import ids_en
+
+DIRECTORIO_ESTADO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.estado')
+# Prefijo del ID -> (describe, parámetro con los IDs, clave de la lista, campo del ID)
+DESCRIBES = {
+    'vpc-': ('describe_vpcs', 'VpcIds', 'Vpcs', 'VpcId'),
+    'subnet-': ('describe_subnets', 'SubnetIds', 'Subnets', 'SubnetId'),
+    'igw-': ('describe_internet_gateways', 'InternetGatewayIds', 'InternetGateways', 'InternetGatewayId'),
+    'rtb-': ('describe_route_tables', 'RouteTableIds', 'RouteTables', 'RouteTableId'),
+    'sg-': ('describe_security_groups', 'GroupIds', 'SecurityGroups', 'GroupId'),
+    'acl-': ('describe_network_acls', 'NetworkAclIds', 'NetworkAcls', 'NetworkAclId'),
+    'eipalloc-': ('describe_addresses', 'AllocationIds', 'Addresses', 'AllocationId'),
+    'nat-': ('describe_nat_gateways', 'NatGatewayIds', 'NatGateways', 'NatGatewayId'),
+    'i-': ('describe_instances', 'InstanceIds', 'Reservations', 'InstanceId'),
+    'tgw-attach-': ('describe_transit_gateway_attachments', 'TransitGatewayAttachmentIds',
+                    'TransitGatewayAttachments', 'TransitGatewayAttachmentId'),
+    'tgw-rtb-': ('describe_transit_gateway_route_tables', 'TransitGatewayRouteTableIds',
+                 'TransitGatewayRouteTables', 'TransitGatewayRouteTableId'),
+    'tgw-': ('describe_transit_gateways', 'TransitGatewayIds', 'TransitGateways', 'TransitGatewayId'),
+}
+# Estados de los que un recurso ya no vuelve: a efectos de reanudar, no existe
+TERMINADOS = {'deleting', 'deleted', 'failed', 'rejected', 'shutting-down', 'terminated'}
+
+
+def _describe(rid):
+    # El prefijo más largo que encaje: 'tgw-attach-' antes que 'tgw-'
+    for prefijo in sorted(DESCRIBES, key=len, reverse=True):
+        if rid.startswith(prefijo):
+            return DESCRIBES[prefijo]
+    return None
+
+
+def desaparecidos(valor, region):
+    """IDs de AWS dentro de valor que ya no existen en la región (un describe por tipo)"""
+    from clientes import cliente
+    por_tipo = {}
+    for rid in ids_en(valor):
+        describe = _describe(rid)
+        if describe is not None:
+            por_tipo.setdefault(describe, []).append(rid)
+    faltan = []
+    for (operacion, parametro, clave, campo), ids in por_tipo.items():
+        try:
+            respuesta = getattr(cliente('ec2', region), operacion)(**{parametro: ids})
+        except Exception as e:
+            if 'NotFound' not in getattr(e, 'response', {}).get('Error', {}).get('Code', ''):
+                raise
+            faltan += ids   # Con un ID inexistente EC2 rechaza toda la consulta: se repiten todos
+            continue
+        elementos = respuesta[clave]
+        if operacion == 'describe_instances':
+            elementos = [i for r in elementos for i in r['Instances']]
+        vivos = set()
+        for e in elementos:
+            estado = e.get('State')
+            if (estado.get('Name') if isinstance(estado, dict) else estado) not in TERMINADOS:
+                vivos.add(e[campo])
+        faltan += [i for i in ids if i not in vivos]
+    return faltan
+
+
+def hash_entradas(entradas):
+    """Hash estable de un dict de entradas (orden de claves indiferente)"""
+    texto = json.dumps(entradas, sort_keys=True, default=str)
+    return hashlib.sha256(texto.encode()).hexdigest()[:16]
+
+
+class EstadoDespliegue:
+    """Registro persistente {paso: {'hash', 'valor', 'region', 'ts'}} de un despliegue."""
+
+    def __init__(self, nombre, directorio=DIRECTORIO_ESTADO):
+        self.ruta = os.path.join(directorio, f"{nombre}.jsonl")
+        self._lock = threading.Lock()
+        self._pasos = {}
+        if os.path.exists(self.ruta):
+            with open(self.ruta) as f:
+                for linea in f:
+                    if linea.strip():
+                        registro = json.loads(linea)
+                        self._pasos[registro['paso']] = registro
+
+    def _escribir(self):
+        # Llamar con el lock tomado
+        directorio = os.path.dirname(self.ruta)
+        os.makedirs(directorio, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directorio, prefix='.tmp-', suffix='.jsonl')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                for registro in self._pasos.values():
+                    f.write(json.dumps(registro, default=str) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.ruta)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def get(self, paso, entradas=None):
+        """Valor guardado del paso, o None si no existe o sus entradas cambiaron"""
+        registro = self._pasos.get(paso)
+        if registro is None:
+            return None
+        if entradas is not None and registro['hash'] != hash_entradas(entradas):
+            return None
+        return registro['valor']
+
+    def guardar(self, paso, valor, entradas=None, region=None, tipo=None):
+        with self._lock:
+            self._pasos[paso] = {
+                'paso': paso,
+                'tipo': tipo,
+                'region': region,
+                'hash': hash_entradas(entradas or {}),
+                'valor': valor,
+                'ts': time.time(),
+            }
+            self._escribir()
+
+    def olvidar(self, paso):
+        with self._lock:
+            if self._pasos.pop(paso, None) is not None:
+                self._escribir()
+
+    def reutilizable(self, paso, entradas=None, region=None, log=None):
+        """Valor guardado del paso si se puede reutilizar, o None si hay que (re)hacerlo.
+
+        Con region, los IDs guardados se comprueban con un describe: si alguno
+        ya no existe el paso se repite. Bloquea (llamadas a boto3).
+        """
+        valor = self.get(paso, entradas)
+        if valor is None:
+            return None
+        faltan = desaparecidos(valor, region) if region else []
+        if faltan:
+            if log:
+                log(f"[REANUDAR] '{paso}': {', '.join(faltan)} ya no {'existe' if len(faltan) == 1 else 'existen'}, "
+                    "se repite el paso.")
+            return None
+        if log:
+            log(f"[REANUDAR] '{paso}' ya estaba hecho ({valor}), se reutiliza.")
+        return valor
+
+    def paso(self, paso, entradas, funcion, region=None, tipo=None, log=None):
+        """Ejecuta funcion() solo si el paso no está ya hecho con las mismas entradas.
+
+        funcion() debe devolver algo serializable a JSON (IDs, dicts de IDs...).
+        Con region, los IDs guardados se comprueban antes de reutilizarlos.
+        """
+        valor = self.reutilizable(paso, entradas, region, log)
+        if valor is not None:
+            return valor
+        with metricas.en_paso(paso) as tramo:
+            valor = funcion()
+            tramo.anotar(valor)
+            tramo.region = region or tramo.region
+        self.guardar(paso, True if valor is None else valor, entradas, region=region, tipo=tipo)
+        return valor
+
+    def registros(self, tipo=None, region=None):
+        """Registros guardados, filtrados por tipo de recurso y/o región"""
+        return [
+            r for r in self._pasos.values()
+            if (tipo is None or r.get('tipo') == tipo) and (region is None or r.get('region') == region)
+        ]
+
+    def borrar(self):
+        """Elimina el fichero de estado (tras una limpieza completa)"""
+        with self._lock:
+            self._pasos = {}
+            if os.path.exists(self.ruta):
+                os.remove(self.ruta)
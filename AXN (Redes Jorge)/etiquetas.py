@@ -0,0 +1,62 @@
+"""Etiquetado en lote.
+
+Casi todos los create_* de EC2 aceptan TagSpecifications: el tag Name viaja
+en la misma llamada que crea el recurso y no hace falta un create_tags
+aparte por cada uno. especificacion() construye ese parámetro.
+
+Lo que no se puede etiquetar al crearlo (recursos que ya existían, o que
+EC2 crea por su cuenta como la tabla de rutas principal) se encola en
+ColaEtiquetas, que agrupa los recursos con el mismo conjunto de tags y
+los envía con un solo create_tags por grupo.
+"""
+import threading
+
+MAX_RECURSOS_POR_LLAMADA = 500
+
+
+def tags(nombre=None, **extra):
+    """Lista de tags de la API: Name (si se da) más los tags extra"""
+    lista = [{'Key': 'Name', 'Value': nombre}] if nombre is not None else []
+    return lista + [{'Key': k, 'Value': str(v)} for k, v in extra.items()]
+
+
+def especificacion(tipo_recurso, nombre=None, **extra):
+    """TagSpecifications para un create_* ('vpc', 'subnet', 'internet-gateway'...)"""
+    return [{'ResourceType': tipo_recurso, 'Tags': tags(nombre, **extra)}]
+
+
+class ColaEtiquetas:
+    """Tags pendientes que se envían agrupados en create_tags multi-recurso."""
+
+    def __init__(self, client, max_recursos=MAX_RECURSOS_POR_LLAMADA):
+        self.client = client
+        self.max_recursos = max_recursos
+        self._lock = threading.Lock()
+        self._grupos = {}  # tags (tupla ordenada) -> [IDs]
+
+    def encolar(self, recursos, nombre=None, **extra):
+        if isinstance(recursos, str):
+            recursos = [recursos]
+        clave = tuple(sorted((t['Key'], t['Value']) for t in tags(nombre, **extra)))
+        with self._lock:
+            self._grupos.setdefault(clave, []).extend(recursos)
+
+    def vaciar(self):
+        """Envía todo lo encolado; devuelve el número de llamadas create_tags"""
+        with self._lock:
+            grupos, self._grupos = self._grupos, {}
+        llamadas = 0
+        for clave, recursos in grupos.items():
+            recursos = list(dict.fromkeys(recursos))
+            for i in range(0, len(recursos), self.max_recursos):
+                self.client.create_tags(Resources=recursos[i:i + self.max_recursos],
+                                        Tags=[{'Key': k, 'Value': v} for k, v in clave])
+                llamadas += 1
+        return llamadas
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.vaciar()
+        return False
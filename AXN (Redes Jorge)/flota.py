@@ -0,0 +1,134 @@
+"""Lanzamiento de instancias en flota.
+
+Las instancias se declaran con Flota.anadir() y lanzar() agrupa las que
+comparten especificación (subred, SGs, IP pública y parámetros de
+run_instances) en una sola llamada con MinCount/MaxCount. Una petición de
+N copias en varias subredes se reparte entre ellas por turnos, y los
+grupos distintos se lanzan a la vez. esperar() sigue a toda la flota con
+un único describe_instances por sondeo (waiters.esperar_todos).
+
+El tag Name va en la propia llamada cuando todo el grupo se llama igual;
+si un grupo mezcla nombres, se etiqueta después con un create_tags por
+nombre (ColaEtiquetas).
+
+    flota = Flota(client, ImageId=AMI_ID, InstanceType='t3.micro', KeyName=KEY_NAME)
+    flota.anadir('lab', [sub_a, sub_b], [sg_lab], cantidad=50)
+    flota.anadir('bastion', sub_pub, [sg_pub], publica=True)
+    ids = flota.lanzar()    # {'lab': [50 IDs], 'bastion': [ID]}: 3 llamadas
+    flota.esperar()
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import metricas
+from etiquetas import ColaEtiquetas, especificacion
+from waiters import esperar_todos, estados_instancias
+
+# --- CONFIGURACIÓN ---
+MAX_WORKERS = 8           # Grupos de la flota lanzados a la vez
+ESTADOS_FALLIDOS = ('shutting-down', 'terminated', 'stopping', 'stopped')
+
+
+def esperar_running(client, ids, timeout=600, log=None):
+    """Espera a que todas las instancias estén running (un describe por sondeo)"""
+    return esperar_todos(estados_instancias(client), ids, listo={'running'}, fallido=ESTADOS_FALLIDOS,
+                         timeout=timeout, descripcion='instancias', log=log)
+
+
+class Flota:
+    """Instancias pendientes de lanzar, agrupadas por especificación."""
+
+    def __init__(self, client, max_workers=MAX_WORKERS, **comun):
+        """comun: parámetros de run_instances compartidos (ImageId, InstanceType, KeyName...)"""
+        self.client = client
+        self.max_workers = max_workers
+        self.comun = comun
+        self._grupos = {}       # especificación -> [(nombre, cantidad)]
+        self.instancias = {}    # nombre -> [IDs], tras lanzar()
+        self.llamadas = 0
+
+    def anadir(self, nombre, subredes, sgs=(), cantidad=1, publica=None, **extra):
+        """Pide 'cantidad' instancias llamadas 'nombre', repartidas entre las subredes.
+
+        publica: None usa lo que diga la subred (MapPublicIpOnLaunch);
+        True/False lo fuerza con una interfaz de red explícita.
+        extra: parámetros de run_instances propios de esta petición.
+        """
+        if isinstance(subredes, str):
+            subredes = [subredes]
+        if not subredes or cantidad < 1:
+            raise ValueError(f"'{nombre}': hacen falta subredes y cantidad >= 1")
+        if any(nombre == n for grupo in self._grupos.values() for n, _ in grupo):
+            raise ValueError(f"'{nombre}' ya está en la flota")
+        parametros = json.dumps(dict(self.comun, **extra), sort_keys=True, default=str)
+        for i, subred in enumerate(subredes):
+            n = cantidad // len(subredes) + (i < cantidad % len(subredes))
+            if n:
+                clave = (subred, tuple(sorted(sgs)), publica, parametros)
+                self._grupos.setdefault(clave, []).append((nombre, n))
+        return self
+
+    def grupos(self):
+        """[(especificación, [(nombre, cantidad)])]: una entrada por run_instances"""
+        return list(self._grupos.items())
+
+    def _argumentos(self, clave, miembros):
+        subred, sgs, publica, parametros = clave
+        total = sum(n for _, n in miembros)
+        kwargs = dict(json.loads(parametros), MinCount=total, MaxCount=total)
+        if publica is None:
+            kwargs['SubnetId'] = subred
+            if sgs:
+                kwargs['SecurityGroupIds'] = list(sgs)
+        else:
+            kwargs['NetworkInterfaces'] = [{'SubnetId': subred, 'DeviceIndex': 0,
+                                            'AssociatePublicIpAddress': publica, 'Groups': list(sgs)}]
+        nombres = {n for n, _ in miembros}
+        if len(nombres) == 1:
+            kwargs['TagSpecifications'] = especificacion('instance', nombres.pop())
+        return kwargs
+
+    def _lanzar_grupo(self, clave, miembros, cola):
+        respuesta = self.client.run_instances(**self._argumentos(clave, miembros))
+        ids = [i['InstanceId'] for i in respuesta['Instances']]
+        reparto, inicio = [], 0
+        for nombre, n in miembros:
+            reparto.append((nombre, ids[inicio:inicio + n]))
+            inicio += n
+        if len(miembros) > 1:
+            for nombre, suyos in reparto:
+                cola.encolar(suyos, nombre)
+        return reparto
+
+    def lanzar(self, log=None):
+        """Lanza todos los grupos a la vez y devuelve {nombre: [IDs]}.
+
+        Si algún grupo falla, lo ya lanzado queda en self.instancias y se
+        relanza el primer error.
+        """
+        grupos, self._grupos = self.grupos(), {}
+        if log:
+            total = sum(n for _, miembros in grupos for _, n in miembros)
+            log(f"Lanzando {total} instancias en {len(grupos)} llamadas run_instances...")
+        with ColaEtiquetas(self.client) as cola:
+            with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(grupos)))) as pool:
+                lanzar = metricas.con_contexto(self._lanzar_grupo)
+                futuros = [pool.submit(lanzar, clave, miembros, cola) for clave, miembros in grupos]
+            errores = []
+            for futuro in futuros:
+                if futuro.exception() is not None:
+                    errores.append(futuro.exception())
+                    continue
+                self.llamadas += 1
+                for nombre, ids in futuro.result():
+                    self.instancias.setdefault(nombre, []).extend(ids)
+        if errores:
+            raise errores[0]
+        return self.instancias
+
+    def ids(self):
+        return [i for ids in self.instancias.values() for i in ids]
+
+    def esperar(self, timeout=600, log=None):
+        """Espera a toda la flota con un solo sondeo agrupado; devuelve {id: estado}"""
+        return esperar_running(self.client, self.ids(), timeout=timeout, log=log)
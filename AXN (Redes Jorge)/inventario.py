@@ -0,0 +1,209 @@
+"""Inventario en memoria de los recursos de red EC2 de una región.
+
+En vez de lanzar describes filtrados cada vez que hace falta encontrar
+algo (VPC por tag, NACL de una subred, tabla principal de una VPC...), se
+descargan todos los recursos de la región con describes paginados y se
+indexan por ID, por tag, por VPC y por asociación de subred. Las
+búsquedas pasan a ser accesos a diccionario.
+
+El inventario se refresca por tipos y, opcionalmente, solo para algunas
+VPCs (refresco incremental), y se comparte por región dentro del proceso.
+"""
+import fnmatch
+import threading
+
+from clientes import cliente
+
+# tipo -> (operación describe, clave de la respuesta, campo ID, filtro por VPC)
+TIPOS = {
+    'vpcs': ('describe_vpcs', 'Vpcs', 'VpcId', 'vpc-id'),
+    'subnets': ('describe_subnets', 'Subnets', 'SubnetId', 'vpc-id'),
+    'route_tables': ('describe_route_tables', 'RouteTables', 'RouteTableId', 'vpc-id'),
+    'network_acls': ('describe_network_acls', 'NetworkAcls', 'NetworkAclId', 'vpc-id'),
+    'security_groups': ('describe_security_groups', 'SecurityGroups', 'GroupId', 'vpc-id'),
+    'internet_gateways': ('describe_internet_gateways', 'InternetGateways', 'InternetGatewayId', 'attachment.vpc-id'),
+    'nat_gateways': ('describe_nat_gateways', 'NatGateways', 'NatGatewayId', 'vpc-id'),
+    'network_interfaces': ('describe_network_interfaces', 'NetworkInterfaces', 'NetworkInterfaceId', 'vpc-id'),
+    'instances': ('describe_instances', 'Reservations', 'InstanceId', 'vpc-id'),
+    'transit_gateways': ('describe_transit_gateways', 'TransitGateways', 'TransitGatewayId', None),
+    'tgw_attachments': ('describe_transit_gateway_attachments', 'TransitGatewayAttachments', 'TransitGatewayAttachmentId', 'resource-id'),
+}
+
+
+def _vpc_de(tipo, recurso):
+    """VPC a la que pertenece un recurso (o None)"""
+    if tipo == 'internet_gateways':
+        adjuntos = recurso.get('Attachments', [])
+        return adjuntos[0]['VpcId'] if adjuntos else None
+    if tipo == 'tgw_attachments':
+        return recurso.get('ResourceId') if recurso.get('ResourceType') == 'vpc' else None
+    return recurso.get('VpcId')
+
+
+class Inventario:
+    """Índice en memoria de los recursos de red de una región."""
+
+    def __init__(self, region, client=None):
+        self.region = region
+        self.client = client or cliente('ec2', region)
+        self._lock = threading.RLock()
+        self._por_tipo = {tipo: {} for tipo in TIPOS}
+        self._zonas = None
+        self.cargado = False
+        self._reindexar()
+
+    # --- CARGA ---
+
+    def _describir(self, tipo, vpc_ids=None):
+        operacion, clave, campo_id, filtro_vpc = TIPOS[tipo]
+        kwargs = {}
+        if vpc_ids is not None:
+            kwargs['Filters'] = [{'Name': filtro_vpc, 'Values': list(vpc_ids)}]
+        if self.client.can_paginate(operacion):
+            paginas = self.client.get_paginator(operacion).paginate(**kwargs)
+        else:
+            paginas = [getattr(self.client, operacion)(**kwargs)]
+
+        recursos = {}
+        for pagina in paginas:
+            for r in pagina[clave]:
+                if tipo == 'instances':
+                    for i in r['Instances']:
+                        recursos[i['InstanceId']] = i
+                else:
+                    recursos[r[campo_id]] = r
+        return recursos
+
+    def refrescar(self, tipos=None, vpc_ids=None):
+        """Vuelve a descargar los tipos indicados (todos por defecto).
+
+        Con vpc_ids solo se descargan y sustituyen los recursos de esas VPCs;
+        el resto del índice se conserva tal cual.
+        """
+        tipos = list(TIPOS) if tipos is None else list(tipos)
+        if vpc_ids is not None:
+            vpc_ids = list(vpc_ids)
+            tipos = [t for t in tipos if TIPOS[t][3] is not None]
+            if not vpc_ids:
+                return self
+        nuevos = {tipo: self._describir(tipo, vpc_ids) for tipo in tipos}
+
+        with self._lock:
+            if vpc_ids is None and len(tipos) == len(TIPOS):
+                self.cargado = True
+            for tipo, recursos in nuevos.items():
+                if vpc_ids is None:
+                    self._por_tipo[tipo] = recursos
+                else:
+                    actuales = self._por_tipo[tipo]
+                    for rid in [i for i, r in actuales.items() if _vpc_de(tipo, r) in vpc_ids]:
+                        del actuales[rid]
+                    actuales.update(recursos)
+            self._reindexar()
+        return self
+
+    def registrar(self, tipo, recurso):
+        """Añade o actualiza un recurso recién creado sin hacer ningún describe"""
+        with self._lock:
+            self._por_tipo[tipo][recurso[TIPOS[tipo][2]]] = recurso
+            self._reindexar()
+
+    def olvidar(self, rid):
+        with self._lock:
+            for recursos in self._por_tipo.values():
+                recursos.pop(rid, None)
+            self._reindexar()
+
+    def _reindexar(self):
+        por_id, por_tag, por_vpc, asoc = {}, {}, {}, {}
+        for tipo, recursos in self._por_tipo.items():
+            for rid, r in recursos.items():
+                por_id[rid] = (tipo, r)
+                for tag in r.get('Tags', []):
+                    por_tag.setdefault((tag['Key'], tag['Value']), set()).add(rid)
+                vpc = _vpc_de(tipo, r)
+                if vpc:
+                    por_vpc.setdefault(vpc, {}).setdefault(tipo, set()).add(rid)
+
+        for rt_id, rt in self._por_tipo['route_tables'].items():
+            for a in rt.get('Associations', []):
+                if a.get('SubnetId'):
+                    asoc.setdefault(a['SubnetId'], {})['route_table'] = (rt_id, a['RouteTableAssociationId'])
+        for nacl_id, nacl in self._por_tipo['network_acls'].items():
+            for a in nacl.get('Associations', []):
+                if a.get('SubnetId'):
+                    asoc.setdefault(a['SubnetId'], {})['network_acl'] = (nacl_id, a['NetworkAclAssociationId'])
+
+        self._por_id, self._por_tag, self._por_vpc, self._asoc = por_id, por_tag, por_vpc, asoc
+
+    # --- BÚSQUEDAS (sin llamadas a AWS) ---
+
+    def get(self, rid):
+        """Recurso por ID (el dict tal cual lo devuelve el describe) o None"""
+        entrada = self._por_id.get(rid)
+        return entrada[1] if entrada else None
+
+    def todos(self, tipo):
+        return list(self._por_tipo[tipo].values())
+
+    def por_tag(self, clave, valor, tipo=None):
+        """IDs con el tag clave=valor (valor admite comodines: 'VPC-R1-*')"""
+        if any(c in valor for c in '*?['):
+            ids = {i for (k, v), s in self._por_tag.items() if k == clave and fnmatch.fnmatchcase(v, valor) for i in s}
+        else:
+            ids = self._por_tag.get((clave, valor), set())
+        if tipo is not None:
+            ids = {i for i in ids if self._por_id[i][0] == tipo}
+        return sorted(ids)
+
+    def vpcs_por_nombre(self, *nombres):
+        return [v for n in nombres for v in self.por_tag('Name', n, tipo='vpcs')]
+
+    def de_vpc(self, vpc_id, tipo):
+        """IDs de los recursos de un tipo que pertenecen a la VPC"""
+        return sorted(self._por_vpc.get(vpc_id, {}).get(tipo, ()))
+
+    def tabla_principal(self, vpc_id):
+        for rt_id in self.de_vpc(vpc_id, 'route_tables'):
+            if any(a.get('Main') for a in self._por_tipo['route_tables'][rt_id].get('Associations', [])):
+                return rt_id
+        return None
+
+    def nacl_de_subred(self, subnet_id):
+        """(nacl_id, association_id) de la NACL asociada a la subred, o None"""
+        return self._asoc.get(subnet_id, {}).get('network_acl')
+
+    def tabla_de_subred(self, subnet_id):
+        """(route_table_id, association_id) explícita de la subred, o None si usa la principal"""
+        return self._asoc.get(subnet_id, {}).get('route_table')
+
+    def zonas_disponibles(self):
+        """Zonas de disponibilidad 'available' (se consultan una sola vez por región)"""
+        with self._lock:
+            if self._zonas is None:
+                azs = self.client.describe_availability_zones(Filters=[{'Name': 'state', 'Values': ['available']}])
+                self._zonas = [z['ZoneName'] for z in azs['AvailabilityZones']]
+            return list(self._zonas)
+
+
+_inventarios = {}
+_inventarios_lock = threading.Lock()
+
+
+def inventario(region, client=None, cargar=True):
+    """Inventario compartido de la región (se descarga completo la primera vez)"""
+    with _inventarios_lock:
+        inv = _inventarios.get(region)
+        if inv is None:
+            inv = _inventarios[region] = Inventario(region, client)
+    # La carga inicial se hace fuera del lock global para no bloquear otras regiones
+    with inv._lock:
+        if cargar and not inv.cargado:
+            inv.refrescar()
+    return inv
+
+
+def limpiar():
+    """Olvida los inventarios de todas las regiones (y sus clientes)"""
+    with _inventarios_lock:
+        _inventarios.clear()
@@ -0,0 +1,161 @@
+"""Limitador de peticiones (token bucket) por región y familia de acciones.
+
+EC2 limita las llamadas por cuenta y región con cubos de tokens separados
+por tipo de acción: las consultas (Describe*...) tienen un cubo, las que
+modifican recursos otro y las más costosas (RunInstances...) otro más
+pequeño. Con despliegues y limpiezas en paralelo es fácil vaciarlos y
+recibir RequestLimitExceeded.
+
+Aquí se replica ese esquema en el cliente: cada petición toma un token
+del cubo (región, familia) antes de enviarse y espera si no hay. Si aun
+así AWS responde con throttling, la tasa de ese cubo se reduce a la mitad
+y luego se recupera poco a poco con cada respuesta correcta (AIMD). El
+modo 'adaptive' de botocore limita el cliente entero y solo después del
+primer throttling; esto separa familias y regiones y frena desde el
+principio, así que una ráfaga de create_route no retrasa los describe.
+
+clientes.cliente() lo instala en los clientes compartidos de SERVICIOS
+mediante los eventos de botocore; no hay que tocar las llamadas.
+"""
+import threading
+import time
+from functools import partial
+
+# --- CONFIGURACIÓN ---
+# familia (o nombre de acción concreto, p. ej. 'CreateRoute') -> (tokens por segundo, ráfaga)
+# Valores aproximados a los cubos por defecto de EC2 por cuenta y región.
+TASAS = {
+    'consultas': (20.0, 100),
+    'mutaciones': (5.0, 50),
+    'intensivas': (2.0, 20),
+}
+SERVICIOS = {'ec2'}
+ACCIONES_INTENSIVAS = {
+    'RunInstances', 'StartInstances', 'StopInstances', 'RebootInstances', 'TerminateInstances',
+    'CreateVolume', 'AttachVolume', 'DetachVolume', 'DeleteVolume',
+}
+PREFIJOS_CONSULTA = ('Describe', 'Get', 'List', 'Search')
+CODIGOS_THROTTLING = {'RequestLimitExceeded', 'Throttling', 'ThrottlingException', 'TooManyRequestsException'}
+FACTOR_REDUCCION = 0.5    # Tasa tras un throttling
+RECUPERACION = 0.05       # Fracción de la tasa configurada que se recupera por respuesta correcta
+TASA_MINIMA = 0.2         # Nunca por debajo de 1 petición cada 5 s
+
+
+class CuboTokens:
+    """Token bucket thread-safe con tasa adaptable."""
+
+    def __init__(self, tasa, rafaga):
+        self.tasa_maxima = float(tasa)
+        self.tasa = float(tasa)
+        self.rafaga = rafaga
+        self.tokens = float(rafaga)
+        self.esperado = 0.0      # Segundos esperados en total
+        self.limitaciones = 0    # Throttlings recibidos
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _rellenar(self):
+        ahora = time.monotonic()
+        self.tokens = min(self.rafaga, self.tokens + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+
+    def tomar(self):
+        """Consume un token, esperando lo necesario si el cubo está vacío"""
+        while True:
+            with self._lock:
+                self._rellenar()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                pausa = (1 - self.tokens) / self.tasa
+                self.esperado += pausa
+            time.sleep(pausa)
+
+    def reducir(self):
+        """Throttling de AWS: baja la tasa y vacía el cubo"""
+        with self._lock:
+            self._rellenar()
+            self.tasa = max(TASA_MINIMA, self.tasa * FACTOR_REDUCCION)
+            self.tokens = 0.0
+            self.limitaciones += 1
+
+    def recuperar(self):
+        """Respuesta correcta: la tasa vuelve poco a poco a la configurada"""
+        if self.tasa < self.tasa_maxima:
+            with self._lock:
+                self._rellenar()
+                self.tasa = min(self.tasa_maxima, self.tasa + self.tasa_maxima * RECUPERACION)
+
+
+_cubos = {}   # (región, familia) -> CuboTokens
+_lock = threading.Lock()
+
+
+def familia(accion):
+    """Cubo al que pertenece una acción de la API ('DescribeVpcs' -> 'consultas')"""
+    if accion in TASAS:
+        return accion
+    if accion in ACCIONES_INTENSIVAS:
+        return 'intensivas'
+    if accion.startswith(PREFIJOS_CONSULTA):
+        return 'consultas'
+    return 'mutaciones'
+
+
+def cubo(region, nombre_familia):
+    clave = (region, nombre_familia)
+    existente = _cubos.get(clave)
+    if existente is not None:
+        return existente
+    with _lock:
+        if clave not in _cubos:
+            _cubos[clave] = CuboTokens(*TASAS[nombre_familia])
+        return _cubos[clave]
+
+
+def configurar(nombre, tasa, rafaga):
+    """Cambia (o crea, con un nombre de acción) la tasa de una familia; afecta a los cubos nuevos"""
+    with _lock:
+        TASAS[nombre] = (tasa, rafaga)
+        for clave in [c for c in _cubos if c[1] == nombre]:
+            del _cubos[clave]
+
+
+def _antes_de_enviar(region, event_name, **kwargs):
+    # before-send.<servicio>.<Acción>: se emite en cada intento, también en los reintentos
+    cubo(region, familia(event_name.rsplit('.', 1)[-1])).tomar()
+
+
+def _tras_respuesta(region, operation, response=None, **kwargs):
+    # needs-retry: no devolver nada (un valor sería la pausa del reintento)
+    if response is None:
+        return
+    codigo = response[1].get('Error', {}).get('Code')
+    if codigo in CODIGOS_THROTTLING:
+        cubo(region, familia(operation.name)).reducir()
+    elif codigo is None:
+        cubo(region, familia(operation.name)).recuperar()
+
+
+def instalar(client):
+    """Engancha el limitador a los eventos de un cliente boto3"""
+    servicio = client.meta.service_model.service_id.hyphenize()
+    region = client.meta.region_name
+    client.meta.events.register(f'before-send.{servicio}', partial(_antes_de_enviar, region),
+                                unique_id=f'limitador-envio-{servicio}-{region}')
+    client.meta.events.register(f'needs-retry.{servicio}', partial(_tras_respuesta, region),
+                                unique_id=f'limitador-respuesta-{servicio}-{region}')
+    return client
+
+
+def resumen():
+    """{(región, familia): {tasa, esperado, limitaciones}} para ver dónde se ha frenado"""
+    with _lock:
+        return {clave: {'tasa': round(c.tasa, 2), 'esperado': round(c.esperado, 2),
+                        'limitaciones': c.limitaciones}
+                for clave, c in _cubos.items()}
+
+
+def limpiar():
+    with _lock:
+        _cubos.clear()
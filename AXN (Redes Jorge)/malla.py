@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Generador de mallas de Transit Gateway: N regiones x M VPCs.
+
+A partir de un número de regiones y de VPCs por región genera la
+configuración completa que consume MRtransit_gateway_multiregion.main():
+VPCs con CIDRs sin solapes (direcciones.plan_direcciones, un bloque
+resumible por región), un TGW por región y el conjunto de peerings,
+full-mesh o hub-and-spoke. Las rutas (resumidas por región) las calcula
+MRtransit.compute_routes a partir de los peerings, y el despliegue va por
+su DAG, así que el tiempo crece con el camino crítico y no con el número
+de VPCs.
+
+Uso:
+    python3 malla.py 10 20 --salida malla.json              # solo genera
+    python3 malla.py 3 4 --modo hub-and-spoke --comprobar    # rutas offline
+    python3 malla.py 10 20 --desplegar --max-workers 32
+    python3 malla.py 10 20 --desplegar --backend asyncio     # esperas sin un hilo cada una
+"""
+import argparse
+import json
+from itertools import combinations
+
+from direcciones import plan_direcciones
+
+# --- CONFIGURACIÓN ---
+REGIONES_AWS = [
+    'us-east-1', 'us-west-2', 'eu-west-1', 'eu-central-1', 'ap-southeast-1', 'ap-northeast-1',
+    'us-east-2', 'us-west-1', 'eu-west-2', 'ap-south-1', 'ap-southeast-2', 'ca-central-1',
+    'eu-north-1', 'sa-east-1', 'eu-west-3', 'ap-northeast-2',
+]
+SUPERBLOQUE = '10.0.0.0/8'
+PREFIJO_VPC = 20       # 10 regiones x 20 VPCs (bloques de 32 /20 por región) caben en un /8
+PREFIJO_SUBRED = 24
+ASN_BASE = 64512
+MODOS = ('full-mesh', 'hub-and-spoke')
+
+
+def generar(regiones, vpcs_por_region, modo='full-mesh', hub=None, superbloque=SUPERBLOQUE,
+            prefijo_vpc=PREFIJO_VPC, prefijo_subred=PREFIJO_SUBRED, asn_base=ASN_BASE):
+    """{'regions': [formato de REGIONS_CONFIG + 'summary'], 'peerings': [[a, b], ...]}
+
+    regiones: número (se toman de REGIONES_AWS) o lista de nombres.
+    """
+    if isinstance(regiones, int):
+        if regiones > len(REGIONES_AWS):
+            raise ValueError(f"Solo hay {len(REGIONES_AWS)} regiones en REGIONES_AWS")
+        regiones = REGIONES_AWS[:regiones]
+    if modo not in MODOS:
+        raise ValueError(f"modo {modo!r}: {' o '.join(MODOS)}")
+
+    nombres = {r: [f"VPC-{r}-{i + 1}" for i in range(vpcs_por_region)] for r in regiones}
+    plan = plan_direcciones({r: {v: 1 for v in vpcs} for r, vpcs in nombres.items()},
+                            superbloque, prefijo_vpc, prefijo_subred)
+    config = [{
+        'region': r, 'asn': asn_base + i, 'tgw_name': f"TGW-{r}", 'summary': plan.regiones[r],
+        'vpcs': [{'name': v, 'vpc_cidr': plan.vpcs[v], 'subnet_cidr': plan.subredes[(v, 'subred-0')]}
+                 for v in nombres[r]],
+    } for i, r in enumerate(regiones)]
+
+    if modo == 'full-mesh':
+        peerings = [list(p) for p in combinations(regiones, 2)]
+    else:
+        hub = hub or regiones[0]
+        if hub not in regiones:
+            raise ValueError(f"El hub {hub} no está entre las regiones")
+        peerings = [[hub, r] for r in regiones if r != hub]
+    return {'regions': config, 'peerings': peerings}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera (y opcionalmente despliega) una malla de TGWs")
+    parser.add_argument('regiones', type=int)
+    parser.add_argument('vpcs_por_region', type=int)
+    parser.add_argument('--modo', choices=MODOS, default='full-mesh')
+    parser.add_argument('--hub', help="región hub en hub-and-spoke (por defecto la primera)")
+    parser.add_argument('--superbloque', default=SUPERBLOQUE)
+    parser.add_argument('--prefijo-vpc', type=int, default=PREFIJO_VPC)
+    parser.add_argument('--salida', help="fichero JSON para MRtransit_gateway_multiregion.py")
+    parser.add_argument('--comprobar', action='store_true', help="alcanzabilidad offline de todas las parejas")
+    parser.add_argument('--desplegar', action='store_true')
+    parser.add_argument('--max-workers', type=int, default=16)
+    parser.add_argument('--backend', choices=['hilos', 'asyncio'], default='hilos',
+                        help="asyncio: todas las esperas de la malla en un solo bucle de eventos")
+    args = parser.parse_args()
+
+    malla = generar(args.regiones, args.vpcs_por_region, args.modo, args.hub,
+                    args.superbloque, args.prefijo_vpc)
+    peerings = [tuple(p) for p in malla['peerings']]
+    total = sum(len(r['vpcs']) for r in malla['regions'])
+    print(f"Malla {args.modo}: {len(malla['regions'])} regiones, {total} VPCs, {len(peerings)} peerings")
+    for r in malla['regions']:
+        print(f"  {r['region']:<16} {r['summary']:<16} {len(r['vpcs'])} VPCs")
+
+    if args.salida:
+        with open(args.salida, 'w') as f:
+            json.dump(malla, f, indent=2)
+        print(f"Configuración guardada en {args.salida}")
+
+    import MRtransit_gateway_multiregion as mrtransit
+    if args.comprobar:
+        from rutas import imprimir_informe
+        if not imprimir_informe(mrtransit.modelo_rutas(malla['regions'], peerings)):
+            raise SystemExit(1)
+    if args.desplegar:
+        import metricas
+        import trazas
+        with trazas.ejecucion(f"malla-{args.regiones}x{args.vpcs_por_region}"):
+            mrtransit.main(malla['regions'], max_workers=args.max_workers, peerings=peerings, backend=args.backend)
+        metricas.resumen()
+        print("Métricas en %s y %s" % metricas.exportar(f"malla-{args.regiones}x{args.vpcs_por_region}"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Mide lo que cuesta importar cada script (sin desplegar nada).
+
+Cada módulo se importa en un intérprete nuevo y se comprueba que:
+  - el import cabe en el presupuesto de arranque (PRESUPUESTO_MS),
+  - no se ha creado ningún cliente boto3 ni se ha importado boto3.
+
+Uso:
+    python3 medir_arranque.py [--presupuesto-ms 100] [modulo ...]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# --- CONFIGURACIÓN ---
+PRESUPUESTO_MS = 100
+MODULOS = [
+    'ejercicio1_arquitectura', 'ejercicio2_nacls', 'ejercicio3_tgw_multiregion', 'Examen',
+    'MRtransit_gateway_multiregion', 'cleanup_ejercicio1', 'cleanup_ejercicio2',
+    'cleanup_ejercicio3', 'MRcleanup_transit_gateway', 'cleanup_lote',
+]
+
+# Se ejecuta en el intérprete hijo: tiempo del import y si boto3 llegó a cargarse
+_SONDA = """
+import json, sys, time
+inicio = time.perf_counter()
+import {modulo}
+ms = (time.perf_counter() - inicio) * 1000
+print(json.dumps({{'ms': ms, 'boto3': 'boto3' in sys.modules}}))
+"""
+
+
+def medir(modulo):
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    salida = subprocess.run([sys.executable, '-c', _SONDA.format(modulo=modulo)], cwd=directorio,
+                            capture_output=True, text=True, check=True)
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Presupuesto de arranque de los scripts")
+    parser.add_argument('modulos', nargs='*', default=MODULOS)
+    parser.add_argument('--presupuesto-ms', type=float, default=PRESUPUESTO_MS)
+    args = parser.parse_args()
+
+    fallos = 0
+    for modulo in args.modulos:
+        r = medir(modulo)
+        ok = r['ms'] <= args.presupuesto_ms and not r['boto3']
+        fallos += not ok
+        aviso = " (importa boto3)" if r['boto3'] else ""
+        print(f"{modulo:<32} {r['ms']:>8.1f} ms  {'OK' if ok else 'FUERA DE PRESUPUESTO'}{aviso}")
+    print(f"Presupuesto: {args.presupuesto_ms:.0f} ms por módulo, {fallos} fuera.")
+    sys.exit(1 if fallos else 0)
+
+
+if __name__ == '__main__':
+    main()
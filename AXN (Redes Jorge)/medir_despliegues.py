@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""Banco de pruebas de los despliegues y limpiezas contra un EC2 simulado.
+
+Cada escenario despliega y limpia una topología con cli.py sobre moto
+(pip install 'moto[ec2]'), sin tocar AWS. moto responde al instante, así
+que aquí se le añade lo que hace lentos los despliegues reales:
+    - latencia por llamada (--latencia),
+    - retrasos en los cambios de estado: un NAT, un TGW o una instancia
+      recién creados siguen 'pending' durante N segundos (--retraso nat=30),
+    - throttling: un token bucket por región que responde
+      RequestLimitExceeded como EC2 (--throttling 20,40; 0 lo quita).
+
+De cada escenario se mide tiempo total, llamadas a la API, pico de
+llamadas en vuelo, throttlings, reintentos y tiempo esperando estados.
+ejercicio1, ejercicio2, examen y ejercicio3 tienen tamaño fijo; mrtransit
+se mide a varias escalas (--escalas 1 10 100 VPCs, repartidas entre
+regiones con malla.generar).
+
+Con --virtual no hace falta moto: los escenarios corren sobre
+simulador_ec2, con los tiempos de estado reales de EC2 (un NAT tarda
+3 minutos) en un reloj virtual. 'tiempo' es entonces lo que habría
+tardado contra AWS y cada escenario dura menos de un segundo de verdad
+(columna 'reales'). Ahí no hay throttling: el simulador responde antes de
+la capa de reintentos de botocore.
+
+Cada escenario corre en un intérprete nuevo sobre una copia temporal de
+los scripts: estado, métricas, trazas y cachés no se mezclan entre
+escenarios ni con los ficheros de .estado/ del directorio real.
+
+Líneas base: --guardar-base escribe los resultados en BASE (JSON) y
+--comparar falla (código 1) si un escenario es más lento o hace más
+llamadas que su línea base por encima de las tolerancias.
+
+Uso:
+    python3 medir_despliegues.py                              # todo, perfil por defecto
+    python3 medir_despliegues.py ejercicio1 mrtransit --escalas 1 10
+    python3 medir_despliegues.py --latencia 0.05 --retraso nat=20 --throttling 10,20
+    python3 medir_despliegues.py --guardar-base               # tras un cambio aceptado
+    python3 medir_despliegues.py --comparar                   # en CI / antes de subir
+    python3 medir_despliegues.py --virtual --comparar         # lo mismo en segundos, sin moto
+"""
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# --- CONFIGURACIÓN ---
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+BASE = os.path.join(DIRECTORIO, 'medir_despliegues_base.json')
+BASE_VIRTUAL = os.path.join(DIRECTORIO, 'medir_despliegues_virtual.json')
+TOPOLOGIAS = ['ejercicio1', 'ejercicio2', 'examen', 'ejercicio3', 'mrtransit']
+ESCALAS = [1, 10, 100]          # VPCs de mrtransit
+VPCS_POR_REGION = 25            # Reparto de las VPCs de mrtransit entre regiones
+LATENCIA = 0.02                 # Segundos por llamada
+RETRASOS = {'nat': 5.0, 'tgw': 5.0, 'vpc-attachment': 3.0, 'peering': 3.0, 'instance': 2.0}
+THROTTLING = (50.0, 100.0)      # Llamadas/s y ráfaga por región (None: sin throttling)
+TOLERANCIA_TIEMPO = 0.25        # +25 % de tiempo sobre la línea base es regresión...
+MARGEN_TIEMPO = 10.0            # ...y además más de estos segundos (el jitter de las esperas)
+TOLERANCIA_LLAMADAS = 0.05      # +5 % de llamadas
+TIMEOUT = 1800                  # Segundos por escenario
+
+# tipo -> (creación, clave de la respuesta, descripción, clave de la lista, campo del ID, estado intermedio, final)
+TRANSICIONES = {
+    'nat': ('CreateNatGateway', 'NatGateway', 'DescribeNatGateways', 'NatGateways',
+            'NatGatewayId', 'pending', 'available'),
+    'tgw': ('CreateTransitGateway', 'TransitGateway', 'DescribeTransitGateways', 'TransitGateways',
+            'TransitGatewayId', 'pending', 'available'),
+    'vpc-attachment': ('CreateTransitGatewayVpcAttachment', 'TransitGatewayVpcAttachment',
+                       'DescribeTransitGatewayVpcAttachments', 'TransitGatewayVpcAttachments',
+                       'TransitGatewayAttachmentId', 'pending', 'available'),
+    'peering': ('CreateTransitGatewayPeeringAttachment', 'TransitGatewayPeeringAttachment',
+                'DescribeTransitGatewayPeeringAttachments', 'TransitGatewayPeeringAttachments',
+                'TransitGatewayAttachmentId', 'initiatingRequest', 'pendingAcceptance'),
+    'instance': ('RunInstances', 'Instances', 'DescribeInstances', 'Reservations',
+                 'InstanceId', 'pending', 'running'),
+}
+
+# AMI de Ubuntu que buscan MRtransit (get_ubuntu_ami) y los demás scripts
+AMI_UBUNTU = {
+    'ami_id': 'ami-0bench0ubuntu2204', 'name': 'ubuntu/images/hvm-ssd/ubuntu-jammy-22.04-amd64-server-20240101',
+    'description': 'Ubuntu 22.04 (banco de pruebas)', 'owner_id': '099720109477', 'public': True,
+    'virtualization_type': 'hvm', 'architecture': 'x86_64', 'state': 'available', 'platform': None,
+    'image_type': 'machine', 'hypervisor': 'xen', 'root_device_name': '/dev/sda1', 'root_device_type': 'ebs',
+    'sriov': 'simple', 'creation_date': '2024-01-01T00:00:00.000Z',
+}
+
+
+def escenarios(topologias, escalas):
+    """[(nombre, topología, config de cli.py)]"""
+    resultado = []
+    for topologia in topologias:
+        if topologia != 'mrtransit':
+            resultado.append((topologia, topologia, {}))
+            continue
+        from malla import generar
+        for vpcs in escalas:
+            regiones = max(1, -(-vpcs // VPCS_POR_REGION))
+            por_region = [vpcs // regiones + (i < vpcs % regiones) for i in range(regiones)]
+            malla = generar(regiones, max(por_region))
+            for config, n in zip(malla['regions'], por_region):
+                config['vpcs'] = config['vpcs'][:n]
+            resultado.append((f"mrtransit-{vpcs}", 'mrtransit', {
+                'mrtransit': {'REGIONS_CONFIG': malla['regions']},
+                'regions': [c['region'] for c in malla['regions']],
+            }))
+    return resultado
+
+
+# --- INTÉRPRETE HIJO: un escenario sobre moto ---
+
+class _Crudo:
+    """Cuerpo de una respuesta HTTP fabricada (lo que botocore lee con stream())"""
+
+    def __init__(self, cuerpo):
+        self._cuerpo = cuerpo
+
+    def stream(self, **kwargs):
+        yield self._cuerpo
+
+
+class Simulador:
+    """Latencia, retrasos de estado y throttling encima de moto, vía eventos de botocore."""
+
+    def __init__(self, latencia, retrasos, throttling):
+        import threading
+        self.latencia = latencia
+        self.retrasos = retrasos
+        self.throttling = throttling
+        self._lock = threading.Lock()
+        self._cubos = {}       # región -> [tokens, último relleno]
+        self._creados = {}     # (tipo, id) -> instante en que termina su transición
+        self.en_vuelo = 0
+        self.pico = 0
+        self.llamadas = 0
+        self.throttlings = 0
+
+    def instalar(self):
+        """Se mete en los handlers de todas las sesiones de botocore que se creen a partir de ahora.
+
+        Sustituye al stubber de moto en 'before-send' y lo llama solo si la
+        petición no se limita: botocore ejecuta todos los handlers de un
+        evento, y si moto la viera crearía el recurso aunque la respuesta
+        fuera un throttling (y otra vez en el reintento).
+        """
+        from botocore import handlers
+        from moto.core.models import botocore_stubber
+        self._moto = botocore_stubber
+        handlers.BUILTIN_HANDLERS[:] = [h for h in handlers.BUILTIN_HANDLERS if h[1] is not botocore_stubber] + [
+            ('before-send', self._enviar), ('before-call', self._antes),
+            ('after-call', self._despues), ('after-call-error', self._despues_error),
+        ]
+
+    def _antes(self, **kwargs):
+        with self._lock:
+            self.llamadas += 1
+            self.en_vuelo += 1
+            self.pico = max(self.pico, self.en_vuelo)
+
+    def _despues_error(self, **kwargs):
+        with self._lock:
+            self.en_vuelo -= 1
+
+    def _throttled(self, region):
+        if not self.throttling:
+            return False
+        tasa, rafaga = self.throttling
+        ahora = time.monotonic()
+        with self._lock:
+            tokens, ultimo = self._cubos.get(region, (rafaga, ahora))
+            tokens = min(rafaga, tokens + (ahora - ultimo) * tasa)
+            if tokens < 1:
+                self._cubos[region] = (tokens, ahora)
+                self.throttlings += 1
+                return True
+            self._cubos[region] = (tokens - 1, ahora)
+            return False
+
+    def _enviar(self, event_name=None, request=None, **kwargs):
+        from botocore.awsrequest import AWSResponse
+        if self.latencia:
+            time.sleep(self.latencia)
+        host = request.url.split('/')[2]
+        region = host.split('.')[1] if host.count('.') >= 3 else 'us-east-1'
+        if host.startswith('ec2.') and self._throttled(region):
+            cuerpo = (b'<?xml version="1.0" encoding="UTF-8"?><Response><Errors><Error>'
+                      b'<Code>RequestLimitExceeded</Code><Message>Request limit exceeded.</Message>'
+                      b'</Error></Errors><RequestID>simulado</RequestID></Response>')
+            return AWSResponse(request.url, 503, {}, _Crudo(cuerpo))
+        respuesta = self._moto(event_name, request, **kwargs)
+        if host.startswith('ec2.') and respuesta is not None and respuesta.status_code == 200:
+            self._corregir_moto(region, request.body)
+        return respuesta
+
+    @staticmethod
+    def _corregir_moto(region, cuerpo):
+        # moto deja las asociaciones de NACL de las subredes borradas y el NACL ya no se puede
+        # borrar (DependencyViolation). En EC2 borrar la subred quita su asociación.
+        from urllib.parse import parse_qs
+        if isinstance(cuerpo, bytes):
+            cuerpo = cuerpo.decode()
+        peticion = parse_qs(cuerpo or '')
+        if peticion.get('Action') != ['DeleteSubnet']:
+            return
+        from moto.core import DEFAULT_ACCOUNT_ID
+        from moto.ec2.models import ec2_backends
+        subred = peticion['SubnetId'][0]
+        for acl in ec2_backends[DEFAULT_ACCOUNT_ID][region].network_acls.values():
+            for clave in [k for k, a in acl._associations.items() if a.subnet_id == subred]:
+                del acl._associations[clave]
+
+    def _despues(self, model=None, parsed=None, **kwargs):
+        with self._lock:
+            self.en_vuelo -= 1
+        if parsed is None or 'Error' in parsed:
+            return
+        ahora = time.monotonic()
+        for tipo, (crear, clave, describir, lista, campo, intermedio, final) in TRANSICIONES.items():
+            retraso = self.retrasos.get(tipo, 0)
+            if not retraso:
+                continue
+            if model.name == crear:
+                elementos = parsed.get(clave) or []
+                for elemento in elementos if isinstance(elementos, list) else [elementos]:
+                    self._creados[(tipo, elemento[campo])] = ahora + retraso
+            elif model.name == describir:
+                elementos = parsed.get(lista, [])
+                if tipo == 'instance':
+                    elementos = [i for r in elementos for i in r.get('Instances', [])]
+                for elemento in elementos:
+                    if self._creados.get((tipo, elemento.get(campo)), 0) <= ahora:
+                        continue
+                    if tipo == 'instance' and elemento['State']['Name'] == final:
+                        elemento['State'] = {'Code': 0, 'Name': intermedio}
+                    elif elemento.get('State') == final:
+                        elemento['State'] = intermedio
+
+
+def _desplegar_y_limpiar(topologia, config, salida, reloj=time.monotonic):
+    """deploy + destroy con cli.py; duración de cada fase (según reloj), reintentos y esperas (error si falla)"""
+    import contextlib
+    import cli
+    import metricas
+    ruta_config = os.path.join(os.getcwd(), 'config.json')
+    with open(ruta_config, 'w') as f:
+        json.dump(config, f)
+    medidas = {'fases': {}, 'reintentos': 0, 'espera_estados': 0.0}
+    inicio = reloj()
+    try:
+        for orden in ('deploy', 'destroy'):
+            comienzo = reloj()
+            try:
+                with contextlib.redirect_stdout(salida):
+                    cli.main([orden, topologia, '--config', ruta_config])
+            finally:
+                # cli.main vacía las métricas al empezar: se recogen tras cada fase
+                datos = metricas.informe()
+                medidas['reintentos'] += sum(c['reintentos'] for c in datos['llamadas'])
+                medidas['espera_estados'] += sum(e['segundos'] for e in datos['esperas'])
+            medidas['fases'][orden] = reloj() - comienzo
+    except BaseException as e:
+        medidas['error'] = f"{type(e).__name__}: {e}"
+    medidas['segundos'] = reloj() - inicio
+    return medidas
+
+
+def ejecutar_escenario(parametros):
+    """En el hijo: despliega y limpia una topología sobre moto y devuelve las medidas"""
+    import io
+    directorio = os.getcwd()
+    amis = os.path.join(directorio, 'amis.json')
+    with open(amis, 'w') as f:
+        json.dump([AMI_UBUNTU], f)
+    os.environ.update(AWS_ACCESS_KEY_ID='banco', AWS_SECRET_ACCESS_KEY='banco', AWS_SESSION_TOKEN='banco',
+                      AWS_DEFAULT_REGION='us-east-1', MOTO_AMIS_PATH=amis, MOTO_EC2_ALLOW_UNKNOWN_AMI='true')
+    os.environ.pop('AWS_PROFILE', None)
+    from moto import mock_aws
+    simulador = Simulador(parametros['latencia'], parametros['retrasos'], parametros['throttling'])
+    simulador.instalar()
+
+    salida = io.StringIO()
+    with mock_aws():
+        import clientes
+        import metricas
+        clientes.cliente('iam').create_instance_profile(InstanceProfileName='LabInstanceProfile')
+        metricas.limpiar()
+        simulador.llamadas = simulador.pico = simulador.throttlings = 0
+        medidas = _desplegar_y_limpiar(parametros['topologia'], parametros['config'], salida)
+    medidas.update(llamadas=simulador.llamadas, pico=simulador.pico, throttlings=simulador.throttlings)
+    if 'error' in medidas:
+        medidas['salida'] = salida.getvalue()[-2000:]
+    return medidas
+
+
+def ejecutar_virtual(parametros):
+    """En el hijo: lo mismo sobre simulador_ec2, en segundos virtuales"""
+    import io
+    import random
+
+    import simulador_ec2
+    random.seed(0)   # El jitter de las esperas también decide el tiempo virtual: mismas cifras en cada medida
+    salida = io.StringIO()
+    inicio = time.perf_counter()
+    with simulador_ec2.simular(creacion=parametros['retrasos'], latencia=parametros['latencia']) as aws:
+        medidas = _desplegar_y_limpiar(parametros['topologia'], parametros['config'], salida, aws.reloj.monotonic)
+        medidas.update(llamadas=sum(aws.llamadas.values()), pico=aws.pico, throttlings=0, restos=aws.resumen(),
+                       errores_api=dict(aws.errores))
+    medidas['reales'] = time.perf_counter() - inicio
+    if 'error' in medidas:
+        medidas['salida'] = salida.getvalue()[-2000:]
+    return medidas
+
+
+# --- PROCESO PRINCIPAL ---
+
+def medir(nombre, topologia, config, args):
+    """Lanza el escenario en un intérprete nuevo sobre una copia de los scripts"""
+    parametros = {'topologia': topologia, 'config': config, 'latencia': args.latencia,
+                  'retrasos': args.retrasos, 'throttling': args.throttling, 'virtual': args.virtual}
+    with tempfile.TemporaryDirectory(prefix=f"banco-{nombre}-") as copia:
+        for fichero in os.listdir(DIRECTORIO):
+            if fichero.endswith('.py'):
+                shutil.copy(os.path.join(DIRECTORIO, fichero), copia)
+        proceso = subprocess.run([sys.executable, os.path.join(copia, os.path.basename(__file__)), '--hijo',
+                                  json.dumps(parametros)], cwd=copia, capture_output=True, text=True,
+                                 timeout=args.timeout)
+    try:
+        return json.loads(proceso.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        return {'error': f"el escenario terminó con código {proceso.returncode}", 'salida': proceso.stderr[-2000:]}
+
+
+def comparar(resultados, base, tolerancia_tiempo, tolerancia_llamadas, margen=MARGEN_TIEMPO):
+    """Mensajes de regresión frente a la línea base"""
+    regresiones = []
+    for nombre, r in resultados.items():
+        b = base.get(nombre)
+        if not b or 'error' in r:
+            continue
+        if r['segundos'] > max(b['segundos'] * (1 + tolerancia_tiempo), b['segundos'] + margen):
+            regresiones.append(f"{nombre}: {r['segundos']:.1f} s frente a {b['segundos']:.1f} s de base")
+        if r['llamadas'] > b['llamadas'] * (1 + tolerancia_llamadas):
+            regresiones.append(f"{nombre}: {r['llamadas']} llamadas frente a {b['llamadas']} de base")
+    return regresiones
+
+
+def _retraso(texto):
+    tipo, _, segundos = texto.partition('=')
+    if tipo not in TRANSICIONES or not segundos:
+        raise argparse.ArgumentTypeError(f"{texto!r}: tipo=segundos con tipo en {sorted(TRANSICIONES)}")
+    return tipo, float(segundos)
+
+
+def _throttling(texto):
+    if texto in ('0', 'no'):
+        return None
+    tasa, _, rafaga = texto.partition(',')
+    return float(tasa), float(rafaga or tasa)
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == '--hijo':
+        parametros = json.loads(sys.argv[2])
+        print(json.dumps((ejecutar_virtual if parametros.get('virtual') else ejecutar_escenario)(parametros)))
+        return
+
+    parser = argparse.ArgumentParser(description="Banco de pruebas de despliegues sobre EC2 simulado (moto)")
+    parser.add_argument('topologias', nargs='*', help=f"por defecto todas: {' '.join(TOPOLOGIAS)}")
+    parser.add_argument('--escalas', type=int, nargs='+', default=ESCALAS, help="VPCs de mrtransit")
+    parser.add_argument('--latencia', type=float, default=LATENCIA, help="segundos por llamada")
+    parser.add_argument('--retraso', type=_retraso, action='append', default=[],
+                        help="tipo=segundos en 'pending' tras crearse (nat, tgw, vpc-attachment, peering, instance)")
+    parser.add_argument('--throttling', type=_throttling, default=THROTTLING, help="tasa,ráfaga por región; 0 lo quita")
+    parser.add_argument('--virtual', action='store_true',
+                        help="simulador_ec2 con reloj virtual en vez de moto (tiempos de estado reales, sin throttling)")
+    parser.add_argument('--base', help=f"por defecto {os.path.basename(BASE)} ({os.path.basename(BASE_VIRTUAL)} con --virtual)")
+    parser.add_argument('--guardar-base', action='store_true')
+    parser.add_argument('--comparar', action='store_true')
+    parser.add_argument('--tolerancia-tiempo', type=float, default=TOLERANCIA_TIEMPO)
+    parser.add_argument('--tolerancia-llamadas', type=float, default=TOLERANCIA_LLAMADAS)
+    parser.add_argument('--timeout', type=int, default=TIMEOUT)
+    parser.add_argument('--salida', help="JSON con todos los resultados")
+    args = parser.parse_args()
+    desconocidas = set(args.topologias) - set(TOPOLOGIAS)
+    if desconocidas:
+        parser.error(f"topologías desconocidas: {sorted(desconocidas)} (hay {', '.join(TOPOLOGIAS)})")
+    args.base = args.base or (BASE_VIRTUAL if args.virtual else BASE)
+    if args.virtual:
+        from simulador_ec2 import CREACION
+        args.throttling = None
+        args.retrasos = dict(CREACION, **dict(args.retraso))
+    else:
+        if importlib.util.find_spec('moto') is None:
+            sys.exit("Hace falta moto: pip install 'moto[ec2]'")
+        args.retrasos = dict(RETRASOS, **dict(args.retraso))
+    perfil = {'latencia': args.latencia, 'retrasos': args.retrasos,
+              'throttling': list(args.throttling) if args.throttling else None}
+    if args.virtual:
+        perfil['virtual'] = True
+
+    print(f"Perfil: latencia {args.latencia} s, retrasos {args.retrasos}, throttling {args.throttling}")
+    print(f"{'escenario':<16} {'tiempo':>8} {'deploy':>8} {'destroy':>8} {'llamadas':>9} {'pico':>5} "
+          f"{'thrott.':>7} {'reint.':>6} {'esperas':>8}" + (f" {'reales':>7}" if args.virtual else ""))
+    resultados = {}
+    for nombre, topologia, config in escenarios(args.topologias or TOPOLOGIAS, args.escalas):
+        r = resultados[nombre] = medir(nombre, topologia, config, args)
+        if 'segundos' not in r:
+            print(f"{nombre:<16} ERROR: {r['error']}\n{r.get('salida', '')}")
+            continue
+        fases = r['fases']
+        print(f"{nombre:<16} {r['segundos']:>7.1f}s {fases.get('deploy', 0):>7.1f}s {fases.get('destroy', 0):>7.1f}s "
+              f"{r['llamadas']:>9} {r['pico']:>5} {r['throttlings']:>7} {r['reintentos']:>6} "
+              f"{r['espera_estados']:>7.1f}s" + (f" {r['reales']:>6.2f}s" if 'reales' in r else "")
+              + (f"  ERROR: {r['error']}" if 'error' in r else ""))
+        if 'error' in r:
+            print(r.get('salida', ''))
+
+    if args.salida:
+        with open(args.salida, 'w') as f:
+            json.dump(resultados, f, indent=2)
+    fallidos = [n for n, r in resultados.items() if 'error' in r]
+    if args.guardar_base:
+        base = {}
+        if os.path.exists(args.base):
+            with open(args.base) as f:
+                base = json.load(f)
+        base.update({n: {'segundos': round(r['segundos'], 1), 'llamadas': r['llamadas'], 'pico': r['pico']}
+                     for n, r in resultados.items() if n not in fallidos})
+        base['_perfil'] = perfil
+        with open(args.base, 'w') as f:
+            json.dump(base, f, indent=2, sort_keys=True)
+        print(f"Línea base guardada en {args.base}")
+    regresiones = []
+    if args.comparar:
+        if not os.path.exists(args.base):
+            sys.exit(f"No hay línea base en {args.base} (--guardar-base)")
+        with open(args.base) as f:
+            base = json.load(f)
+        if base.get('_perfil') != perfil:
+            print(f"AVISO: la línea base se midió con otro perfil: {base.get('_perfil')}")
+        regresiones = comparar(resultados, base, args.tolerancia_tiempo, args.tolerancia_llamadas)
+        for regresion in regresiones:
+            print(f"REGRESIÓN {regresion}")
+        if not regresiones:
+            print("Sin regresiones frente a la línea base.")
+    sys.exit(1 if fallidos or regresiones else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+"""Métricas de las llamadas a AWS, de las esperas y de los pasos del despliegue.
+
+Se engancha a los eventos de botocore de todos los clientes compartidos
+(clientes.py) y registra, por servicio, región, operación y paso del
+despliegue en curso:
+    llamadas, errores, latencia (histograma), reintentos y throttlings.
+Además cuenta el tiempo esperando a que AWS cambie de estado (waiters.py,
+coalescer.py, asincrono.py), la duración de cada paso del DAG y la espera
+en el limitador, para ver de un vistazo si un despliegue lento lo es por
+la API, por los estados de AWS o por nuestro propio ritmo.
+
+El paso en curso viaja en una contextvar: dag_executor y
+EstadoDespliegue.paso la fijan, y los pools que lanzan trabajo desde un
+paso la copian (con_contexto) para que sus llamadas también se atribuyan.
+Cada paso y cada espera es además un tramo de trazas.py.
+
+Al final de cada ejecución exportar() deja un informe JSON y el mismo
+contenido en formato de texto de Prometheus en .metricas/.
+"""
+import bisect
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from functools import partial
+
+import limitador
+import trazas
+
+# --- CONFIGURACIÓN ---
+DIRECTORIO_METRICAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.metricas')
+LIMITES_LATENCIA = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # Segundos (buckets del histograma)
+SIN_PASO = '-'
+
+_paso = contextvars.ContextVar('paso', default=SIN_PASO)
+_lock = threading.Lock()
+_llamadas = {}   # (servicio, región, operación, paso) -> contadores
+_esperas = {}    # (tipo, región, paso) -> {'esperas', 'segundos'}
+_pasos = {}      # paso -> segundos
+_inicio = time.monotonic()
+
+
+def _contadores():
+    return {'llamadas': 0, 'errores': 0, 'reintentos': 0, 'throttlings': 0, 'segundos': 0.0, 'maximo': 0.0,
+            'buckets': [0] * (len(LIMITES_LATENCIA) + 1)}
+
+
+# --- PASO EN CURSO ---
+
+def paso_actual():
+    return _paso.get()
+
+
+@contextlib.contextmanager
+def en_paso(nombre, depende=None):
+    """Atribuye al paso 'nombre' las llamadas y esperas del bloque y mide su duración.
+
+    Devuelve su tramo de trazas.py; depende: pasos previos del DAG (para el camino crítico).
+    Un paso del DAG que envuelve al paso de estado del mismo nombre cuenta una sola vez.
+    """
+    if _paso.get() == nombre and trazas.actual() is not None:
+        yield trazas.actual()
+        return
+    token = _paso.set(nombre)
+    inicio = time.monotonic()
+    try:
+        with trazas.tramo(nombre, 'paso', depende=depende) as tramo:
+            yield tramo
+    finally:
+        _paso.reset(token)
+        with _lock:
+            _pasos[nombre] = _pasos.get(nombre, 0.0) + time.monotonic() - inicio
+
+
+def con_contexto(funcion):
+    """Envuelve funcion para ejecutarla en otro hilo con el paso en curso de quien la envuelve"""
+    contexto = contextvars.copy_context()
+    return lambda *args, **kwargs: contexto.copy().run(funcion, *args, **kwargs)
+
+
+# --- EVENTOS DE BOTOCORE ---
+
+def _antes(servicio, region, context=None, **kwargs):
+    # before-call: una vez por llamada (los reintentos no vuelven a pasar por aquí)
+    if context is not None:
+        context['metricas'] = {'inicio': time.monotonic(), 'paso': paso_actual(), 'intentos': 0, 'throttlings': 0}
+
+
+def _intento(servicio, region, request_dict=None, response=None, attempts=None, **kwargs):
+    # needs-retry: tras cada intento. No devolver nada (un valor sería la pausa del reintento)
+    datos = (request_dict or {}).get('context', {}).get('metricas')
+    if datos is None:
+        return
+    datos['intentos'] = max(datos['intentos'], attempts or 1)
+    if response is not None and response[1].get('Error', {}).get('Code') in limitador.CODIGOS_THROTTLING:
+        datos['throttlings'] += 1
+
+
+def _registrar(servicio, region, operacion, datos, error):
+    segundos = time.monotonic() - datos['inicio']
+    clave = (servicio, region, operacion, datos['paso'])
+    with _lock:
+        c = _llamadas.setdefault(clave, _contadores())
+        c['llamadas'] += 1
+        c['errores'] += bool(error)
+        c['reintentos'] += max(0, datos['intentos'] - 1)
+        c['throttlings'] += datos['throttlings']
+        c['segundos'] += segundos
+        c['maximo'] = max(c['maximo'], segundos)
+        c['buckets'][bisect.bisect_left(LIMITES_LATENCIA, segundos)] += 1
+
+
+def _despues(servicio, region, model=None, http_response=None, context=None, **kwargs):
+    datos = (context or {}).pop('metricas', None)
+    if datos is not None:
+        _registrar(servicio, region, model.name, datos, http_response is not None and http_response.status_code >= 300)
+
+
+def _despues_error(servicio, region, event_name, context=None, **kwargs):
+    # Excepciones sin respuesta HTTP (timeouts, conexión...) tras agotar los reintentos
+    datos = (context or {}).pop('metricas', None)
+    if datos is not None:
+        _registrar(servicio, region, event_name.rsplit('.', 1)[-1], datos, True)
+
+
+def instalar(client):
+    """Engancha las métricas a los eventos de un cliente boto3 (o aiobotocore)"""
+    servicio = client.meta.service_model.service_id.hyphenize()
+    region = client.meta.region_name
+    for evento, funcion in (('before-call', _antes), ('needs-retry', _intento),
+                            ('after-call', _despues), ('after-call-error', _despues_error)):
+        client.meta.events.register(f'{evento}.{servicio}', partial(funcion, servicio, region),
+                                    unique_id=f'metricas-{evento}-{servicio}-{region}')
+    return client
+
+
+# --- ESPERAS ---
+
+def registrar_espera(tipo, region, segundos):
+    """Tiempo bloqueado esperando a que AWS lleve recursos de 'tipo' a un estado"""
+    clave = (tipo, region, paso_actual())
+    with _lock:
+        e = _esperas.setdefault(clave, {'esperas': 0, 'segundos': 0.0})
+        e['esperas'] += 1
+        e['segundos'] += segundos
+
+
+@contextlib.contextmanager
+def espera(tipo, region=None, ids=()):
+    inicio = time.monotonic()
+    try:
+        with trazas.tramo(f"espera {tipo}", 'espera', region=region, recursos=ids):
+            yield
+    finally:
+        registrar_espera(tipo, region or '-', time.monotonic() - inicio)
+
+
+# --- INFORMES ---
+
+def informe():
+    """Todas las métricas como dict serializable a JSON"""
+    with _lock:
+        llamadas = [dict(servicio=s, region=r, operacion=o, paso=p, **c, segundos_media=c['segundos'] / c['llamadas'])
+                    for (s, r, o, p), c in _llamadas.items() if c['llamadas']]
+        esperas = [dict(tipo=t, region=r, paso=p, **e) for (t, r, p), e in _esperas.items()]
+        pasos = dict(_pasos)
+    return {
+        'duracion': time.monotonic() - _inicio,
+        'limites_latencia': list(LIMITES_LATENCIA),
+        'llamadas': sorted(llamadas, key=lambda c: -c['segundos']),
+        'esperas': sorted(esperas, key=lambda e: -e['segundos']),
+        'pasos': dict(sorted(pasos.items(), key=lambda kv: -kv[1])),
+        'limitador': [dict(region=r, familia=f, **d) for (r, f), d in sorted(limitador.resumen().items())],
+    }
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(**valores):
+    return '{' + ','.join(f'{k}="{_escapar(v)}"' for k, v in valores.items()) + '}'
+
+
+def prometheus(datos=None):
+    """El informe en formato de texto de Prometheus (para node_exporter textfile o un pushgateway)"""
+    datos = datos or informe()
+    lineas = []
+
+    def metrica(nombre, tipo, ayuda, muestras):
+        lineas.extend([f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}"])
+        lineas.extend(f"{nombre}{etiquetas} {valor:g}" for etiquetas, valor in muestras)
+
+    llamadas = datos['llamadas']
+    claves = [(c, _etiquetas(servicio=c['servicio'], region=c['region'], operacion=c['operacion'], paso=c['paso']))
+              for c in llamadas]
+    for campo, ayuda in (('llamadas', 'Llamadas a la API'), ('errores', 'Llamadas terminadas en error'),
+                         ('reintentos', 'Reintentos de botocore'), ('throttlings', 'Respuestas de throttling')):
+        metrica(f"aws_api_{campo}_total", 'counter', ayuda, [(e, c[campo]) for c, e in claves])
+
+    nombre = 'aws_api_latencia_segundos'
+    lineas.extend([f"# HELP {nombre} Latencia de cada llamada (con sus reintentos)", f"# TYPE {nombre} histogram"])
+    for c, _ in claves:
+        base = dict(servicio=c['servicio'], region=c['region'], operacion=c['operacion'], paso=c['paso'])
+        acumulado = 0
+        for limite, n in zip(list(datos['limites_latencia']) + ['+Inf'], c['buckets']):
+            acumulado += n
+            lineas.append(f"{nombre}_bucket{_etiquetas(**base, le=limite)} {acumulado}")
+        lineas.append(f"{nombre}_sum{_etiquetas(**base)} {c['segundos']:g}")
+        lineas.append(f"{nombre}_count{_etiquetas(**base)} {c['llamadas']}")
+
+    metrica('espera_estado_segundos_total', 'counter', 'Tiempo esperando estados de AWS',
+            [(_etiquetas(tipo=e['tipo'], region=e['region'], paso=e['paso']), e['segundos']) for e in datos['esperas']])
+    metrica('paso_segundos', 'gauge', 'Duración de cada paso del despliegue',
+            [(_etiquetas(paso=p), s) for p, s in datos['pasos'].items()])
+    metrica('limitador_espera_segundos_total', 'counter', 'Tiempo frenado por el limitador',
+            [(_etiquetas(region=d['region'], familia=d['familia']), d['esperado']) for d in datos['limitador']])
+    metrica('ejecucion_segundos', 'gauge', 'Duración de la ejecución', [('', datos['duracion'])])
+    return '\n'.join(lineas) + '\n'
+
+
+def exportar(nombre, directorio=DIRECTORIO_METRICAS):
+    """Escribe <nombre>.json y <nombre>.prom y devuelve sus rutas"""
+    datos = informe()
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, nombre)
+    with open(f"{ruta}.json", 'w') as f:
+        json.dump(datos, f, indent=2)
+    with open(f"{ruta}.prom", 'w') as f:
+        f.write(prometheus(datos))
+    return f"{ruta}.json", f"{ruta}.prom"
+
+
+def resumen(log=print, n=5):
+    """Las operaciones, esperas y pasos que más tiempo se han llevado"""
+    datos = informe()
+    total = sum(c['llamadas'] for c in datos['llamadas'])
+    log(f"{total} llamadas a AWS en {datos['duracion']:.1f} s "
+        f"({sum(c['reintentos'] for c in datos['llamadas'])} reintentos, "
+        f"{sum(c['throttlings'] for c in datos['llamadas'])} throttlings)")
+    for c in datos['llamadas'][:n]:
+        log(f"  API    {c['operacion']:<40} {c['region']:<14} {c['llamadas']:>5} llamadas {c['segundos']:>8.1f} s")
+    for e in datos['esperas'][:n]:
+        log(f"  espera {e['tipo']:<40} {e['region']:<14} {e['esperas']:>5} esperas  {e['segundos']:>8.1f} s")
+    for paso, segundos in list(datos['pasos'].items())[:n]:
+        log(f"  paso   {paso:<40} {segundos:>8.1f} s")
+
+
+def limpiar():
+    global _inicio
+    with _lock:
+        _llamadas.clear()
+        _esperas.clear()
+        _pasos.clear()
+        _inicio = time.monotonic()
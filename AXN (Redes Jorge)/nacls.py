@@ -0,0 +1,176 @@
+"""Reglas de NACL como datos: compilación, validación y programación en lote.
+
+Un NACL se declara como una lista de EntradaNacl (dirección, número,
+protocolo, puertos, CIDR, acción). compilar() la convierte en una tabla
+{(egress, número): entrada} normalizada y la valida entera antes de hacer
+ninguna llamada a la API: números repetidos o fuera de rango, CIDRs y
+puertos inválidos y reglas ensombrecidas (una regla con número menor ya
+decide todo su tráfico, así que nunca se evalúa).
+
+programar() crea las entradas de un NACL en paralelo (el limitador de los
+clientes compartidos se encarga del ritmo) y asociar() resuelve todas las
+asociaciones subred -> NACL con un único describe_network_acls de la VPC.
+"""
+import ipaddress
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# --- CONFIGURACIÓN ---
+MAX_WORKERS = 8
+PROTOCOLOS_NACL = {'tcp': '6', 'udp': '17', 'icmp': '1', 'all': '-1'}
+CON_PUERTOS = ('6', '17')
+REGLA_MAXIMA = 32766
+REGLA_POR_DEFECTO = 32767  # Regla '*' de los NACLs, no se puede tocar
+
+# Entrada de NACL: desde/hasta solo aplican a tcp/udp
+EntradaNacl = namedtuple('EntradaNacl', 'egress numero protocolo desde hasta cidr accion',
+                         defaults=(None, None, '0.0.0.0/0', 'allow'))
+
+
+class ReglasNaclInvalidas(ValueError):
+    """La tabla de un NACL tiene errores; problemas lista todos los encontrados."""
+
+    def __init__(self, nombre, problemas):
+        super().__init__(f"NACL {nombre}: " + "; ".join(problemas))
+        self.problemas = problemas
+
+
+def normalizar(e):
+    proto = PROTOCOLOS_NACL.get(str(e.protocolo), str(e.protocolo))
+    if proto not in CON_PUERTOS:
+        return e._replace(protocolo=proto, desde=None, hasta=None)
+    return e._replace(protocolo=proto)
+
+
+def entrada_real(e):
+    """Entrada de describe_network_acls -> EntradaNacl normalizada"""
+    rango = e.get('PortRange') or {}
+    return normalizar(EntradaNacl(e['Egress'], e['RuleNumber'], e['Protocol'],
+                                  rango.get('From'), rango.get('To'),
+                                  e.get('CidrBlock'), e['RuleAction']))
+
+
+def argumentos(e):
+    """EntradaNacl -> kwargs de create/replace_network_acl_entry"""
+    kwargs = {'RuleNumber': e.numero, 'Protocol': e.protocolo, 'RuleAction': e.accion,
+              'Egress': e.egress, 'CidrBlock': e.cidr}
+    if e.desde is not None:
+        kwargs['PortRange'] = {'From': e.desde, 'To': e.hasta}
+    if e.protocolo == '1':
+        kwargs['IcmpTypeCode'] = {'Type': -1, 'Code': -1}
+    return kwargs
+
+
+def _direccion(e):
+    return 'salida' if e.egress else 'entrada'
+
+
+def _problemas_entrada(e):
+    problemas = []
+    if not isinstance(e.numero, int) or not 1 <= e.numero <= REGLA_MAXIMA:
+        problemas.append(f"número de regla {e.numero!r} fuera de 1-{REGLA_MAXIMA}")
+    if e.accion not in ('allow', 'deny'):
+        problemas.append(f"regla {e.numero}: acción {e.accion!r} (allow o deny)")
+    try:
+        ipaddress.ip_network(e.cidr)
+    except ValueError:
+        problemas.append(f"regla {e.numero}: CIDR inválido {e.cidr!r}")
+    if e.protocolo in CON_PUERTOS:
+        if e.desde is None or e.hasta is None:
+            problemas.append(f"regla {e.numero}: tcp/udp necesita rango de puertos")
+        elif not 0 <= e.desde <= e.hasta <= 65535:
+            problemas.append(f"regla {e.numero}: rango de puertos {e.desde}-{e.hasta} inválido")
+    elif not e.protocolo.lstrip('-').isdigit():
+        problemas.append(f"regla {e.numero}: protocolo {e.protocolo!r} desconocido")
+    return problemas
+
+
+def cubre(a, b):
+    """True si todo el tráfico de la entrada b también lo decide la entrada a"""
+    if a.egress != b.egress or a.protocolo not in ('-1', b.protocolo):
+        return False
+    if a.protocolo in CON_PUERTOS and not a.desde <= b.desde <= b.hasta <= a.hasta:
+        return False
+    red_a, red_b = ipaddress.ip_network(a.cidr), ipaddress.ip_network(b.cidr)
+    return red_a.version == red_b.version and red_b.subnet_of(red_a)
+
+
+def compilar(entradas, cidrs=None, nombre='NACL'):
+    """Lista de EntradaNacl -> {(egress, número): entrada}, validada y ordenada.
+
+    cidrs: {nombre: CIDR} para resolver las referencias 'cidr:<nombre>'.
+    Lanza ReglasNaclInvalidas con todos los problemas a la vez.
+    """
+    cidrs = cidrs or {}
+    problemas = []
+    tabla = {}
+    for e in entradas:
+        if e.cidr.startswith('cidr:'):
+            if e.cidr[5:] not in cidrs:
+                problemas.append(f"regla {e.numero}: referencia {e.cidr!r} sin CIDR en la topología")
+                continue
+            e = e._replace(cidr=cidrs[e.cidr[5:]])
+        e = normalizar(e)
+        errores = _problemas_entrada(e)
+        if errores:
+            problemas += errores
+            continue
+        clave = (e.egress, e.numero)
+        if clave in tabla:
+            problemas.append(f"regla {e.numero} de {_direccion(e)} repetida")
+            continue
+        tabla[clave] = e
+
+    tabla = dict(sorted(tabla.items()))
+    # Los NACLs evalúan por número ascendente y se quedan con la primera que coincide
+    vistas = []
+    for e in tabla.values():
+        previa = next((a for a in vistas if cubre(a, e)), None)
+        if previa is not None:
+            problemas.append(f"regla {e.numero} de {_direccion(e)} ensombrecida por la {previa.numero} "
+                             f"({previa.accion}): nunca se evalúa")
+        vistas.append(e)
+
+    if problemas:
+        raise ReglasNaclInvalidas(nombre, problemas)
+    return tabla
+
+
+def en_paralelo(tareas, max_workers=MAX_WORKERS):
+    """Ejecuta las funciones sin argumentos a la vez; si alguna falla relanza el primer error"""
+    tareas = list(tareas)
+    if len(tareas) <= 1:
+        return [t() for t in tareas]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tareas))) as pool:
+        futuros = [pool.submit(t) for t in tareas]
+    errores = [f.exception() for f in futuros if f.exception() is not None]
+    if errores:
+        raise errores[0]
+    return [f.result() for f in futuros]
+
+
+def programar(client, nacl_id, tabla, max_workers=MAX_WORKERS):
+    """Crea todas las entradas de la tabla en el NACL, en paralelo"""
+    en_paralelo([lambda e=e: client.create_network_acl_entry(NetworkAclId=nacl_id, **argumentos(e))
+                 for e in tabla.values()], max_workers)
+    return len(tabla)
+
+
+def asociar(client, vpc_id, asignacion, max_workers=MAX_WORKERS):
+    """Asocia cada subred a su NACL ({subnet_id: nacl_id}) con un solo describe de la VPC.
+
+    Devuelve el número de asociaciones cambiadas.
+    """
+    actuales = {}  # subnet_id -> (nacl_id, association_id)
+    respuesta = client.describe_network_acls(Filters=[{'Name': 'vpc-id', 'Values': [vpc_id]}])
+    for nacl in respuesta['NetworkAcls']:
+        for a in nacl.get('Associations', []):
+            actuales[a['SubnetId']] = (nacl['NetworkAclId'], a['NetworkAclAssociationId'])
+
+    sin_asociacion = [s for s in asignacion if s not in actuales]
+    if sin_asociacion:
+        raise ValueError(f"Subredes sin asociación de NACL en {vpc_id}: {sin_asociacion}")
+    cambios = [(actuales[s][1], nacl_id) for s, nacl_id in asignacion.items() if actuales[s][0] != nacl_id]
+    en_paralelo([lambda a=a, n=n: client.replace_network_acl_association(AssociationId=a, NetworkAclId=n)
+                 for a, n in cambios], max_workers)
+    return len(cambios)
@@ -0,0 +1,450 @@
+"""Modo plan: compara la topología deseada con lo que hay desplegado.
+
+Los scripts describen lo que quieren (VPC, subredes, IGW, SGs con sus
+reglas, NACLs con sus entradas y asociaciones, tablas de rutas, NAT e
+instancias) como una lista de Recurso en orden de dependencias.
+calcular_plan() lee el estado real de la VPC con un describe agrupado por
+tipo de recurso (inventario.Inventario) y devuelve solo los cambios que
+faltan; aplicar_plan() los ejecuta. Un segundo run sin cambios en la
+configuración no hace ninguna llamada de escritura.
+
+Los recursos se identifican por su tag Name (prefijo + nombre) dentro de
+la VPC y se referencian entre sí por su nombre corto: 'sg:<nombre>' como
+origen de una regla de SG se resuelve al ID del SG al aplicar, y
+'cidr:<nombre>' en cualquier CIDR de reglas o rutas se sustituye por el
+CIDR de ese recurso de la topología. Así las reglas no dependen de
+constantes derivadas que se queden viejas al cambiar la configuración.
+"""
+from collections import namedtuple
+
+from itertools import groupby
+
+from etiquetas import ColaEtiquetas, especificacion
+from inventario import Inventario
+from nacls import REGLA_POR_DEFECTO, argumentos, asociar, compilar, en_paralelo, entrada_real, programar
+from waiters import esperar_todos, estados_instancias, estados_nat
+
+# Tipos del inventario que cuelgan de la VPC y se leen en el plan
+TIPOS_VPC = ['subnets', 'route_tables', 'network_acls', 'security_groups',
+             'internet_gateways', 'nat_gateways', 'instances']
+
+PROTOCOLOS_SG = {'6': 'tcp', '17': 'udp', '1': 'icmp', 'all': '-1'}
+
+# Regla de entrada de un SG: origen es un CIDR, 'cidr:<nombre>' o 'sg:<nombre>' de otro SG de la topología
+ReglaSg = namedtuple('ReglaSg', 'protocolo desde hasta origen')
+
+# accion: crear, modificar, asociar, autorizar, revocar, crear-regla, reemplazar-regla,
+# borrar-regla, crear-ruta, reemplazar-ruta, borrar-ruta, esperar, etiquetar o conflicto.
+# ejecutar(client, ids) hace el cambio. Los conflictos no tienen ejecutar y los
+# 'etiquetar' (detalle = (ID, tag Name completo)) se encolan y se envían juntos al final del plan.
+Cambio = namedtuple('Cambio', 'accion tipo nombre detalle ejecutar')
+
+
+class Recurso:
+    """Recurso deseado. tipo: vpc, subnet, igw, sg, nacl, rt, nat o instance."""
+
+    def __init__(self, tipo, nombre, **props):
+        self.tipo = tipo
+        self.nombre = nombre
+        self.props = props
+
+    def __repr__(self):
+        return f"Recurso({self.tipo!r}, {self.nombre!r})"
+
+
+def _normalizar_regla(r, ids):
+    proto = PROTOCOLOS_SG.get(str(r.protocolo), str(r.protocolo))
+    origen = r.origen
+    if origen.startswith('sg:'):
+        origen = ids.get(origen[3:], origen)
+    if proto == '-1':
+        return ReglaSg(proto, None, None, origen)
+    return ReglaSg(proto, r.desde, r.hasta, origen)
+
+
+def _reglas_reales(sg):
+    reglas = set()
+    for p in sg.get('IpPermissions', []):
+        proto = p['IpProtocol']
+        desde, hasta = (None, None) if proto == '-1' else (p.get('FromPort'), p.get('ToPort'))
+        for rango in p.get('IpRanges', []):
+            reglas.add(ReglaSg(proto, desde, hasta, rango['CidrIp']))
+        for par in p.get('UserIdGroupPairs', []):
+            reglas.add(ReglaSg(proto, desde, hasta, par['GroupId']))
+    return reglas
+
+
+def _permiso(regla, ids):
+    """ReglaSg -> IpPermission de la API (resolviendo 'sg:<Nombre>' al aplicar)"""
+    regla = _normalizar_regla(regla, ids)
+    permiso = {'IpProtocol': regla.protocolo}
+    if regla.protocolo != '-1':
+        permiso['FromPort'], permiso['ToPort'] = regla.desde, regla.hasta
+    if regla.origen.startswith('sg-'):
+        permiso['UserIdGroupPairs'] = [{'GroupId': regla.origen}]
+    else:
+        permiso['IpRanges'] = [{'CidrIp': regla.origen}]
+    return permiso
+
+
+class _Planificador:
+    """Calcula los cambios recurso a recurso sobre el inventario de la VPC."""
+
+    def __init__(self, inv, vpc_id, recursos, prefijo='', tablas=None):
+        self.inv = inv
+        self.vpc_id = vpc_id
+        self.prefijo = prefijo
+        self.tablas = tablas or {}
+        self.ids = {}
+        self.tipos = {r.nombre: r.tipo for r in recursos}
+        self.cidrs = _cidrs(recursos)
+        self.asociaciones_nacl = {}  # nombre del NACL -> subredes a (re)asociar
+
+    def etiqueta(self, r):
+        """Tag Name real del recurso"""
+        return self.prefijo + r.nombre
+
+    def cidr(self, valor):
+        """'cidr:<nombre>' -> CIDR de ese recurso de la topología"""
+        if valor.startswith('cidr:'):
+            return self.cidrs[valor[5:]]
+        return valor
+
+    def existente(self, tipo_inv, nombre, descartar=()):
+        """Recurso real de la VPC con ese tag Name (o None)"""
+        if self.vpc_id is None:
+            return None
+        de_vpc = set(self.inv.de_vpc(self.vpc_id, tipo_inv))
+        for rid in self.inv.por_tag('Name', nombre, tipo_inv):
+            recurso = self.inv.get(rid)
+            if rid in de_vpc and _estado(recurso) not in descartar:
+                return recurso
+        return None
+
+    def _etiquetar(self, r, rid):
+        """Recurso encontrado por otra vía (adjunto a la VPC, GroupName) al que le falta el tag Name"""
+        reales = {t['Key']: t['Value'] for t in self.inv.get(rid).get('Tags', [])}
+        if reales.get('Name') == self.etiqueta(r):
+            return []
+        return [Cambio('etiquetar', r.tipo, r.nombre, (rid, self.etiqueta(r)), None)]
+
+    def vpc(self, r):
+        if self.vpc_id is None:
+            def crear(client, ids):
+                vpc_id = client.create_vpc(CidrBlock=r.props['cidr'],
+                                           TagSpecifications=especificacion('vpc', self.etiqueta(r)))['Vpc']['VpcId']
+                client.get_waiter('vpc_available').wait(VpcIds=[vpc_id])
+                if r.props.get('dns_hostnames'):
+                    client.modify_vpc_attribute(VpcId=vpc_id, EnableDnsHostnames={'Value': True})
+                ids[r.nombre] = vpc_id
+            return [Cambio('crear', 'vpc', r.nombre, r.props['cidr'], crear)]
+        self.ids[r.nombre] = self.vpc_id
+        real = self.inv.get(self.vpc_id)['CidrBlock']
+        if real != r.props['cidr']:
+            return [Cambio('conflicto', 'vpc', r.nombre, f"CIDR real {real}, deseado {r.props['cidr']}", None)]
+        return []
+
+    def subnet(self, r):
+        p = r.props
+        real = self.existente('subnets', self.etiqueta(r))
+        if real is None:
+            def crear(client, ids):
+                sub_id = client.create_subnet(VpcId=ids[p['vpc']], CidrBlock=p['cidr'],
+                                              AvailabilityZone=p['az'],
+                                              TagSpecifications=especificacion('subnet', self.etiqueta(r)))['Subnet']['SubnetId']
+                if p.get('publica'):
+                    client.modify_subnet_attribute(SubnetId=sub_id, MapPublicIpOnLaunch={'Value': True})
+                ids[r.nombre] = sub_id
+            return [Cambio('crear', 'subnet', r.nombre, f"{p['cidr']} en {p['az']}", crear)]
+
+        self.ids[r.nombre] = sub_id = real['SubnetId']
+        if (real['CidrBlock'], real['AvailabilityZone']) != (p['cidr'], p['az']):
+            return [Cambio('conflicto', 'subnet', r.nombre,
+                           f"real {real['CidrBlock']} en {real['AvailabilityZone']}, deseada {p['cidr']} en {p['az']}", None)]
+        publica = bool(p.get('publica'))
+        if real.get('MapPublicIpOnLaunch', False) != publica:
+            return [Cambio('modificar', 'subnet', r.nombre, f"MapPublicIpOnLaunch={publica}",
+                           lambda client, ids: client.modify_subnet_attribute(
+                               SubnetId=sub_id, MapPublicIpOnLaunch={'Value': publica}))]
+        return []
+
+    def igw(self, r):
+        # El IGW se reconoce por estar adjunto a la VPC, tenga el nombre que tenga
+        adjuntos = self.inv.de_vpc(self.vpc_id, 'internet_gateways') if self.vpc_id else []
+        if adjuntos:
+            self.ids[r.nombre] = igw_id = adjuntos[0]
+            return self._etiquetar(r, igw_id)
+
+        def crear(client, ids):
+            igw_id = client.create_internet_gateway(
+                TagSpecifications=especificacion('internet-gateway', self.etiqueta(r)))['InternetGateway']['InternetGatewayId']
+            client.attach_internet_gateway(InternetGatewayId=igw_id, VpcId=ids[r.props['vpc']])
+            ids[r.nombre] = igw_id
+        return [Cambio('crear', 'igw', r.nombre, f"adjunto a {r.props['vpc']}", crear)]
+
+    def sg(self, r):
+        p = r.props
+        reglas = [x._replace(origen=self.cidr(x.origen)) for x in p.get('reglas', [])]
+        real = self.existente('security_groups', self.etiqueta(r))
+        if real is None and self.vpc_id is not None:
+            # Los SGs creados sin tag Name se reconocen por GroupName
+            real = next((self.inv.get(g) for g in self.inv.de_vpc(self.vpc_id, 'security_groups')
+                         if self.inv.get(g)['GroupName'] == self.etiqueta(r)), None)
+        if real is None:
+            def crear(client, ids):
+                sg_id = client.create_security_group(GroupName=self.etiqueta(r), Description=p.get('descripcion', self.etiqueta(r)),
+                                                     VpcId=ids[p['vpc']],
+                                                     TagSpecifications=especificacion('security-group', self.etiqueta(r)))['GroupId']
+                ids[r.nombre] = sg_id
+                if reglas:
+                    client.authorize_security_group_ingress(GroupId=sg_id, IpPermissions=[_permiso(x, ids) for x in reglas])
+            return [Cambio('crear', 'sg', r.nombre, f"{len(reglas)} reglas de entrada", crear)]
+
+        self.ids[r.nombre] = sg_id = real['GroupId']
+        deseadas = {_normalizar_regla(x, self.ids): x for x in reglas}
+        reales = _reglas_reales(real)
+        cambios = self._etiquetar(r, sg_id)
+        faltan = [x for n, x in deseadas.items() if n not in reales]
+        sobran = [x for x in reales if x not in deseadas]
+        if faltan:
+            cambios.append(Cambio('autorizar', 'sg', r.nombre, faltan,
+                                  lambda client, ids: client.authorize_security_group_ingress(
+                                      GroupId=sg_id, IpPermissions=[_permiso(x, ids) for x in faltan])))
+        if sobran:
+            cambios.append(Cambio('revocar', 'sg', r.nombre, sobran,
+                                  lambda client, ids: client.revoke_security_group_ingress(
+                                      GroupId=sg_id, IpPermissions=[_permiso(x, ids) for x in sobran])))
+        return cambios
+
+    def nacl(self, r):
+        p = r.props
+        entradas = self.tablas[r.nombre]
+        subredes = p.get('subredes', [])
+        real = self.existente('network_acls', self.etiqueta(r))
+        if real is None:
+            def crear(client, ids):
+                nacl_id = client.create_network_acl(
+                    VpcId=ids[p['vpc']], TagSpecifications=especificacion('network-acl', self.etiqueta(r)))['NetworkAcl']['NetworkAclId']
+                ids[r.nombre] = nacl_id
+                programar(client, nacl_id, entradas)
+            if subredes:
+                self.asociaciones_nacl[r.nombre] = subredes
+            return [Cambio('crear', 'nacl', r.nombre, f"{len(entradas)} entradas", crear)]
+
+        self.ids[r.nombre] = nacl_id = real['NetworkAclId']
+        reales = {(e.egress, e.numero): e for e in map(entrada_real, real.get('Entries', []))
+                  if e.numero < REGLA_POR_DEFECTO}
+        cambios = []
+        for clave, e in entradas.items():
+            if clave not in reales:
+                cambios.append(Cambio('crear-regla', 'nacl', r.nombre, e,
+                                      lambda client, ids, e=e: client.create_network_acl_entry(
+                                          NetworkAclId=nacl_id, **argumentos(e))))
+            elif reales[clave] != e:
+                cambios.append(Cambio('reemplazar-regla', 'nacl', r.nombre, e,
+                                      lambda client, ids, e=e: client.replace_network_acl_entry(
+                                          NetworkAclId=nacl_id, **argumentos(e))))
+        for (egress, numero), e in reales.items():
+            if (egress, numero) not in entradas:
+                cambios.append(Cambio('borrar-regla', 'nacl', r.nombre, e,
+                                      lambda client, ids, egress=egress, numero=numero: client.delete_network_acl_entry(
+                                          NetworkAclId=nacl_id, RuleNumber=numero, Egress=egress)))
+
+        pendientes = [s for s in subredes
+                      if s not in self.ids or (self.inv.nacl_de_subred(self.ids[s]) or (None,))[0] != nacl_id]
+        if pendientes:
+            self.asociaciones_nacl[r.nombre] = pendientes
+        return cambios
+
+    def rt(self, r):
+        p = r.props
+        rutas = {self.cidr(c): destino for c, destino in p.get('rutas', {}).items()}
+        subredes = p.get('subredes', [])
+        real = self.existente('route_tables', self.etiqueta(r))
+        if real is None:
+            def crear(client, ids):
+                rt_id = client.create_route_table(
+                    VpcId=ids[p['vpc']], TagSpecifications=especificacion('route-table', self.etiqueta(r)))['RouteTable']['RouteTableId']
+                ids[r.nombre] = rt_id
+            cambios = [Cambio('crear', 'rt', r.nombre, f"{len(rutas)} rutas", crear)]
+            cambios += [Cambio('crear-ruta', 'rt', r.nombre, f"{cidr} -> {destino}", self._ruta('create_route', r.nombre, cidr, destino))
+                        for cidr, destino in rutas.items()]
+            cambios += [Cambio('asociar', 'rt', r.nombre, s, _asociar_rt(r.nombre, s, None)) for s in subredes]
+            return cambios
+
+        self.ids[r.nombre] = rt_id = real['RouteTableId']
+        reales = {}
+        for ruta in real.get('Routes', []):
+            if ruta.get('GatewayId') == 'local' or 'DestinationCidrBlock' not in ruta:
+                continue
+            reales[ruta['DestinationCidrBlock']] = (ruta.get('GatewayId') or ruta.get('NatGatewayId')
+                                                    or ruta.get('TransitGatewayId'))
+        cambios = []
+        for cidr, destino in rutas.items():
+            if cidr not in reales:
+                cambios.append(Cambio('crear-ruta', 'rt', r.nombre, f"{cidr} -> {destino}",
+                                      self._ruta('create_route', r.nombre, cidr, destino)))
+            elif reales[cidr] != self.ids.get(destino):
+                cambios.append(Cambio('reemplazar-ruta', 'rt', r.nombre, f"{cidr} -> {destino}",
+                                      self._ruta('replace_route', r.nombre, cidr, destino)))
+        for cidr in reales:
+            if cidr not in rutas:
+                cambios.append(Cambio('borrar-ruta', 'rt', r.nombre, cidr,
+                                      lambda client, ids, cidr=cidr: client.delete_route(
+                                          RouteTableId=rt_id, DestinationCidrBlock=cidr)))
+        for s in subredes:
+            actual = self.inv.tabla_de_subred(self.ids[s]) if s in self.ids else None
+            if actual is None or actual[0] != rt_id:
+                cambios.append(Cambio('asociar', 'rt', r.nombre, s, _asociar_rt(r.nombre, s, actual and actual[1])))
+        return cambios
+
+    def _ruta(self, operacion, rt_nombre, cidr, destino):
+        campo = {'igw': 'GatewayId', 'nat': 'NatGatewayId'}[self.tipos[destino]]
+
+        def ejecutar(client, ids):
+            getattr(client, operacion)(RouteTableId=ids[rt_nombre], DestinationCidrBlock=cidr, **{campo: ids[destino]})
+        return ejecutar
+
+    def nat(self, r):
+        p = r.props
+        real = self.existente('nat_gateways', self.etiqueta(r), descartar=('deleting', 'deleted', 'failed'))
+        if real is not None:
+            self.ids[r.nombre] = nat_id = real['NatGatewayId']
+            if real['State'] == 'pending':
+                return [Cambio('esperar', 'nat', r.nombre, 'pending -> available',
+                               lambda client, ids: _esperar_nat(client, nat_id))]
+            return []
+
+        def crear(client, ids):
+            eip_id = client.allocate_address(Domain='vpc', TagSpecifications=especificacion('elastic-ip', f"{self.etiqueta(r)}-eip"))['AllocationId']
+            nat_id = client.create_nat_gateway(SubnetId=ids[p['subred']], AllocationId=eip_id,
+                                               TagSpecifications=especificacion('natgateway', self.etiqueta(r)))['NatGateway']['NatGatewayId']
+            ids[r.nombre] = nat_id
+            _esperar_nat(client, nat_id)
+        return [Cambio('crear', 'nat', r.nombre, f"en {p['subred']} (con EIP nueva)", crear)]
+
+    def instance(self, r):
+        p = r.props
+        real = self.existente('instances', self.etiqueta(r), descartar=('shutting-down', 'terminated'))
+        if real is not None:
+            self.ids[r.nombre] = real['InstanceId']
+            return []
+
+        def crear(client, ids):
+            kwargs = dict(ImageId=p['ami'], InstanceType=p.get('tipo_instancia', 't3.micro'), MinCount=1, MaxCount=1,
+                          SubnetId=ids[p['subred']], SecurityGroupIds=[ids[sg] for sg in p.get('sgs', [])],
+                          TagSpecifications=especificacion('instance', self.etiqueta(r)))
+            if p.get('key'):
+                kwargs['KeyName'] = p['key']
+            if p.get('perfil'):
+                kwargs['IamInstanceProfile'] = {'Name': p['perfil']}
+            ids[r.nombre] = client.run_instances(**kwargs)['Instances'][0]['InstanceId']
+        return [Cambio('crear', 'instance', r.nombre, f"{p['ami']} en {p['subred']}", crear)]
+
+
+def _estado(recurso):
+    estado = recurso.get('State')
+    return estado.get('Name') if isinstance(estado, dict) else estado
+
+
+def _esperar_nat(client, nat_id):
+    esperar_todos(estados_nat(client), [nat_id], listo={'available'}, fallido={'failed', 'deleted'},
+                  timeout=600, descripcion='NAT Gateway')
+
+
+def _asociar_rt(rt_nombre, subred, asociacion):
+    def ejecutar(client, ids):
+        if asociacion:
+            client.replace_route_table_association(AssociationId=asociacion, RouteTableId=ids[rt_nombre])
+        else:
+            client.associate_route_table(RouteTableId=ids[rt_nombre], SubnetId=ids[subred])
+    return ejecutar
+
+
+def _cidrs(recursos):
+    return {r.nombre: r.props['cidr'] for r in recursos if 'cidr' in r.props}
+
+
+def _asociar_nacls(vpc_nombre, asociaciones):
+    def ejecutar(client, ids):
+        asociar(client, ids[vpc_nombre], {ids[s]: ids[nacl] for nacl, subredes in asociaciones.items()
+                                          for s in subredes})
+    return ejecutar
+
+
+def calcular_plan(recursos, client, region, prefijo=''):
+    """Cambios mínimos para llevar la VPC de la topología al estado deseado.
+
+    prefijo: se antepone al nombre de cada recurso para formar su tag Name.
+    Devuelve (cambios, ids) con ids = {nombre: ID real} de lo que ya existe.
+    Las tablas de los NACLs se compilan y validan antes de cualquier llamada
+    (nacls.ReglasNaclInvalidas si tienen errores).
+    """
+    recursos = list(recursos)
+    cidrs = _cidrs(recursos)
+    tablas = {r.nombre: compilar(r.props.get('entradas', []), cidrs, r.nombre)
+              for r in recursos if r.tipo == 'nacl'}
+    vpc = next(r for r in recursos if r.tipo == 'vpc')
+    inv = Inventario(region, client).refrescar(['vpcs'])
+    encontradas = inv.vpcs_por_nombre(prefijo + vpc.nombre)
+    vpc_id = encontradas[0] if encontradas else None
+    if vpc_id is not None:
+        inv.refrescar(TIPOS_VPC, vpc_ids=[vpc_id])
+
+    planificador = _Planificador(inv, vpc_id, recursos, prefijo, tablas)
+    cambios = []
+    tras_nacls = 0
+    for r in recursos:
+        cambios += getattr(planificador, r.tipo)(r)
+        if r.tipo == 'nacl':
+            tras_nacls = len(cambios)
+    # Todas las asociaciones de NACLs de la VPC en un solo cambio (un describe al aplicar)
+    asociaciones = planificador.asociaciones_nacl
+    if asociaciones:
+        cambios.insert(tras_nacls, Cambio('asociar', 'nacl', ', '.join(asociaciones), asociaciones,
+                                          _asociar_nacls(vpc.nombre, asociaciones)))
+    return cambios, planificador.ids
+
+
+SIMBOLOS = {'crear': '+', 'conflicto': '!', 'revocar': '-', 'borrar-regla': '-', 'borrar-ruta': '-'}
+
+
+def imprimir_plan(cambios, log=print):
+    if not cambios:
+        log("Sin cambios: lo desplegado coincide con la configuración.")
+        return
+    log(f"Plan: {len(cambios)} cambios")
+    for c in cambios:
+        log(f"  {SIMBOLOS.get(c.accion, '~')} {c.accion:<16} {c.tipo:<8} {c.nombre}: {c.detalle}")
+
+
+# Cambios de reglas de un mismo NACL: tocan números distintos y se pueden lanzar a la vez
+REGLAS_NACL = {'crear-regla', 'reemplazar-regla', 'borrar-regla'}
+
+
+def aplicar_plan(cambios, client, ids, log=None):
+    """Ejecuta los cambios en orden y espera en lote a las instancias nuevas.
+
+    Las reglas consecutivas de un mismo NACL se aplican en paralelo.
+    """
+    conflictos = [c for c in cambios if c.accion == 'conflicto']
+    if conflictos:
+        raise ValueError("El plan tiene conflictos que no se pueden aplicar en caliente: "
+                         + "; ".join(f"{c.nombre} ({c.detalle})" for c in conflictos))
+    with ColaEtiquetas(client) as cola:
+        grupos = groupby(cambios, lambda c: c.nombre if c.accion in REGLAS_NACL else id(c))
+        for _, grupo in grupos:
+            grupo = list(grupo)
+            if grupo[0].accion == 'etiquetar':
+                cola.encolar(*grupo[0].detalle)
+                continue
+            if log:
+                for c in grupo:
+                    log(f"{c.accion} {c.tipo} {c.nombre}...")
+            en_paralelo([lambda c=c: c.ejecutar(client, ids) for c in grupo])
+
+    nuevas = [ids[c.nombre] for c in cambios if c.tipo == 'instance' and c.accion == 'crear']
+    if nuevas:
+        esperar_todos(estados_instancias(client), nuevas, listo={'running'},
+                      fallido={'terminated', 'shutting-down'}, timeout=600, descripcion='instancias', log=log)
+    return ids
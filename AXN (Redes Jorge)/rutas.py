@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""Motor offline de resolución de rutas para VPCs y Transit Gateways.
+
+Modela las tablas de rutas de las VPCs, las de los TGWs y los attachments
+(VPC <-> TGW y peering TGW <-> TGW) y resuelve cada salto por longest
+prefix match, igual que AWS: así se puede comprobar sin desplegar que un
+paquete de VPC-East-1 llega de verdad a VPC-West-2 aunque se mezclen
+rutas resumidas (10.0.0.0/8) con las /16 de cada VPC.
+
+Cada tabla es un trie binario de prefijos: insertar y buscar cuestan como
+mucho 32 pasos, independientemente del número de rutas.
+
+Resultados de una traza:
+    entregado   el destino está dentro de la VPC a la que se llega
+    sin-ruta    ninguna ruta de la tabla cubre el destino
+    blackhole   ruta 'blackhole' o hacia un TGW/attachment que no existe
+    bucle       el paquete vuelve a una tabla por la que ya pasó
+    fuera       sale del modelo (IGW, NAT...)
+
+Los scripts que instalan rutas exponen modelo_rutas() con lo que
+configuran (MRtransit_gateway_multiregion, ejercicio3_tgw_multiregion):
+    python3 rutas.py MRtransit_gateway_multiregion
+"""
+import ipaddress
+import sys
+from collections import namedtuple
+
+# --- CONFIGURACIÓN ---
+MAX_SALTOS = 64
+PRIMER_HOST = 10   # Host de cada VPC que se usa como destino en todos_los_pares()
+
+Ruta = namedtuple('Ruta', 'destino objetivo')
+Traza = namedtuple('Traza', 'resultado saltos motivo')  # saltos: [(nodo, ruta usada)]
+
+
+class TriePrefijos:
+    """Trie binario de prefijos IPv4 con búsqueda por el prefijo más largo."""
+
+    def __init__(self):
+        self._hijos = [[0, 0]]   # nodo -> [hijo bit 0, hijo bit 1] (0 = no hay)
+        self._valores = [None]   # nodo -> valor del prefijo que termina ahí
+        self._n = 0
+
+    def insertar(self, cidr, valor):
+        red = ipaddress.IPv4Network(cidr)
+        bits, longitud = int(red.network_address), red.prefixlen
+        nodo = 0
+        for i in range(longitud):
+            bit = (bits >> (31 - i)) & 1
+            if not self._hijos[nodo][bit]:
+                self._hijos.append([0, 0])
+                self._valores.append(None)
+                self._hijos[nodo][bit] = len(self._hijos) - 1
+            nodo = self._hijos[nodo][bit]
+        if self._valores[nodo] is None:
+            self._n += 1
+        self._valores[nodo] = valor
+
+    def buscar(self, ip):
+        """Valor del prefijo más largo que contiene la IP (entera), o None"""
+        hijos, valores = self._hijos, self._valores
+        nodo, mejor = 0, valores[0]
+        for i in range(31, -1, -1):
+            nodo = hijos[nodo][(ip >> i) & 1]
+            if not nodo:
+                break
+            if valores[nodo] is not None:
+                mejor = valores[nodo]
+        return mejor
+
+    def valores(self):
+        return [v for v in self._valores if v is not None]
+
+    def __len__(self):
+        return self._n
+
+
+class Red:
+    """VPCs, TGWs y attachments con sus tablas de rutas."""
+
+    def __init__(self):
+        self.vpcs = {}           # nombre -> (IPv4Network, TriePrefijos)
+        self.tgws = {}           # nombre -> TriePrefijos
+        self.attachments = {}    # nombre -> {nodo: nodo del otro extremo}
+        self._adjunto = {}       # (vpc, tgw) -> attachment
+
+    # --- CONSTRUCCIÓN ---
+
+    def anadir_vpc(self, nombre, cidr, rutas=None):
+        """rutas: {cidr: objetivo}; objetivo = nombre de TGW, 'blackhole', 'igw'... (la local se añade sola)"""
+        tabla = TriePrefijos()
+        tabla.insertar(cidr, Ruta(cidr, 'local'))
+        self.vpcs[nombre] = (ipaddress.IPv4Network(cidr), tabla)
+        for destino, objetivo in (rutas or {}).items():
+            self.anadir_ruta_vpc(nombre, destino, objetivo)
+        return self
+
+    def anadir_tgw(self, nombre, rutas=None):
+        """rutas: {cidr: attachment o 'blackhole'}"""
+        self.tgws.setdefault(nombre, TriePrefijos())
+        for destino, objetivo in (rutas or {}).items():
+            self.anadir_ruta_tgw(nombre, destino, objetivo)
+        return self
+
+    def anadir_ruta_vpc(self, vpc, destino, objetivo):
+        self.vpcs[vpc][1].insertar(destino, Ruta(destino, objetivo))
+
+    def anadir_ruta_tgw(self, tgw, destino, objetivo):
+        self.tgws[tgw].insertar(destino, Ruta(destino, objetivo))
+
+    def adjuntar_vpc(self, attachment, tgw, vpc):
+        self.attachments[attachment] = {('tgw', tgw): ('vpc', vpc), ('vpc', vpc): ('tgw', tgw)}
+        self._adjunto[(vpc, tgw)] = attachment
+        return self
+
+    def peering(self, attachment, tgw_a, tgw_b):
+        self.attachments[attachment] = {('tgw', tgw_a): ('tgw', tgw_b), ('tgw', tgw_b): ('tgw', tgw_a)}
+        return self
+
+    # --- RESOLUCIÓN ---
+
+    def _siguiente(self, nodo, ip):
+        """Un salto: (siguiente nodo, ruta) o (None, ruta, resultado, motivo) si el paquete termina ahí"""
+        tipo, nombre = nodo
+        if tipo == 'vpc':
+            red, tabla = self.vpcs[nombre]
+            if int(red.network_address) <= ip <= int(red.broadcast_address):
+                return None, None, 'entregado', f"entregado en {nombre}"
+        else:
+            tabla = self.tgws[nombre]
+        ruta = tabla.buscar(ip)
+        if ruta is None:
+            return None, None, 'sin-ruta', f"{nombre}: ninguna ruta cubre el destino"
+        if ruta.objetivo == 'blackhole':
+            return None, ruta, 'blackhole', f"{nombre}: ruta {ruta.destino} en blackhole"
+
+        if tipo == 'vpc':
+            if ruta.objetivo not in self.tgws:
+                return None, ruta, 'fuera', f"{nombre}: {ruta.destino} sale por {ruta.objetivo}"
+            if (nombre, ruta.objetivo) not in self._adjunto:
+                return None, ruta, 'blackhole', f"{nombre}: ruta {ruta.destino} -> {ruta.objetivo} sin attachment"
+            return ('tgw', ruta.objetivo), ruta, None, None
+
+        extremos = self.attachments.get(ruta.objetivo, {})
+        if nodo not in extremos:
+            return None, ruta, 'blackhole', f"{nombre}: ruta {ruta.destino} -> {ruta.objetivo}, attachment inexistente"
+        return extremos[nodo], ruta, None, None
+
+    def trazar(self, origen, destino):
+        """Traza salto a salto desde la VPC origen hacia una IP (o el nombre de otra VPC)"""
+        ip = self._ip_destino(destino)
+        nodo, saltos, vistos = ('vpc', origen), [], set()
+        while len(saltos) < MAX_SALTOS:
+            if nodo in vistos:
+                return Traza('bucle', saltos, f"bucle: vuelve a {nodo[1]}")
+            vistos.add(nodo)
+            siguiente, ruta, resultado, motivo = self._siguiente(nodo, ip)
+            saltos.append((nodo, ruta))
+            if siguiente is None:
+                return Traza(resultado, saltos, motivo)
+            nodo = siguiente
+        return Traza('bucle', saltos, f"más de {MAX_SALTOS} saltos")
+
+    def _ip_destino(self, destino):
+        if destino in self.vpcs:
+            red = self.vpcs[destino][0]
+            return int(red.network_address) + min(PRIMER_HOST, red.num_addresses - 1)
+        return int(ipaddress.IPv4Address(destino))
+
+    def todos_los_pares(self):
+        """{(vpc origen, vpc destino): (resultado, motivo)} para todas las parejas.
+
+        Por cada destino, el resultado de cada tabla se calcula una sola vez y
+        lo reutilizan todos los orígenes que pasan por ella.
+        """
+        pares = {}
+        for destino in self.vpcs:
+            ip = self._ip_destino(destino)
+            memo = {}   # nodo -> (resultado, motivo) hacia este destino
+            for origen in self.vpcs:
+                camino, nodo = [], ('vpc', origen)
+                while nodo not in memo:
+                    if nodo in camino:
+                        final = ('bucle', f"bucle: vuelve a {nodo[1]}")
+                        break
+                    camino.append(nodo)
+                    siguiente, _, resultado, motivo = self._siguiente(nodo, ip)
+                    if siguiente is None:
+                        final = (resultado, motivo)
+                        break
+                    nodo = siguiente
+                else:
+                    final = memo[nodo]
+                for n in camino:
+                    memo[n] = final
+                pares[(origen, destino)] = memo[('vpc', origen)]
+        return pares
+
+    def blackholes(self):
+        """Rutas que no llevan a ningún sitio: [(tabla, destino, motivo)]"""
+        encontrados = []
+        for vpc, (_, tabla) in self.vpcs.items():
+            for ruta in tabla.valores():
+                if ruta.objetivo == 'blackhole':
+                    encontrados.append((vpc, ruta.destino, 'blackhole explícito'))
+                elif ruta.objetivo in self.tgws and (vpc, ruta.objetivo) not in self._adjunto:
+                    encontrados.append((vpc, ruta.destino, f"{ruta.objetivo} sin attachment de {vpc}"))
+        for tgw, tabla in self.tgws.items():
+            for ruta in tabla.valores():
+                if ruta.objetivo == 'blackhole':
+                    encontrados.append((tgw, ruta.destino, 'blackhole explícito'))
+                elif ('tgw', tgw) not in self.attachments.get(ruta.objetivo, {}):
+                    encontrados.append((tgw, ruta.destino, f"attachment {ruta.objetivo} no está en {tgw}"))
+        return encontrados
+
+
+def imprimir_informe(red, log=print):
+    """Matriz de alcanzabilidad entre VPCs y rutas rotas"""
+    pares = red.todos_los_pares()
+    fallos = {k: v for k, v in pares.items() if k[0] != k[1] and v[0] != 'entregado'}
+    log(f"{len(red.vpcs)} VPCs, {len(red.tgws)} TGWs: "
+        f"{len(pares) - len(red.vpcs) - len(fallos)}/{len(pares) - len(red.vpcs)} parejas alcanzables")
+    for (origen, destino), (resultado, motivo) in sorted(fallos.items()):
+        log(f"  {origen} -> {destino}: {resultado} ({motivo})")
+    for tabla, destino, motivo in red.blackholes():
+        log(f"  blackhole en {tabla}: {destino} ({motivo})")
+    return not fallos
+
+
+if __name__ == '__main__':
+    # python3 rutas.py <módulo con modelo_rutas()> [VPC origen] [destino]
+    import importlib
+    red = importlib.import_module(sys.argv[1]).modelo_rutas()
+    if len(sys.argv) > 3:
+        traza = red.trazar(sys.argv[2], sys.argv[3])
+        for (tipo, nombre), ruta in traza.saltos:
+            print(f"  {tipo:<4} {nombre:<24} {ruta.destino + ' -> ' + ruta.objetivo if ruta else ''}")
+        print(f"{traza.resultado}: {traza.motivo}")
+        sys.exit(0 if traza.resultado == 'entregado' else 1)
+    sys.exit(0 if imprimir_informe(red) else 1)
@@ -5,7 +5,7 @@ def crear_vpc():
     ec2 = boto3.client('ec2')
 
     # Crear la VPC
-    vpc = ec2.create_vpc(CidrBlock='192.168.5.0/16')
+    vpc = ec2.create_vpc(CidrBlock='192.168.0.0/16')
     vpc_id = vpc['Vpc']['VpcId']
     print(f'VPC creada con ID: {vpc_id}')
 
@@ -0,0 +1,1509 @@
+"""EC2/STS simulado en el propio proceso, con reloj virtual, para pruebas rápidas.
+
+Las esperas de verdad (NAT 3-5 min, TGW ~2 min, aceptar un peering...)
+hacen lenta cualquier prueba realista. Con simular() activo, las llamadas
+de boto3 no salen del proceso: un handler de 'before-call' de botocore
+las responde desde un EC2 en memoria, y time.sleep, time.monotonic,
+time.time y asyncio.sleep de los módulos de RELOJ_VIRTUAL (waiters,
+coalescer, botocore.waiter...) pasan a un reloj virtual; el módulo time
+de la biblioteca estándar no se toca. Un NAT sigue tardando
+sus 3 minutos en estar 'available', pero de reloj virtual: los waiters
+duermen, el reloj salta y un despliegue + limpieza multi-región entero
+tarda menos de un segundo.
+
+    with simular() as aws:
+        cli.main(['deploy', 'ejercicio3'])
+        cli.main(['destroy', 'ejercicio3'])
+        print(aws.resumen(), aws.reloj.transcurrido())
+
+Se modelan las máquinas de estados de cada API (con sus nombres):
+    VPC, subred                pending -> available; el borrado es inmediato
+    IGW (su attachment)        attaching -> available -> (suelto)
+    NAT                        pending -> available | failed -> deleting -> deleted
+    TGW, attachment de VPC     pending -> available -> deleting -> deleted
+    peering de TGWs            initiatingRequest -> pendingAcceptance -> (accept) pending
+                               -> available -> deleting -> deleted; visible en las dos regiones
+    instancia                  pending -> running -> shutting-down -> terminated
+y los errores de dependencias de EC2: DependencyViolation al borrar una
+subred con ENIs, una VPC con recursos dentro, un IGW adjunto o un SG
+referenciado; IncorrectState al adjuntar a un TGW que no está available,
+crear una ruta hacia un attachment pendiente o aceptar un peering que no
+está en pendingAcceptance; un NAT creado sin IGW en la VPC acaba 'failed'.
+Los recursos terminados (deleted, terminated) siguen saliendo en los
+describe durante VISIBLE_TRAS_BORRAR, como en EC2.
+
+El reloj avanza cuando los hilos que duermen llevan QUIETUD (tiempo real)
+sin que nadie llame a la API: el que antes despierta salta a su hora. Las
+pausas de hilos en paralelo se solapan como en la realidad y el tiempo
+virtual final es el que habría tardado contra AWS (sin red, salvo que se
+pida latencia= por llamada).
+
+No hay throttling: el handler responde antes de la capa de reintentos de
+botocore. Lo que no está en la tabla de operaciones responde
+UnsupportedOperation: con la simulación activa ninguna llamada llega a AWS.
+"""
+import asyncio
+import contextlib
+import copy
+import datetime
+import fnmatch
+import importlib
+import ipaddress
+import itertools
+import os
+import threading
+import time
+from collections import Counter
+
+# --- CONFIGURACIÓN ---
+CUENTA = '123456789012'
+QUIETUD = 0.001              # Segundos reales sin actividad antes de adelantar el reloj
+VISIBLE_TRAS_BORRAR = 3600   # Segundos virtuales que un recurso 'deleted'/'terminated' sigue en los describe
+# Segundos virtuales de cada transición (tiempos típicos de EC2)
+CREACION = {'vpc': 1, 'subnet': 1, 'igw': 2, 'nat': 180, 'tgw': 120, 'vpc-attachment': 60,
+            'peering': 15, 'instance': 30}
+ACEPTACION = 90              # Peering aceptado: pending -> available
+BORRADO = {'nat': 60, 'tgw': 120, 'vpc-attachment': 60, 'peering': 60, 'instance': 45}
+ZONAS = 'abc'
+# Módulos que duermen o miden tiempo durante un despliegue: su 'time' (y su
+# 'asyncio') se sustituyen por el reloj virtual mientras dura simular()
+RELOJ_VIRTUAL = ('waiters', 'coalescer', 'limitador', 'estado', 'metricas', 'trazas', 'cleanup_lote',
+                 'asincrono', 'botocore.waiter', 'aiobotocore.waiter')
+IMAGENES = [
+    {'ImageId': 'ami-0c7217cdde317cfec', 'Name': 'ubuntu/images/hvm-ssd/ubuntu-jammy-22.04-amd64-server-20240111',
+     'CreationDate': '2024-01-11T00:00:00.000Z', 'OwnerId': '099720109477'},
+    {'ImageId': 'ami-04b70fa74e45c3917', 'Name': 'ubuntu/images/hvm-ssd-gp3/ubuntu-noble-24.04-amd64-server-20240423',
+     'CreationDate': '2024-04-23T00:00:00.000Z', 'OwnerId': '099720109477'},
+]
+# Estado final de los tipos que siguen visibles tras borrarse
+FINALES = {'nat': 'deleted', 'tgw': 'deleted', 'tgw-rt': 'deleted', 'vpc-attachment': 'deleted',
+           'peering': 'deleted', 'instance': 'terminated'}
+CODIGOS_INSTANCIA = {'pending': 0, 'running': 16, 'shutting-down': 32, 'terminated': 48, 'stopping': 64, 'stopped': 80}
+# Filtros cuyo campo no sale de pasar el nombre a CamelCase
+ALIAS_FILTROS = {
+    'attachment.vpc-id': ('Attachments', 'VpcId'),
+    'attachment.state': ('Attachments', 'State'),
+    'association.subnet-id': ('Associations', 'SubnetId'),
+    'association.main': ('Associations', 'Main'),
+    'association.route-table-association-id': ('Associations', 'RouteTableAssociationId'),
+    'association.network-acl-id': ('Associations', 'NetworkAclId'),
+    'instance-state-name': ('State', 'Name'),
+    'default': ('IsDefault',),
+    'is-default': ('IsDefault',),
+    'cidr': ('CidrBlock',),
+    'availability-zone': ('Placement', 'AvailabilityZone'),
+}
+
+_OPERACIONES = {}   # nombre de boto3 (create_vpc...) -> método de EC2Simulado
+_activa = None      # EC2Simulado de la simulación en marcha
+_cargador = None    # Loader de botocore compartido por las sesiones simuladas
+_CLAVE = 'simulador_ec2'
+
+
+class ErrorAWS(Exception):
+    """Respuesta de error de la API simulada (se convierte en ClientError en boto3)."""
+
+    def __init__(self, codigo, mensaje, estado_http=400):
+        super().__init__(f"{codigo}: {mensaje}")
+        self.codigo = codigo
+        self.mensaje = mensaje
+        self.estado_http = estado_http
+
+
+def operacion(funcion):
+    """Registra un método de EC2Simulado como la operación de boto3 del mismo nombre"""
+    _OPERACIONES[funcion.__name__] = funcion
+    return funcion
+
+
+# --- RELOJ VIRTUAL ---
+
+class Reloj:
+    """Reloj virtual compartido por todos los hilos.
+
+    dormir() no espera el tiempo pedido: registra la hora de despertar y,
+    cuando nadie llama a la API durante QUIETUD, el hilo que antes tiene
+    que despertar adelanta el reloj hasta su hora.
+    """
+
+    def __init__(self, quietud=QUIETUD, monotonic=time.monotonic, epoca=time.time):
+        self.quietud = quietud
+        self.inicio = monotonic()    # Continúa desde el reloj real: nada retrocede al entrar
+        self._epoca = epoca() - self.inicio
+        # Segundos virtuales desde el inicio, aparte del valor absoluto: sumados a un
+        # monotonic() real grande perderían precisión y transcurrido() no sería exacto
+        self._transcurrido = 0.0
+        self._cond = threading.Condition()
+        self._despertares = []
+        self._actividad = 0
+
+    def monotonic(self):
+        return self.inicio + self._transcurrido
+
+    def time(self):
+        return self._epoca + self.monotonic()
+
+    def transcurrido(self):
+        return self._transcurrido
+
+    def actividad(self):
+        """Alguien hace algo (una llamada a la API): los dormidos no adelantan el reloj todavía"""
+        with self._cond:
+            self._actividad += 1
+
+    def avanzar(self, segundos):
+        with self._cond:
+            self._transcurrido += segundos
+            self._actividad += 1
+            self._cond.notify_all()
+
+    def dormir(self, segundos, _esperar=None):
+        if segundos <= 0:
+            return
+        with self._cond:
+            despertar = self._transcurrido + segundos
+            self._despertares.append(despertar)
+            try:
+                while self._transcurrido < despertar:
+                    vista = self._actividad
+                    self._cond.wait(self.quietud)
+                    if (self._transcurrido < despertar and self._actividad == vista
+                            and despertar <= min(self._despertares)):
+                        self._transcurrido = despertar
+                        self._actividad += 1
+                        self._cond.notify_all()
+            finally:
+                self._despertares.remove(despertar)
+
+
+class _Sustituto:
+    """Un módulo con algunos atributos cambiados; el resto se lee del original"""
+
+    def __init__(self, original, **cambios):
+        self._original = original
+        vars(self).update(cambios)
+
+    def __getattr__(self, nombre):
+        return getattr(self._original, nombre)
+
+
+@contextlib.contextmanager
+def reloj_virtual(reloj, modulos=RELOJ_VIRTUAL):
+    """time.sleep/monotonic/time y asyncio.sleep de los módulos indicados van al reloj mientras dure el bloque.
+
+    Solo cambia el atributo 'time' (o 'asyncio') de cada módulo, no el
+    módulo de la biblioteca estándar: el resto del proceso sigue con el
+    reloj de verdad. Los que no pueden importarse (aiobotocore sin
+    instalar) se saltan. Al salir se restauran los originales.
+    """
+    asyncio_sleep = asyncio.sleep
+
+    async def dormir_async(segundos, resultado=None):
+        if segundos > 0:
+            await asyncio.get_running_loop().run_in_executor(None, reloj.dormir, segundos)
+        else:
+            await asyncio_sleep(0)
+        return resultado
+
+    sustitutos = {'time': (time, _Sustituto(time, sleep=reloj.dormir, monotonic=reloj.monotonic, time=reloj.time)),
+                  'asyncio': (asyncio, _Sustituto(asyncio, sleep=dormir_async))}
+    cambiados = []
+    try:
+        for nombre in modulos:
+            try:
+                mod = importlib.import_module(nombre)
+            except ImportError:
+                continue
+            for atributo, (original, sustituto) in sustitutos.items():
+                if vars(mod).get(atributo) is original:
+                    setattr(mod, atributo, sustituto)
+                    cambiados.append((mod, atributo, original))
+        yield reloj
+    finally:
+        for mod, atributo, original in reversed(cambiados):
+            setattr(mod, atributo, original)
+
+
+# --- RECURSOS ---
+
+class Recurso:
+    """Un recurso simulado: datos fijos, tags y su línea de tiempo de estados."""
+
+    def __init__(self, tipo, rid, region, datos):
+        self.tipo = tipo
+        self.id = rid
+        self.region = region
+        self.datos = datos
+        self.tags = []
+        self.fases = []    # [(instante, estado)]
+
+    def programar(self, ahora, *fases):
+        """Encadena estados desde ahora: programar(t, ('pending', 180), ('available', None)).
+
+        Lo que estaba programado para después de ahora se descarta (borrar un NAT pending).
+        """
+        self.fases = [(t, e) for t, e in self.fases if t <= ahora]
+        for estado, segundos in fases:
+            self.fases.append((ahora, estado))
+            if segundos is None:
+                break
+            ahora += segundos
+        return self
+
+    def estado(self, ahora):
+        actual = self.fases[0][1] if self.fases else None
+        for t, e in self.fases:
+            if t > ahora:
+                break
+            actual = e
+        return actual
+
+    def desde(self, ahora):
+        """Instante en que empezó el estado actual"""
+        inicio = None
+        for t, _ in self.fases:
+            if t > ahora:
+                break
+            inicio = t
+        return inicio
+
+    def visible(self, ahora):
+        final = FINALES.get(self.tipo)
+        return not (final and self.estado(ahora) == final and ahora - self.desde(ahora) > VISIBLE_TRAS_BORRAR)
+
+    def etiquetar(self, tags):
+        for tag in tags:
+            self.tags = [t for t in self.tags if t['Key'] != tag['Key']] + [{'Key': tag['Key'], 'Value': tag.get('Value', '')}]
+
+    def __repr__(self):
+        return f"Recurso({self.tipo}, {self.id}, {self.region})"
+
+
+def _camino(nombre):
+    if nombre in ALIAS_FILTROS:
+        return ALIAS_FILTROS[nombre]
+    return tuple(''.join(p.capitalize() for p in parte.split('-')) for parte in nombre.split('.'))
+
+
+def _valores(vista, nombre):
+    if nombre.startswith('tag:'):
+        return [t['Value'] for t in vista.get('Tags', []) if t['Key'] == nombre[4:]]
+    if nombre == 'tag-key':
+        return [t['Key'] for t in vista.get('Tags', [])]
+    valores = [vista]
+    for clave in _camino(nombre):
+        siguientes = []
+        for v in valores:
+            v = v.get(clave) if isinstance(v, dict) else None
+            siguientes += v if isinstance(v, list) else [v] if v is not None else []
+        valores = siguientes
+    return [str(v).lower() if isinstance(v, bool) else str(v) for v in valores]
+
+
+def cumple(vista, filtros):
+    """Filtros de EC2: todos deben casar, con alguno de sus valores (admiten * y ?)"""
+    return all(any(fnmatch.fnmatchcase(v, patron) for v in _valores(vista, f['Name']) for patron in f['Values'])
+               for f in filtros or [])
+
+
+# --- EC2 SIMULADO ---
+
+class EC2Simulado:
+    """EC2 (y STS) en memoria: regiones, recursos y una operación por método."""
+
+    def __init__(self, reloj, creacion=None, borrado=None, aceptacion=ACEPTACION, cuenta=CUENTA, latencia=0.0):
+        self.reloj = reloj
+        self.creacion = dict(CREACION, **(creacion or {}))
+        self.borrado = dict(BORRADO, **(borrado or {}))
+        self.aceptacion = aceptacion
+        self.cuenta = cuenta
+        self.latencia = latencia
+        self._lock = threading.RLock()
+        self._regiones = {}            # región -> {tipo: {id: Recurso}}
+        self._ids = itertools.count(0x0a1b2c3d4e5f60001)
+        self._ips_publicas = itertools.count(int(ipaddress.ip_address('3.80.0.10')))
+        self.llamadas = Counter()      # operación -> llamadas
+        self.errores = Counter()       # código de error -> veces
+        self.en_vuelo = 0
+        self.pico = 0
+
+    # --- Atender una llamada de botocore ---
+
+    def atender(self, servicio, nombre, parametros, region, url):
+        """(respuesta HTTP, respuesta ya parseada) de una llamada, como la devolvería botocore"""
+        from botocore.awsrequest import AWSResponse
+        self.reloj.actividad()
+        with self._lock:
+            self.llamadas[nombre] += 1
+            self.en_vuelo += 1
+            self.pico = max(self.pico, self.en_vuelo)
+        try:
+            if self.latencia:
+                self.reloj.dormir(self.latencia)
+            funcion = _OPERACIONES.get(nombre) if servicio in ('ec2', 'sts') else None
+            try:
+                if funcion is None:
+                    raise ErrorAWS('UnsupportedOperation', f"{servicio}.{nombre} is not supported by the simulator")
+                with self._lock:
+                    respuesta = copy.deepcopy(funcion(self, region, copy.deepcopy(parametros)))
+                estado_http = 200
+            except ErrorAWS as e:
+                with self._lock:
+                    self.errores[e.codigo] += 1
+                respuesta = {'Error': {'Code': e.codigo, 'Message': e.mensaje}}
+                estado_http = e.estado_http
+        finally:
+            with self._lock:
+                self.en_vuelo -= 1
+            self.reloj.actividad()
+        respuesta['ResponseMetadata'] = {'RequestId': f"simulado-{next(self._ids):x}", 'HTTPStatusCode': estado_http,
+                                         'HTTPHeaders': {}, 'RetryAttempts': 0}
+        return AWSResponse(url, estado_http, {}, None), respuesta
+
+    # --- Consultas para las pruebas ---
+
+    def resumen(self, region=None):
+        """{tipo: nº de recursos vivos} (sin contar los deleted/terminated ni los de serie de cada VPC)"""
+        ahora = self.reloj.monotonic()
+        cuenta = Counter()
+        for r in self._todos(region):
+            if r.estado(ahora) == FINALES.get(r.tipo) or r.datos.get('_de_serie'):
+                continue
+            cuenta[r.tipo] += 1
+        return dict(sorted(cuenta.items()))
+
+    def recursos(self, tipo, region=None):
+        """Vistas (los dicts de los describe) de los recursos visibles de un tipo"""
+        ahora = self.reloj.monotonic()
+        return [self._vista(r, ahora, r.region) for r in self._todos(region) if r.tipo == tipo and r.visible(ahora)]
+
+    def _todos(self, region=None):
+        regiones = [region] if region else list(self._regiones)
+        vistos = set()
+        for reg in regiones:
+            for por_id in self._regiones.get(reg, {}).values():
+                for r in por_id.values():
+                    if id(r) not in vistos:   # Los peerings están en sus dos regiones
+                        vistos.add(id(r))
+                        yield r
+
+    # --- Utilidades internas ---
+
+    def _ahora(self):
+        return self.reloj.monotonic()
+
+    def _fecha(self, instante=None):
+        instante = self._ahora() if instante is None else instante
+        return datetime.datetime.fromtimestamp(self.reloj._epoca + instante, datetime.timezone.utc)
+
+    def _id(self, prefijo):
+        return f"{prefijo}-{next(self._ids):017x}"
+
+    def _de(self, region, tipo):
+        return self._regiones.setdefault(region, {}).setdefault(tipo, {})
+
+    def _nuevo(self, region, tipo, prefijo, datos, parametros=None, tipo_tags=None):
+        r = Recurso(tipo, self._id(prefijo), region, datos)
+        r.creado = self._ahora()
+        for spec in (parametros or {}).get('TagSpecifications', []):
+            if tipo_tags and spec['ResourceType'] != tipo_tags:
+                raise ErrorAWS('InvalidParameterValue',
+                               f"'{spec['ResourceType']}' is not a valid taggable resource type for this operation.")
+            r.etiquetar(spec.get('Tags', []))
+        self._de(region, tipo)[r.id] = r
+        return r
+
+    def _buscar(self, region, tipo, rid, codigo):
+        r = self._de(region, tipo).get(rid)
+        if r is None or not r.visible(self._ahora()):
+            raise ErrorAWS(codigo, f"The ID '{rid}' does not exist")
+        return r
+
+    def _quitar(self, r):
+        self._de(r.region, r.tipo).pop(r.id, None)
+
+    def _estado(self, r):
+        return r.estado(self._ahora())
+
+    def _describir(self, region, tipo, p, campo_ids=None, codigo=None):
+        ahora = self._ahora()
+        candidatos = [r for r in self._de(region, tipo).values() if r.visible(ahora)]
+        ids = p.get(campo_ids) if campo_ids else None
+        if ids:
+            conocidos = {r.id for r in candidatos}
+            faltan = [i for i in ids if i not in conocidos]
+            if faltan:
+                raise ErrorAWS(codigo, f"The ID '{faltan[0]}' does not exist")
+            candidatos = [r for r in candidatos if r.id in ids]
+        vistas = [self._vista(r, ahora, region) for r in candidatos]
+        return [v for v in vistas if cumple(v, p.get('Filters'))]
+
+    def _vista(self, r, ahora, region):
+        vista = getattr(self, '_vista_' + r.tipo.replace('-', '_'))(r, ahora, region)
+        if r.tags:
+            vista['Tags'] = r.tags
+        return vista
+
+    def _zonas(self, region):
+        return [f"{region}{letra}" for letra in ZONAS]
+
+    def _ip_publica(self):
+        return str(ipaddress.ip_address(next(self._ips_publicas)))
+
+    def _ip_privada(self, subred):
+        subred.datos['_siguiente_ip'] += 1
+        return str(ipaddress.ip_network(subred.datos['CidrBlock'])[subred.datos['_siguiente_ip']])
+
+    def _vivo(self, r, ahora=None):
+        """El recurso no ha llegado a su estado final (ni está fallido)"""
+        estado = r.estado(self._ahora() if ahora is None else ahora)
+        return estado not in (FINALES.get(r.tipo), 'failed', 'rejected')
+
+    # --- STS ---
+
+    @operacion
+    def get_caller_identity(self, region, p):
+        return {'UserId': 'AIDASIMULADO', 'Account': self.cuenta, 'Arn': f"arn:aws:iam::{self.cuenta}:user/simulado"}
+
+    # --- Regiones, zonas e imágenes ---
+
+    @operacion
+    def describe_availability_zones(self, region, p):
+        abreviatura = ''.join(parte[0] for parte in region.split('-')[:-1]) + region.split('-')[-1]
+        zonas = [{'ZoneName': nombre, 'State': 'available', 'RegionName': region, 'ZoneId': f"{abreviatura}-az{i + 1}",
+                  'ZoneType': 'availability-zone', 'OptInStatus': 'opt-in-not-required', 'Messages': []}
+                 for i, nombre in enumerate(self._zonas(region))]
+        nombres = p.get('ZoneNames')
+        return {'AvailabilityZones': [z for z in zonas if (not nombres or z['ZoneName'] in nombres)
+                                      and cumple(z, p.get('Filters'))]}
+
+    @operacion
+    def describe_images(self, region, p):
+        imagenes = [dict(i, State='available', Public=True, Architecture='x86_64', ImageType='machine',
+                         RootDeviceType='ebs', VirtualizationType='hvm') for i in IMAGENES]
+        ids, duenos = p.get('ImageIds'), p.get('Owners')
+        return {'Images': [i for i in imagenes if (not ids or i['ImageId'] in ids)
+                           and (not duenos or i['OwnerId'] in duenos) and cumple(i, p.get('Filters'))]}
+
+    # --- VPCs ---
+
+    def _vista_vpc(self, r, ahora, region):
+        return {'VpcId': r.id, 'CidrBlock': r.datos['CidrBlock'], 'State': r.estado(ahora), 'OwnerId': self.cuenta,
+                'DhcpOptionsId': 'dopt-simulado', 'InstanceTenancy': 'default', 'IsDefault': False,
+                'CidrBlockAssociationSet': [{'AssociationId': f"vpc-cidr-assoc-{r.id[4:]}",
+                                             'CidrBlock': r.datos['CidrBlock'],
+                                             'CidrBlockState': {'State': 'associated'}}]}
+
+    @operacion
+    def create_vpc(self, region, p):
+        try:
+            red = ipaddress.ip_network(p['CidrBlock'])
+        except ValueError:
+            raise ErrorAWS('InvalidParameterValue', f"Value ({p['CidrBlock']}) for parameter cidrBlock is invalid.")
+        if not 16 <= red.prefixlen <= 28:
+            raise ErrorAWS('InvalidVpc.Range', f"The CIDR '{p['CidrBlock']}' is invalid.")
+        vpc = self._nuevo(region, 'vpc', 'vpc', {'CidrBlock': str(red), 'EnableDnsSupport': True,
+                                                  'EnableDnsHostnames': False}, p, 'vpc')
+        vpc.programar(self._ahora(), ('pending', self.creacion['vpc']), ('available', None))
+        # Lo que EC2 crea con cada VPC: tabla principal, NACL y SG por defecto
+        rt = self._nuevo(region, 'rt', 'rtb', {'VpcId': vpc.id, 'Routes': [], 'Asociaciones': {}, '_de_serie': True})
+        rt.datos['Asociaciones'][self._id('rtbassoc')] = None    # None: la asociación principal
+        rt.programar(self._ahora(), ('available', None))
+        acl = self._nuevo(region, 'nacl', 'acl', {'VpcId': vpc.id, 'IsDefault': True, 'Entries': [
+            {'RuleNumber': 100, 'Protocol': '-1', 'RuleAction': 'allow', 'Egress': e, 'CidrBlock': '0.0.0.0/0'}
+            for e in (False, True)], 'Asociaciones': {}, '_de_serie': True})
+        acl.programar(self._ahora(), ('available', None))
+        sg = self._nuevo(region, 'sg', 'sg', {'VpcId': vpc.id, 'GroupName': 'default', 'Description':
+                                              'default VPC security group', 'IpPermissions': [], '_de_serie': True})
+        sg.datos['IpPermissions'] = [{'IpProtocol': '-1', 'UserIdGroupPairs': [{'GroupId': sg.id, 'UserId': self.cuenta}]}]
+        sg.programar(self._ahora(), ('available', None))
+        return {'Vpc': self._vista(vpc, self._ahora(), region)}
+
+    @operacion
+    def describe_vpcs(self, region, p):
+        return {'Vpcs': self._describir(region, 'vpc', p, 'VpcIds', 'InvalidVpcID.NotFound')}
+
+    @operacion
+    def modify_vpc_attribute(self, region, p):
+        vpc = self._buscar(region, 'vpc', p['VpcId'], 'InvalidVpcID.NotFound')
+        for atributo in ('EnableDnsSupport', 'EnableDnsHostnames'):
+            if atributo in p:
+                vpc.datos[atributo] = p[atributo]['Value']
+        return {}
+
+    @operacion
+    def describe_vpc_attribute(self, region, p):
+        vpc = self._buscar(region, 'vpc', p['VpcId'], 'InvalidVpcID.NotFound')
+        atributo = p['Attribute'][0].upper() + p['Attribute'][1:]
+        return {'VpcId': vpc.id, atributo: {'Value': vpc.datos[atributo]}}
+
+    def _dependencias_vpc(self, vpc):
+        ahora = self._ahora()
+        de_vpc = [r for tipo in ('subnet', 'rt', 'nacl', 'sg', 'vpc-attachment') for r in self._de(vpc.region, tipo).values()
+                  if r.datos.get('VpcId') == vpc.id and not r.datos.get('_de_serie') and self._vivo(r, ahora)]
+        igws = [g for g in self._de(vpc.region, 'igw').values() if self._adjunto(g, ahora) == vpc.id]
+        return de_vpc + igws
+
+    @operacion
+    def delete_vpc(self, region, p):
+        vpc = self._buscar(region, 'vpc', p['VpcId'], 'InvalidVpcID.NotFound')
+        dependencias = self._dependencias_vpc(vpc)
+        if dependencias:
+            raise ErrorAWS('DependencyViolation', f"The vpc '{vpc.id}' has dependencies and cannot be deleted.")
+        for tipo in ('rt', 'nacl', 'sg'):
+            for r in list(self._de(region, tipo).values()):
+                if r.datos.get('VpcId') == vpc.id:
+                    self._quitar(r)
+        self._quitar(vpc)
+        return {}
+
+    # --- Subredes ---
+
+    def _vista_subnet(self, r, ahora, region):
+        libres = ipaddress.ip_network(r.datos['CidrBlock']).num_addresses - 5
+        return {'SubnetId': r.id, 'VpcId': r.datos['VpcId'], 'CidrBlock': r.datos['CidrBlock'],
+                'AvailabilityZone': r.datos['AvailabilityZone'], 'State': r.estado(ahora),
+                'MapPublicIpOnLaunch': r.datos['MapPublicIpOnLaunch'], 'DefaultForAz': False,
+                'AvailableIpAddressCount': libres - len(self._enis_de_subred(r, ahora)), 'OwnerId': self.cuenta,
+                'SubnetArn': f"arn:aws:ec2:{region}:{self.cuenta}:subnet/{r.id}"}
+
+    @operacion
+    def create_subnet(self, region, p):
+        vpc = self._buscar(region, 'vpc', p['VpcId'], 'InvalidVpcID.NotFound')
+        try:
+            red = ipaddress.ip_network(p['CidrBlock'])
+        except ValueError:
+            raise ErrorAWS('InvalidParameterValue', f"Value ({p['CidrBlock']}) for parameter cidrBlock is invalid.")
+        if not red.subnet_of(ipaddress.ip_network(vpc.datos['CidrBlock'])) or not 16 <= red.prefixlen <= 28:
+            raise ErrorAWS('InvalidSubnet.Range', f"The CIDR '{p['CidrBlock']}' is invalid.")
+        for otra in self._de(region, 'subnet').values():
+            if otra.datos['VpcId'] == vpc.id and red.overlaps(ipaddress.ip_network(otra.datos['CidrBlock'])):
+                raise ErrorAWS('InvalidSubnet.Conflict', f"The CIDR '{p['CidrBlock']}' conflicts with another subnet")
+        zona = p.get('AvailabilityZone') or self._zonas(region)[0]
+        if zona not in self._zonas(region):
+            raise ErrorAWS('InvalidParameterValue', f"Value ({zona}) for parameter availabilityZone is invalid.")
+        subred = self._nuevo(region, 'subnet', 'subnet', {'VpcId': vpc.id, 'CidrBlock': str(red), 'AvailabilityZone': zona,
+                                                           'MapPublicIpOnLaunch': False, '_siguiente_ip': 3}, p, 'subnet')
+        subred.programar(self._ahora(), ('pending', self.creacion['subnet']), ('available', None))
+        # Toda subred nace asociada al NACL por defecto de su VPC
+        acl = next(a for a in self._de(region, 'nacl').values() if a.datos['VpcId'] == vpc.id and a.datos['IsDefault'])
+        acl.datos['Asociaciones'][self._id('aclassoc')] = subred.id
+        return {'Subnet': self._vista(subred, self._ahora(), region)}
+
+    @operacion
+    def describe_subnets(self, region, p):
+        return {'Subnets': self._describir(region, 'subnet', p, 'SubnetIds', 'InvalidSubnetID.NotFound')}
+
+    @operacion
+    def modify_subnet_attribute(self, region, p):
+        subred = self._buscar(region, 'subnet', p['SubnetId'], 'InvalidSubnetID.NotFound')
+        if 'MapPublicIpOnLaunch' in p:
+            subred.datos['MapPublicIpOnLaunch'] = p['MapPublicIpOnLaunch']['Value']
+        return {}
+
+    @operacion
+    def delete_subnet(self, region, p):
+        subred = self._buscar(region, 'subnet', p['SubnetId'], 'InvalidSubnetID.NotFound')
+        if self._enis_de_subred(subred, self._ahora()):
+            raise ErrorAWS('DependencyViolation', f"The subnet '{subred.id}' has dependencies and cannot be deleted.")
+        # Borrar la subred quita sus asociaciones explícitas de tabla de rutas y de NACL
+        for tipo in ('rt', 'nacl'):
+            for r in self._de(region, tipo).values():
+                for asoc in [a for a, s in r.datos['Asociaciones'].items() if s == subred.id]:
+                    del r.datos['Asociaciones'][asoc]
+        self._quitar(subred)
+        return {}
+
+    # --- Interfaces de red (las de NAT, instancias y attachments, derivadas de su estado) ---
+
+    def _enis(self, region, ahora):
+        """[(eni_id, subred, tipo de interfaz, dueño)] de los recursos que aún ocupan su subred"""
+        enis = []
+        for nat in self._de(region, 'nat').values():
+            if nat.estado(ahora) not in ('deleted', 'failed'):
+                enis.append((nat.datos['NetworkInterfaceId'], nat.datos['SubnetId'], 'nat_gateway', nat))
+        for inst in self._de(region, 'instance').values():
+            if inst.estado(ahora) != 'terminated':
+                enis.append((inst.datos['NetworkInterfaceId'], inst.datos['SubnetId'], 'interface', inst))
+        for att in self._de(region, 'vpc-attachment').values():
+            if att.estado(ahora) not in ('deleted', 'failed'):
+                enis += [(f"eni-{att.id[15:]}{i}", s, 'transit_gateway', att) for i, s in enumerate(att.datos['SubnetIds'])]
+        return enis
+
+    def _enis_de_subred(self, subred, ahora):
+        return [e for e in self._enis(subred.region, ahora) if e[1] == subred.id]
+
+    @operacion
+    def describe_network_interfaces(self, region, p):
+        ahora = self._ahora()
+        subredes = self._de(region, 'subnet')
+        vistas = []
+        for eni_id, subred_id, tipo, dueno in self._enis(region, ahora):
+            subred = subredes.get(subred_id)
+            vistas.append({'NetworkInterfaceId': eni_id, 'SubnetId': subred_id, 'VpcId': dueno.datos.get('VpcId') or (
+                subred.datos['VpcId'] if subred else None), 'Status': 'in-use', 'InterfaceType': tipo,
+                'RequesterManaged': tipo != 'interface', 'AvailabilityZone': subred.datos['AvailabilityZone'] if subred else None,
+                'Description': f"Interface for {dueno.id}", 'OwnerId': self.cuenta})
+        ids = p.get('NetworkInterfaceIds')
+        if ids:
+            faltan = [i for i in ids if i not in {v['NetworkInterfaceId'] for v in vistas}]
+            if faltan:
+                raise ErrorAWS('InvalidNetworkInterfaceID.NotFound', f"The networkInterface ID '{faltan[0]}' does not exist")
+            vistas = [v for v in vistas if v['NetworkInterfaceId'] in ids]
+        return {'NetworkInterfaces': [v for v in vistas if cumple(v, p.get('Filters'))]}
+
+    @operacion
+    def delete_network_interface(self, region, p):
+        if any(e[0] == p['NetworkInterfaceId'] for e in self._enis(region, self._ahora())):
+            raise ErrorAWS('InvalidParameterValue', f"Network interface '{p['NetworkInterfaceId']}' is currently in use.")
+        raise ErrorAWS('InvalidNetworkInterfaceID.NotFound',
+                       f"The networkInterface ID '{p['NetworkInterfaceId']}' does not exist")
+
+    # --- Internet Gateways ---
+
+    def _adjunto(self, igw, ahora):
+        """VPC a la que está adjunto el IGW (también mientras se adjunta), o None"""
+        return igw.datos['VpcId'] if igw.datos['VpcId'] and igw.estado(ahora) != 'detached' else None
+
+    def _vista_igw(self, r, ahora, region):
+        vpc = self._adjunto(r, ahora)
+        return {'InternetGatewayId': r.id, 'OwnerId': self.cuenta,
+                'Attachments': [{'VpcId': vpc, 'State': r.estado(ahora)}] if vpc else []}
+
+    @operacion
+    def create_internet_gateway(self, region, p):
+        igw = self._nuevo(region, 'igw', 'igw', {'VpcId': None}, p, 'internet-gateway')
+        igw.programar(self._ahora(), ('detached', None))
+        return {'InternetGateway': self._vista(igw, self._ahora(), region)}
+
+    @operacion
+    def describe_internet_gateways(self, region, p):
+        return {'InternetGateways': self._describir(region, 'igw', p, 'InternetGatewayIds',
+                                                    'InvalidInternetGatewayID.NotFound')}
+
+    @operacion
+    def attach_internet_gateway(self, region, p):
+        igw = self._buscar(region, 'igw', p['InternetGatewayId'], 'InvalidInternetGatewayID.NotFound')
+        vpc = self._buscar(region, 'vpc', p['VpcId'], 'InvalidVpcID.NotFound')
+        ahora = self._ahora()
+        if self._adjunto(igw, ahora):
+            raise ErrorAWS('Resource.AlreadyAssociated', f"resource {igw.id} is already attached to network {igw.datos['VpcId']}")
+        if any(self._adjunto(g, ahora) == vpc.id for g in self._de(region, 'igw').values()):
+            raise ErrorAWS('Resource.AlreadyAssociated', f"Network {vpc.id} already has an internet gateway attached")
+        igw.datos['VpcId'] = vpc.id
+        igw.programar(ahora, ('attaching', self.creacion['igw']), ('available', None))
+        return {}
+
+    def _direcciones_publicas(self, vpc_id, ahora):
+        region_nat = [n for n in self._de_vpc_tipo(vpc_id, 'nat') if n.estado(ahora) not in ('deleted', 'failed')]
+        instancias = [i for i in self._de_vpc_tipo(vpc_id, 'instance')
+                      if i.estado(ahora) != 'terminated' and i.datos.get('PublicIpAddress')]
+        return region_nat + instancias
+
+    def _de_vpc_tipo(self, vpc_id, tipo):
+        return [r for reg in self._regiones.values() for r in reg.get(tipo, {}).values() if r.datos.get('VpcId') == vpc_id]
+
+    @operacion
+    def detach_internet_gateway(self, region, p):
+        igw = self._buscar(region, 'igw', p['InternetGatewayId'], 'InvalidInternetGatewayID.NotFound')
+        ahora = self._ahora()
+        if self._adjunto(igw, ahora) != p['VpcId']:
+            raise ErrorAWS('Gateway.NotAttached', f"resource {igw.id} is not attached to network {p['VpcId']}")
+        if self._direcciones_publicas(p['VpcId'], ahora):
+            raise ErrorAWS('DependencyViolation', f"Network {p['VpcId']} has some mapped public address(es). "
+                                                  "Please unmap those public address(es) before detaching the gateway.")
+        # En EC2 el detach es prácticamente inmediato: un delete justo después ya no choca
+        igw.programar(ahora, ('detached', None))
+        return {}
+
+    @operacion
+    def delete_internet_gateway(self, region, p):
+        igw = self._buscar(region, 'igw', p['InternetGatewayId'], 'InvalidInternetGatewayID.NotFound')
+        if self._adjunto(igw, self._ahora()):
+            raise ErrorAWS('DependencyViolation', f"The internetGateway '{igw.id}' has dependencies and cannot be deleted.")
+        self._quitar(igw)
+        return {}
+
+    # --- Tablas de rutas ---
+
+    def _estado_ruta(self, ruta, region, ahora):
+        objetivos = (('GatewayId', 'igw'), ('NatGatewayId', 'nat'), ('TransitGatewayId', 'tgw'))
+        for campo, tipo in objetivos:
+            if campo in ruta and ruta[campo] != 'local':
+                r = self._de(region, tipo).get(ruta[campo])
+                vivo = r is not None and (self._adjunto(r, ahora) if tipo == 'igw' else self._vivo(r, ahora))
+                return 'active' if vivo else 'blackhole'
+        return 'active'
+
+    def _vista_rt(self, r, ahora, region):
+        vpc = self._de(region, 'vpc').get(r.datos['VpcId'])
+        local = [{'DestinationCidrBlock': vpc.datos['CidrBlock'], 'GatewayId': 'local', 'Origin': 'CreateRouteTable',
+                  'State': 'active'}] if vpc else []
+        rutas = [dict(ruta, Origin='CreateRoute', State=self._estado_ruta(ruta, region, ahora)) for ruta in r.datos['Routes']]
+        asociaciones = [{'Main': subred is None, 'RouteTableAssociationId': asoc, 'RouteTableId': r.id,
+                         'AssociationState': {'State': 'associated'}, **({'SubnetId': subred} if subred else {})}
+                        for asoc, subred in r.datos['Asociaciones'].items()]
+        return {'RouteTableId': r.id, 'VpcId': r.datos['VpcId'], 'OwnerId': self.cuenta, 'Routes': local + rutas,
+                'Associations': asociaciones, 'PropagatingVgws': []}
+
+    @operacion
+    def create_route_table(self, region, p):
+        vpc = self._buscar(region, 'vpc', p['VpcId'], 'InvalidVpcID.NotFound')
+        rt = self._nuevo(region, 'rt', 'rtb', {'VpcId': vpc.id, 'Routes': [], 'Asociaciones': {}}, p, 'route-table')
+        rt.programar(self._ahora(), ('available', None))
+        return {'RouteTable': self._vista(rt, self._ahora(), region)}
+
+    @operacion
+    def describe_route_tables(self, region, p):
+        return {'RouteTables': self._describir(region, 'rt', p, 'RouteTableIds', 'InvalidRouteTableID.NotFound')}
+
+    def _destino_ruta(self, region, rt, p):
+        """Campo y valor del destino de create_route/replace_route, validados"""
+        ahora = self._ahora()
+        if p.get('GatewayId'):
+            igw = self._buscar(region, 'igw', p['GatewayId'], 'InvalidInternetGatewayID.NotFound')
+            if self._adjunto(igw, ahora) != rt.datos['VpcId']:
+                raise ErrorAWS('InvalidParameterValue', f"route table {rt.id} and network gateway {igw.id} "
+                                                        "belong to different networks")
+            return 'GatewayId', igw.id
+        if p.get('NatGatewayId'):
+            nat = self._de(region, 'nat').get(p['NatGatewayId'])
+            if nat is None or not self._vivo(nat, ahora) or nat.estado(ahora) == 'deleting':
+                raise ErrorAWS('InvalidNatGatewayID.NotFound', f"The natGateway ID '{p['NatGatewayId']}' does not exist")
+            return 'NatGatewayId', nat.id
+        if p.get('TransitGatewayId'):
+            tgw = self._de(region, 'tgw').get(p['TransitGatewayId'])
+            adjunta = tgw is not None and any(
+                a.datos['TransitGatewayId'] == tgw.id and a.datos['VpcId'] == rt.datos['VpcId']
+                and a.estado(ahora) in ('pending', 'available') for a in self._de(region, 'vpc-attachment').values())
+            if not adjunta:
+                raise ErrorAWS('InvalidTransitGatewayID.NotFound',
+                               f"The transitGateway ID '{p['TransitGatewayId']}' does not exist.")
+            return 'TransitGatewayId', tgw.id
+        raise ErrorAWS('InvalidParameterCombination', "No route target specified")
+
+    @operacion
+    def create_route(self, region, p):
+        rt = self._buscar(region, 'rt', p['RouteTableId'], 'InvalidRouteTableID.NotFound')
+        destino = p['DestinationCidrBlock']
+        vpc = self._de(region, 'vpc').get(rt.datos['VpcId'])
+        if any(r['DestinationCidrBlock'] == destino for r in rt.datos['Routes']) or (vpc and vpc.datos['CidrBlock'] == destino):
+            raise ErrorAWS('RouteAlreadyExists', f"The route identified by {destino} already exists.")
+        campo, objetivo = self._destino_ruta(region, rt, p)
+        rt.datos['Routes'].append({'DestinationCidrBlock': destino, campo: objetivo})
+        return {'Return': True}
+
+    @operacion
+    def replace_route(self, region, p):
+        rt = self._buscar(region, 'rt', p['RouteTableId'], 'InvalidRouteTableID.NotFound')
+        indice = next((i for i, r in enumerate(rt.datos['Routes']) if r['DestinationCidrBlock'] == p['DestinationCidrBlock']), None)
+        if indice is None:
+            raise ErrorAWS('InvalidRoute.NotFound', f"no route with destination-cidr-block {p['DestinationCidrBlock']} "
+                                                    f"in route table {rt.id}")
+        campo, objetivo = self._destino_ruta(region, rt, p)
+        rt.datos['Routes'][indice] = {'DestinationCidrBlock': p['DestinationCidrBlock'], campo: objetivo}
+        return {}
+
+    @operacion
+    def delete_route(self, region, p):
+        rt = self._buscar(region, 'rt', p['RouteTableId'], 'InvalidRouteTableID.NotFound')
+        antes = len(rt.datos['Routes'])
+        rt.datos['Routes'] = [r for r in rt.datos['Routes'] if r['DestinationCidrBlock'] != p['DestinationCidrBlock']]
+        if len(rt.datos['Routes']) == antes:
+            raise ErrorAWS('InvalidRoute.NotFound', f"no route with destination-cidr-block {p['DestinationCidrBlock']} "
+                                                    f"in route table {rt.id}")
+        return {}
+
+    def _asociacion(self, region, tipo, asoc_id, codigo):
+        for r in self._de(region, tipo).values():
+            if asoc_id in r.datos['Asociaciones']:
+                return r
+        raise ErrorAWS(codigo, f"The association ID '{asoc_id}' does not exist")
+
+    @operacion
+    def associate_route_table(self, region, p):
+        rt = self._buscar(region, 'rt', p['RouteTableId'], 'InvalidRouteTableID.NotFound')
+        subred = self._buscar(region, 'subnet', p['SubnetId'], 'InvalidSubnetID.NotFound')
+        if subred.datos['VpcId'] != rt.datos['VpcId']:
+            raise ErrorAWS('InvalidParameterValue', f"Route table {rt.id} and subnet {subred.id} belong to different networks")
+        if any(subred.id in r.datos['Asociaciones'].values() for r in self._de(region, 'rt').values()):
+            raise ErrorAWS('Resource.AlreadyAssociated', f"the specified association for route table {rt.id} conflicts "
+                                                         "with an existing association")
+        asoc = self._id('rtbassoc')
+        rt.datos['Asociaciones'][asoc] = subred.id
+        return {'AssociationId': asoc, 'AssociationState': {'State': 'associated'}}
+
+    @operacion
+    def disassociate_route_table(self, region, p):
+        rt = self._asociacion(region, 'rt', p['AssociationId'], 'InvalidAssociationID.NotFound')
+        if rt.datos['Asociaciones'][p['AssociationId']] is None:
+            raise ErrorAWS('InvalidParameterValue', "cannot disassociate the main route table association")
+        del rt.datos['Asociaciones'][p['AssociationId']]
+        return {}
+
+    @operacion
+    def replace_route_table_association(self, region, p):
+        anterior = self._asociacion(region, 'rt', p['AssociationId'], 'InvalidAssociationID.NotFound')
+        rt = self._buscar(region, 'rt', p['RouteTableId'], 'InvalidRouteTableID.NotFound')
+        if rt.datos['VpcId'] != anterior.datos['VpcId']:
+            raise ErrorAWS('InvalidParameterValue', f"Route table {rt.id} belongs to a different network")
+        subred = anterior.datos['Asociaciones'].pop(p['AssociationId'])
+        nueva = self._id('rtbassoc')
+        rt.datos['Asociaciones'][nueva] = subred
+        return {'NewAssociationId': nueva, 'AssociationState': {'State': 'associated'}}
+
+    @operacion
+    def delete_route_table(self, region, p):
+        rt = self._buscar(region, 'rt', p['RouteTableId'], 'InvalidRouteTableID.NotFound')
+        if rt.datos['Asociaciones']:
+            raise ErrorAWS('DependencyViolation', f"The routeTable '{rt.id}' has dependencies and cannot be deleted.")
+        self._quitar(rt)
+        return {}
+
+    # --- NACLs ---
+
+    def _vista_nacl(self, r, ahora, region):
+        por_defecto = [{'RuleNumber': 32767, 'Protocol': '-1', 'RuleAction': 'deny', 'Egress': e, 'CidrBlock': '0.0.0.0/0'}
+                       for e in (False, True)]
+        return {'NetworkAclId': r.id, 'VpcId': r.datos['VpcId'], 'IsDefault': r.datos['IsDefault'], 'OwnerId': self.cuenta,
+                'Entries': sorted(r.datos['Entries'] + por_defecto, key=lambda e: (e['Egress'], e['RuleNumber'])),
+                'Associations': [{'NetworkAclAssociationId': a, 'NetworkAclId': r.id, 'SubnetId': s}
+                                 for a, s in r.datos['Asociaciones'].items()]}
+
+    @operacion
+    def create_network_acl(self, region, p):
+        vpc = self._buscar(region, 'vpc', p['VpcId'], 'InvalidVpcID.NotFound')
+        acl = self._nuevo(region, 'nacl', 'acl', {'VpcId': vpc.id, 'IsDefault': False, 'Entries': [], 'Asociaciones': {}},
+                          p, 'network-acl')
+        acl.programar(self._ahora(), ('available', None))
+        return {'NetworkAcl': self._vista(acl, self._ahora(), region)}
+
+    @operacion
+    def describe_network_acls(self, region, p):
+        return {'NetworkAcls': self._describir(region, 'nacl', p, 'NetworkAclIds', 'InvalidNetworkAclID.NotFound')}
+
+    @staticmethod
+    def _entrada_nacl(p):
+        entrada = {'RuleNumber': p['RuleNumber'], 'Protocol': p['Protocol'], 'RuleAction': p['RuleAction'],
+                   'Egress': p['Egress'], 'CidrBlock': p.get('CidrBlock')}
+        for campo in ('PortRange', 'IcmpTypeCode'):
+            if campo in p:
+                entrada[campo] = p[campo]
+        return entrada
+
+    def _indice_entrada(self, acl, p):
+        return next((i for i, e in enumerate(acl.datos['Entries'])
+                     if (e['Egress'], e['RuleNumber']) == (p['Egress'], p['RuleNumber'])), None)
+
+    @operacion
+    def create_network_acl_entry(self, region, p):
+        acl = self._buscar(region, 'nacl', p['NetworkAclId'], 'InvalidNetworkAclID.NotFound')
+        if not 1 <= p['RuleNumber'] <= 32766:
+            raise ErrorAWS('InvalidParameterValue', f"Invalid value for parameter ruleNumber: {p['RuleNumber']}")
+        if self._indice_entrada(acl, p) is not None:
+            raise ErrorAWS('NetworkAclEntryAlreadyExists', f"The network acl entry identified by {p['RuleNumber']} "
+                                                           "already exists.")
+        acl.datos['Entries'].append(self._entrada_nacl(p))
+        return {}
+
+    @operacion
+    def replace_network_acl_entry(self, region, p):
+        acl = self._buscar(region, 'nacl', p['NetworkAclId'], 'InvalidNetworkAclID.NotFound')
+        indice = self._indice_entrada(acl, p)
+        if indice is None:
+            raise ErrorAWS('InvalidNetworkAclEntry.NotFound', f"The network acl entry identified by {p['RuleNumber']} "
+                                                              "does not exist.")
+        acl.datos['Entries'][indice] = self._entrada_nacl(p)
+        return {}
+
+    @operacion
+    def delete_network_acl_entry(self, region, p):
+        acl = self._buscar(region, 'nacl', p['NetworkAclId'], 'InvalidNetworkAclID.NotFound')
+        indice = self._indice_entrada(acl, p)
+        if indice is None:
+            raise ErrorAWS('InvalidNetworkAclEntry.NotFound', f"The network acl entry identified by {p['RuleNumber']} "
+                                                              "does not exist.")
+        del acl.datos['Entries'][indice]
+        return {}
+
+    @operacion
+    def replace_network_acl_association(self, region, p):
+        anterior = self._asociacion(region, 'nacl', p['AssociationId'], 'InvalidAssociationID.NotFound')
+        acl = self._buscar(region, 'nacl', p['NetworkAclId'], 'InvalidNetworkAclID.NotFound')
+        if acl.datos['VpcId'] != anterior.datos['VpcId']:
+            raise ErrorAWS('InvalidParameterValue', f"Network ACL {acl.id} belongs to a different network")
+        subred = anterior.datos['Asociaciones'].pop(p['AssociationId'])
+        nueva = self._id('aclassoc')
+        acl.datos['Asociaciones'][nueva] = subred
+        return {'NewAssociationId': nueva}
+
+    @operacion
+    def delete_network_acl(self, region, p):
+        acl = self._buscar(region, 'nacl', p['NetworkAclId'], 'InvalidNetworkAclID.NotFound')
+        if acl.datos['IsDefault']:
+            raise ErrorAWS('InvalidParameterValue', f"cannot delete default network ACL {acl.id}")
+        if acl.datos['Asociaciones']:
+            raise ErrorAWS('DependencyViolation', f"The networkAcl '{acl.id}' has dependencies and cannot be deleted.")
+        self._quitar(acl)
+        return {}
+
+    # --- Security groups ---
+
+    def _vista_sg(self, r, ahora, region):
+        return {'GroupId': r.id, 'GroupName': r.datos['GroupName'], 'Description': r.datos['Description'],
+                'VpcId': r.datos['VpcId'], 'OwnerId': self.cuenta, 'IpPermissions': r.datos['IpPermissions'],
+                'IpPermissionsEgress': [{'IpProtocol': '-1', 'IpRanges': [{'CidrIp': '0.0.0.0/0'}], 'Ipv6Ranges': [],
+                                         'PrefixListIds': [], 'UserIdGroupPairs': []}]}
+
+    @operacion
+    def create_security_group(self, region, p):
+        vpc = self._buscar(region, 'vpc', p['VpcId'], 'InvalidVpcID.NotFound')
+        if any(g.datos['VpcId'] == vpc.id and g.datos['GroupName'] == p['GroupName'] for g in self._de(region, 'sg').values()):
+            raise ErrorAWS('InvalidGroup.Duplicate', f"The security group '{p['GroupName']}' already exists for VPC '{vpc.id}'")
+        sg = self._nuevo(region, 'sg', 'sg', {'VpcId': vpc.id, 'GroupName': p['GroupName'],
+                                              'Description': p['Description'], 'IpPermissions': []}, p, 'security-group')
+        sg.programar(self._ahora(), ('available', None))
+        return {'GroupId': sg.id, 'SecurityGroupArn': f"arn:aws:ec2:{region}:{self.cuenta}:security-group/{sg.id}"}
+
+    @operacion
+    def describe_security_groups(self, region, p):
+        return {'SecurityGroups': self._describir(region, 'sg', p, 'GroupIds', 'InvalidGroup.NotFound')}
+
+    @staticmethod
+    def _clave_permiso(permiso):
+        if permiso['IpProtocol'] in ('-1', 'all'):
+            return ('-1', None, None)
+        return (str(permiso['IpProtocol']), permiso.get('FromPort'), permiso.get('ToPort'))
+
+    @staticmethod
+    def _origenes(permiso):
+        return ([('IpRanges', 'CidrIp', r['CidrIp']) for r in permiso.get('IpRanges', [])]
+                + [('UserIdGroupPairs', 'GroupId', g['GroupId']) for g in permiso.get('UserIdGroupPairs', [])])
+
+    @operacion
+    def authorize_security_group_ingress(self, region, p):
+        sg = self._buscar(region, 'sg', p['GroupId'], 'InvalidGroup.NotFound')
+        for permiso in p.get('IpPermissions', []):
+            for _, _, origen in self._origenes(permiso):
+                if origen.startswith('sg-'):
+                    self._buscar(region, 'sg', origen, 'InvalidGroup.NotFound')
+            clave = self._clave_permiso(permiso)
+            actual = next((x for x in sg.datos['IpPermissions'] if self._clave_permiso(x) == clave), None)
+            if actual is None:
+                actual = {'IpProtocol': clave[0], 'IpRanges': [], 'Ipv6Ranges': [], 'PrefixListIds': [], 'UserIdGroupPairs': []}
+                if clave[0] != '-1':
+                    actual['FromPort'], actual['ToPort'] = clave[1], clave[2]
+                sg.datos['IpPermissions'].append(actual)
+            existentes = set(self._origenes(actual))
+            for lista, campo, origen in self._origenes(permiso):
+                if (lista, campo, origen) in existentes:
+                    raise ErrorAWS('InvalidPermission.Duplicate', f"the specified rule \"peer: {origen}, {clave[0]}\" "
+                                                                  "already exists")
+                actual.setdefault(lista, []).append({campo: origen, **({'UserId': self.cuenta} if campo == 'GroupId' else {})})
+        return {'Return': True}
+
+    @operacion
+    def revoke_security_group_ingress(self, region, p):
+        sg = self._buscar(region, 'sg', p['GroupId'], 'InvalidGroup.NotFound')
+        for permiso in p.get('IpPermissions', []):
+            clave = self._clave_permiso(permiso)
+            actual = next((x for x in sg.datos['IpPermissions'] if self._clave_permiso(x) == clave), None)
+            quitar = set(self._origenes(permiso))
+            if actual is None or not quitar <= set(self._origenes(actual)):
+                raise ErrorAWS('InvalidPermission.NotFound', "The specified rule does not exist in this security group.")
+            for lista in ('IpRanges', 'UserIdGroupPairs'):
+                campo = 'CidrIp' if lista == 'IpRanges' else 'GroupId'
+                actual[lista] = [x for x in actual.get(lista, []) if (lista, campo, x[campo]) not in quitar]
+            if not actual['IpRanges'] and not actual['UserIdGroupPairs']:
+                sg.datos['IpPermissions'].remove(actual)
+        return {'Return': True}
+
+    @operacion
+    def delete_security_group(self, region, p):
+        sg = self._buscar(region, 'sg', p['GroupId'], 'InvalidGroup.NotFound')
+        if sg.datos.get('_de_serie'):
+            raise ErrorAWS('CannotDelete', f"the specified group: \"{sg.id}\" name: \"default\" cannot be deleted by a user")
+        ahora = self._ahora()
+        referencias = [g for g in self._de(region, 'sg').values() if g is not sg and any(
+            par['GroupId'] == sg.id for permiso in g.datos['IpPermissions'] for par in permiso.get('UserIdGroupPairs', []))]
+        en_uso = [i for i in self._de(region, 'instance').values()
+                  if i.estado(ahora) != 'terminated' and sg.id in i.datos['GroupIds']]
+        if referencias or en_uso:
+            raise ErrorAWS('DependencyViolation', f"resource {sg.id} has a dependent object")
+        self._quitar(sg)
+        return {}
+
+    # --- Elastic IPs y NAT Gateways ---
+
+    def _asociada(self, region, allocation_id, ahora):
+        return next((n for n in self._de(region, 'nat').values()
+                     if n.datos['AllocationId'] == allocation_id and n.estado(ahora) not in ('deleted', 'failed')), None)
+
+    def _vista_eip(self, r, ahora, region):
+        vista = {'AllocationId': r.id, 'PublicIp': r.datos['PublicIp'], 'Domain': 'vpc', 'PublicIpv4Pool': 'amazon',
+                 'NetworkBorderGroup': region}
+        nat = self._asociada(region, r.id, ahora)
+        if nat is not None:
+            vista.update(AssociationId=f"eipassoc-{nat.id[4:]}", NetworkInterfaceId=nat.datos['NetworkInterfaceId'],
+                         PrivateIpAddress=nat.datos['PrivateIp'])
+        return vista
+
+    @operacion
+    def allocate_address(self, region, p):
+        eip = self._nuevo(region, 'eip', 'eipalloc', {'PublicIp': self._ip_publica()}, p, 'elastic-ip')
+        eip.programar(self._ahora(), ('available', None))
+        return {k: v for k, v in self._vista(eip, self._ahora(), region).items() if k != 'Tags'}
+
+    @operacion
+    def describe_addresses(self, region, p):
+        return {'Addresses': self._describir(region, 'eip', p, 'AllocationIds', 'InvalidAllocationID.NotFound')}
+
+    @operacion
+    def release_address(self, region, p):
+        eip = self._buscar(region, 'eip', p['AllocationId'], 'InvalidAllocationID.NotFound')
+        if self._asociada(region, eip.id, self._ahora()) is not None:
+            raise ErrorAWS('InvalidIPAddress.InUse', f"Address {eip.datos['PublicIp']} is in use.")
+        self._quitar(eip)
+        return {}
+
+    def _vista_nat(self, r, ahora, region):
+        estado = r.estado(ahora)
+        vista = {'NatGatewayId': r.id, 'SubnetId': r.datos['SubnetId'], 'VpcId': r.datos['VpcId'], 'State': estado,
+                 'ConnectivityType': 'public', 'CreateTime': self._fecha(r.creado),
+                 'NatGatewayAddresses': [{'AllocationId': r.datos['AllocationId'], 'PublicIp': r.datos['PublicIp'],
+                                          'PrivateIp': r.datos['PrivateIp'],
+                                          'NetworkInterfaceId': r.datos['NetworkInterfaceId']}]}
+        if estado == 'failed':
+            vista.update(FailureCode='Gateway.NotAttached',
+                         FailureMessage=f"Network {r.datos['VpcId']} has no Internet gateway attached")
+        if estado in ('deleting', 'deleted'):
+            vista['DeleteTime'] = self._fecha(r.desde(ahora))
+        return vista
+
+    @operacion
+    def create_nat_gateway(self, region, p):
+        subred = self._buscar(region, 'subnet', p['SubnetId'], 'InvalidSubnetID.NotFound')
+        eip = self._buscar(region, 'eip', p['AllocationId'], 'InvalidAllocationID.NotFound')
+        ahora = self._ahora()
+        if self._asociada(region, eip.id, ahora) is not None:
+            raise ErrorAWS('Resource.AlreadyAssociated', f"Elastic IP address [{eip.id}] is already associated")
+        nat = self._nuevo(region, 'nat', 'nat', {'SubnetId': subred.id, 'VpcId': subred.datos['VpcId'],
+                                                  'AllocationId': eip.id, 'PublicIp': eip.datos['PublicIp'],
+                                                  'PrivateIp': self._ip_privada(subred),
+                                                  'NetworkInterfaceId': self._id('eni')}, p, 'natgateway')
+        # Sin IGW en la VPC el NAT público no llega a funcionar: pending -> failed
+        con_igw = any(self._adjunto(g, ahora) == subred.datos['VpcId'] for g in self._de(region, 'igw').values())
+        nat.programar(ahora, ('pending', self.creacion['nat']), ('available' if con_igw else 'failed', None))
+        return {'NatGateway': self._vista(nat, ahora, region)}
+
+    @operacion
+    def describe_nat_gateways(self, region, p):
+        return {'NatGateways': self._describir(region, 'nat', p, 'NatGatewayIds', 'NatGatewayNotFound')}
+
+    @operacion
+    def delete_nat_gateway(self, region, p):
+        nat = self._buscar(region, 'nat', p['NatGatewayId'], 'NatGatewayNotFound')
+        ahora = self._ahora()
+        if nat.estado(ahora) in ('deleting', 'deleted'):
+            raise ErrorAWS('InvalidParameterValue', f"The NAT gateway {nat.id} is already being deleted")
+        nat.programar(ahora, ('deleting', self.borrado['nat']), ('deleted', None))
+        return {'NatGatewayId': nat.id}
+
+    # --- Instancias ---
+
+    def _vista_instance(self, r, ahora, region):
+        estado = r.estado(ahora)
+        vista = {'InstanceId': r.id, 'ImageId': r.datos['ImageId'], 'InstanceType': r.datos['InstanceType'],
+                 'State': {'Code': CODIGOS_INSTANCIA[estado], 'Name': estado}, 'LaunchTime': self._fecha(r.creado),
+                 'Placement': {'AvailabilityZone': r.datos['AvailabilityZone'], 'Tenancy': 'default'},
+                 'AmiLaunchIndex': r.datos['AmiLaunchIndex'], 'Architecture': 'x86_64', 'RootDeviceType': 'ebs'}
+        if estado != 'terminated':
+            vista.update(SubnetId=r.datos['SubnetId'], VpcId=r.datos['VpcId'], PrivateIpAddress=r.datos['PrivateIpAddress'],
+                         SecurityGroups=[{'GroupId': g, 'GroupName': self._de(region, 'sg')[g].datos['GroupName']}
+                                         for g in r.datos['GroupIds'] if g in self._de(region, 'sg')],
+                         NetworkInterfaces=[{'NetworkInterfaceId': r.datos['NetworkInterfaceId'],
+                                             'SubnetId': r.datos['SubnetId'], 'VpcId': r.datos['VpcId'],
+                                             'PrivateIpAddress': r.datos['PrivateIpAddress'], 'Status': 'in-use'}])
+        if estado == 'running' and r.datos.get('PublicIpAddress'):
+            vista['PublicIpAddress'] = r.datos['PublicIpAddress']
+        for campo in ('KeyName', 'IamInstanceProfile'):
+            if r.datos.get(campo):
+                vista[campo] = r.datos[campo]
+        return vista
+
+    @operacion
+    def run_instances(self, region, p):
+        interfaz = (p.get('NetworkInterfaces') or [{}])[0]
+        subred_id = p.get('SubnetId') or interfaz.get('SubnetId')
+        if not subred_id:
+            raise ErrorAWS('VPCIdNotSpecified', "No default VPC for this user")
+        subred = self._buscar(region, 'subnet', subred_id, 'InvalidSubnetID.NotFound')
+        vpc_id = subred.datos['VpcId']
+        grupos = p.get('SecurityGroupIds') or interfaz.get('Groups') or [
+            g.id for g in self._de(region, 'sg').values() if g.datos['VpcId'] == vpc_id and g.datos.get('_de_serie')]
+        for g in grupos:
+            if self._buscar(region, 'sg', g, 'InvalidGroup.NotFound').datos['VpcId'] != vpc_id:
+                raise ErrorAWS('InvalidParameter', f"Security group {g} and subnet {subred.id} belong to different networks.")
+        if not 1 <= p['MinCount'] <= p['MaxCount']:
+            raise ErrorAWS('InvalidParameterValue', "MinCount must be between 1 and MaxCount")
+        publica = interfaz.get('AssociatePublicIpAddress', subred.datos['MapPublicIpOnLaunch'])
+        perfil = p.get('IamInstanceProfile')
+        reserva = self._id('r')
+        instancias = []
+        for indice in range(p['MaxCount']):
+            inst = self._nuevo(region, 'instance', 'i', {
+                'ImageId': p['ImageId'], 'InstanceType': p.get('InstanceType', 'm1.small'), 'KeyName': p.get('KeyName'),
+                'SubnetId': subred.id, 'VpcId': vpc_id, 'AvailabilityZone': subred.datos['AvailabilityZone'],
+                'GroupIds': list(grupos), 'PrivateIpAddress': self._ip_privada(subred), 'NetworkInterfaceId': self._id('eni'),
+                'PublicIpAddress': self._ip_publica() if publica else None, 'ReservationId': reserva,
+                'AmiLaunchIndex': indice,
+                'IamInstanceProfile': {'Arn': f"arn:aws:iam::{self.cuenta}:instance-profile/{perfil.get('Name', '')}"}
+                if perfil else None})
+            for spec in p.get('TagSpecifications', []):
+                if spec['ResourceType'] == 'instance':
+                    inst.etiquetar(spec.get('Tags', []))
+            inst.programar(self._ahora(), ('pending', self.creacion['instance']), ('running', None))
+            instancias.append(inst)
+        return {'ReservationId': reserva, 'OwnerId': self.cuenta, 'Groups': [],
+                'Instances': [self._vista(i, self._ahora(), region) for i in instancias]}
+
+    @operacion
+    def describe_instances(self, region, p):
+        vistas = self._describir(region, 'instance', p, 'InstanceIds', 'InvalidInstanceID.NotFound')
+        reservas = {}
+        for vista in vistas:
+            reserva = self._de(region, 'instance')[vista['InstanceId']].datos['ReservationId']
+            reservas.setdefault(reserva, []).append(vista)
+        return {'Reservations': [{'ReservationId': r, 'OwnerId': self.cuenta, 'Groups': [], 'Instances': i}
+                                 for r, i in reservas.items()]}
+
+    @operacion
+    def terminate_instances(self, region, p):
+        ahora = self._ahora()
+        instancias = [self._buscar(region, 'instance', i, 'InvalidInstanceID.NotFound') for i in p['InstanceIds']]
+        cambios = []
+        for inst in instancias:
+            antes = inst.estado(ahora)
+            if antes not in ('shutting-down', 'terminated'):
+                inst.programar(ahora, ('shutting-down', self.borrado['instance']), ('terminated', None))
+            despues = inst.estado(ahora)
+            cambios.append({'InstanceId': inst.id, 'PreviousState': {'Code': CODIGOS_INSTANCIA[antes], 'Name': antes},
+                            'CurrentState': {'Code': CODIGOS_INSTANCIA[despues], 'Name': despues}})
+        return {'TerminatingInstances': cambios}
+
+    # --- Transit Gateways ---
+
+    def _vista_tgw(self, r, ahora, region):
+        return {'TransitGatewayId': r.id, 'TransitGatewayArn': f"arn:aws:ec2:{region}:{self.cuenta}:transit-gateway/{r.id}",
+                'State': r.estado(ahora), 'OwnerId': self.cuenta, 'Description': r.datos['Description'],
+                'CreationTime': self._fecha(r.creado), 'Options': r.datos['Options']}
+
+    def _vista_tgw_rt(self, r, ahora, region):
+        return {'TransitGatewayRouteTableId': r.id, 'TransitGatewayId': r.datos['TransitGatewayId'],
+                'State': r.estado(ahora), 'DefaultAssociationRouteTable': True, 'DefaultPropagationRouteTable': True,
+                'CreationTime': self._fecha(r.creado)}
+
+    @operacion
+    def create_transit_gateway(self, region, p):
+        opciones = {'AmazonSideAsn': 64512, 'AutoAcceptSharedAttachments': 'disable', 'DefaultRouteTableAssociation': 'enable',
+                    'DefaultRouteTablePropagation': 'enable', 'VpnEcmpSupport': 'enable', 'DnsSupport': 'enable',
+                    'MulticastSupport': 'disable'}
+        opciones.update(p.get('Options', {}))
+        tgw = self._nuevo(region, 'tgw', 'tgw', {'Description': p.get('Description', ''), 'Options': opciones},
+                          p, 'transit-gateway')
+        rt = self._nuevo(region, 'tgw-rt', 'tgw-rtb', {'TransitGatewayId': tgw.id, 'Routes': []})
+        opciones['AssociationDefaultRouteTableId'] = opciones['PropagationDefaultRouteTableId'] = rt.id
+        for r in (tgw, rt):
+            r.programar(self._ahora(), ('pending', self.creacion['tgw']), ('available', None))
+        return {'TransitGateway': self._vista(tgw, self._ahora(), region)}
+
+    @operacion
+    def describe_transit_gateways(self, region, p):
+        return {'TransitGateways': self._describir(region, 'tgw', p, 'TransitGatewayIds', 'InvalidTransitGatewayID.NotFound')}
+
+    def _attachments_de(self, region, tgw_id):
+        """Attachments (de VPC y peerings) que tocan el TGW"""
+        vpc = [a for a in self._de(region, 'vpc-attachment').values() if a.datos['TransitGatewayId'] == tgw_id]
+        peerings = [a for a in self._de(region, 'peering').values()
+                    if tgw_id in (a.datos['Requester']['TransitGatewayId'], a.datos['Accepter']['TransitGatewayId'])]
+        return vpc + peerings
+
+    @operacion
+    def delete_transit_gateway(self, region, p):
+        tgw = self._buscar(region, 'tgw', p['TransitGatewayId'], 'InvalidTransitGatewayID.NotFound')
+        ahora = self._ahora()
+        if tgw.estado(ahora) != 'available':
+            raise ErrorAWS('IncorrectState', f"{tgw.id} is in invalid state")
+        if any(self._vivo(a, ahora) for a in self._attachments_de(region, tgw.id)):
+            raise ErrorAWS('IncorrectState', f"{tgw.id} has non-deleted Transit Gateway Attachments")
+        rt = self._de(region, 'tgw-rt')[tgw.datos['Options']['AssociationDefaultRouteTableId']]
+        for r in (tgw, rt):
+            r.programar(ahora, ('deleting', self.borrado['tgw']), ('deleted', None))
+        return {'TransitGateway': self._vista(tgw, ahora, region)}
+
+    @operacion
+    def describe_transit_gateway_route_tables(self, region, p):
+        return {'TransitGatewayRouteTables': self._describir(region, 'tgw-rt', p, 'TransitGatewayRouteTableIds',
+                                                             'InvalidRouteTableID.NotFound')}
+
+    @operacion
+    def create_transit_gateway_route(self, region, p):
+        rt = self._buscar(region, 'tgw-rt', p['TransitGatewayRouteTableId'], 'InvalidRouteTableID.NotFound')
+        ahora = self._ahora()
+        if rt.estado(ahora) != 'available':
+            raise ErrorAWS('IncorrectState', f"{rt.id} is in invalid state")
+        if any(r['DestinationCidrBlock'] == p['DestinationCidrBlock'] for r in rt.datos['Routes']):
+            raise ErrorAWS('RouteAlreadyExists', f"Route {p['DestinationCidrBlock']} already exists in {rt.id}")
+        ruta = {'DestinationCidrBlock': p['DestinationCidrBlock'], 'Type': 'static'}
+        if p.get('Blackhole'):
+            ruta['State'] = 'blackhole'
+        else:
+            att_id = p['TransitGatewayAttachmentId']
+            att = self._de(region, 'vpc-attachment').get(att_id) or self._de(region, 'peering').get(att_id)
+            if att is None or not att.visible(ahora):
+                raise ErrorAWS('InvalidTransitGatewayAttachmentID.NotFound',
+                               f"Transit Gateway Attachment {att_id} was deleted or does not exist.")
+            if rt.datos['TransitGatewayId'] not in (t['TransitGatewayId'] for t in self._tgws_de(att)):
+                raise ErrorAWS('InvalidParameterValue', f"{att_id} is not attached to {rt.datos['TransitGatewayId']}")
+            if att.estado(ahora) != 'available':
+                raise ErrorAWS('IncorrectState', f"{att_id} is in invalid state")
+            ruta.update(State='active', TransitGatewayAttachments=[{'TransitGatewayAttachmentId': att_id}])
+        rt.datos['Routes'].append(ruta)
+        return {'Route': ruta}
+
+    # --- Attachments de VPC ---
+
+    def _tgws_de(self, att):
+        if att.tipo == 'peering':
+            return [att.datos['Requester'], att.datos['Accepter']]
+        return [{'TransitGatewayId': att.datos['TransitGatewayId']}]
+
+    def _vista_vpc_attachment(self, r, ahora, region):
+        return {'TransitGatewayAttachmentId': r.id, 'TransitGatewayId': r.datos['TransitGatewayId'], 'VpcId': r.datos['VpcId'],
+                'VpcOwnerId': self.cuenta, 'State': r.estado(ahora), 'SubnetIds': r.datos['SubnetIds'],
+                'CreationTime': self._fecha(r.creado),
+                'Options': {'DnsSupport': 'enable', 'Ipv6Support': 'disable', 'ApplianceModeSupport': 'disable'}}
+
+    @operacion
+    def create_transit_gateway_vpc_attachment(self, region, p):
+        tgw = self._buscar(region, 'tgw', p['TransitGatewayId'], 'InvalidTransitGatewayID.NotFound')
+        vpc = self._buscar(region, 'vpc', p['VpcId'], 'InvalidVpcID.NotFound')
+        ahora = self._ahora()
+        if tgw.estado(ahora) != 'available':
+            raise ErrorAWS('IncorrectState', f"{tgw.id} is in invalid state")
+        zonas = []
+        for subred_id in p['SubnetIds']:
+            subred = self._buscar(region, 'subnet', subred_id, 'InvalidSubnetID.NotFound')
+            if subred.datos['VpcId'] != vpc.id:
+                raise ErrorAWS('InvalidParameterValue', f"Subnet {subred_id} does not belong to {vpc.id}")
+            zonas.append(subred.datos['AvailabilityZone'])
+        if len(set(zonas)) != len(zonas):
+            raise ErrorAWS('DuplicateSubnetsInSameZone', "Subnets in the same availability zone are not allowed")
+        if any(a.datos['VpcId'] == vpc.id and self._vivo(a, ahora) for a in self._attachments_de(region, tgw.id)
+               if a.tipo == 'vpc-attachment'):
+            raise ErrorAWS('DuplicateTransitGatewayAttachment', f"{tgw.id} has a non-deleted attachment for {vpc.id}")
+        att = self._nuevo(region, 'vpc-attachment', 'tgw-attach', {'TransitGatewayId': tgw.id, 'VpcId': vpc.id,
+                                                                    'SubnetIds': list(p['SubnetIds'])},
+                          p, 'transit-gateway-attachment')
+        att.programar(ahora, ('pending', self.creacion['vpc-attachment']), ('available', None))
+        return {'TransitGatewayVpcAttachment': self._vista(att, ahora, region)}
+
+    @operacion
+    def describe_transit_gateway_vpc_attachments(self, region, p):
+        return {'TransitGatewayVpcAttachments': self._describir(region, 'vpc-attachment', p, 'TransitGatewayAttachmentIds',
+                                                                'InvalidTransitGatewayAttachmentID.NotFound')}
+
+    @operacion
+    def delete_transit_gateway_vpc_attachment(self, region, p):
+        att = self._buscar(region, 'vpc-attachment', p['TransitGatewayAttachmentId'],
+                           'InvalidTransitGatewayAttachmentID.NotFound')
+        ahora = self._ahora()
+        if att.estado(ahora) not in ('available', 'failed', 'rejected'):
+            raise ErrorAWS('IncorrectState', f"{att.id} is in invalid state")
+        att.programar(ahora, ('deleting', self.borrado['vpc-attachment']), ('deleted', None))
+        return {'TransitGatewayVpcAttachment': self._vista(att, ahora, region)}
+
+    # --- Peerings entre TGWs (el mismo attachment en las dos regiones) ---
+
+    def _vista_peering(self, r, ahora, region):
+        estado = r.estado(ahora)
+        return {'TransitGatewayAttachmentId': r.id, 'RequesterTgwInfo': r.datos['Requester'],
+                'AccepterTgwInfo': r.datos['Accepter'], 'State': estado, 'CreationTime': self._fecha(r.creado),
+                'Status': {'Code': estado, 'Message': estado}}
+
+    @operacion
+    def create_transit_gateway_peering_attachment(self, region, p):
+        tgw = self._buscar(region, 'tgw', p['TransitGatewayId'], 'InvalidTransitGatewayID.NotFound')
+        region_par = p['PeerRegion']
+        par = self._de(region_par, 'tgw').get(p['PeerTransitGatewayId'])
+        if p['PeerAccountId'] != self.cuenta or par is None or not self._vivo(par):
+            raise ErrorAWS('InvalidTransitGatewayID.NotFound',
+                           f"Transit Gateway {p['PeerTransitGatewayId']} was deleted or does not exist.")
+        ahora = self._ahora()
+        if tgw.estado(ahora) != 'available' or par.estado(ahora) != 'available':
+            raise ErrorAWS('IncorrectState', f"{tgw.id} or {par.id} is in invalid state")
+        if any({a.datos['Requester']['TransitGatewayId'], a.datos['Accepter']['TransitGatewayId']} == {tgw.id, par.id}
+               and self._vivo(a, ahora) for a in self._de(region, 'peering').values()):
+            raise ErrorAWS('DuplicateTransitGatewayAttachment', f"{tgw.id} is already peered with {par.id}")
+        peering = self._nuevo(region, 'peering', 'tgw-attach', {
+            'Requester': {'TransitGatewayId': tgw.id, 'OwnerId': self.cuenta, 'Region': region},
+            'Accepter': {'TransitGatewayId': par.id, 'OwnerId': self.cuenta, 'Region': region_par}},
+            p, 'transit-gateway-attachment')
+        self._de(region_par, 'peering')[peering.id] = peering
+        peering.programar(ahora, ('initiatingRequest', self.creacion['peering']), ('pendingAcceptance', None))
+        return {'TransitGatewayPeeringAttachment': self._vista(peering, ahora, region)}
+
+    @operacion
+    def describe_transit_gateway_peering_attachments(self, region, p):
+        return {'TransitGatewayPeeringAttachments': self._describir(
+            region, 'peering', p, 'TransitGatewayAttachmentIds', 'InvalidTransitGatewayAttachmentID.NotFound')}
+
+    @operacion
+    def accept_transit_gateway_peering_attachment(self, region, p):
+        peering = self._buscar(region, 'peering', p['TransitGatewayAttachmentId'], 'InvalidTransitGatewayAttachmentID.NotFound')
+        ahora = self._ahora()
+        if peering.datos['Accepter']['Region'] != region:
+            raise ErrorAWS('InvalidParameterValue', f"{peering.id} must be accepted from {peering.datos['Accepter']['Region']}")
+        if peering.estado(ahora) != 'pendingAcceptance':
+            raise ErrorAWS('IncorrectState', f"{peering.id} is in invalid state")
+        peering.programar(ahora, ('pending', self.aceptacion), ('available', None))
+        return {'TransitGatewayPeeringAttachment': self._vista(peering, ahora, region)}
+
+    @operacion
+    def reject_transit_gateway_peering_attachment(self, region, p):
+        peering = self._buscar(region, 'peering', p['TransitGatewayAttachmentId'], 'InvalidTransitGatewayAttachmentID.NotFound')
+        ahora = self._ahora()
+        if peering.estado(ahora) != 'pendingAcceptance':
+            raise ErrorAWS('IncorrectState', f"{peering.id} is in invalid state")
+        peering.programar(ahora, ('rejected', None))
+        return {'TransitGatewayPeeringAttachment': self._vista(peering, ahora, region)}
+
+    @operacion
+    def delete_transit_gateway_peering_attachment(self, region, p):
+        peering = self._buscar(region, 'peering', p['TransitGatewayAttachmentId'], 'InvalidTransitGatewayAttachmentID.NotFound')
+        ahora = self._ahora()
+        if peering.estado(ahora) not in ('available', 'pendingAcceptance', 'rejected', 'failed'):
+            raise ErrorAWS('IncorrectState', f"{peering.id} is in invalid state")
+        peering.programar(ahora, ('deleting', self.borrado['peering']), ('deleted', None))
+        return {'TransitGatewayPeeringAttachment': self._vista(peering, ahora, region)}
+
+    # --- Todos los attachments de la región ---
+
+    @operacion
+    def describe_transit_gateway_attachments(self, region, p):
+        ahora = self._ahora()
+        vistas = []
+        for att in self._de(region, 'vpc-attachment').values():
+            if att.visible(ahora):
+                vistas.append({'TransitGatewayAttachmentId': att.id, 'TransitGatewayId': att.datos['TransitGatewayId'],
+                               'ResourceType': 'vpc', 'ResourceId': att.datos['VpcId'], 'State': att.estado(ahora),
+                               'Tags': att.tags})
+        for att in self._de(region, 'peering').values():
+            if att.visible(ahora):
+                local, remoto = att.datos['Requester'], att.datos['Accepter']
+                if local['Region'] != region:
+                    local, remoto = remoto, local
+                vistas.append({'TransitGatewayAttachmentId': att.id, 'TransitGatewayId': local['TransitGatewayId'],
+                               'ResourceType': 'peering', 'ResourceId': remoto['TransitGatewayId'],
+                               'State': att.estado(ahora), 'Tags': att.tags})
+        for vista in vistas:
+            vista.update(TransitGatewayOwnerId=self.cuenta, ResourceOwnerId=self.cuenta)
+        ids = p.get('TransitGatewayAttachmentIds')
+        if ids:
+            vistas = [v for v in vistas if v['TransitGatewayAttachmentId'] in ids]
+        return {'TransitGatewayAttachments': [v for v in vistas if cumple(v, p.get('Filters'))]}
+
+    # --- Tags ---
+
+    @operacion
+    def create_tags(self, region, p):
+        ahora = self._ahora()
+        por_id = {r.id: r for por_tipo in self._regiones.get(region, {}).values() for r in por_tipo.values()}
+        for rid in p['Resources']:
+            recurso = por_id.get(rid)
+            if recurso is None or not recurso.visible(ahora):
+                raise ErrorAWS('InvalidID', f"The ID '{rid}' is not valid")
+            recurso.etiquetar(p['Tags'])
+        return {}
+
+
+# --- INSTALACIÓN EN BOTOCORE ---
+
+def _capturar(params=None, context=None, **kwargs):
+    # before-parameter-build: los parámetros tal cual los pasa el script, antes de serializarlos
+    if _activa is not None and context is not None:
+        context[_CLAVE] = params
+
+
+def _cargador_compartido(data_path=''):
+    # Cada sesión nueva volvería a leer el modelo de EC2 (varios MB de JSON): en la simulación se lee una vez
+    global _cargador
+    from botocore.loaders import create_loader
+    if _cargador is None:
+        _cargador = create_loader(data_path)
+    return _cargador
+
+
+def _responder(model=None, params=None, context=None, request_signer=None, **kwargs):
+    # before-call: la respuesta que devuelve un handler sustituye a la petición HTTP
+    simulado = _activa
+    if simulado is None:
+        return None
+    from botocore import xform_name
+    return simulado.atender(model.service_model.service_id.hyphenize(), xform_name(model.name),
+                            (context or {}).pop(_CLAVE, {}), request_signer.region_name, params['url'])
+
+
+@contextlib.contextmanager
+def simular(creacion=None, borrado=None, aceptacion=ACEPTACION, latencia=0.0, cuenta=CUENTA, quietud=QUIETUD):
+    """EC2/STS simulado y reloj virtual mientras dure el bloque; devuelve el EC2Simulado.
+
+    creacion/borrado: {tipo: segundos virtuales} que sustituyen a CREACION/BORRADO.
+    latencia: segundos virtuales de cada llamada.
+
+    Los clientes compartidos (clientes.py) y los inventarios se vacían al
+    entrar y al salir: los que se creen dentro responden desde la
+    simulación y ninguno creado antes llega a usarse en ella.
+    """
+    global _activa
+    import botocore.session
+    from botocore import handlers
+
+    import clientes
+    import inventario
+    if _activa is not None:
+        raise RuntimeError("Ya hay una simulación en marcha en este proceso")
+    reloj = Reloj(quietud)
+    simulado = EC2Simulado(reloj, creacion, borrado, aceptacion, cuenta, latencia)
+    cargador_original = botocore.session.create_loader
+    # Credenciales ficticias: los clientes no buscan las reales (ni el IMDS) y nada podría firmarse contra AWS
+    entorno = {'AWS_ACCESS_KEY_ID': 'simulado', 'AWS_SECRET_ACCESS_KEY': 'simulado', 'AWS_SESSION_TOKEN': 'simulado',
+               'AWS_DEFAULT_REGION': os.environ.get('AWS_DEFAULT_REGION', 'us-east-1'),
+               'AWS_EC2_METADATA_DISABLED': 'true', 'AWS_PROFILE': None}
+    entorno_original = {k: os.environ.get(k) for k in entorno}
+    nuevos = [('before-parameter-build', _capturar, handlers.REGISTER_LAST), ('before-call', _responder, handlers.REGISTER_LAST)]
+
+    def restaurar_entorno(valores):
+        for clave, valor in valores.items():
+            if valor is None:
+                os.environ.pop(clave, None)
+            else:
+                os.environ[clave] = valor
+
+    restaurar_entorno(entorno)
+    handlers.BUILTIN_HANDLERS.extend(nuevos)
+    clientes.limpiar()
+    inventario.limpiar()
+    botocore.session.create_loader = _cargador_compartido
+    _activa = simulado
+    try:
+        with reloj_virtual(reloj):
+            yield simulado
+    finally:
+        _activa = None
+        botocore.session.create_loader = cargador_original
+        for handler in nuevos:
+            handlers.BUILTIN_HANDLERS.remove(handler)
+        clientes.limpiar()
+        inventario.limpiar()
+        restaurar_entorno(entorno_original)
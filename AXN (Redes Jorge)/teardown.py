@@ -0,0 +1,209 @@
+"""Motor de borrado por capas para VPCs.
+
+Descubre todo lo que cuelga de una o varias VPCs (con un describe por tipo
+de recurso para todas a la vez) y lo borra en orden inverso de
+dependencias. Dentro de cada capa todo se borra en paralelo, y solo se
+espera a lo que realmente bloquea a la capa siguiente:
+
+  1. instancias, NAT Gateways, attachments de TGW  (esperas agrupadas)
+  2. ENIs sueltas y Elastic IPs de los NAT
+  3. subredes
+  4. tablas de rutas, security groups y NACLs
+  5. Internet Gateways
+  6. VPCs
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+import trazas
+from metricas import con_contexto
+from waiters import esperar_todos, reintentar, estados_instancias, estados_nat, estados_vpc_attachments
+
+
+def _paginar(client, operacion, clave, filtros):
+    paginas = client.get_paginator(operacion).paginate(Filters=filtros)
+    return [r for pagina in paginas for r in pagina[clave]]
+
+
+def descubrir(client, vpc_ids, indice=None):
+    """Inventario de todo lo borrable en las VPCs indicadas.
+
+    Sin 'indice' se hace un describe por tipo para todas las VPCs a la vez; con un
+    inventario.Inventario ya cargado se resuelve todo desde su índice.
+    """
+    vpc_ids = list(vpc_ids)
+    por_vpc = [{'Name': 'vpc-id', 'Values': vpc_ids}]
+
+    if indice is not None:
+        def de(tipo):
+            return [indice.get(i) for v in vpc_ids for i in indice.de_vpc(v, tipo)]
+        instancias = de('instances')
+        nats = de('nat_gateways')
+        attachments = de('tgw_attachments')
+        rts = de('route_tables')
+        sgs = de('security_groups')
+        nacls = de('network_acls')
+        igws = de('internet_gateways')
+        subredes = de('subnets')
+    else:
+        instancias = [i for r in _paginar(client, 'describe_instances', 'Reservations', por_vpc) for i in r['Instances']]
+        nats = _paginar(client, 'describe_nat_gateways', 'NatGateways', por_vpc)
+        attachments = _paginar(client, 'describe_transit_gateway_vpc_attachments', 'TransitGatewayVpcAttachments', por_vpc)
+        rts = _paginar(client, 'describe_route_tables', 'RouteTables', por_vpc)
+        sgs = _paginar(client, 'describe_security_groups', 'SecurityGroups', por_vpc)
+        nacls = _paginar(client, 'describe_network_acls', 'NetworkAcls', por_vpc)
+        igws = _paginar(client, 'describe_internet_gateways', 'InternetGateways',
+                        [{'Name': 'attachment.vpc-id', 'Values': vpc_ids}])
+        subredes = _paginar(client, 'describe_subnets', 'Subnets', por_vpc)
+
+    instancias = [i for i in instancias if i['State']['Name'] not in ('terminated',)]
+    nats = [n for n in nats if n['State'] not in ('deleted', 'deleting')]
+    attachments = [a for a in attachments if a['State'] not in ('deleted', 'deleting')]
+    rts = [rt for rt in rts if not any(a.get('Main') for a in rt.get('Associations', []))]
+    sgs = [sg for sg in sgs if sg['GroupName'] != 'default']
+    nacls = [n for n in nacls if not n['IsDefault']]
+
+    return {
+        'vpcs': list(vpc_ids),
+        'instancias': [i['InstanceId'] for i in instancias],
+        'nats': [n['NatGatewayId'] for n in nats],
+        'eips': [a['AllocationId'] for n in nats for a in n.get('NatGatewayAddresses', []) if a.get('AllocationId')],
+        'attachments': [a['TransitGatewayAttachmentId'] for a in attachments],
+        'subredes': [s['SubnetId'] for s in subredes],
+        'rts': rts,
+        'sgs': sgs,
+        'nacls': [n['NetworkAclId'] for n in nacls],
+        'igws': [(g['InternetGatewayId'], a['VpcId']) for g in igws for a in g.get('Attachments', []) if a['VpcId'] in vpc_ids],
+    }
+
+
+def _es_dependencia(e):
+    return isinstance(e, ClientError) and e.response['Error']['Code'] in ('DependencyViolation', 'IncorrectState')
+
+
+def _ya_borrado(e):
+    return isinstance(e, ClientError) and 'NotFound' in e.response['Error']['Code']
+
+
+def _capa(pool, nombre, acciones, resumen, log, timeout=300):
+    """Lanza todas las acciones de una capa a la vez; reintenta las que fallan por dependencias"""
+    if not acciones:
+        return
+    if log:
+        log(f"Capa '{nombre}': {len(acciones)} operaciones en paralelo...")
+
+    def ejecutar(descripcion, funcion):
+        try:
+            reintentar(funcion, _es_dependencia, timeout=timeout, log=None)
+            return descripcion, None
+        except Exception as e:
+            if _ya_borrado(e):
+                return descripcion, None
+            return descripcion, e
+
+    with trazas.tramo(f"capa {nombre}", 'capa'):
+        for descripcion, error in pool.map(con_contexto(lambda a: ejecutar(*a)), acciones):
+            if error is None:
+                resumen['borrados'] += 1
+            else:
+                resumen['errores'].append(f"{descripcion}: {error}")
+                if log:
+                    log(f"Error en {descripcion}: {error}")
+
+
+def destruir_vpcs(client, vpc_ids, max_workers=16, log=None, indice=None):
+    """Borra por completo las VPCs indicadas y todo lo que contienen.
+
+    indice: inventario.Inventario de la región ya cargado (ahorra los describes de descubrimiento).
+
+    Devuelve un resumen {'borrados': n, 'errores': [...]}.
+    """
+    resumen = {'borrados': 0, 'errores': []}
+    vpc_ids = list(vpc_ids)
+    if not vpc_ids:
+        return resumen
+
+    inv = descubrir(client, vpc_ids, indice)
+    if log:
+        log(f"Descubiertos en {vpc_ids}: {len(inv['instancias'])} instancias, {len(inv['nats'])} NAT, "
+            f"{len(inv['attachments'])} attachments, {len(inv['subredes'])} subredes, {len(inv['rts'])} RTs, "
+            f"{len(inv['sgs'])} SGs, {len(inv['nacls'])} NACLs, {len(inv['igws'])} IGWs")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        # 1. Lo que tarda en desaparecer: se ordena todo a la vez y se espera en lote
+        acciones = []
+        if inv['instancias']:
+            acciones.append(('terminar instancias', lambda: client.terminate_instances(InstanceIds=inv['instancias'])))
+        acciones += [(f"NAT {n}", lambda n=n: client.delete_nat_gateway(NatGatewayId=n)) for n in inv['nats']]
+        acciones += [(f"attachment {a}", lambda a=a: client.delete_transit_gateway_vpc_attachment(TransitGatewayAttachmentId=a))
+                     for a in inv['attachments']]
+        _capa(pool, 'instancias/NAT/attachments', acciones, resumen, log)
+
+        esperas = []
+        esperar = con_contexto(esperar_todos)   # Las esperas cuelgan del paso que borra en las trazas
+        if inv['instancias']:
+            esperas.append(pool.submit(esperar, estados_instancias(client), inv['instancias'], listo={'terminated'},
+                                       ausente='terminated', timeout=900, descripcion='instancias terminando', log=log))
+        if inv['nats']:
+            esperas.append(pool.submit(esperar, estados_nat(client), inv['nats'], listo={'deleted'},
+                                       ausente='deleted', timeout=900, descripcion='NAT Gateways borrándose', log=log))
+        if inv['attachments']:
+            esperas.append(pool.submit(esperar, estados_vpc_attachments(client), inv['attachments'], listo={'deleted'},
+                                       ausente='deleted', timeout=900, descripcion='attachments borrándose', log=log))
+        for espera in esperas:
+            try:
+                espera.result()
+            except Exception as e:
+                resumen['errores'].append(str(e))
+
+        # 2. Restos: ENIs que quedaron 'available' y las EIPs de los NAT
+        enis = _paginar(client, 'describe_network_interfaces', 'NetworkInterfaces',
+                        [{'Name': 'vpc-id', 'Values': vpc_ids}, {'Name': 'status', 'Values': ['available']}])
+        acciones = [(f"ENI {e['NetworkInterfaceId']}", lambda e=e: client.delete_network_interface(NetworkInterfaceId=e['NetworkInterfaceId']))
+                    for e in enis]
+        acciones += [(f"EIP {a}", lambda a=a: client.release_address(AllocationId=a)) for a in inv['eips']]
+        _capa(pool, 'ENIs/EIPs', acciones, resumen, log)
+
+        # 3. Subredes
+        _capa(pool, 'subredes', [(f"subred {s}", lambda s=s: client.delete_subnet(SubnetId=s)) for s in inv['subredes']],
+              resumen, log)
+
+        # 4. Tablas de rutas, SGs y NACLs. Los SGs que se referencian entre sí
+        #    (SG-Backend -> SG-Frontend) se desenganchan antes de borrarlos.
+        referencias = [(sg['GroupId'], [p for p in sg.get('IpPermissions', []) if p.get('UserIdGroupPairs')]) for sg in inv['sgs']]
+        _capa(pool, 'referencias entre SGs',
+              [(f"revocar reglas de {g}", lambda g=g, p=p: client.revoke_security_group_ingress(GroupId=g, IpPermissions=p))
+               for g, p in referencias if p], resumen, log)
+
+        acciones = []
+        for rt in inv['rts']:
+            def borrar_rt(rt=rt):
+                for a in rt.get('Associations', []):
+                    if a.get('SubnetId'):
+                        try:
+                            client.disassociate_route_table(AssociationId=a['RouteTableAssociationId'])
+                        except ClientError as e:
+                            if not _ya_borrado(e):
+                                raise
+                client.delete_route_table(RouteTableId=rt['RouteTableId'])
+            acciones.append((f"RT {rt['RouteTableId']}", borrar_rt))
+        acciones += [(f"SG {sg['GroupId']}", lambda g=sg['GroupId']: client.delete_security_group(GroupId=g)) for sg in inv['sgs']]
+        acciones += [(f"NACL {n}", lambda n=n: client.delete_network_acl(NetworkAclId=n)) for n in inv['nacls']]
+        _capa(pool, 'RTs/SGs/NACLs', acciones, resumen, log)
+
+        # 5. Internet Gateways
+        def borrar_igw(igw_id, vpc_id):
+            client.detach_internet_gateway(InternetGatewayId=igw_id, VpcId=vpc_id)
+            client.delete_internet_gateway(InternetGatewayId=igw_id)
+        _capa(pool, 'IGWs', [(f"IGW {g}", lambda g=g, v=v: borrar_igw(g, v)) for g, v in inv['igws']], resumen, log)
+
+        # 6. VPCs
+        _capa(pool, 'VPCs', [(f"VPC {v}", lambda v=v: client.delete_vpc(VpcId=v)) for v in vpc_ids], resumen, log)
+
+    if indice is not None:
+        # Refresco incremental: solo se vuelven a leer las VPCs borradas
+        indice.refrescar(vpc_ids=vpc_ids)
+    if log:
+        log(f"Borrado terminado: {resumen['borrados']} operaciones OK, {len(resumen['errores'])} errores.")
+    return resumen
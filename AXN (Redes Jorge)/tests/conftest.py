@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los scripts son módulos sueltos en el directorio de arriba (se importan por nombre, como entre ellos)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
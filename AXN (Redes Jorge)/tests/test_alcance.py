@@ -0,0 +1,172 @@
+"""alcance.py frente a una evaluación por fuerza bruta (regla a regla, con ipaddress)."""
+import ipaddress
+import random
+
+import pytest
+
+from alcance import EFIMEROS, Evaluador, IndiceReglas
+from nacls import CON_PUERTOS, EntradaNacl
+from plan import ReglaSg
+
+CIDRS = ['0.0.0.0/0', '10.0.0.0/16', '10.0.1.0/24', '10.0.2.0/23', '10.0.3.128/25', '8.8.8.0/24', '10.0.0.16/28']
+PROTOCOLOS = ['6', '17', '1', '-1']
+SUBREDES = {'sub-a': '10.0.0.0/24', 'sub-b': '10.0.1.0/24', 'sub-c': '10.0.2.0/24', 'sub-d': '10.0.3.0/24'}
+IPS_SUELTAS = ['8.8.8.8', '10.0.3.200', '10.0.1.50', '192.168.1.1']
+
+
+def _entradas(rnd, n, egress=False):
+    entradas = []
+    for numero in rnd.sample(range(1, 200), n):
+        proto = rnd.choice(PROTOCOLOS)
+        desde = hasta = None
+        if proto in CON_PUERTOS:
+            desde = rnd.choice([0, 22, 80, 443, 1024, 3000, 40000])
+            hasta = min(65535, desde + rnd.choice([0, 10, 1000, 30000, 65535]))
+        entradas.append(EntradaNacl(egress, numero, proto, desde, hasta, rnd.choice(CIDRS), rnd.choice(['allow', 'deny'])))
+    return entradas
+
+
+def _coincide(e, ip, proto, puerto):
+    return (ipaddress.IPv4Address(ip) in ipaddress.ip_network(e.cidr) and e.protocolo in ('-1', proto)
+            and (e.desde is None or proto not in CON_PUERTOS or e.desde <= puerto <= e.hasta))
+
+
+def _primera(entradas, ip, proto, puerto):
+    return next((e for e in sorted(entradas, key=lambda e: e.numero) if _coincide(e, ip, proto, puerto)), None)
+
+
+def _permite_rango(entradas, ip, proto, desde, hasta):
+    """Todos los puertos desde-hasta permitidos: basta mirar los extremos de cada tramo de reglas"""
+    if proto not in CON_PUERTOS:
+        desde = hasta = 0
+    puertos = {desde} | {p for e in entradas if e.desde is not None
+                         for p in (e.desde, e.hasta + 1) if desde <= p <= hasta}
+    return all((r := _primera(entradas, ip, proto, p)) is not None and r.accion == 'allow' for p in puertos)
+
+
+@pytest.mark.parametrize('semilla', range(20))
+def test_indice_igual_que_primera_regla(semilla):
+    rnd = random.Random(semilla)
+    entradas = _entradas(rnd, rnd.randint(0, 12))
+    indice = IndiceReglas(entradas)
+    ips = ['10.0.0.20', '10.0.1.7', '10.0.2.255', '10.0.3.129', '8.8.8.8', '0.0.0.0', '255.255.255.255']
+    for ip in ips:
+        entero = int(ipaddress.IPv4Address(ip))
+        for proto in PROTOCOLOS + ['50']:
+            for puerto in (0, 22, 80, 443, 1023, 1024, 3000, 40000, 65535):
+                assert indice.regla(entero, proto, puerto) == _primera(entradas, ip, proto, puerto)
+            for desde, hasta in ((22, 22), (80, 443), EFIMEROS):
+                assert indice.permite(entero, proto, desde, hasta)[0] == _permite_rango(entradas, ip, proto, desde, hasta)
+
+
+class _Modelo:
+    """La misma VPC que el Evaluador, resuelta a mano"""
+
+    def __init__(self, rnd):
+        self.nacls = {'nacl-1': (_entradas(rnd, 6), _entradas(rnd, 6, True)),
+                      'nacl-2': (_entradas(rnd, 6), _entradas(rnd, 6, True))}
+        self.nacl_de = {'sub-a': 'nacl-1', 'sub-b': 'nacl-1', 'sub-c': 'nacl-2'}   # sub-d sin NACL
+        self.sgs = {}
+        for nombre in ('sg-web', 'sg-db', 'sg-admin'):
+            reglas = []
+            for _ in range(rnd.randint(0, 3)):
+                proto = rnd.choice(['tcp', 'udp', 'icmp', '-1'])
+                desde, hasta = (sorted(rnd.sample([22, 80, 443, 3306, 8080], 2)) if proto in ('tcp', 'udp')
+                                else (None, None))
+                origen = rnd.choice(CIDRS[:6] + ['sg:sg-web', 'sg:sg-admin'])
+                reglas.append(ReglaSg(proto, desde, hasta, origen))
+            self.sgs[nombre] = reglas
+        self.instancias = {f"ec2-{s}": (str(ipaddress.ip_network(c).network_address + 10),
+                                        rnd.sample(sorted(self.sgs), rnd.randint(0, 2)))
+                           for s, c in SUBREDES.items()}
+
+    def evaluador(self):
+        ev = Evaluador()
+        for nombre, cidr in SUBREDES.items():
+            ev.anadir_subred(nombre, cidr)
+        for nombre, (entrada, salida) in self.nacls.items():
+            ev.anadir_nacl(nombre, entrada + salida, [s for s, n in self.nacl_de.items() if n == nombre])
+        for nombre, reglas in self.sgs.items():
+            ev.anadir_sg(nombre, reglas)
+        for nombre, (ip, sgs) in self.instancias.items():
+            ev.anadir_instancia(nombre, ip, sgs)
+        return ev
+
+    def ip(self, punto):
+        if punto in self.instancias:
+            return self.instancias[punto][0]
+        if punto in SUBREDES:
+            return str(ipaddress.ip_network(SUBREDES[punto]).network_address + 10)
+        return punto
+
+    def subred(self, ip):
+        return next((s for s, c in SUBREDES.items() if ipaddress.IPv4Address(ip) in ipaddress.ip_network(c)), None)
+
+    def sgs_de(self, ip):
+        return next((sgs for i, sgs in self.instancias.values() if i == ip), None)
+
+    def permite(self, origen, destino, puerto, proto, efimeros):
+        ip_o, ip_d = self.ip(origen), self.ip(destino)
+        sub_o, sub_d = self.subred(ip_o), self.subred(ip_d)
+        if sub_o != sub_d:
+            nacl_o, nacl_d = self.nacl_de.get(sub_o), self.nacl_de.get(sub_d)
+            pasos = []
+            if nacl_o:
+                pasos += [(self.nacls[nacl_o][1], ip_d, puerto, puerto), (self.nacls[nacl_o][0], ip_d, *efimeros)]
+            if nacl_d:
+                pasos += [(self.nacls[nacl_d][0], ip_o, puerto, puerto), (self.nacls[nacl_d][1], ip_o, *efimeros)]
+            if not all(_permite_rango(entradas, ip, proto, desde, hasta) for entradas, ip, desde, hasta in pasos):
+                return False
+        sgs = self.sgs_de(ip_d)
+        if sgs is None:
+            return True
+        sgs_origen = self.sgs_de(ip_o) or []
+        for nombre in sgs:
+            for r in self.sgs[nombre]:
+                p = {'tcp': '6', 'udp': '17', 'icmp': '1'}.get(r.protocolo, r.protocolo)
+                if p not in ('-1', proto):
+                    continue
+                if proto in CON_PUERTOS and r.desde is not None and not r.desde <= puerto <= r.hasta:
+                    continue
+                if (r.origen[3:] in sgs_origen if r.origen.startswith('sg:')
+                        else ipaddress.IPv4Address(ip_o) in ipaddress.ip_network(r.origen)):
+                    return True
+        return False
+
+
+@pytest.mark.parametrize('semilla', range(15))
+def test_evaluador_igual_que_fuerza_bruta(semilla):
+    modelo = _Modelo(random.Random(semilla))
+    ev = modelo.evaluador()
+    puntos = list(modelo.instancias) + list(SUBREDES) + IPS_SUELTAS
+    for origen in puntos:
+        for destino in puntos:
+            for puerto, protocolo, puerto_origen in ((22, 'tcp', None), (443, 'tcp', 40000), (53, 'udp', None),
+                                                     (0, 'icmp', None), (3306, '-1', 1500)):
+                proto = {'tcp': '6', 'udp': '17', 'icmp': '1'}.get(protocolo, protocolo)
+                efimeros = (puerto_origen, puerto_origen) if puerto_origen is not None else EFIMEROS
+                esperado = modelo.permite(origen, destino, puerto, proto, efimeros)
+                veredicto = ev.flujo(origen, destino, puerto, protocolo, puerto_origen)
+                assert veredicto.permitido == esperado, (origen, destino, puerto, protocolo, veredicto.motivo)
+                assert ev.permite(origen, destino, puerto, protocolo, puerto_origen) == esperado
+
+
+@pytest.mark.parametrize('semilla', range(5))
+def test_lote_igual_que_permite(semilla):
+    modelo = _Modelo(random.Random(semilla))
+    ev = modelo.evaluador()
+    puntos = list(modelo.instancias) + list(SUBREDES) + IPS_SUELTAS
+    ip = {p: int(ipaddress.IPv4Address(modelo.ip(p))) for p in puntos}
+    flujos = [(o, d, puerto) for o in puntos for d in puntos for puerto in (22, 80, 443, 3306)]
+    for protocolo, puerto_origen in (('tcp', None), ('udp', 40000), ('-1', None)):
+        lote = ev.permite_ips([(ip[o], ip[d], puerto) for o, d, puerto in flujos], protocolo, puerto_origen)
+        assert lote == [ev.permite(o, d, puerto, protocolo, puerto_origen) for o, d, puerto in flujos]
+
+
+def test_motivo_de_un_flujo_bloqueado():
+    ev = (Evaluador().anadir_subred('pub', '10.0.0.0/24').anadir_subred('priv', '10.0.1.0/24')
+          .anadir_nacl('nacl-priv', [EntradaNacl(False, 100, '6', 22, 22, '10.0.0.0/24', 'deny')], ['priv']))
+    veredicto = ev.flujo('pub', 'priv', 22)
+    assert not veredicto.permitido
+    assert veredicto.motivo == "NACL nacl-priv (entrada, regla 100) bloquea la ida desde 10.0.0.10"
+    assert ev.flujo('pub', 'pub', 22).permitido
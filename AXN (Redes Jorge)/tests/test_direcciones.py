@@ -0,0 +1,86 @@
+"""direcciones.py: asignador buddy y plan de direcciones."""
+import ipaddress
+import random
+
+import pytest
+
+from direcciones import EspacioLibre, SinEspacio, Solapamiento, comprobar_sin_solapes, plan_direcciones
+
+
+def test_asigna_el_bloque_mas_bajo_y_parte_lo_justo():
+    espacio = EspacioLibre('10.0.0.0/16')
+    assert espacio.asignar(24) == '10.0.0.0/24'
+    assert espacio.asignar(20) == '10.0.16.0/20'
+    assert espacio.asignar(24) == '10.0.1.0/24'
+    assert espacio.libre() == 2 ** 16 - 2 ** 12 - 2 * 2 ** 8
+
+
+def test_liberar_fusiona_con_el_companero():
+    espacio = EspacioLibre('10.0.0.0/16')
+    bloques = [espacio.asignar(18) for _ in range(4)]
+    with pytest.raises(SinEspacio):
+        espacio.asignar(24)
+    for cidr in reversed(bloques):
+        espacio.liberar(cidr)
+    # Todo fusionado de nuevo: cabe el superbloque entero
+    assert espacio.asignar(16) == '10.0.0.0/16'
+
+
+def test_liberar_un_hueco_se_reutiliza():
+    espacio = EspacioLibre('10.0.0.0/24')
+    a, b, c = (espacio.asignar(26) for _ in range(3))
+    espacio.liberar(a)
+    assert espacio.asignar(27) == '10.0.0.0/27'
+    with pytest.raises(ValueError):
+        espacio.liberar(a)
+
+
+def test_reservar_y_solapes():
+    espacio = EspacioLibre('10.0.0.0/16')
+    espacio.reservar('10.0.0.0/24')
+    assert espacio.asignar(24) == '10.0.1.0/24'
+    with pytest.raises(Solapamiento):
+        espacio.reservar('10.0.0.128/25')
+    with pytest.raises(Solapamiento):
+        espacio.reservar('192.168.0.0/24')
+
+
+@pytest.mark.parametrize('semilla', range(10))
+def test_asignaciones_aleatorias_sin_solapes(semilla):
+    rnd = random.Random(semilla)
+    espacio = EspacioLibre('10.0.0.0/16')
+    vivos = []
+    for _ in range(400):
+        if vivos and rnd.random() < 0.4:
+            espacio.liberar(vivos.pop(rnd.randrange(len(vivos))))
+            continue
+        prefijo = rnd.randint(18, 28)
+        try:
+            cidr = espacio.asignar(prefijo)
+        except SinEspacio:
+            continue
+        red = ipaddress.IPv4Network(cidr)
+        assert red.prefixlen == prefijo and not any(red.overlaps(ipaddress.IPv4Network(v)) for v in vivos)
+        vivos.append(cidr)
+        assert espacio.libre() == 2 ** 16 - sum(ipaddress.IPv4Network(v).num_addresses for v in vivos)
+    comprobar_sin_solapes(vivos)
+    for cidr in vivos:
+        espacio.liberar(cidr)
+    assert espacio.asignar(16) == '10.0.0.0/16'
+
+
+def test_plan_diez_regiones_de_veinte_vpcs():
+    regiones = {f"region-{r}": {f"VPC-{r}-{v}": 2 for v in range(20)} for r in range(10)}
+    plan = plan_direcciones(regiones)
+    assert len(plan.vpcs) == 200 and len(plan.subredes) == 400
+    comprobar_sin_solapes(plan.vpcs.values())
+    comprobar_sin_solapes(plan.regiones.values())
+    for region, vpcs in regiones.items():
+        resumen = ipaddress.IPv4Network(plan.regiones[region])
+        assert all(ipaddress.IPv4Network(plan.vpcs[v]).subnet_of(resumen) for v in vpcs)
+
+
+def test_plan_que_no_cabe_dice_el_prefijo_que_haria_falta():
+    regiones = {f"region-{r}": {f"VPC-{r}-{v}": 1 for v in range(20)} for r in range(10)}
+    with pytest.raises(SinEspacio, match="VPCs /17"):
+        plan_direcciones(regiones, prefijo_vpc=16)
@@ -0,0 +1,73 @@
+"""rutas.py: longest prefix match frente a ipaddress y trazas entre VPCs y TGWs."""
+import ipaddress
+import random
+
+import pytest
+
+from rutas import Red, TriePrefijos
+
+
+def _mas_largo(prefijos, ip):
+    """Referencia: entre los prefijos que contienen la IP, el más largo"""
+    direccion = ipaddress.IPv4Address(ip)
+    dentro = [n for n in prefijos if direccion in n]
+    return str(max(dentro, key=lambda n: n.prefixlen)) if dentro else None
+
+
+@pytest.mark.parametrize('semilla', range(20))
+def test_buscar_igual_que_ipaddress(semilla):
+    rnd = random.Random(semilla)
+    prefijos = {ipaddress.IPv4Network((rnd.getrandbits(32), longitud), strict=False)
+                for longitud in (rnd.choice([0, 1, 8, 12, 16, 20, 24, 28, 32]) for _ in range(rnd.randint(1, 60)))}
+    # Prefijos anidados dentro de los que ya hay, para que el más largo importe
+    prefijos |= {next(n.subnets(new_prefix=min(32, n.prefixlen + rnd.randint(1, 8)))) for n in list(prefijos)
+                 if n.prefixlen < 32}
+    trie = TriePrefijos()
+    for n in prefijos:
+        trie.insertar(str(n), str(n))
+    assert len(trie) == len(prefijos)
+    ips = [rnd.getrandbits(32) for _ in range(300)]
+    ips += [int(n.network_address) for n in prefijos] + [int(n.broadcast_address) for n in prefijos]
+    for ip in ips:
+        assert trie.buscar(ip) == _mas_largo(prefijos, ip)
+
+
+def test_reinsertar_sustituye_el_valor():
+    trie = TriePrefijos()
+    trie.insertar('10.0.0.0/8', 'a')
+    trie.insertar('10.0.0.0/8', 'b')
+    assert len(trie) == 1
+    assert trie.buscar(int(ipaddress.IPv4Address('10.1.2.3'))) == 'b'
+    assert trie.buscar(int(ipaddress.IPv4Address('11.0.0.0'))) is None
+
+
+def _dos_regiones():
+    red = (Red()
+           .anadir_vpc('east', '10.0.0.0/16', {'10.0.0.0/8': 'tgw-e'})
+           .anadir_vpc('west', '10.1.0.0/16', {'10.0.0.0/8': 'tgw-w'})
+           .anadir_tgw('tgw-e', {'10.0.0.0/16': 'att-east', '10.1.0.0/16': 'peer'})
+           .anadir_tgw('tgw-w', {'10.1.0.0/16': 'att-west', '10.0.0.0/8': 'peer'})
+           .adjuntar_vpc('att-east', 'tgw-e', 'east')
+           .adjuntar_vpc('att-west', 'tgw-w', 'west')
+           .peering('peer', 'tgw-e', 'tgw-w'))
+    return red
+
+
+def test_traza_entre_regiones_por_ruta_resumida():
+    traza = _dos_regiones().trazar('east', 'west')
+    assert traza.resultado == 'entregado'
+    assert [nodo for nodo, _ in traza.saltos] == [('vpc', 'east'), ('tgw', 'tgw-e'), ('tgw', 'tgw-w'), ('vpc', 'west')]
+    assert _dos_regiones().trazar('west', 'east').resultado == 'entregado'
+
+
+def test_resultados_de_traza():
+    red = _dos_regiones()
+    red.anadir_ruta_tgw('tgw-e', '10.2.0.0/16', 'peer')      # tgw-w lo devuelve por el /8 resumido
+    red.anadir_ruta_tgw('tgw-e', '10.3.0.0/16', 'blackhole')
+    red.anadir_ruta_vpc('east', '0.0.0.0/0', 'igw')
+    assert red.trazar('east', '10.2.0.5').resultado == 'bucle'
+    assert red.trazar('east', '10.3.0.5').resultado == 'blackhole'
+    assert red.trazar('east', '8.8.8.8').resultado == 'fuera'
+    assert red.trazar('west', '8.8.8.8').resultado == 'sin-ruta'
+    pares = red.todos_los_pares()
+    assert pares[('east', 'west')][0] == pares[('west', 'east')][0] == 'entregado'
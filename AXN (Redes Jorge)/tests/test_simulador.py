@@ -0,0 +1,31 @@
+"""Un deploy + destroy completo sobre simulador_ec2 y el alcance de su reloj virtual."""
+import argparse
+import time
+
+import pytest
+
+import medir_despliegues
+import simulador_ec2
+import waiters
+
+
+def test_deploy_y_destroy_sobre_el_simulador():
+    # Como en medir_despliegues --virtual: intérprete nuevo sobre una copia de los scripts (sin tocar .estado/)
+    args = argparse.Namespace(latencia=0.0, retrasos=dict(simulador_ec2.CREACION), throttling=None,
+                              virtual=True, timeout=300)
+    r = medir_despliegues.medir('examen', 'examen', {}, args)
+    assert 'error' not in r, r.get('salida')
+    assert r['restos'] == {}
+    assert r['fases']['deploy'] >= simulador_ec2.CREACION['nat']   # Esperó al NAT, en segundos virtuales
+    assert r['reales'] < r['segundos']
+
+
+def test_reloj_virtual_solo_en_los_modulos_parcheados():
+    sleep, monotonic = time.sleep, time.monotonic
+    with simulador_ec2.simular() as aws:
+        assert time.sleep is sleep and time.monotonic is monotonic
+        antes = waiters.time.monotonic()
+        waiters.time.sleep(3600)
+        assert waiters.time.monotonic() - antes == pytest.approx(3600)
+        assert aws.reloj.transcurrido() >= 3600
+    assert waiters.time is time
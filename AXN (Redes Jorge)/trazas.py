@@ -0,0 +1,286 @@
+"""Trazas de despliegues y limpiezas: tramos, camino crítico y tiempo ocioso.
+
+Cada paso (metricas.en_paso: pasos del DAG, EstadoDespliegue.paso, fases
+de los scripts) y cada espera a AWS (waiters, coalescer, asincrono) abre
+un tramo con inicio y fin, región, IDs de recursos y el tramo padre. El
+padre viaja en una contextvar, así que los pools que copian el contexto
+(metricas.con_contexto) y las tareas de asyncio cuelgan sus tramos del
+paso que las lanzó.
+
+    with trazas.ejecucion('ejercicio1'):
+        main()
+
+Al cerrar la ejecución se calcula:
+    - el camino crítico: la cadena de tramos que marca la duración total.
+      Entre pasos del DAG se siguen sus dependencias; en el resto, el
+      hermano que terminó justo antes de empezar el siguiente. Cada
+      eslabón se desglosa en sus propios hijos.
+    - el tiempo ocioso: cuánto de la ejecución no había ningún paso en
+      marcha, y cuánto hay entre eslabones del camino crítico.
+y se escribe .trazas/<nombre>.json en formato de eventos de Chrome, que
+abren chrome://tracing y ui.perfetto.dev. El camino crítico va repetido
+en una fila propia para verlo de un vistazo.
+"""
+import contextlib
+import contextvars
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+# --- CONFIGURACIÓN ---
+DIRECTORIO_TRAZAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.trazas')
+TOLERANCIA = 0.05   # Segundos de solape admitidos al encadenar hermanos sin dependencias
+RE_REGION = re.compile(r'\b[a-z]{2}(?:-gov)?-[a-z]+-\d\b')
+RE_ID = re.compile(r'^[a-z]+(?:-[a-z]+)*-[0-9a-f]{8,17}$')
+
+_actual = contextvars.ContextVar('tramo', default=None)
+_lock = threading.Lock()
+_tramos = []
+_ids = itertools.count(1)
+
+
+class Tramo:
+    """Intervalo de la ejecución: un paso, una espera, una capa de borrado..."""
+
+    def __init__(self, nombre, categoria, padre, depende=None, region=None, recursos=()):
+        self.id = next(_ids)
+        self.nombre = nombre
+        self.categoria = categoria
+        self.padre = padre
+        self.depende = None if depende is None else tuple(depende)   # None: se desconocen
+        self.region = region or _region(nombre)
+        self.recursos = list(recursos)
+        self.carril = _carril()
+        self.inicio = time.monotonic()
+        self.fin = None
+        self.error = None
+
+    @property
+    def duracion(self):
+        return (self.fin if self.fin is not None else time.monotonic()) - self.inicio
+
+    def anotar(self, valor):
+        """Añade los IDs de AWS que aparezcan en valor (resultado de un paso, lista de IDs...)"""
+        for rid in ids_en(valor):
+            if rid not in self.recursos:
+                self.recursos.append(rid)
+
+    def __repr__(self):
+        return f"Tramo({self.nombre!r}, {self.categoria}, {self.duracion:.1f}s)"
+
+
+def _region(nombre):
+    encontrada = RE_REGION.search(nombre)
+    return encontrada.group(0) if encontrada else None
+
+
+def _carril():
+    # Fila del visor: la tarea de asyncio si hay bucle en marcha, si no el hilo.
+    # asyncio no se importa aquí (cuesta ~50 ms de arranque): si nadie lo ha
+    # cargado, tampoco puede haber un bucle en marcha.
+    asyncio = sys.modules.get('asyncio')
+    tarea = None
+    if asyncio is not None:
+        try:
+            tarea = asyncio.current_task()
+        except RuntimeError:
+            pass
+    return tarea.get_name() if tarea is not None else threading.current_thread().name
+
+
+def ids_en(valor):
+    """IDs de AWS (vpc-..., subnet-..., tgw-attach-...) dentro de un valor cualquiera"""
+    if isinstance(valor, str):
+        return [valor] if RE_ID.match(valor) else []
+    if isinstance(valor, dict):
+        return [i for v in valor.values() for i in ids_en(v)]
+    if isinstance(valor, (list, tuple, set)):
+        return [i for v in valor for i in ids_en(v)]
+    rid = getattr(valor, 'id', None)   # boto3 resources (ec2.Vpc, ec2.Subnet...)
+    return ids_en(rid) if isinstance(rid, str) else []
+
+
+def actual():
+    return _actual.get()
+
+
+@contextlib.contextmanager
+def tramo(nombre, categoria='paso', depende=None, region=None, recursos=()):
+    """Registra el bloque como tramo hijo del tramo en curso"""
+    padre = _actual.get()
+    nuevo = Tramo(nombre, categoria, padre.id if padre else None, depende, region, ids_en(list(recursos)))
+    with _lock:
+        _tramos.append(nuevo)
+    token = _actual.set(nuevo)
+    try:
+        yield nuevo
+    except BaseException as e:
+        nuevo.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _actual.reset(token)
+        nuevo.fin = time.monotonic()
+
+
+# --- ANÁLISIS ---
+
+def tramos():
+    with _lock:
+        return list(_tramos)
+
+
+def _hijos(todos, padre):
+    return [t for t in todos if t.padre == padre.id and t.fin is not None]
+
+
+def _cadena(hijos):
+    """Hermanos que marcan el final del padre: del que acaba el último hacia atrás"""
+    if not hijos:
+        return []
+    por_nombre = {t.nombre: t for t in hijos}
+    eslabon = max(hijos, key=lambda t: t.fin)
+    cadena = [eslabon]
+    while True:
+        if eslabon.depende is not None:
+            previos = [por_nombre[d] for d in eslabon.depende if d in por_nombre]
+        else:
+            previos = [t for t in hijos if t is not eslabon and t.fin <= eslabon.inicio + TOLERANCIA]
+        previos = [t for t in previos if t not in cadena]
+        if not previos:
+            return cadena[::-1]
+        eslabon = max(previos, key=lambda t: t.fin)
+        cadena.append(eslabon)
+
+
+def ruta_critica(raiz, todos=None):
+    """[(profundidad, tramo)]: el camino crítico de raiz, cada eslabón seguido del de sus hijos"""
+    todos = tramos() if todos is None else todos
+    resultado = []
+
+    def desglosar(padre, profundidad):
+        for eslabon in _cadena(_hijos(todos, padre)):
+            resultado.append((profundidad, eslabon))
+            desglosar(eslabon, profundidad + 1)
+
+    desglosar(raiz, 0)
+    return resultado
+
+
+def _union(intervalos):
+    total, fin = 0.0, None
+    for a, b in sorted(intervalos):
+        if fin is None or a > fin:
+            total += b - a
+            fin = b
+        elif b > fin:
+            total += b - fin
+            fin = b
+    return total
+
+
+def analizar(raiz, todos=None):
+    """Duración, camino crítico y tiempos ocioso/esperando de una ejecución"""
+    todos = tramos() if todos is None else todos
+    hijos = _hijos(todos, raiz)
+    cadena = _cadena(hijos)
+    descendientes, pendientes = [], [raiz]
+    while pendientes:
+        nuevos = _hijos(todos, pendientes.pop())
+        descendientes += nuevos
+        pendientes += nuevos
+    fin = raiz.fin if raiz.fin is not None else time.monotonic()
+    # Huecos del camino crítico: antes del primer eslabón, entre eslabones y tras el último
+    bordes = [raiz.inicio] + [x for t in cadena for x in (t.inicio, t.fin)] + [fin]
+    huecos = sum(max(0.0, bordes[i + 1] - bordes[i]) for i in range(0, len(bordes), 2))
+    return {
+        'duracion': raiz.duracion,
+        'ruta_critica': [{'profundidad': p, 'nombre': t.nombre, 'categoria': t.categoria, 'region': t.region,
+                          'segundos': t.duracion, 'recursos': t.recursos}
+                         for p, t in ruta_critica(raiz, todos)],
+        'ocioso': raiz.duracion - _union([(t.inicio, t.fin) for t in hijos]),
+        'huecos_ruta_critica': huecos,
+        'esperando_aws': _union([(t.inicio, t.fin) for t in descendientes if t.categoria == 'espera']),
+    }
+
+
+# --- EXPORTACIÓN ---
+
+def chrome(raiz, todos=None):
+    """Eventos de traza de Chrome/Perfetto (tramos completos 'X', en microsegundos)"""
+    todos = tramos() if todos is None else todos
+    incluidos, pendientes = [raiz], [raiz]
+    while pendientes:
+        padre = pendientes.pop()
+        nuevos = [t for t in todos if t.padre == padre.id]
+        incluidos += nuevos
+        pendientes += nuevos
+    carriles = {'ruta crítica': 0}
+    for t in incluidos:
+        carriles.setdefault(t.carril, len(carriles))
+    nombres = {t.id: t.nombre for t in incluidos}
+    critica = {t.id for _, t in ruta_critica(raiz, todos)}
+
+    def evento(t, tid):
+        fin = t.fin if t.fin is not None else time.monotonic()
+        args = {'region': t.region, 'recursos': t.recursos, 'padre': nombres.get(t.padre)}
+        if t.depende:
+            args['depende'] = list(t.depende)
+        if t.error:
+            args['error'] = t.error
+        return {'name': t.nombre, 'cat': t.categoria, 'ph': 'X', 'pid': 1, 'tid': tid,
+                'ts': round((t.inicio - raiz.inicio) * 1e6), 'dur': round((fin - t.inicio) * 1e6),
+                'args': {k: v for k, v in args.items() if v not in (None, [])}}
+
+    eventos = [{'name': 'process_name', 'ph': 'M', 'pid': 1, 'args': {'name': raiz.nombre}}]
+    eventos += [{'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': carril}}
+                for carril, tid in carriles.items()]
+    eventos += [evento(t, carriles[t.carril]) for t in incluidos]
+    eventos += [evento(t, 0) for t in incluidos if t.id in critica]
+    return {'traceEvents': eventos, 'displayTimeUnit': 'ms', 'otherData': analizar(raiz, todos)}
+
+
+def exportar(raiz, nombre=None, directorio=DIRECTORIO_TRAZAS):
+    """Escribe <nombre>.json (abrir en ui.perfetto.dev o chrome://tracing) y devuelve su ruta"""
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, f"{nombre or raiz.nombre}.json")
+    with open(ruta, 'w') as f:
+        json.dump(chrome(raiz), f, indent=1)
+    return ruta
+
+
+def resumen(raiz, log=print, n=12):
+    datos = analizar(raiz)
+    log(f"Ejecución '{raiz.nombre}': {datos['duracion']:.1f} s, ocioso {datos['ocioso']:.1f} s, "
+        f"huecos en el camino crítico {datos['huecos_ruta_critica']:.1f} s, "
+        f"esperando a AWS {datos['esperando_aws']:.1f} s")
+    log("Camino crítico:")
+    for eslabon in datos['ruta_critica'][:n]:
+        sangria = '  ' * (eslabon['profundidad'] + 1)
+        log(f"{sangria}{eslabon['nombre']:<{44 - len(sangria)}} {eslabon['segundos']:>8.1f} s")
+    if len(datos['ruta_critica']) > n:
+        log(f"  ... ({len(datos['ruta_critica']) - n} más en la traza)")
+
+
+@contextlib.contextmanager
+def ejecucion(nombre, exportar_a=DIRECTORIO_TRAZAS, log=print):
+    """Tramo raíz de un despliegue o limpieza: al salir resume y exporta la traza (aunque falle)"""
+    with tramo(nombre, 'ejecucion') as raiz:
+        try:
+            yield raiz
+        finally:
+            raiz.fin = time.monotonic()
+            if log:
+                resumen(raiz, log)
+            if exportar_a:
+                ruta = exportar(raiz, directorio=exportar_a)
+                if log:
+                    log(f"Traza en {ruta}")
+
+
+def limpiar():
+    with _lock:
+        _tramos.clear()
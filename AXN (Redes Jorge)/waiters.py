@@ -0,0 +1,186 @@
+"""Motor de esperas compartido para recursos AWS.
+
+Sustituye los bucles 'while True: describe; sleep(10)' y las esperas a
+ciegas. Cada sondeo hace UNA sola llamada describe con todos los IDs
+pendientes, el intervalo crece con backoff exponencial y jitter, y cada
+recurso tiene su propio plazo máximo.
+"""
+import random
+import time
+
+import metricas
+
+# --- CONFIGURACIÓN ---
+VALORES_POR_FILTRO = 200   # EC2 rechaza filtros con más valores: los IDs van por tandas
+
+
+class TiempoAgotado(Exception):
+    """Algún recurso no llegó al estado esperado dentro de su plazo."""
+
+    def __init__(self, mensaje, pendientes):
+        super().__init__(mensaje)
+        self.pendientes = pendientes
+
+
+class EstadoFallido(Exception):
+    """Algún recurso llegó a un estado del que ya no va a salir (failed, deleted...)."""
+
+    def __init__(self, mensaje, fallidos):
+        super().__init__(mensaje)
+        self.fallidos = fallidos
+
+
+def backoff(intento, base=2.0, maximo=30.0):
+    """Segundos a esperar en el intento N: exponencial con 'full jitter'"""
+    techo = min(maximo, base * (2 ** min(intento, 16)))
+    return random.uniform(base / 2, max(base / 2, techo))
+
+
+def esperar(consultar, ids, listo, fallido=(), modo='todos', timeout=600,
+            ausente=None, base=2.0, maximo=30.0, descripcion='recursos', log=None):
+    """Espera a que los recursos lleguen a un estado de 'listo'.
+
+    consultar(ids) -> {id: estado}: una sola llamada para todos los IDs.
+    listo / fallido: conjuntos de estados finales buenos y malos.
+    modo: 'todos' espera a todos, 'alguno' vuelve con el primero que esté listo.
+    timeout: segundos (para todos) o {id: segundos} con plazos por recurso.
+    ausente: estado que se asigna a los IDs que el describe no devuelve
+        ('deleted' para esperas de borrado; None = seguir esperando).
+
+    Devuelve {id: estado} de los recursos que quedaron listos.
+    El tiempo esperado se anota en metricas.py con el tipo y la región de
+    consultar (las funciones estados_* de abajo los llevan).
+    """
+    with metricas.espera(getattr(consultar, 'tipo', descripcion), getattr(consultar, 'region', None), ids):
+        return _esperar(consultar, ids, listo, fallido, modo, timeout, ausente, base, maximo, descripcion, log)
+
+
+def _esperar(consultar, ids, listo, fallido, modo, timeout, ausente, base, maximo, descripcion, log):
+    listo = set(listo)
+    fallido = set(fallido)
+    inicio = time.monotonic()
+    if isinstance(timeout, dict):
+        plazos = {i: inicio + timeout.get(i, 600) for i in ids}
+    else:
+        plazos = {i: inicio + timeout for i in ids}
+
+    pendientes = list(dict.fromkeys(ids))
+    hechos = {}
+    intento = 0
+
+    while pendientes:
+        estados = consultar(pendientes)
+        malos = {}
+        for rid in pendientes:
+            estado = estados.get(rid, ausente)
+            if estado in listo:
+                hechos[rid] = estado
+            elif estado in fallido:
+                malos[rid] = estado
+
+        if malos:
+            raise EstadoFallido(f"{descripcion} en estado fallido: {malos}", malos)
+
+        pendientes = [i for i in pendientes if i not in hechos]
+        if not pendientes or (modo == 'alguno' and hechos):
+            break
+
+        ahora = time.monotonic()
+        vencidos = [i for i in pendientes if ahora >= plazos[i]]
+        if vencidos:
+            raise TiempoAgotado(f"Tiempo agotado esperando {descripcion}: {vencidos}", vencidos)
+
+        pausa = min(backoff(intento, base, maximo), max(0.0, min(plazos[i] for i in pendientes) - ahora))
+        if log:
+            log(f"Esperando {descripcion}... {len(hechos)}/{len(hechos) + len(pendientes)} listos (siguiente consulta en {pausa:.0f}s)")
+        time.sleep(pausa)
+        intento += 1
+
+    return hechos
+
+
+def esperar_todos(consultar, ids, listo, **kwargs):
+    return esperar(consultar, ids, listo, modo='todos', **kwargs)
+
+
+def esperar_alguno(consultar, ids, listo, **kwargs):
+    return esperar(consultar, ids, listo, modo='alguno', **kwargs)
+
+
+def reintentar(funcion, reintentable, timeout=300, base=2.0, maximo=30.0, log=None):
+    """Ejecuta funcion() reintentando con backoff mientras reintentable(error) sea cierto"""
+    limite = time.monotonic() + timeout
+    intento = 0
+    while True:
+        try:
+            return funcion()
+        except Exception as e:
+            if not reintentable(e) or time.monotonic() >= limite:
+                raise
+            pausa = backoff(intento, base, maximo)
+            if log:
+                log(f"Reintentando en {pausa:.0f}s ({e})")
+            time.sleep(pausa)
+            intento += 1
+
+
+# --- CONSULTAS AGRUPADAS (un describe por sondeo, con paginación) ---
+
+def _paginas(client, operacion, filtro, ids):
+    """Páginas del describe filtrado por los IDs, en tandas de VALORES_POR_FILTRO"""
+    ids = list(ids)
+    for i in range(0, len(ids), VALORES_POR_FILTRO):
+        filtros = [{'Name': filtro, 'Values': ids[i:i + VALORES_POR_FILTRO]}]
+        if client.can_paginate(operacion):
+            yield from client.get_paginator(operacion).paginate(Filters=filtros)
+        else:
+            yield getattr(client, operacion)(Filters=filtros)
+
+
+def _describir(client, operacion, clave, filtro, campo_id, ids):
+    return {r[campo_id]: r['State'] for pagina in _paginas(client, operacion, filtro, ids) for r in pagina[clave]}
+
+
+def _consulta(client, tipo, funcion):
+    """consultar(ids) etiquetada con tipo y región para las métricas de espera"""
+    funcion.tipo = tipo
+    funcion.region = getattr(getattr(client, 'meta', None), 'region_name', None)
+    return funcion
+
+
+def estados_tgw(client):
+    return _consulta(client, 'tgw', lambda ids: _describir(client, 'describe_transit_gateways', 'TransitGateways',
+                                                           'transit-gateway-id', 'TransitGatewayId', ids))
+
+
+def estados_vpc_attachments(client):
+    return _consulta(client, 'vpc-attachment', lambda ids: _describir(
+        client, 'describe_transit_gateway_vpc_attachments', 'TransitGatewayVpcAttachments',
+        'transit-gateway-attachment-id', 'TransitGatewayAttachmentId', ids))
+
+
+def estados_peering(client):
+    return _consulta(client, 'peering', lambda ids: _describir(
+        client, 'describe_transit_gateway_peering_attachments', 'TransitGatewayPeeringAttachments',
+        'transit-gateway-attachment-id', 'TransitGatewayAttachmentId', ids))
+
+
+def estados_attachments(client):
+    return _consulta(client, 'attachment', lambda ids: _describir(
+        client, 'describe_transit_gateway_attachments', 'TransitGatewayAttachments',
+        'transit-gateway-attachment-id', 'TransitGatewayAttachmentId', ids))
+
+
+def estados_nat(client):
+    return _consulta(client, 'nat', lambda ids: _describir(client, 'describe_nat_gateways', 'NatGateways',
+                                                           'nat-gateway-id', 'NatGatewayId', ids))
+
+
+def estados_instancias(client):
+    def consultar(ids):
+        paginas = _paginas(client, 'describe_instances', 'instance-id', ids)
+        return {
+            i['InstanceId']: i['State']['Name']
+            for pagina in paginas for r in pagina['Reservations'] for i in r['Instances']
+        }
+    return _consulta(client, 'instance', consultar)